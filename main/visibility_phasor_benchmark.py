@@ -0,0 +1,67 @@
+import numpy as NP
+import argparse
+import time
+import scipy.constants as FCNST
+from prisim import interferometry as RI
+
+## Benchmark the evaluation of phasors by frequency recurrence against the
+## direct evaluation of complex exponentials used in observe() and report
+## the maximum deviation between the two in double and single precision
+
+parser = argparse.ArgumentParser(description='Program to benchmark phasor evaluation methods used in visibility simulations')
+parser.add_argument('--nsrc', dest='nsrc', help='Number of sources', type=int, default=2000)
+parser.add_argument('--nbl', dest='nbl', help='Number of baselines', type=int, default=200)
+parser.add_argument('--nchan', dest='nchan', help='Number of frequency channels', type=int, default=128)
+parser.add_argument('--maxbl', dest='maxbl', help='Maximum baseline length [m]', type=float, default=300.0)
+parser.add_argument('--freq', dest='freq', help='Center frequency [Hz]', type=float, default=150e6)
+parser.add_argument('--bw', dest='bw', help='Bandwidth [Hz]', type=float, default=10e6)
+parser.add_argument('--renorm', dest='renorm', help='Renormalization interval [channels]', type=int, default=16)
+parser.add_argument('--ntrials', dest='ntrials', help='Number of trials', type=int, default=3)
+
+args = vars(parser.parse_args())
+
+nsrc = args['nsrc']
+nbl = args['nbl']
+nchan = args['nchan']
+renorm_interval = args['renorm']
+ntrials = args['ntrials']
+
+randstate = NP.random.RandomState(0)
+bl = args['maxbl'] * (2.0 * randstate.rand(nbl,3) - 1.0)
+bl[:,2] = 0.0
+skypos_dircos = randstate.randn(nsrc,3)
+skypos_dircos[:,2] = NP.abs(skypos_dircos[:,2])
+skypos_dircos = skypos_dircos / NP.sqrt(NP.sum(skypos_dircos**2, axis=1, keepdims=True))
+delays = NP.dot(skypos_dircos, bl.T) / FCNST.c # nsrc x nbl
+channels = args['freq'] - 0.5*args['bw'] + args['bw'] / nchan * NP.arange(nchan)
+pbfluxes = randstate.rand(nsrc,nchan)
+
+print 'Benchmarking {0:0d} sources x {1:0d} baselines x {2:0d} channels with renormalization every {3:0d} channels'.format(nsrc, nbl, nchan, renorm_interval)
+
+for memsave in [False, True]:
+    if memsave:
+        precision = 'single'
+    else:
+        precision = 'double'
+    t_direct = []
+    t_recurrence = []
+    for trial in xrange(ntrials):
+        t1 = time.time()
+        if memsave:
+            phasors_direct = NP.exp(-1j * NP.asarray(2.0 * NP.pi).astype(NP.float32) * delays[:,:,NP.newaxis].astype(NP.float32) * channels.astype(NP.float32).reshape(1,1,-1)).astype(NP.complex64)
+        else:
+            phasors_direct = NP.exp(-1j * 2.0 * NP.pi * delays[:,:,NP.newaxis] * channels.reshape(1,1,-1))
+        skyvis_direct = NP.sum(pbfluxes[:,NP.newaxis,:] * phasors_direct, axis=0)
+        t2 = time.time()
+        phasors_recurrence = RI.phasor_recurrence(delays, channels, renorm_interval=renorm_interval, memsave=memsave)
+        skyvis_recurrence = NP.sum(pbfluxes[:,NP.newaxis,:] * phasors_recurrence, axis=0)
+        t3 = time.time()
+        t_direct += [t2 - t1]
+        t_recurrence += [t3 - t2]
+
+    phasors_exact = NP.exp(-1j * 2.0 * NP.pi * delays[:,:,NP.newaxis] * channels.reshape(1,1,-1))
+    skyvis_exact = NP.sum(pbfluxes[:,NP.newaxis,:] * phasors_exact, axis=0)
+    print '\n{0} precision:'.format(precision)
+    print '\tDirect:     {0:.3f} s, max phasor error = {1:.2e}, max relative visibility error = {2:.2e}'.format(min(t_direct), NP.abs(phasors_direct - phasors_exact).max(), NP.abs(skyvis_direct - skyvis_exact).max() / NP.abs(skyvis_exact).max())
+    print '\tRecurrence: {0:.3f} s, max phasor error = {1:.2e}, max relative visibility error = {2:.2e}'.format(min(t_recurrence), NP.abs(phasors_recurrence - phasors_exact).max(), NP.abs(skyvis_recurrence - skyvis_exact).max() / NP.abs(skyvis_exact).max())
+    print '\tSpeed-up:   {0:.2f}'.format(min(t_direct) / min(t_recurrence))
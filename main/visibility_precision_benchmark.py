@@ -0,0 +1,60 @@
+import numpy as NP
+import argparse
+import time
+import scipy.constants as FCNST
+from prisim import interferometry as RI
+
+## Benchmark the accuracy and speed of visibilities computed in double,
+## single and mixed precision (single precision phasors with double
+## precision phases and accumulation) against the double precision path
+
+parser = argparse.ArgumentParser(description='Program to benchmark precision modes of visibility simulations')
+parser.add_argument('--nsrc', dest='nsrc', help='Number of sources', type=int, default=100000)
+parser.add_argument('--nbl', dest='nbl', help='Number of baselines', type=int, default=64)
+parser.add_argument('--nchan', dest='nchan', help='Number of frequency channels', type=int, default=64)
+parser.add_argument('--maxbl', dest='maxbl', help='Maximum baseline length [m]', type=float, default=1000.0)
+parser.add_argument('--freq', dest='freq', help='Center frequency [Hz]', type=float, default=150e6)
+parser.add_argument('--bw', dest='bw', help='Bandwidth [Hz]', type=float, default=10e6)
+parser.add_argument('--ntrials', dest='ntrials', help='Number of trials', type=int, default=3)
+
+args = vars(parser.parse_args())
+
+nsrc = args['nsrc']
+nbl = args['nbl']
+nchan = args['nchan']
+ntrials = args['ntrials']
+
+randstate = NP.random.RandomState(0)
+bl = args['maxbl'] * (2.0 * randstate.rand(nbl,3) - 1.0)
+bl[:,2] = 0.0
+skypos_dircos = randstate.randn(nsrc,3)
+skypos_dircos[:,2] = NP.abs(skypos_dircos[:,2])
+skypos_dircos = skypos_dircos / NP.sqrt(NP.sum(skypos_dircos**2, axis=1, keepdims=True))
+delays = NP.dot(skypos_dircos, bl.T) / FCNST.c # nsrc x nbl
+channels = args['freq'] - 0.5*args['bw'] + args['bw'] / nchan * NP.arange(nchan)
+pbfluxes = randstate.rand(nsrc,nchan)
+
+print 'Benchmarking {0:0d} sources x {1:0d} baselines x {2:0d} channels'.format(nsrc, nbl, nchan)
+
+timing = {}
+skyvis = {}
+for memsave in [False, True, 'mixed']:
+    timing[memsave] = []
+    for trial in xrange(ntrials):
+        scratch = {}
+        if memsave:
+            fluxes = pbfluxes.astype(NP.float32)
+        else:
+            fluxes = pbfluxes
+        t1 = time.time()
+        skyvis[memsave] = RI.tiled_visibilities(delays, fluxes, channels, memsave=memsave, scratch=scratch)
+        t2 = time.time()
+        timing[memsave] += [t2 - t1]
+
+skyvis_ref = skyvis[False]
+for memsave, precision in zip([False, True, 'mixed'], ['double', 'single', 'mixed']):
+    print '\n{0} precision:'.format(precision)
+    print '\tTime:       {0:.3f} s'.format(min(timing[memsave]))
+    print '\tSpeed-up:   {0:.2f}'.format(min(timing[False]) / min(timing[memsave]))
+    if memsave:
+        print '\tMax relative visibility error = {0:.2e}'.format(NP.abs(skyvis[memsave] - skyvis_ref).max() / NP.abs(skyvis_ref).max())
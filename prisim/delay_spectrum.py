@@ -1,5 +1,7 @@
 from __future__ import division
 import numpy as NP
+import os, hashlib
+import h5py
 import multiprocessing as MP
 import itertools as IT
 import progressbar as PGB
@@ -26,6 +28,58 @@ prisim_path = prisim.__path__[0]+'/'
 
 cosmo100 = CP.FlatLambdaCDM(H0=100.0, Om0=0.27)  # Using H0 = 100 km/s/Mpc
 
+# Beam cubes and their 3D volumes computed by member function beam3Dvol() of
+# class DelayPowerSpectrum indexed by the digest of the beam parameters
+_beam3Dvol_cache = {}
+
+#################################################################################
+
+def _beam3Dvol_digest(obj, sha=None):
+
+    """
+    ----------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    This internal routine returns a hexadecimal SHA-1 digest of nested
+    dictionaries, lists, tuples, numpy arrays and scalars which is stable
+    across sessions and hence usable in names of cache files
+
+    Inputs:
+
+    obj     [dictionary, list, tuple, numpy array or scalar] Object to be
+            digested
+
+    sha     [instance of hashlib SHA-1] Used only in recursive calls. Must be
+            set to None (default) otherwise
+
+    Outputs:
+
+    Hexadecimal digest string if input sha is None
+    ----------------------------------------------------------------------------
+    """
+
+    top_level = sha is None
+    if top_level:
+        sha = hashlib.sha1()
+    if isinstance(obj, dict):
+        sha.update('dict{0:0d}'.format(len(obj)))
+        for key in sorted(obj):
+            sha.update(repr(key))
+            _beam3Dvol_digest(obj[key], sha=sha)
+    elif isinstance(obj, (list, tuple)):
+        sha.update('list{0:0d}'.format(len(obj)))
+        for item in obj:
+            _beam3Dvol_digest(item, sha=sha)
+    elif isinstance(obj, NP.ndarray):
+        sha.update('array{0}{1}'.format(obj.dtype.str, obj.shape))
+        if obj.dtype == object:
+            _beam3Dvol_digest(obj.tolist(), sha=sha)
+        else:
+            sha.update(NP.ascontiguousarray(obj).tostring())
+    else:
+        sha.update(repr(obj))
+    if top_level:
+        return sha.hexdigest()
+
 #################################################################################
 
 def _astropy_columns(cols, tabtype='BinTableHDU'):
@@ -2828,6 +2882,11 @@ class DelayPowerSpectrum(object):
 
     bw          [scalar] (effective) bandwidth (in Hz)
 
+    beam_cache_dir
+                [NoneType or string] Directory in which the beam cubes and 3D
+                volumes computed by member function beam3Dvol() are cached on
+                disk. If None, they are cached only in memory
+
     kprll       [numpy array] line-of-sight wavenumbers (in h/Mpc) corresponding
                 to delays in the delay spectrum
 
@@ -3105,6 +3164,10 @@ class DelayPowerSpectrum(object):
                 line assuming a mean wavelength (in m) for the relationship 
                 between baseline lengths and spatial frequencies (u and v)
 
+    beam3Dvol() Compute the 3D volume (in Sr Hz) of the squared power pattern
+                used in the power spectrum normalization, using cached beam
+                cubes and volumes where available
+
     compute_power_spectrum()
                 Compute delay power spectrum in units of K^2 (Mpc/h)^3 from the 
                 delay spectrum in units of Jy Hz
@@ -3116,14 +3179,14 @@ class DelayPowerSpectrum(object):
     ----------------------------------------------------------------------------
     """
 
-    def __init__(self, dspec, cosmo=cosmo100):
+    def __init__(self, dspec, cosmo=cosmo100, beam_cache_dir=None):
 
         """
         ------------------------------------------------------------------------
         Initialize an instance of class DelayPowerSpectrum. Attributes 
         initialized are: ds, cosmo, f, df, f0, z, bw, drz_los, rz_transverse,
         rz_los, kprll, kperp, jacobian1, jacobian2, subband_delay_power_spectra,
-        subband_delay_power_spectra_resampled
+        subband_delay_power_spectra_resampled, beam_cache_dir
 
         Inputs:
 
@@ -3135,6 +3198,13 @@ class DelayPowerSpectrum(object):
                  FLRW or default_cosmology of astropy cosmology module. Default
                  value is set using concurrent cosmology but keep 
                  H0=100 km/s/Mpc
+
+        beam_cache_dir
+                 [NoneType or string] Directory in which the beam cubes and 3D
+                 volumes computed by member function beam3Dvol() are cached on
+                 disk so that later instances over the same simulation skip the
+                 beam computation. If set to None (default), they are cached
+                 only in memory
         ------------------------------------------------------------------------
         """
         
@@ -3149,6 +3219,13 @@ class DelayPowerSpectrum(object):
         if not isinstance(cosmo, (CP.FLRW, CP.default_cosmology)):
             raise TypeError('Input cosmology must be a cosmology class defined in Astropy')
 
+        if beam_cache_dir is not None:
+            if not isinstance(beam_cache_dir, str):
+                raise TypeError('Input beam_cache_dir must be a string')
+            if not os.path.isdir(beam_cache_dir):
+                os.makedirs(beam_cache_dir)
+        self.beam_cache_dir = beam_cache_dir
+
         self.cosmo = cosmo
         self.ds = dspec
         self.f = self.ds.f
@@ -3375,6 +3452,34 @@ class DelayPowerSpectrum(object):
 
     def beam3Dvol(self, freq_wts=None, nside=32):
 
+        """
+        ------------------------------------------------------------------------
+        Compute the 3D volume (in Sr Hz) of the squared power pattern used in
+        the power spectrum normalization. The beam cube on the HEALPix sphere
+        and its volumes are cached in memory (and on disk in the directory in
+        attribute beam_cache_dir if set) indexed by the beam parameters, nside
+        and frequencies, and the volumes additionally by the frequency weights.
+        Repeated calls with the same beam hence skip reading and interpolating
+        an external beam or evaluating the analytic beam.
+
+        Keyword Inputs:
+
+        freq_wts    [numpy array] Frequency weights to be applied to the beam.
+                    Must be of shape (nchan,) or (nwin, nchan). Default = None
+                    (uniform weights)
+
+        nside       [integer] HEALPix resolution parameter of the sphere on
+                    which the beam is evaluated. An external beam of coarser
+                    resolution is used at its own resolution. Default = 32
+
+        Output:
+
+        The product Omega x bandwidth (in Sr Hz) of shape (nwin,). Read
+        docstring of function beam3Dvol() for details
+        ------------------------------------------------------------------------
+        """
+
+        use_external_beam = False
         if self.ds.ia.simparms_file is not None:
             parms_file = open(self.ds.ia.simparms_file, 'r')
             parms = yaml.safe_load(parms_file)
@@ -3397,6 +3502,36 @@ class DelayPowerSpectrum(object):
                 if select_beam_freq is None:
                     select_beam_freq = self.f0
                 pbeam_spec_interp_method = beam_info['spec_interp']
+
+        if use_external_beam:
+            beam_parms = ['external', os.path.abspath(beam_file), os.path.getmtime(beam_file), beam_filefmt, beam_pol, beam_chromaticity, pbeam_spec_interp_method, select_beam_freq]
+        else:
+            beam_parms = ['telescope', self.ds.ia.telescope]
+        beam_key = _beam3Dvol_digest([beam_parms, nside, self.f])
+        if freq_wts is None:
+            wts_key = 'uniform'
+        else:
+            wts_key = _beam3Dvol_digest(NP.asarray(freq_wts))
+
+        if beam_key not in _beam3Dvol_cache:
+            _beam3Dvol_cache[beam_key] = {'beam': None, 'omega_bw': {}}
+        cached = _beam3Dvol_cache[beam_key]
+        if wts_key in cached['omega_bw']:
+            return NP.copy(cached['omega_bw'][wts_key])
+
+        cache_file = None
+        if self.beam_cache_dir is not None:
+            cache_file = self.beam_cache_dir + '/beam3Dvol_' + beam_key + '.hdf5'
+            if os.path.isfile(cache_file):
+                with h5py.File(cache_file, 'r') as fileobj:
+                    if wts_key in fileobj['omega_bw']:
+                        cached['omega_bw'][wts_key] = fileobj['omega_bw'][wts_key].value
+                        return NP.copy(cached['omega_bw'][wts_key])
+                    if cached['beam'] is None:
+                        cached['beam'] = fileobj['beam'].value
+
+        if cached['beam'] is None:
+            if use_external_beam:
                 if beam_filefmt.lower() == 'fits':
                     extbeam = fits.getdata(beam_file, extname='BEAM_{0}'.format(beam_pol))
                     beam_freqs = fits.getdata(beam_file, extname='FREQS_{0}'.format(beam_pol))
@@ -3428,16 +3563,21 @@ class DelayPowerSpectrum(object):
                 az = NP.degrees(phi)
                 altaz = NP.hstack((alt.reshape(-1,1), az.reshape(-1,1)))
                 beam = PB.primary_beam_generator(altaz, self.f, self.ds.ia.telescope, freq_scale='Hz', skyunits='altaz', east2ax1=0.0, pointing_info=None, pointing_center=None)
-        else:
-            theta, phi = HP.pix2ang(nside, NP.arange(HP.nside2npix(nside)))
-            alt = 90.0 - NP.degrees(theta)
-            az = NP.degrees(phi)
-            altaz = NP.hstack((alt.reshape(-1,1), az.reshape(-1,1)))
-            beam = PB.primary_beam_generator(altaz, self.f, self.ds.ia.telescope, freq_scale='Hz', skyunits='altaz', east2ax1=0.0, pointing_info=None, pointing_center=None)
-            # omega_bw =  self.wl0**2 / NP.mean(self.ds.ia.A_eff) * self.bw
-
-        omega_bw = beam3Dvol(beam, self.f, freq_wts=freq_wts, hemisphere=True)
-        return omega_bw
+                # omega_bw =  self.wl0**2 / NP.mean(self.ds.ia.A_eff) * self.bw
+            cached['beam'] = beam
+
+        omega_bw = beam3Dvol(cached['beam'], self.f, freq_wts=freq_wts, hemisphere=True)
+        cached['omega_bw'][wts_key] = omega_bw
+
+        if cache_file is not None:
+            with h5py.File(cache_file, 'a') as fileobj:
+                if 'beam' not in fileobj:
+                    fileobj.create_dataset('beam', data=cached['beam'])
+                    fileobj.create_group('omega_bw')
+                fileobj['omega_bw'][wts_key] = omega_bw
+                fileobj['omega_bw'][wts_key].attrs['units'] = 'Sr Hz'
+
+        return NP.copy(omega_bw)
 
     ############################################################################
 
@@ -15,6 +15,7 @@ import warnings
 import h5py
 from distutils.version import LooseVersion
 import psutil
+from multiprocessing.pool import ThreadPool
 from astroutils import geometry as GEOM
 from astroutils import gridding_modules as GRD
 from astroutils import constants as CNST
@@ -83,6 +84,168 @@ def _astropy_columns(cols, tabtype='BinTableHDU'):
 
 ################################################################################
 
+def _append_along_axis(current, value, axis, buf=None, capacity=None,
+                       leading=False):
+
+    """
+    ----------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    This internal routine appends an array to another along the specified axis
+    by writing into a preallocated buffer. If the buffer is full, its capacity
+    along the axis is doubled, so that the cost of appending is amortized to
+    be independent of the number of elements already accumulated, unlike
+    numpy.concatenate() which copies the entire array on every call.
+
+    Inputs:
+
+    current [None or numpy array] Array to be appended to. If set to None, a
+            new array is started with value
+
+    value   [numpy array] Array to be appended. Must have the same number of
+            dimensions as current and may have any length along the
+            specified axis
+
+    axis    [integer] Axis along which value is appended
+
+    buf     [None or numpy array] Buffer returned by the previous call. It is
+            reused only if current is a view of its leading elements along
+            axis, otherwise a new buffer is allocated
+
+    capacity
+            [None or integer] Minimum length of a newly allocated buffer along
+            axis. If set to None (default), the buffer is allocated to hold
+            twice the number of elements along axis
+
+    leading [boolean] If set to True, the buffer is laid out with axis as its
+            first (slowest varying) axis so that each appended value occupies
+            contiguous memory, and the appended array returned is a view of
+            the buffer with the axes in the same order as current and value.
+            If set to False (default), the buffer has the same axis order as
+            value
+
+    Outputs:
+
+    Tuple consisting of the appended array which is a view into the buffer,
+    and the buffer which must be passed on to the next call
+    ----------------------------------------------------------------------------
+    """
+
+    value = NP.asarray(value)
+    if current is None:
+        n = 0
+        dtype = value.dtype
+    else:
+        n = current.shape[axis]
+        dtype = NP.promote_types(current.dtype, value.dtype)
+
+    if leading:
+        bufaxis = 0
+    else:
+        bufaxis = axis
+
+    def bufview(buf, m):
+        if leading:
+            return NP.rollaxis(buf[:m], 0, axis+1)
+        return buf[(slice(None),)*axis+(slice(0,m),)]
+
+    k = value.shape[axis]
+    reuse = False
+    if (buf is not None) and (current is not None):
+        if (current.base is buf) and (buf.dtype == dtype) and (current.strides == bufview(buf, n).strides):
+            if current.__array_interface__['data'][0] == buf.__array_interface__['data'][0]:
+                reuse = True
+
+    if (not reuse) or (buf.shape[bufaxis] < n+k):
+        if capacity is None:
+            capacity = 1
+        if reuse:
+            capacity = max(capacity, 2*buf.shape[bufaxis])
+        else:
+            capacity = max(capacity, 2*n)
+        bufshape = list(value.shape)
+        bufshape[axis] = max(capacity, n+k)
+        if leading:
+            bufshape = [bufshape[axis]] + bufshape[:axis] + bufshape[axis+1:]
+        newbuf = NP.empty(tuple(bufshape), dtype=dtype)
+        if current is not None:
+            bufview(newbuf, n)[...] = current
+        buf = newbuf
+
+    appended = bufview(buf, n+k)
+    appended[(slice(None),)*axis+(slice(n,n+k),)] = value
+    return (appended, buf)
+
+################################################################################
+
+def _time_major_view(current, axis):
+
+    """
+    ----------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    This internal routine copies an array into a buffer laid out with the
+    specified (time) axis as its first axis and returns a view of the buffer
+    with the axes in the original order. The view can be passed on to
+    _append_along_axis() with leading set to True along with the buffer.
+
+    Inputs:
+
+    current [None or numpy array] Array to be laid out. If set to None, None
+            is returned
+
+    axis    [integer] Axis to be laid out first in memory
+
+    Outputs:
+
+    Tuple consisting of the view of the buffer with the axes in the same order
+    as current, and the buffer
+    ----------------------------------------------------------------------------
+    """
+
+    if current is None:
+        return (None, None)
+    buf = NP.ascontiguousarray(NP.rollaxis(current, axis))
+    return (NP.rollaxis(buf, 0, axis+1), buf)
+
+################################################################################
+
+def _scratch_array(scratch, key, shape, dtype):
+
+    """
+    ----------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    This internal routine returns an uninitialized array of the specified
+    shape and type which is a view into a scratch buffer held in a dictionary.
+    The buffer is reallocated only if it is too small or of a different type,
+    so that repeated calls with similar shapes do not allocate memory.
+
+    Inputs:
+
+    scratch [None or dictionary] Holds the scratch buffers under their keys.
+            If set to None, a new array is returned
+
+    key     [string] Key of the scratch buffer in scratch
+
+    shape   [tuple] Shape of the array
+
+    dtype   [numpy dtype] Type of the array
+
+    Outputs:
+
+    Numpy array of the specified shape and type
+    ----------------------------------------------------------------------------
+    """
+
+    size = int(NP.prod(shape))
+    if scratch is None:
+        return NP.empty(shape, dtype=dtype)
+    buf = scratch.get(key)
+    if (buf is None) or (buf.dtype != NP.dtype(dtype)) or (buf.size < size):
+        buf = NP.empty(size, dtype=dtype)
+        scratch[key] = buf
+    return buf[:size].reshape(shape)
+
+################################################################################
+
 def read_gaintable(gainsfile, axes_order=None):
 
     """
@@ -1977,1513 +2140,2392 @@ def antenna_power(skymodel, telescope_info, pointing_info, freq_scale=None):
 
 #################################################################################
 
-class GainInfo(object):
+def _channel_spacing(freqs, max_ulps=4):
 
     """
-    ----------------------------------------------------------------------------
-    Class to manage instrument gains
+    ---------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    This internal routine returns the spacing of evenly spaced frequency
+    channels, or None if the channels deviate from an evenly spaced grid
+    between the first and last channels by more than max_ulps units in the
+    last place of the largest frequency. Such deviations change the phases
+    by no more than their rounding error in a direct evaluation, which is
+    what the phasor recurrence relies on. A relative tolerance on the
+    channel spacing would admit deviations that grow into phase errors many
+    orders of magnitude larger along the recurrence.
+    ---------------------------------------------------------------------------
+    """
 
-    Attributes:
+    freqs = NP.asarray(freqs, dtype=NP.float64).ravel()
+    if freqs.size < 2:
+        return None
+    df = (freqs[-1] - freqs[0]) / (freqs.size - 1)
+    deviations = NP.abs(freqs - (freqs[0] + df * NP.arange(freqs.size)))
+    if NP.any(deviations > max_ulps * NP.spacing(NP.abs(freqs).max())):
+        return None
+    return df
 
-    gaintable   [None or dictionary] If set to None, all antenna- and
-                baseline-based gains will be set to unity. If returned as
-                dictionary, it contains the loaded gains. It contains the
-                following keys and values:
-                'antenna-based'     [None or dictionary] Contains antenna-
-                                    based instrument gain information. If
-                                    set to None, all antenna-based gains are
-                                    set to unity. If returned as dictionary,
-                                    it has the following keys and values:
-                                    'ordering'  [list or numpy array] Three
-                                                element list of strings
-                                                indicating the ordering of
-                                                axes - 'time', 'label',
-                                                and 'frequency' as specified
-                                                in input axes_order
-                                    'gains'     [scalar or numpy array]
-                                                Complex antenna-based
-                                                instrument gains. Must be
-                                                of shape (nant, nchan, nts)
-                                                If there is no variations in
-                                                gains along an axis, then
-                                                the corresponding nax may be
-                                                set to 1 and the gains will
-                                                be replicated along that
-                                                axis using numpy array
-                                                broadcasting. For example,
-                                                shapes (nant,1,1), (1,1,1),
-                                                (1,nchan,nts) are
-                                                acceptable. If specified as
-                                                a scalar, it will be
-                                                replicated along all three
-                                                axes, namely, 'label',
-                                                'frequency' and 'time'.
-                                    'label'     [None or list or numpy
-                                                array] List or antenna
-                                                labels that correspond to
-                                                nant along the 'label' axis.
-                                                If nant=1, this may be set
-                                                to None, else it will be
-                                                specified and will match the
-                                                nant.
-                                    'frequency' [None or list or numpy array]
-                                                Frequency channels that
-                                                correspond to the nax along
-                                                the 'frequency' axis. If the
-                                                nchan=1 along the 'frequency'
-                                                axis, this may be set to None,
-                                                else it must be specified and
-                                                must match the nchan
-                                    'time'      [None or list or numpy array]
-                                                Observation times that
-                                                correspond to the nax along
-                                                the 'time' axis. If the
-                                                ntimes=1 along the 'time'
-                                                axis, this may be set to None,
-                                                else it must be specified and
-                                                must match the ntimes. It must
-                                                be a float and can be in
-                                                seconds, hours, days, etc.
-                'baseline-based'    [None or dictionary] Contains baseline-
-                                    based instrument gain information. If
-                                    set to None, all baseline-based gains
-                                    are set to unity. If returned as
-                                    dictionary, it has the following keys
-                                    and values:
-                                    'ordering'  [list or numpy array] Three
-                                                element list of strings
-                                                indicating the ordering of
-                                                axes - 'time', 'label',
-                                                and 'frequency' as
-                                                specified in input
-                                                axes_order
-                                    'gains'     [scalar or numpy array]
-                                                Complex baseline-based
-                                                instrument gains. Must be
-                                                of shape (nbl, nchan, nts)
-                                                If there is no variations in
-                                                gains along an axis, then
-                                                the corresponding nax may be
-                                                set to 1 and the gains will
-                                                be replicated along that
-                                                axis using numpy array
-                                                broadcasting. For example,
-                                                shapes (nant,1,1), (1,1,1),
-                                                (1,nchan,nts) are
-                                                acceptable. If specified as
-                                                a scalar, it will be
-                                                replicated along all three
-                                                axes, namely, 'label',
-                                                'frequency' and 'time'.
-                                    'label'     [None or list or numpy
-                                                array] List or baseline
-                                                labels that correspond to
-                                                nbl along the 'label' axis.
-                                                If nbl=1 along the 'label'
-                                                axis this may be set to
-                                                None, else it will be
-                                                specified and will match nbl
-                                    'frequency' [None or list or numpy array]
-                                                Frequency channels that
-                                                correspond to the nax along
-                                                the 'frequency' axis. If the
-                                                nchan=1 along the 'frequency'
-                                                axis, this may be set to None,
-                                                else it must be specified and
-                                                must match the nchan
-                                    'time'      [None or list or numpy array]
-                                                Observation times that
-                                                correspond to the nax along
-                                                the 'time' axis. If the
-                                                ntimes=1 along the 'time'
-                                                axis, this may be set to None,
-                                                else it must be specified and
-                                                must match the ntimes. It must
-                                                be a float and can be in
-                                                seconds, hours, days, etc.
+#################################################################################
 
-    interpfuncs [dictionary] Determined in member function interpolator().
-                Contains interpolation information under two keys, namely,
-                'antenna-based' and 'baseline-based'. Under each of these keys
-                is another dictionary with the following keys and values:
-                'dims'      [numpy array of strings] Contains the axes labels
-                            of the interpolated axes for antenna or baseline
-                            labels. It could contain a single element ['time'],
-                            of ['frequency'] indicating 1D splines along that
-                            axis or contain two elements 'time' and 'frequency'
-                            indicating 2D splines. 1D splines will have been
-                            obtained with scipy.interpolate.interp1d while
-                            2D splines obtained with scipy.interpolate.interp2d
-                'interp'    [numpy recArray] Holds the interpolation functions
-                            (instances of scipy.interpolate.interp1d or
-                            scipy.interpolate.interp2d depending on the value
-                            under 'dims' key) for each antenna or baseline
-                            label. It is of size nbl. Each entry in this
-                            numpy recArray has two fields, 'real' for
-                            interpolation of real part and 'imag' for the
-                            imaginary part. If it is a one element recarray,
-                            then it applies to all antennas and baselines
-                Member function interpolate_gains() uses this attribute to
-                return interpolated gains
+def phasor_recurrence(delays, freqs, renorm_interval=16, memsave=False):
 
-    splinefuncs [dictionary] Determined in member function splinator().
-                Contains spline information under two keys, namely,
-                'antenna-based' and 'baseline-based'. Under each of these keys
-                is another dictionary with the following keys and values:
-                'dims'      [numpy array of strings] Contains the axes labels
-                            of the interpolated axes for antenna or baseline
-                            labels. It could contain a single element ['time'],
-                            of ['frequency'] indicating 1D splines along that
-                            axis or contain two elements 'time' and 'frequency'
-                            indicating 2D splines. 1D splines will have been
-                            obtained with scipy.interpolate.UnivariateSpline
-                            while 2D splines obtained with
-                            scipy.interpolate.RectBivariateSpline
-                'interp'    [numpy recArray] Holds the spline functions
-                            (instances of scipy.interpolate.UnivariateSpline or
-                            scipy.interpolate.RectBivariateSpline depending on
-                            the value under 'dims' key) for each antenna or
-                            baseline label. It is of size nbl. Each entry in
-                            this numpy recArray has two fields, 'real' for
-                            interpolation of real part and 'imag' for the
-                            imaginary part. If it is a one element recarray,
-                            then it applies to all antennas and baselines.
-                Member function spline_gains() uses this attribute to return
-                spline-interpolated gains
+    """
+    ---------------------------------------------------------------------------
+    Compute phasors exp(-i 2 pi delays freqs) on evenly spaced frequency
+    channels by a recurrence along frequency. The complex exponential is
+    evaluated exactly only at the first channel and for a single channel
+    step, and the phasors at subsequent channels are obtained by complex
+    multiplication with the phasor of the channel step. To bound the drift
+    from accumulated round-off, the phasors are re-evaluated exactly every
+    renorm_interval channels.
 
-    Member functions:
+    Inputs:
 
-    __init__()  Initialize an instance of class GainInfo from a file
+    delays      [numpy array] Delays (in seconds) of any shape
 
-    read_gaintable()
-                Read gain table from file in HDF5 format and return and/or
-                store as attribute
+    freqs       [numpy array] Evenly spaced frequency channels (in Hz) of size
+                nchan. The channels may deviate from an evenly spaced grid
+                by no more than a few units in the last place of the
+                frequencies, otherwise ValueError is raised
 
-    eval_gains()
-                Extract complex instrument gains for given baselines from the
-                gain table
+    Keyword Inputs:
 
-    interpolator()
-                Sets up interpolation functions and stores them in the
-                attribute interpfuncs. Better alternative is to use splinator()
+    renorm_interval
+                [integer] Number of channels after which the phasors are
+                evaluated exactly again. Default = 16
 
-    splinator() Sets up spline functions and stores them in the attribute
-                splinefuncs. Better alternative to interpolator()
+    memsave     [boolean] If set to True, the phasors are stored and the
+                recurrence evaluated in single precision, otherwise in double
+                precision (default). The phases of the exactly evaluated
+                channels are always determined in double precision
 
-    interpolate_gains()
-                Interpolate at the specified baselines for the given
-                frequencies and times using attribute interpfuncs. Better
-                alternative is to use spline_gains()
+    Output:
 
-    spline_gains()
-                Evaluate spline at the specified baselines for the given
-                frequencies and times using attribute splinefuncs. Better
-                alternative to interpolate_gains()
+    Numpy array of phasors of shape delays.shape+(nchan,). The array is a view
+    in which the frequency axis is the last axis while the memory is laid out
+    with frequency as the slowest varying axis.
 
-    nearest_gains()
-                Extract complex instrument gains for given baselines from the
-                gain table determined by nearest neighbor logic
+    Notes:
 
-    write_gaintable()
-                Write gain table with specified axes ordering to external file
-                in HDF5 format
-    -----------------------------------------------------------------------------
+    Each step of the recurrence incurs a relative error of at most about
+    (sqrt(5)+1)u, where u is the unit round-off (1.1e-16 in double precision
+    and 6.0e-8 in single precision), from the complex multiplication and the
+    rounding of the step phasor. Hence the phasors deviate from those
+    evaluated directly in the same precision by at most approximately
+    3.3 (renorm_interval-1) u in absolute value, in addition to an error of
+    order |2 pi delays freqs| u from rounding of the phase which the direct
+    evaluation also incurs. For the default renorm_interval, the former is
+    about 5e-15 in double precision and 3e-6 in single precision. Since the
+    phases are always determined in double precision, the phasors in single
+    precision are usually more accurate than those evaluated directly in
+    single precision. The number of complex
+    exponentials evaluated is reduced by a factor of about renorm_interval.
+    ---------------------------------------------------------------------------
     """
 
-    def __init__(self, init_file=None, axes_order=None):
+    try:
+        delays, freqs
+    except NameError:
+        raise NameError('Inputs delays and freqs must be specified')
 
-        """
-        ------------------------------------------------------------------------
-        Initialize an instance of class GainInfo from a file
+    delays = NP.asarray(delays, dtype=NP.float64)
+    freqs = NP.asarray(freqs, dtype=NP.float64).ravel()
 
-        Attributes initialized are:
-        gaintable, interpfuncs, splinefuncs
+    if not isinstance(renorm_interval, int):
+        raise TypeError('Input renorm_interval must be an integer')
+    if renorm_interval < 1:
+        raise ValueError('Input renorm_interval must be positive')
 
-        Read docstring of class GainInfo for details on these attributes
+    if memsave:
+        datatype = NP.complex64
+    else:
+        datatype = NP.complex128
+
+    phasors = NP.empty((freqs.size,)+delays.shape, dtype=datatype)
+    if freqs.size > 1:
+        df = _channel_spacing(freqs)
+        if df is None:
+            raise ValueError('Input freqs must be evenly spaced')
+        step_phasor = NP.exp(-1j * 2.0 * NP.pi * df * delays).astype(datatype, copy=False)
+
+    for chan in xrange(freqs.size):
+        if chan % renorm_interval == 0:
+            phasors[chan] = NP.exp(-1j * 2.0 * NP.pi * freqs[chan] * delays)
+        else:
+            NP.multiply(phasors[chan-1], step_phasor, out=phasors[chan])
 
-        Keyword Inputs:
+    return NP.rollaxis(phasors, 0, phasors.ndim)
 
-        gainsfile   [string] Filename including the full path that contains the
-                    instrument gains. It must be in HDF5 format. It must contain
-                    the following structure:
-                    'antenna-based'     [dictionary] Contains antenna-based
-                                        instrument gain information. It has the
-                                        following keys and values:
-                                        'ordering'  [list or numpy array] Three
-                                                    element list of strings
-                                                    indicating the ordering of
-                                                    axes - 'time', 'label',
-                                                    and 'frequency'. Must be
-                                                    specified (no defaults)
-                                        'gains'     [scalar or numpy array]
-                                                    Complex antenna-based
-                                                    instrument gains. Must be
-                                                    of shape (nax1, nax2, nax3)
-                                                    where ax1, ax2 and ax3 are
-                                                    specified by the axes
-                                                    ordering under key
-                                                    'ordering'. If there is no
-                                                    variations in gains along an
-                                                    axis, then the corresponding
-                                                    nax may be set to 1 and the
-                                                    gains will be replicated
-                                                    along that axis using numpy
-                                                    array broadcasting. For
-                                                    example, shapes (nax1,1,1),
-                                                    (1,1,1), (1,nax2,nax3) are
-                                                    acceptable. If specified as
-                                                    a scalar, it will be
-                                                    replicated along all three
-                                                    axes, namely, 'label',
-                                                    'frequency' and 'time'.
-                                        'label'     [None or list or numpy array]
-                                                    List or antenna labels that
-                                                    correspond to the nax along
-                                                    the 'label' axis. If the
-                                                    nax=1 along the 'label' axis,
-                                                    this may be set to None, else
-                                                    it must be specified and must
-                                                    match the nax.
-                                        'frequency' [None or list or numpy
-                                                    array] Frequency channels
-                                                    that correspond to the
-                                                    nax along the 'frequency'
-                                                    axis. If the nax=1 along the
-                                                    'frequency' axis, this may
-                                                    be set to None, else it must
-                                                    be specified and must match
-                                                    the nax.
-                                        'time'      [None or list or numpy
-                                                    array] Observation times
-                                                    that correspond to the nax
-                                                    along the 'time' axis. If
-                                                    the nax=1 along the 'time'
-                                                    axis, this may be set to
-                                                    None, else it must be
-                                                    specified and must match the
-                                                    nax. It must be a float and
-                                                    can be in seconds, hours,
-                                                    days, etc.
-                    'baseline-based'    [dictionary] Contains baseline-based
-                                        instrument gain information. It has the
-                                        following keys and values:
-                                        'ordering'  [list or numpy array] Three
-                                                    element list of strings
-                                                    indicating the ordering of
-                                                    axes - 'time', 'label',
-                                                    and 'frequency'. Must be
-                                                    specified (no defaults)
-                                        'gains'     [scalar or numpy array]
-                                                    Complex baseline-based
-                                                    instrument gains. Must be
-                                                    of shape (nax1, nax2, nax3)
-                                                    where ax1, ax2 and ax3 are
-                                                    specified by the axes
-                                                    ordering under key
-                                                    'ordering'. If there is no
-                                                    variations in gains along an
-                                                    axis, then the corresponding
-                                                    nax may be set to 1 and the
-                                                    gains will be replicated
-                                                    along that axis using numpy
-                                                    array broadcasting. For
-                                                    example, shapes (nax1,1,1),
-                                                    (1,1,1), (1,nax2,nax3) are
-                                                    acceptable. If specified as
-                                                    a scalar, it will be
-                                                    replicated along all three
-                                                    axes, namely, 'label',
-                                                    'frequency' and 'time'.
-                                        'label'     [None or list or numpy
-                                                    array] List of baseline
-                                                    labels that correspond to
-                                                    the nax along the 'label'
-                                                    axis. If the nax=1 along the
-                                                    'label' axis this may be set
-                                                    to None, else it must be
-                                                    specified and must match the
-                                                    nax.
-                                        'frequency' [None or list or numpy
-                                                    array] Frequency channels
-                                                    that correspond to the
-                                                    nax along the 'frequency'
-                                                    axis. If the nax=1 along the
-                                                    'frequency' axis, this may
-                                                    be set to None, else it must
-                                                    be specified and must match
-                                                    the nax.
-                                        'time'      [None or list or numpy
-                                                    array] Observation times
-                                                    that correspond to the nax
-                                                    along the 'time' axis. If
-                                                    the nax=1 along the 'time'
-                                                    axis, this may be set to
-                                                    None, else it must be
-                                                    specified and must match the
-                                                    nax. It must be a float and
-                                                    can be in seconds, hours,
-                                                    days, etc.
+#################################################################################
 
-        axes_order  [None or list or numpy array] The gaintable which is read is
-                    stored in this axes ordering. If set to None, it will store
-                    in this order ['label', 'frequency', 'time']
-        ------------------------------------------------------------------------
-        """
+def antenna_factored_visibilities(antpos, a1_ind, a2_ind, skypos_dircos,
+                                  pbfluxes, freqs, pc_dircos=None,
+                                  gradient=False, memsave=False,
+                                  memory_limit=None):
 
-        self.gaintable = None
-        self.interpfuncs = {key: None for key in ['antenna-based', 'baseline-based']}
-        self.splinefuncs = {key: None for key in ['antenna-based', 'baseline-based']}
-        if init_file is not None:
-            self.gaintable = self.read_gaintable(init_file, axes_order=axes_order, action='return')
-        self.interpolator()
-        self.splinator(smoothness=None)
+    """
+    ---------------------------------------------------------------------------
+    Compute visibilities by factoring the phase term of each baseline into
+    per-antenna phasors. For each frequency channel, the antenna phasor matrix
+    E (nant x nsrc) is formed once and all baselines are obtained from the
+    matrix product E . diag(pb*flux) . E^H, thereby requiring phasor memory
+    that scales with the number of antennas rather than the number of
+    baselines and evaluating the hot path with BLAS matrix multiplications.
 
-    #############################################################################
+    Inputs:
 
-    def read_gaintable(self, gainsfile, axes_order=None, action='return'):
+    antpos      [numpy array] Antenna positions (in m) in local ENU coordinate
+                system as a nant x 3 array
 
-        """
-        ------------------------------------------------------------------------
-        Read gain table from file in HDF5 format and return and/or store as
-        attribute
+    a1_ind      [numpy array] Indices into antpos of first antenna (under field
+                'A1') of each baseline. Must be of size nbl
 
-        Input:
+    a2_ind      [numpy array] Indices into antpos of second antenna (under
+                field 'A2') of each baseline. Must be of size nbl. Baseline
+                vectors are antpos[a2_ind] - antpos[a1_ind]
 
-        gainsfile   [string] Filename including the full path that contains the
-                    instrument gains. It must be in HDF5 format. It must contain
-                    the following structure:
-                    'antenna-based'     [dictionary] Contains antenna-based
-                                        instrument gain information. It has the
-                                        following keys and values:
-                                        'ordering'  [list or numpy array] Three
-                                                    element list of strings
-                                                    indicating the ordering of
-                                                    axes - 'time', 'label',
-                                                    and 'frequency'. Must be
-                                                    specified (no defaults)
-                                        'gains'     [scalar or numpy array]
-                                                    Complex antenna-based
-                                                    instrument gains. Must be
-                                                    of shape (nax1, nax2, nax3)
-                                                    where ax1, ax2 and ax3 are
-                                                    specified by the axes
-                                                    ordering under key
-                                                    'ordering'. If there is no
-                                                    variations in gains along an
-                                                    axis, then the corresponding
-                                                    nax may be set to 1 and the
-                                                    gains will be replicated
-                                                    along that axis using numpy
-                                                    array broadcasting. For
-                                                    example, shapes (nax1,1,1),
-                                                    (1,1,1), (1,nax2,nax3) are
-                                                    acceptable. If specified as
-                                                    a scalar, it will be
-                                                    replicated along all three
-                                                    axes, namely, 'label',
-                                                    'frequency' and 'time'.
-                                        'label'     [None or list or numpy
-                                                    array] List or antenna
-                                                    labels that correspond to
-                                                    the nax along the 'label'
-                                                    axis. If the nax=1 along the
-                                                    'label' axis, this may be
-                                                    set to None, else it must be
-                                                    specified and must match the
-                                                    nax.
-                                        'frequency' [None or list or numpy
-                                                    array] Frequency channels
-                                                    that correspond to the nax
-                                                    along the 'frequency' axis.
-                                                    If the nax=1 along the
-                                                    'frequency' axis, this may
-                                                    be set to None, else it must
-                                                    be specified and must match
-                                                    the nax.
-                                        'time'      [None or list or numpy
-                                                    array] Observation times
-                                                    that correspond to the nax
-                                                    along the 'time' axis. If
-                                                    the nax=1 along the 'time'
-                                                    axis, this may be set to
-                                                    None, else it must be
-                                                    specified and must match the
-                                                    nax. It must be a float and
-                                                    can be in seconds, hours,
-                                                    days, etc.
-                    'baseline-based'    [dictionary] Contains baseline-based
-                                        instrument gain information. It has the
-                                        following keys and values:
-                                        'ordering'  [list or numpy array] Three
-                                                    element list of strings
-                                                    indicating the ordering of
-                                                    axes - 'time', 'label',
-                                                    and 'frequency'. Must be
-                                                    specified (no defaults)
-                                        'gains'     [scalar or numpy array]
-                                                    Complex baseline-based
-                                                    instrument gains. Must be
-                                                    of shape (nax1, nax2, nax3)
-                                                    where ax1, ax2 and ax3 are
-                                                    specified by the axes
-                                                    ordering under key
-                                                    'ordering'. If there is no
-                                                    variations in gains along an
-                                                    axis, then the corresponding
-                                                    nax may be set to 1 and the
-                                                    gains will be replicated
-                                                    along that axis using numpy
-                                                    array broadcasting. For
-                                                    example, shapes (nax1,1,1),
-                                                    (1,1,1), (1,nax2,nax3) are
-                                                    acceptable. If specified as
-                                                    a scalar, it will be
-                                                    replicated along all three
-                                                    axes, namely, 'label',
-                                                    'frequency' and 'time'.
-                                        'label'     [None or list or numpy
-                                                    array] List of baseline
-                                                    labels that correspond to
-                                                    the nax along the 'label'
-                                                    axis. If the nax=1 along the
-                                                    'label' axis this may be set
-                                                    to None, else it must be
-                                                    specified and must match the
-                                                    nax.
-                                        'frequency' [None or list or numpy
-                                                    array] Frequency channels
-                                                    that correspond to the nax
-                                                    along the 'frequency' axis.
-                                                    If the nax=1 along the
-                                                    'frequency' axis, this may
-                                                    be set to None, else it must
-                                                    be specified and must match
-                                                    the nax.
-                                        'time'      [None or list or numpy
-                                                    array] Observation times
-                                                    that correspond to the nax
-                                                    along the 'time' axis. If
-                                                    the nax=1 along the 'time'
-                                                    axis, this may be set to
-                                                    None, else it must be
-                                                    specified and must match the
-                                                    nax. It must be a float and
-                                                    can be in seconds, hours,
-                                                    days, etc.
+    skypos_dircos
+                [numpy array] Direction cosines of sky positions as a nsrc x 3
+                array
 
-        axes_order  [None or list or numpy array] The gaintable which is read is
-                    stored in this axes ordering. If set to None, it will store
-                    in this order ['label', 'frequency', 'time']
+    pbfluxes    [numpy array] Primary beam weighted flux densities as a
+                nsrc x nchan array
 
-        action      [string] If set to 'store' (default), the gain table will
-                    be stored as attribute in addition to being returned. If set
-                    to 'return' the gain table will be returned.
+    freqs       [numpy array] Frequency channels (in Hz) of size nchan
 
-        Output:
+    Keyword Inputs:
 
-        gaintable   [None or dictionary] If set to None, all antenna- and
-                    baseline-based gains will be set to unity. If returned as
-                    dictionary, it contains the loaded gains. It contains the
-                    following keys and values:
-                    'antenna-based'     [None or dictionary] Contains antenna-
-                                        based instrument gain information. If
-                                        set to None, all antenna-based gains are
-                                        set to unity. If returned as dictionary,
-                                        it has the following keys and values:
-                                        'ordering'  [list or numpy array] Three
-                                                    element list of strings
-                                                    indicating the ordering of
-                                                    axes - 'time', 'label',
-                                                    and 'frequency' as specified
-                                                    in input axes_order
-                                        'gains'     [scalar or numpy array]
-                                                    Complex antenna-based
-                                                    instrument gains. Must be
-                                                    of shape (nant, nchan, nts)
-                                                    If there is no variations in
-                                                    gains along an axis, then
-                                                    the corresponding nax may be
-                                                    set to 1 and the gains will
-                                                    be replicated along that
-                                                    axis using numpy array
-                                                    broadcasting. For example,
-                                                    shapes (nant,1,1), (1,1,1),
-                                                    (1,nchan,nts) are
-                                                    acceptable. If specified as
-                                                    a scalar, it will be
-                                                    replicated along all three
-                                                    axes, namely, 'label',
-                                                    'frequency' and 'time'.
-                                        'label'     [None or list or numpy
-                                                    array] List or antenna
-                                                    labels that correspond to
-                                                    nant along the 'label' axis.
-                                                    If nant=1, this may be set
-                                                    to None, else it will be
-                                                    specified and will match the
-                                                    nant.
-                                        'frequency' [None or list or numpy
-                                                    array] Frequency channels
-                                                    that correspond to the nax
-                                                    along the 'frequency' axis.
-                                                    If the nchan=1 along the
-                                                    'frequency' axis, this may
-                                                    be set to None, else it must
-                                                    be specified and must match
-                                                    the nchan.
-                                        'time'      [None or list or numpy
-                                                    array] Observation times
-                                                    that correspond to the nax
-                                                    along the 'time' axis. If
-                                                    the ntimes=1 along the
-                                                    'time' axis, this may be set
-                                                    to None, else it must be
-                                                    specified and must match the
-                                                    ntimes. It will be a float
-                                                    and in same units as given
-                                                    in input
-                    'baseline-based'    [None or dictionary] Contains baseline-
-                                        based instrument gain information. If
-                                        set to None, all baseline-based gains
-                                        are set to unity. If returned as
-                                        dictionary, it has the following keys
-                                        and values:
-                                        'ordering'  [list or numpy array] Three
-                                                    element list of strings
-                                                    indicating the ordering of
-                                                    axes - 'time', 'label',
-                                                    and 'frequency' as
-                                                    specified in input
-                                                    axes_order
-                                        'gains'     [scalar or numpy array]
-                                                    Complex baseline-based
-                                                    instrument gains. Must be
-                                                    of shape (nbl, nchan, nts)
-                                                    If there is no variations in
-                                                    gains along an axis, then
-                                                    the corresponding nax may be
-                                                    set to 1 and the gains will
-                                                    be replicated along that
-                                                    axis using numpy array
-                                                    broadcasting. For example,
-                                                    shapes (nant,1,1), (1,1,1),
-                                                    (1,nchan,nts) are
-                                                    acceptable. If specified as
-                                                    a scalar, it will be
-                                                    replicated along all three
-                                                    axes, namely, 'label',
-                                                    'frequency' and 'time'.
-                                        'label'     [None or list or numpy
-                                                    array] List or baseline
-                                                    labels that correspond to
-                                                    nbl along the 'label' axis.
-                                                    If nbl=1 along the 'label'
-                                                    axis this may be set to
-                                                    None, else it will be
-                                                    specified and will match nbl
-                                        'frequency' [None or list or numpy
-                                                    array] Frequency channels
-                                                    that correspond to the nax
-                                                    along the 'frequency' axis.
-                                                    If the nchan=1 along the
-                                                    'frequency' axis, this may
-                                                    be set to None, else it must
-                                                    be specified and must match
-                                                    the nchan.
-                                        'time'      [None or list or numpy
-                                                    array] Observation times
-                                                    that correspond to the nax
-                                                    along the 'time' axis. If
-                                                    the ntimes=1 along the
-                                                    'time' axis, this may be set
-                                                    to None, else it must be
-                                                    specified and must match the
-                                                    ntimes. It will be a float
-                                                    and in same units as given
-                                                    in input
-        ------------------------------------------------------------------------
-        """
+    pc_dircos   [numpy array] Direction cosines of the phase center as a
+                3-element vector. If set to None (default), the visibilities
+                are phased to zenith
 
-        if not isinstance(action, str):
-            return TypeError('Input parameter action must be a string')
-        action = action.lower()
-        if action not in ['store', 'return']:
-            raise ValueError('Invalid value specified for input parameter action')
+    gradient    [boolean] If set to True, also compute the gradient of the
+                visibilities with respect to the baseline vector. Default=False
 
-        gaintable = read_gaintable(gainsfile, axes_order=axes_order)
-        if action == 'store':
-            self.gaintable = gaintable
-        return gaintable
+    memsave     [boolean] If set to True, phasors and visibilities are stored
+                in single precision, otherwise in double precision (default).
+                The phase of each antenna is always evaluated in double
+                precision
 
-    #############################################################################
+    memory_limit
+                [scalar] Memory (in bytes) that may be used for the antenna
+                phasors. If exceeded, the computation is serialized over
+                chunks of sky positions. If set to None (default), the
+                available system memory is used
 
-    def interpolator(self, kind='linear'):
+    Output:
 
-        """
-        ------------------------------------------------------------------------
-        Sets up interpolation functions and stores them in the attribute
-        interpfuncs. Better alternative is to use splinator()
+    If gradient is set to False, numpy array of visibilities of size
+    nbl x nchan. If gradient is set to True, a 2-element tuple whose first
+    element is the nbl x nchan visibilities and the second element is the
+    3 x nbl x nchan visibility gradient with respect to the baseline vector
+    ---------------------------------------------------------------------------
+    """
 
-        Inputs:
+    try:
+        antpos, a1_ind, a2_ind, skypos_dircos, pbfluxes, freqs
+    except NameError:
+        raise NameError('Inputs antpos, a1_ind, a2_ind, skypos_dircos, pbfluxes and freqs must be specified')
+
+    antpos = NP.asarray(antpos).reshape(-1,3)
+    a1_ind = NP.asarray(a1_ind).ravel()
+    a2_ind = NP.asarray(a2_ind).ravel()
+    if a1_ind.size != a2_ind.size:
+        raise ValueError('Inputs a1_ind and a2_ind must be of same size')
+    skypos_dircos = NP.asarray(skypos_dircos).reshape(-1,3)
+    freqs = NP.asarray(freqs).ravel()
+    pbfluxes = NP.asarray(pbfluxes).reshape(skypos_dircos.shape[0],freqs.size)
+
+    if memsave:
+        datatype = NP.complex64
+    else:
+        datatype = NP.complex128
+
+    # Only antennas that participate in the baselines are required
+
+    ant_ind, inv_ind = NP.unique(NP.concatenate((a1_ind, a2_ind)), return_inverse=True)
+    a1_ind = inv_ind[:a1_ind.size]
+    a2_ind = inv_ind[a1_ind.size:]
+    antpos = antpos[ant_ind,:]
+    nant = ant_ind.size
+    nbl = a1_ind.size
+    nsrc = skypos_dircos.shape[0]
+
+    ant_delays = NP.dot(antpos, skypos_dircos.T) / FCNST.c # nant x nsrc
+    if pc_dircos is not None:
+        ant_delays -= NP.dot(antpos, NP.asarray(pc_dircos).reshape(-1,1)) / FCNST.c # nant x 1
+
+    skyvis = NP.zeros((nbl, freqs.size), dtype=datatype)
+    if gradient:
+        skyvis_gradient = NP.zeros((3, nbl, freqs.size), dtype=datatype)
+    if nsrc == 0:
+        if gradient:
+            return (skyvis, skyvis_gradient)
+        return skyvis
+
+    if memory_limit is None:
+        memory_limit = psutil.virtual_memory().available
+    memory_required = 3.0 * nant * nsrc * NP.dtype(datatype).itemsize # phasors, weighted phasors and their conjugates
+    n_src_stepsize = max(1, int(nsrc / NP.ceil(memory_required/float(memory_limit))))
+    src_indices = range(0, nsrc, n_src_stepsize)
+
+    for i in xrange(len(src_indices)):
+        srcslice = slice(src_indices[i], min(src_indices[i]+n_src_stepsize, nsrc))
+        for chan in xrange(freqs.size):
+            ant_phasors = NP.exp(-1j * 2.0 * NP.pi * freqs[chan] * ant_delays[:,srcslice]).astype(datatype, copy=False) # nant x nsrc
+            ant_phasors_H = ant_phasors.conj().T # nsrc x nant
+            corr_matrix = NP.dot(ant_phasors * pbfluxes[srcslice,chan].reshape(1,-1).astype(ant_phasors.real.dtype), ant_phasors_H) # nant x nant
+            skyvis[:,chan] += corr_matrix[a2_ind,a1_ind]
+            if gradient:
+                for comp in xrange(3):
+                    wts = (pbfluxes[srcslice,chan] * skypos_dircos[srcslice,comp]).reshape(1,-1).astype(ant_phasors.real.dtype)
+                    corr_matrix = NP.dot(ant_phasors * wts, ant_phasors_H)
+                    skyvis_gradient[comp,:,chan] += corr_matrix[a2_ind,a1_ind]
+
+    if gradient:
+        return (skyvis, skyvis_gradient)
+    return skyvis
 
-        kind    [string] Type of interpolation. Accepted values are
-                'linear' (default), 'cubic' or 'quintic'. See documentation
-                of scipy.interpolate.interp1d and scipy.interpolate.interp2d
-                for details
-        ------------------------------------------------------------------------
-        """
+#################################################################################
 
-        kind = kind.lower()
-        if kind not in ['linear', 'cubic', 'quintic']:
-            raise ValueError('Specified kind of interpolation invalid')
+def visibility_tile_plan(nsrc, nbl, nchan, itemsize, memory_budget=None,
+                         tile_bytes=None):
 
-        if self.gaintable is not None:
-            for gainkey in self.gaintable:
-                if self.gaintable[gainkey] is not None:
-                    self.interpfuncs[gainkey] = None
-                    if self.gaintable[gainkey]['gains'] is not None:
-                        if isinstance(self.gaintable[gainkey]['gains'], NP.ndarray):
-                            if self.gaintable[gainkey]['gains'].ndim != 3:
-                                raise ValueError('Gains must be a 3D numpy array')
-                            # if self.gaintable[gainkey]['gains'].size > 1:
-                            if (self.gaintable[gainkey]['gains'].shape[self.gaintable[gainkey]['ordering'].index('frequency')] > 1) or (self.gaintable[gainkey]['gains'].shape[self.gaintable[gainkey]['ordering'].index('time')] > 1):
-                                temp_axes_order = ['label', 'frequency', 'time']
-                                inp_order = self.gaintable[gainkey]['ordering']
-                                temp_transpose_order = NMO.find_list_in_list(inp_order, temp_axes_order)
-                                if NP.all(inp_order == temp_axes_order):
-                                    gains = NP.copy(self.gaintable[gainkey]['gains'])
-                                else:
-                                    gains = NP.transpose(NP.copy(self.gaintable[gainkey]['gains']), axes=temp_transpose_order)
-                                dims = []
-                                for ax in NP.arange(1,3):
-                                    if gains.shape[ax] > 1:
-                                        dims += [temp_axes_order[ax]]
-                                dims = NP.asarray(dims)
-                                interpf = []
-                                for labelind in xrange(gains.shape[0]):
-                                    if dims.size == 1:
-                                        interpf_real = interpolate.interp1d(self.gaintable[gainkey][dims[0]], gains[labelind,:,:].real.ravel(), kind=kind, bounds_error=True)
-                                        interpf_imag = interpolate.interp1d(self.gaintable[gainkey][dims[0]], gains[labelind,:,:].imag.ravel(), kind=kind, bounds_error=True)
-                                    else:
-                                        interpf_real = interpolate.interp2d(self.gaintable[gainkey]['time'], self.gaintable[gainkey]['frequency'], gains[labelind,:,:].real, kind=kind, bounds_error=True)
-                                        interpf_imag = interpolate.interp2d(self.gaintable[gainkey]['time'], self.gaintable[gainkey]['frequency'], gains[labelind,:,:].imag, kind=kind, bounds_error=True)
-                                    interpf += [(copy.copy(interpf_real), copy.copy(interpf_imag))]
-                                self.interpfuncs[gainkey] = {'interp': NP.asarray(interpf, dtype=[('real', NP.object), ('imag', NP.object)]), 'dims': dims}
+    """
+    ---------------------------------------------------------------------------
+    Plan the tiling of the (source x baseline x channel) phasor tensor of a
+    visibility computation so that the working set of a tile stays within a
+    cache friendly size and the total scratch memory stays within a memory
+    budget. The channel axis is kept whole as far as possible, followed by
+    the baseline axis, and the remaining room is filled with sources, over
+    which the visibilities are accumulated.
 
-    ############################################################################
+    Inputs:
 
-    def splinator(self, smoothness=None):
+    nsrc        [integer] Number of sources
 
-        """
-        -----------------------------------------------------------------------
-        Sets up spline functions and stores them in the attribute splinefuncs.
-        Better alternative to interpolator()
+    nbl         [integer] Number of baselines
 
-        Inputs:
+    nchan       [integer] Number of frequency channels
 
-        smoothness  [integer or float] Smoothness of spline interpolation. Must
-                    be positive. If set to None (default), it will set equal to
-                    the number of samples using which the spline functions are
-                    estimated. Read documentation of
-                    scipy.interpolate.UnivariateSpline and
-                    scipy.interpolate.RectBivariateSpline for more details
-        -----------------------------------------------------------------------
-        """
-        if smoothness is not None:
-            if not isinstance(smoothness, (int,float)):
-                raise TypeError('Input smoothness must be a scalar')
-            if smoothness <= 0.0:
-                raise ValueError('Input smoothness must be a positive number')
+    itemsize    [integer] Size (in bytes) of a complex phasor. Must be 8
+                (single precision) or 16 (double precision)
 
-        if self.gaintable is not None:
-            for gainkey in self.gaintable:
-                if self.gaintable[gainkey] is not None:
-                    self.splinefuncs[gainkey] = None
-                    if self.gaintable[gainkey]['gains'] is not None:
-                        if isinstance(self.gaintable[gainkey]['gains'], NP.ndarray):
-                            if self.gaintable[gainkey]['gains'].ndim != 3:
-                                raise ValueError('Gains must be a 3D numpy array')
-                            # if self.gaintable[gainkey]['gains'].size > 1:
-                            if (self.gaintable[gainkey]['gains'].shape[self.gaintable[gainkey]['ordering'].index('frequency')] > 1) or (self.gaintable[gainkey]['gains'].shape[self.gaintable[gainkey]['ordering'].index('time')] > 1):
-                                temp_axes_order = ['label', 'frequency', 'time']
-                                inp_order = self.gaintable[gainkey]['ordering']
-                                temp_transpose_order = NMO.find_list_in_list(inp_order, temp_axes_order)
-                                if NP.all(inp_order == temp_axes_order):
-                                    gains = NP.copy(self.gaintable[gainkey]['gains'])
-                                else:
-                                    gains = NP.transpose(NP.copy(self.gaintable[gainkey]['gains']), axes=temp_transpose_order)
-                                dims = []
-                                for ax in NP.arange(1,3):
-                                    if gains.shape[ax] > 1:
-                                        dims += [temp_axes_order[ax]]
-                                dims = NP.asarray(dims)
-                                interpf = []
-                                for labelind in xrange(gains.shape[0]):
-                                    if dims.size == 1:
-                                        if smoothness is None:
-                                            smoothness = self.gaintable[gainkey][dims[0]].size
-                                        interpf_real = interpolate.UnivariateSpline(self.gaintable[gainkey][dims[0]], gains[labelind,:,:].real.ravel(), s=smoothness, ext='raise')
-                                        interpf_imag = interpolate.UnivariateSpline(self.gaintable[gainkey][dims[0]], gains[labelind,:,:].imag.ravel(), s=smoothness, ext='raise')
-                                    else:
-                                        if smoothness is None:
-                                            smoothness = gains.shape[1]*gains.shape[2]
-                                        interpf_real = interpolate.RectBivariateSpline(self.gaintable[gainkey]['time'], self.gaintable[gainkey]['frequency'], gains[labelind,:,:].real.T, bbox=[self.gaintable[gainkey]['time'].min(), self.gaintable[gainkey]['time'].max(), self.gaintable[gainkey]['frequency'].min(), self.gaintable[gainkey]['frequency'].max()], s=smoothness)
-                                        interpf_imag = interpolate.RectBivariateSpline(self.gaintable[gainkey]['time'], self.gaintable[gainkey]['frequency'], gains[labelind,:,:].imag.T, bbox=[self.gaintable[gainkey]['time'].min(), self.gaintable[gainkey]['time'].max(), self.gaintable[gainkey]['frequency'].min(), self.gaintable[gainkey]['frequency'].max()], s=smoothness)
-                                    interpf += [(copy.copy(interpf_real), copy.copy(interpf_imag))]
-                                self.splinefuncs[gainkey] = {'interp': NP.asarray(interpf, dtype=[('real', NP.object), ('imag', NP.object)]), 'dims': dims}
+    Keyword Inputs:
 
-    #############################################################################
+    memory_budget
+                [scalar] Memory (in bytes) that may be used for the scratch
+                buffers of a tile. If set to None (default), the available
+                system memory is used
 
-    def interpolate_gains(self, bl_labels, freqs=None, times=None,
-                          axes_order=None):
+    tile_bytes  [scalar] Preferred size (in bytes) of the scratch buffers of a
+                tile. If set to None (default), it is set to 8 MB which fits
+                in the last level cache of most processors. It is reduced to
+                memory_budget if the latter is smaller
 
-        """
-        ------------------------------------------------------------------------
-        Interpolate at the specified baselines for the given frequencies and
-        times using attribute interpfuncs. Better alternative is to use
-        spline_gains()
+    Output:
 
-        Inputs:
+    Dictionary containing the following keys and values:
+    'src'       [integer] Number of sources in a tile
+    'bl'        [integer] Number of baselines in a tile
+    'chan'      [integer] Number of frequency channels in a tile
+    'ntiles'    [integer] Total number of tiles
+    'tile_bytes'
+                [integer] Size (in bytes) of the scratch buffers of a tile
+    'memory_budget'
+                [scalar] Memory budget (in bytes) used for planning
+    ---------------------------------------------------------------------------
+    """
 
-        bl_labels   [Numpy structured array tuples] Labels of antennas in the
-                    pair used to produce the baseline vector under fields 'A2'
-                    and 'A1' for second and first antenna respectively. The
-                    baseline vector is obtained by position of antennas under
-                    'A2' minus position of antennas under 'A1'. The array is of
-                    size nbl
+    if not isinstance(itemsize, (int, NP.integer)):
+        raise TypeError('Input itemsize must be an integer')
+    if itemsize not in [8, 16]:
+        raise ValueError('Input itemsize must be 8 or 16')
+    if memory_budget is None:
+        memory_budget = psutil.virtual_memory().available
+    elif not isinstance(memory_budget, (int, float)):
+        raise TypeError('Input memory_budget must be a scalar')
+    elif memory_budget <= 0:
+        raise ValueError('Input memory_budget must be positive')
+    if tile_bytes is None:
+        tile_bytes = 2**23
+    elif not isinstance(tile_bytes, (int, float)):
+        raise TypeError('Input tile_bytes must be a scalar')
+    elif tile_bytes <= 0:
+        raise ValueError('Input tile_bytes must be positive')
+
+    bytes_per_element = itemsize + itemsize // 2 # complex phasors and their real phases
+    max_elements = max(1, int(min(tile_bytes, memory_budget) // bytes_per_element))
+    nchan_tile = max(1, min(nchan, max_elements))
+    nbl_tile = max(1, min(nbl, max_elements // nchan_tile))
+    nsrc_tile = max(1, min(nsrc, max_elements // (nchan_tile * nbl_tile)))
+    ntiles = int(NP.ceil(nsrc/float(nsrc_tile)) * NP.ceil(nbl/float(nbl_tile)) * NP.ceil(nchan/float(nchan_tile)))
+
+    return {'src': nsrc_tile, 'bl': nbl_tile, 'chan': nchan_tile, 'ntiles': ntiles, 'tile_bytes': nsrc_tile * nbl_tile * nchan_tile * bytes_per_element, 'memory_budget': memory_budget}
 
-        freqs       [None or numpy array] Array of frequencies at which the
-                    gains are to be interpolated using the attribute
-                    interpfuncs. If set to None (default), all frequencies in
-                    the gaintable are assumed. The specified frequencies must
-                    always lie within the range which was used in creating the
-                    interpolation functions, otherwise an exception will be
-                    raised. The array is of size nchan
+#################################################################################
 
-        times       [None or numpy array] Array of times at which the gains
-                    are to be interpolated using the attribute interpfuncs. If
-                    set to None (default), all times in the gaintable are
-                    assumed. The specified times must always lie within the
-                    range which was used in creating the interpolation
-                    functions, otherwise an exception will be raised. The
-                    array is of size nts
+def _visibility_tiles(inputs):
 
-        axes_order  [None or list or numpy array] Axes ordering for extracted
-                    gains. It must contain the three elements 'label',
-                    'frequency', and 'time'. If set to None, it will be
-                    returned in the same order as in the input gaintable.
+    """
+    ---------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    This internal routine computes the visibilities of a set of sources tile
+    by tile as planned by visibility_tile_plan(). It is called by
+    tiled_visibilities() serially or from a pool of threads.
 
-        Outputs:
+    Inputs:
 
-        [numpy array] Complex gains of shape nbl x nchan x nts for the
-        specified baselines, frequencies and times.
-        ------------------------------------------------------------------------
-        """
-        try:
-            bl_labels
-        except NameError:
-            raise NameError('Input bl_labels must be specified')
+    inputs      [tuple] Consists of delays (nsrc x nbl), pbfluxes (nsrc x
+                nchan), freqs (nchan), vis_wts (None or nsrc x nbl x nchan),
+                skypos_dircos (None or nsrc x 3), phasor_mode, memsave, the
+                tile plan, and the scratch buffer dictionary (or None). Read
+                docstring of tiled_visibilities() for details
 
-        blgains = NP.asarray(1.0).reshape(1,1,1)
-        if self.gaintable is not None:
-            a1_labels = bl_labels['A1']
-            a2_labels = bl_labels['A2']
-            for key in ['antenna-based', 'baseline-based']:
-                if self.interpfuncs[key] is not None:
-                    labels = self.gaintable[key]['label']
-                    if freqs is None:
-                        if self.gaintable[key]['frequency'] is not None:
-                            freqs = self.gaintable[key]['frequency']
-                    elif isinstance(freqs, (int,list,NP.ndarray)):
-                        freqs = NP.asarray(freqs).ravel()
-                    else:
-                        raise TypeError('Input freqs must be a scalar, list or numpy array')
+    Output:
 
-                    if times is None:
-                        if self.gaintable[key]['time'] is not None:
-                            times = self.gaintable[key]['time']
-                    elif isinstance(times, (int,list,NP.ndarray)):
-                        times = NP.asarray(times).ravel()
-                    else:
-                        raise TypeError('Input times must be a scalar, list or numpy array')
+    Tuple consisting of the nbl x nchan visibilities and the 3 x nbl x nchan
+    visibility gradient which is None if skypos_dircos is None
+    ---------------------------------------------------------------------------
+    """
 
-                    if self.gaintable[key]['frequency'] is not None:
-                        ib_freq_index = NP.logical_and(freqs <= NP.amax(self.gaintable[key]['frequency']), freqs >= NP.amin(self.gaintable[key]['frequency']))
-                        oobl_freq_index = freqs < NP.amin(self.gaintable[key]['frequency'])
-                        oobr_freq_index = freqs > NP.amax(self.gaintable[key]['frequency'])
-                        oob_freq_index = NP.logical_not(ib_freq_index)
-                        if NP.any(oob_freq_index):
-                            raise ValueError('One or more of the frequencies outside interpolation range')
+    delays, pbfluxes, freqs, vis_wts, skypos_dircos, phasor_mode, memsave, plan, scratch = inputs
+    nsrc, nbl = delays.shape
+    nchan = freqs.size
+    if memsave:
+        datatype = NP.complex64
+        realtype = NP.float32
+    else:
+        datatype = NP.complex128
+        realtype = NP.float64
+    if memsave == 'mixed':
+        accumtype = NP.complex128
+    else:
+        accumtype = datatype
+
+    skyvis = NP.zeros((nbl, nchan), dtype=accumtype)
+    skyvis_gradient = None
+    if skypos_dircos is not None:
+        skyvis_gradient = NP.zeros((3, nbl, nchan), dtype=accumtype)
+
+    neg_two_pi_freqs = (-2.0 * NP.pi * freqs).astype(realtype)
+    for b0 in xrange(0, nbl, plan['bl']):
+        b1 = min(b0+plan['bl'], nbl)
+        for c0 in xrange(0, nchan, plan['chan']):
+            c1 = min(c0+plan['chan'], nchan)
+            for s0 in xrange(0, nsrc, plan['src']):
+                s1 = min(s0+plan['src'], nsrc)
+                if phasor_mode == 'recurrence':
+                    phasors = phasor_recurrence(delays[s0:s1,b0:b1], freqs[c0:c1], memsave=memsave)
+                else:
+                    phases = _scratch_array(scratch, 'phases', (s1-s0,b1-b0,c1-c0), realtype)
+                    phasors = _scratch_array(scratch, 'phasors', (s1-s0,b1-b0,c1-c0), datatype)
+                    if memsave == 'mixed': # Reduce the phase to within half a turn in double precision before single precision trigonometry
+                        turns = _scratch_array(scratch, 'turns', (s1-s0,b1-b0,c1-c0), NP.float64)
+                        NP.multiply(delays[s0:s1,b0:b1,NP.newaxis], freqs[c0:c1].reshape(1,1,-1), out=turns)
+                        NP.rint(turns, out=phases)
+                        NP.subtract(turns, phases, out=turns)
+                        NP.multiply(turns, -2.0 * NP.pi, out=phases, casting='same_kind')
                     else:
-                        if freqs is not None:
-                            ib_freq_index = NP.ones(freqs.size, dtype=NP.bool)
-                            oob_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
-                            oobl_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
-                            oobr_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
-                        else:
-                            ib_freq_index = None
-                            oob_freq_index = None
-
-                    if self.gaintable[key]['time'] is not None:
-                        ib_time_index = NP.logical_and(times <= NP.amax(self.gaintable[key]['time']), times >= NP.amin(self.gaintable[key]['time']))
-                        oobl_time_index = times < NP.amin(self.gaintable[key]['time'])
-                        oobr_time_index = times > NP.amax(self.gaintable[key]['time'])
-                        oob_time_index = NP.logical_not(ib_time_index)
-                        if NP.any(oob_time_index):
-                            raise ValueError('One or more of the times outside interpolation range')
+                        NP.multiply(delays[s0:s1,b0:b1,NP.newaxis].astype(realtype), neg_two_pi_freqs[c0:c1].reshape(1,1,-1), out=phases)
+                    NP.cos(phases, out=phasors.real)
+                    NP.sin(phases, out=phasors.imag)
+                if vis_wts is not None:
+                    phasors *= vis_wts[s0:s1,b0:b1,c0:c1]
+                phasors *= pbfluxes[s0:s1,NP.newaxis,c0:c1]
+                skyvis[b0:b1,c0:c1] += NP.sum(phasors, axis=0, dtype=accumtype)
+                if skypos_dircos is not None:
+                    if memsave == 'mixed': # Sum the gradient over the sources in double precision as well
+                        skyvis_gradient[:,b0:b1,c0:c1] += NP.tensordot(skypos_dircos[s0:s1,:].T.astype(NP.float64), phasors.astype(accumtype), axes=1)
                     else:
-                        if times is not None:
-                            ib_time_index = NP.ones(times.size, dtype=NP.bool)
-                            oob_time_index = NP.zeros(times.size, dtype=NP.bool)
-                            oobl_time_index = NP.zeros(times.size, dtype=NP.bool)
-                            oobr_time_index = NP.zeros(times.size, dtype=NP.bool)
-                        else:
-                            ib_time_index = None
-                            oob_time_index = None
+                        skyvis_gradient[:,b0:b1,c0:c1] += NP.tensordot(skypos_dircos[s0:s1,:].T.astype(realtype), phasors, axes=1)
 
-                    if isinstance(self.interpfuncs[key], dict):
-                        if 'dims' not in self.interpfuncs[key]:
-                            raise KeyError('Key "dims" not found in attribute interpfuncs[{0}]'.format(key))
-                        if not isinstance(self.interpfuncs[key]['dims'], NP.ndarray):
-                            raise TypeError('Key "dims" in attribute interpfuncs[{0}] must contain a numpy array'.format(key))
+    return (skyvis, skyvis_gradient)
 
-                        if self.interpfuncs[key]['dims'].size == 1:
-                            if self.interpfuncs[key]['dims'][0] == 'time':
-                                ntimes = ib_time_index.size
-                                if freqs is None:
-                                    nchan = 1
-                                else:
-                                    nchan = ib_freq_index.size
-                                inp = times[ib_time_index]
-                            else:
-                                nchan = ib_freq_index.size
-                                if times is None:
-                                    ntimes = 1
-                                else:
-                                    ntimes = ib_time_index.size
-                                inp = freqs[ib_freq_index]
-                        else:
-                            inp_times = times[ib_time_index]
-                            inp_freqs = freqs[ib_freq_index]
-                            ntimes = ib_time_index.size
-                            nchan = ib_freq_index.size
+#################################################################################
 
-                        if key == 'antenna-based':
-                            ind1 = NMO.find_list_in_list(labels, a1_labels)
-                            ind2 = NMO.find_list_in_list(labels, a2_labels)
-                            if NP.sum(ind1.mask) > 0:
-                                raise IndexError('Some antenna gains could not be found')
-                            if NP.sum(ind2.mask) > 0:
-                                raise IndexError('Some antenna gains could not be found')
-                            g1_conj = None
-                            g2 = None
-                            for i in xrange(ind1.size):
-                                if self.interpfuncs[key]['dims'].size == 1:
-                                    if g1_conj is None:
-                                        g1_conj = (self.interpfuncs[key]['interp']['real'][ind1[i]](inp) - 1j * self.interpfuncs[key]['interp']['imag'][ind1[i]](inp)).reshape(1,nchan,ntimes)
-                                        g2 = (self.interpfuncs[key]['interp']['real'][ind2[i]](inp) + 1j * self.interpfuncs[key]['interp']['imag'][ind2[i]](inp)).reshape(1,nchan,ntimes)
-                                    else:
-                                        g1_conj = NP.concatenate((g1_conj, (self.interpfuncs[key]['interp']['real'][ind1[i]](inp) - 1j * self.interpfuncs[key]['interp']['imag'][ind1[i]](inp)).reshape(1,nchan,ntimes)), axis=0)
-                                        g2 = NP.concatenate((g2, (self.interpfuncs[key]['interp']['real'][ind2[i]](inp) + 1j * self.interpfuncs[key]['interp']['imag'][ind2[i]](inp)).reshape(1,nchan,ntimes)), axis=0)
-                                else:
-                                    if g1_conj is None:
-                                        g1_conj = (self.interpfuncs[key]['interp']['real'][ind1[i]](inp_times,inp_freqs) - 1j * self.interpfuncs[key]['interp']['imag'][ind1[i]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)
-                                        g2 = (self.interpfuncs[key]['interp']['real'][ind2[i]](inp_times,inp_freqs) + 1j * self.interpfuncs[key]['interp']['imag'][ind2[i]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)
-                                    else:
-                                        g1_conj = NP.concatenate((g1_conj, (self.interpfuncs[key]['interp']['real'][ind1[i]](inp_times,inp_freqs) - 1j * self.interpfuncs[key]['interp']['imag'][ind1[i]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)), axis=0)
-                                        g2 = NP.concatenate((g2, (self.interpfuncs[key]['interp']['real'][ind2[i]](inp_times,inp_freqs) + 1j * self.interpfuncs[key]['interp']['imag'][ind2[i]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)), axis=0)
+def tiled_visibilities(delays, pbfluxes, freqs, vis_wts=None,
+                       skypos_dircos=None, phasor_mode='direct',
+                       memsave=False, memory_budget=None, tile_bytes=None,
+                       scratch=None, debug_hook=None, nthreads=None):
 
-                            blgains = blgains * g1_conj * g2 * NP.ones((1,nchan,ntimes), dtype=NP.complex)
-                        else:
-                            g12 = None
-                            for labelind,label in enumerate(bl_labels):
-                                if label in labels:
-                                    ind = NP.where(self.gaintable[key]['label'] == label)[0]
-                                    if self.interpfuncs[key]['dims'].size == 1:
-                                        if g12 is None:
-                                            g12 = (self.interpfuncs[key]['interp']['real'][ind[0]](inp) + 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)
-                                        else:
-                                            g12 = NP.concatenate((g12, (self.interpfuncs[key]['interp']['real'][ind[0]](inp) + 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)), axis=0)
-                                    else:
-                                        if g12 is None:
-                                            g12 = (self.interpfuncs[key]['interp']['real'][ind[0]](inp_times,inp_freqs) + 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)
-                                        else:
-                                            g12 = NP.concatenate((g12, (self.interpfuncs[key]['interp']['real'][ind[0]](inp_times,inp_freqs) + 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)), axis=0)
-                                elif NP.asarray([tuple(reversed(label))], dtype=bl_labels.dtype)[0] in labels:
-                                    ind = NP.where(labels == NP.asarray([tuple(reversed(label))], dtype=bl_labels.dtype)[0])[0]
-                                    if self.interpfuncs[key]['dims'].size == 1:
-                                        if g12 is None:
-                                            g12 = (self.interpfuncs[key]['interp']['real'][ind[0]](inp) - 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)
-                                        else:
-                                            g12 = NP.concatenate((g12, (self.interpfuncs[key]['interp']['real'][ind[0]](inp) - 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)), axis=0)
-                                    else:
-                                        if g12 is None:
-                                            g12 = (self.interpfuncs[key]['interp']['real'][ind[0]](inp_times,inp_freqs) - 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)
-                                        else:
-                                            g12 = NP.concatenate((g12, (self.interpfuncs[key]['interp']['real'][ind[0]](inp_times,inp_freqs) - 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)), axis=0)
-                                else:
-                                    if g12 is None:
-                                        g12 = NP.ones((1,nchan,ntimes), dtype=NP.complex)
-                                    else:
-                                        g12 = NP.concatenate((g12, NP.ones((1,nchan,ntimes), dtype=NP.complex)), axis=0)
-                            blgains = blgains * g12 * NP.ones((1,nchan,ntimes), dtype=NP.complex)
+    """
+    ---------------------------------------------------------------------------
+    Compute visibilities from the delays of sources relative to the phase
+    center by tiling the (source x baseline x channel) phasor tensor as
+    planned by visibility_tile_plan(). The phasors of a tile are written into
+    scratch buffers which are reused across tiles and, if provided, across
+    calls. The visibilities of a (baseline x channel) block are accumulated
+    over the source tiles while the block is resident in the cache.
 
-        interp_axes_order = ['label', 'frequency', 'time']
-        if axes_order is None:
-            axes_order = self.gaintable['antenna-based']['ordering']
-        elif not isinstance(axes_order, (list, NP.ndarray)):
-            raise TypeError('axes_order must be a list')
-        else:
-            if len(axes_order) != 3:
-                raise ValueError('axes_order must be a three element list')
-            for orderkey in ['label', 'frequency', 'time']:
-                if orderkey not in axes_order:
-                    raise ValueError('axes_order does not contain key "{0}"'.format(orderkey))
+    Inputs:
 
-        transpose_order = NMO.find_list_in_list(interp_axes_order, axes_order)
-        blgains = NP.transpose(blgains, axes=transpose_order)
+    delays      [numpy array] Delays (in s) of the sources relative to the
+                phase center as a nsrc x nbl array
 
-        return blgains
+    pbfluxes    [numpy array] Primary beam weighted flux densities as a
+                nsrc x nchan array
 
-    #############################################################################
+    freqs       [numpy array] Frequency channels (in Hz) of size nchan
 
-    def spline_gains(self, bl_labels, freqs=None, times=None, axes_order=None):
+    Keyword Inputs:
 
-        """
-        ------------------------------------------------------------------------
-        Evaluate spline at the specified baselines for the given frequencies and
-        times using attribute splinefuncs. Better alternative to
-        interpolate_gains()
+    vis_wts     [numpy array] Visibility weights of extended sources as a
+                nsrc x nbl x nchan array. If set to None (default), no
+                weights are applied
 
-        Inputs:
+    skypos_dircos
+                [numpy array] Direction cosines of sky positions as a nsrc x 3
+                array. If provided, the gradient of the visibilities with
+                respect to the baseline vector is also computed. Default=None
 
-        bl_labels   [Numpy structured array tuples] Labels of antennas in the
-                    pair used to produce the baseline vector under fields 'A2'
-                    and 'A1' for second and first antenna respectively. The
-                    baseline vector is obtained by position of antennas under
-                    'A2' minus position of antennas under 'A1'. The array is of
-                    size nbl
+    phasor_mode [string] Accepted values are 'direct' (default) and
+                'recurrence'. Read docstring of member function observe() of
+                class InterferometerArray for details
 
-        freqs       [None or numpy array] Array of frequencies at which the
-                    gains are to be interpolated using the attribute
-                    splinefuncs. If set to None (default), all frequencies in
-                    the gaintable are assumed. The specified frequencies must
-                    always lie within the range which was used in creating the
-                    interpolation functions, otherwise an exception will be
-                    raised. The array is of size nchan
+    memsave     [boolean or string] If set to True, phasors and visibilities
+                are computed in single precision, otherwise in double
+                precision (default). If set to 'mixed', the phases are
+                evaluated and reduced to within half a turn in double
+                precision, the phasors are computed and stored in single
+                precision, and the visibilities are accumulated in double
+                precision before they are returned in single precision. This
+                retains the accuracy of the sum over a large number of
+                sources at nearly the cost of single precision
 
-        times       [None or numpy array] Array of times at which the gains
-                    are to be interpolated using the attribute splinefuncs. If
-                    set to None (default), all times in the gaintable are
-                    assumed. The specified times must always lie within the
-                    range which was used in creating the interpolation
-                    functions, otherwise an exception will be raised. The array
-                    is of size nts
+    memory_budget
+                [scalar] Memory (in bytes) that may be used for the scratch
+                buffers. If set to None (default), the available system memory
+                is used
 
-        axes_order  [None or list or numpy array] Axes ordering for extracted
-                    gains. It must contain the three elements 'label',
-                    'frequency', and 'time'. If set to None, it will be
-                    returned in the same order as in the input gaintable.
+    tile_bytes  [scalar] Preferred size (in bytes) of the scratch buffers of a
+                tile. Read docstring of visibility_tile_plan() for details
 
-        Outputs:
+    scratch     [dictionary] Holds scratch buffers that are reused across
+                calls. It is updated in place when the buffers are grown. If
+                set to None (default), buffers are allocated for this call only
 
-        [numpy array] Complex gains of shape nbl x nchan x nts for the specified
-        baselines, frequencies and times.
-        ---------------------------------------------------------------------------
-        """
+    debug_hook  [function] If provided, it is called once with the
+                dictionary returned by visibility_tile_plan() before the tiles
+                are computed. The dictionary also contains the number of
+                threads under key 'nthreads'. Default=None
+
+    nthreads    [integer] Number of threads over which the sources are
+                divided. Each thread computes the tiles of its sources into
+                its own scratch buffers and partial visibilities, which are
+                summed at the end. The memory budget is shared equally by the
+                threads. NumPy releases the global interpreter lock inside
+                the array operations, so the threads run concurrently. If set
+                to None (default) or 1, the tiles are computed serially
+
+    Output:
+
+    If skypos_dircos is set to None, numpy array of visibilities of size
+    nbl x nchan. Otherwise, a 2-element tuple whose first element is the
+    nbl x nchan visibilities and the second element is the 3 x nbl x nchan
+    visibility gradient with respect to the baseline vector
+    ---------------------------------------------------------------------------
+    """
 
+    delays = NP.asarray(delays)
+    if delays.ndim != 2:
+        raise ValueError('Input delays must be a 2D array')
+    nsrc, nbl = delays.shape
+    freqs = NP.asarray(freqs).ravel()
+    nchan = freqs.size
+    pbfluxes = NP.asarray(pbfluxes).reshape(nsrc,nchan)
+    if vis_wts is not None:
+        vis_wts = NP.asarray(vis_wts).reshape(nsrc,nbl,nchan)
+    if skypos_dircos is not None:
+        skypos_dircos = NP.asarray(skypos_dircos).reshape(nsrc,3)
+    if phasor_mode not in ['direct', 'recurrence']:
+        raise ValueError('Invalid value specified in input phasor_mode')
+    if memsave not in [True, False, 'mixed']:
+        raise ValueError('Input memsave must be True, False or "mixed"')
+    if debug_hook is not None:
+        if not callable(debug_hook):
+            raise TypeError('Input debug_hook must be callable')
+
+    if memsave:
+        datatype = NP.complex64
+    else:
+        datatype = NP.complex128
+    if memsave == 'mixed':
+        itemsize = 16 # single precision phasors and phases along with double precision turns
+    else:
+        itemsize = NP.dtype(datatype).itemsize
+
+    if nthreads is None:
+        nthreads = 1
+    elif not isinstance(nthreads, int):
+        raise TypeError('Input nthreads must be an integer')
+    elif nthreads < 1:
+        raise ValueError('Input nthreads must be positive')
+    nthreads = max(1, min(nthreads, nsrc))
+
+    if memory_budget is None:
+        memory_budget = psutil.virtual_memory().available
+    plan = visibility_tile_plan(int(NP.ceil(nsrc/float(nthreads))), nbl, nchan, itemsize, memory_budget=memory_budget/float(nthreads), tile_bytes=tile_bytes)
+    plan['nthreads'] = nthreads
+    if debug_hook is not None:
+        debug_hook(plan)
+
+    if nthreads == 1:
+        skyvis, skyvis_gradient = _visibility_tiles((delays, pbfluxes, freqs, vis_wts, skypos_dircos, phasor_mode, memsave, plan, scratch))
+    else:
+        src_edges = NP.linspace(0, nsrc, nthreads+1).astype(int)
+        thread_inputs = []
+        for thread in xrange(nthreads):
+            srcslice = slice(src_edges[thread], src_edges[thread+1])
+            thread_scratch = None
+            if scratch is not None:
+                thread_scratch = scratch.setdefault('thread_{0:0d}'.format(thread), {})
+            thread_inputs += [(delays[srcslice,:], pbfluxes[srcslice,:], freqs, None if vis_wts is None else vis_wts[srcslice,:,:], None if skypos_dircos is None else skypos_dircos[srcslice,:], phasor_mode, memsave, plan, thread_scratch)]
+        pool = ThreadPool(processes=nthreads)
         try:
-            bl_labels
-        except NameError:
-            raise NameError('Input bl_labels must be specified')
+            thread_outputs = pool.map(_visibility_tiles, thread_inputs)
+        finally:
+            pool.close()
+            pool.join()
+        skyvis, skyvis_gradient = thread_outputs[0]
+        for thread_skyvis, thread_skyvis_gradient in thread_outputs[1:]:
+            skyvis += thread_skyvis
+            if skyvis_gradient is not None:
+                skyvis_gradient += thread_skyvis_gradient
+
+    skyvis = skyvis.astype(datatype, copy=False)
+    if skypos_dircos is not None:
+        return (skyvis, skyvis_gradient.astype(datatype, copy=False))
+    return skyvis
 
-        blgains = NP.asarray(1.0).reshape(1,1,1)
-        if self.gaintable is not None:
-            a1_labels = bl_labels['A1']
-            a2_labels = bl_labels['A2']
-            for key in ['antenna-based', 'baseline-based']:
-                if self.splinefuncs[key] is not None:
-                    labels = self.gaintable[key]['label']
-                    if freqs is None:
-                        if self.gaintable[key]['frequency'] is not None:
-                            freqs = self.gaintable[key]['frequency']
-                    elif isinstance(freqs, (int,list,NP.ndarray)):
-                        freqs = NP.asarray(freqs).ravel()
-                    else:
-                        raise TypeError('Input freqs must be a scalar, list or numpy array')
+#################################################################################
 
-                    if times is None:
-                        if self.gaintable[key]['time'] is not None:
-                            times = self.gaintable[key]['time']
-                    elif isinstance(times, (int,list,NP.ndarray)):
-                        times = NP.asarray(times).ravel()
-                    else:
-                        raise TypeError('Input times must be a scalar, list or numpy array')
+def _snapshot_block_visibilities(inputs):
 
-                    if self.gaintable[key]['frequency'] is not None:
-                        ib_freq_index = NP.logical_and(freqs <= NP.amax(self.gaintable[key]['frequency']), freqs >= NP.amin(self.gaintable[key]['frequency']))
-                        oobl_freq_index = freqs < NP.amin(self.gaintable[key]['frequency'])
-                        oobr_freq_index = freqs > NP.amax(self.gaintable[key]['frequency'])
-                        oob_freq_index = NP.logical_not(ib_freq_index)
-                        if NP.any(oob_freq_index):
-                            raise IndexError('One or more of the frequencies outside interpolation range')
-                    else:
-                        if freqs is not None:
-                            ib_freq_index = NP.ones(freqs.size, dtype=NP.bool)
-                            oob_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
-                            oobl_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
-                            oobr_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
-                        else:
-                            ib_freq_index = None
-                            oob_freq_index = None
+    """
+    ---------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    This internal routine computes the visibilities of a block of (snapshot x
+    source) combinations which are sorted by snapshot, and sums them over the
+    sources of each snapshot. It is called by member function observe_batch()
+    of class InterferometerArray serially or from a pool of threads.
 
-                    if self.gaintable[key]['time'] is not None:
-                        ib_time_index = NP.logical_and(times <= NP.amax(self.gaintable[key]['time']), times >= NP.amin(self.gaintable[key]['time']))
-                        oobl_time_index = times < NP.amin(self.gaintable[key]['time'])
-                        oobr_time_index = times > NP.amax(self.gaintable[key]['time'])
-                        oob_time_index = NP.logical_not(ib_time_index)
-                        if NP.any(oob_time_index):
-                            raise IndexError('One or more of the times outside interpolation range')
-                    else:
-                        if times is not None:
-                            ib_time_index = NP.ones(times.size, dtype=NP.bool)
-                            oob_time_index = NP.zeros(times.size, dtype=NP.bool)
-                            oobl_time_index = NP.zeros(times.size, dtype=NP.bool)
-                            oobr_time_index = NP.zeros(times.size, dtype=NP.bool)
-                        else:
-                            ib_time_index = None
-                            oob_time_index = None
+    Inputs:
 
-                    if isinstance(self.splinefuncs[key], dict):
-                        if 'dims' not in self.splinefuncs[key]:
-                            raise KeyError('Key "dims" not found in attribute splinefuncs[{0}]'.format(key))
-                        if not isinstance(self.splinefuncs[key]['dims'], NP.ndarray):
-                            raise TypeError('Key "dims" in attribute splinefuncs[{0}] must contain a numpy array'.format(key))
+    inputs      [tuple] Consists of the geometric delays (nrows x nbl), the
+                delays of the phase centers of all the snapshots
+                (n_snapshots x nbl), the snapshot index of each row (nrows),
+                pbfluxes (nrows x nchan), freqs (nchan), vis_wts (None or
+                nrows x nbl x nchan), skypos_dircos (None or nrows x 3),
+                phasor_mode and memsave
 
-                        if self.splinefuncs[key]['dims'].size == 1:
-                            if self.splinefuncs[key]['dims'][0] == 'time':
-                                ntimes = ib_time_index.size
-                                if freqs is None:
-                                    nchan = 1
-                                else:
-                                    nchan = ib_freq_index.size
-                                inp = times[ib_time_index]
-                            else:
-                                nchan = ib_freq_index.size
-                                if times is None:
-                                    ntimes = 1
-                                else:
-                                    ntimes = ib_time_index.size
-                                inp = freqs[ib_freq_index]
-                        else:
-                            inp_times = times[ib_time_index]
-                            inp_freqs = freqs[ib_freq_index]
-                            ntimes = ib_time_index.size
-                            nchan = ib_freq_index.size
+    Output:
 
-                        tgrid, fgrid = NP.meshgrid(inp_times, inp_freqs)
-                        tvec = tgrid.ravel()
-                        fvec = fgrid.ravel()
+    Tuple consisting of the indices of the snapshots in the block, their
+    visibilities (nsnaps x nbl x nchan) and visibility gradients (nsnaps x 3
+    x nbl x nchan) which is None if skypos_dircos is None
+    ---------------------------------------------------------------------------
+    """
 
-                        if key == 'antenna-based':
-                            ind1 = NMO.find_list_in_list(labels, a1_labels)
-                            ind2 = NMO.find_list_in_list(labels, a2_labels)
-                            if NP.sum(ind1.mask) > 0:
-                                raise IndexError('Some antenna gains could not be found')
-                            if NP.sum(ind2.mask) > 0:
-                                raise IndexError('Some antenna gains could not be found')
-                            g1_conj = None
-                            g2 = None
-                            for i in xrange(ind1.size):
-                                if self.splinefuncs[key]['dims'].size == 1:
-                                    if g1_conj is None:
-                                        g1_conj = (self.splinefuncs[key]['interp']['real'][ind1[i]](inp) - 1j * self.splinefuncs[key]['interp']['imag'][ind1[i]](inp)).reshape(1,nchan,ntimes)
-                                        g2 = (self.splinefuncs[key]['interp']['real'][ind2[i]](inp) + 1j * self.splinefuncs[key]['interp']['imag'][ind2[i]](inp)).reshape(1,nchan,ntimes)
-                                    else:
-                                        g1_conj = NP.concatenate((g1_conj, (self.splinefuncs[key]['interp']['real'][ind1[i]](inp) - 1j * self.splinefuncs[key]['interp']['imag'][ind1[i]](inp)).reshape(1,nchan,ntimes)), axis=0)
-                                        g2 = NP.concatenate((g2, (self.splinefuncs[key]['interp']['real'][ind2[i]](inp) + 1j * self.splinefuncs[key]['interp']['imag'][ind2[i]](inp)).reshape(1,nchan,ntimes)), axis=0)
-                                else:
-                                    if g1_conj is None:
-                                        g1_conj = (self.splinefuncs[key]['interp']['real'][ind1[i]].ev(tvec,fvec) - 1j * self.splinefuncs[key]['interp']['imag'][ind1[i]].ev(tvec,fvec)).reshape(1,nchan,ntimes)
-                                        g2 = (self.splinefuncs[key]['interp']['real'][ind2[i]].ev(tvec,fvec) + 1j * self.splinefuncs[key]['interp']['imag'][ind2[i]].ev(tvec,fvec)).reshape(1,nchan,ntimes)
-                                    else:
-                                        g1_conj = NP.concatenate((g1_conj, (self.splinefuncs[key]['interp']['real'][ind1[i]].ev(tvec,fvec) - 1j * self.splinefuncs[key]['interp']['imag'][ind1[i]].ev(tvec,fvec)).reshape(1,nchan,ntimes)), axis=0)
-                                        g2 = NP.concatenate((g2, (self.splinefuncs[key]['interp']['real'][ind2[i]].ev(tvec,fvec) + 1j * self.splinefuncs[key]['interp']['imag'][ind2[i]].ev(tvec,fvec)).reshape(1,nchan,ntimes)), axis=0)
+    geometric_delays, pc_delay_offsets, row_snap, pbfluxes, freqs, vis_wts, skypos_dircos, phasor_mode, memsave = inputs
+    delays = geometric_delays.astype(NP.float64) - pc_delay_offsets[row_snap,:].astype(NP.float64)
+    if phasor_mode == 'recurrence':
+        phase_matrix = phasor_recurrence(delays, freqs, memsave=memsave)
+    elif memsave == 'mixed':
+        turns = delays[:,:,NP.newaxis] * freqs.astype(NP.float64).reshape(1,1,-1)
+        turns -= NP.rint(turns) # Reduce the phase to within half a turn in double precision before single precision trigonometry
+        phase_matrix = NP.exp(-1j * NP.asarray(2.0 * NP.pi).astype(NP.float32) * turns.astype(NP.float32)).astype(NP.complex64, copy=False)
+        del turns
+    elif memsave:
+        phase_matrix = NP.exp(-1j * NP.asarray(2.0 * NP.pi).astype(NP.float32) * delays[:,:,NP.newaxis].astype(NP.float32) * freqs.astype(NP.float32).reshape(1,1,-1)).astype(NP.complex64, copy=False)
+    else:
+        phase_matrix = NP.exp(-1j * 2.0 * NP.pi * delays[:,:,NP.newaxis] * freqs.astype(NP.float64).reshape(1,1,-1))
+    del delays
+    if vis_wts is not None:
+        phase_matrix *= vis_wts
+    phase_matrix *= pbfluxes[:,NP.newaxis,:]
+
+    if memsave == 'mixed':
+        accumtype = NP.complex128
+    else:
+        accumtype = phase_matrix.dtype
+    seg_starts = NP.concatenate(([0], NP.flatnonzero(NP.diff(row_snap))+1))
+    seg_snaps = row_snap[seg_starts]
+    skyvis = NP.add.reduceat(phase_matrix, seg_starts, axis=0, dtype=accumtype)
+    skyvis_gradient = None
+    if skypos_dircos is not None:
+        skyvis_gradient = NP.add.reduceat(skypos_dircos[:,:,NP.newaxis,NP.newaxis].astype(phase_matrix.real.dtype) * phase_matrix[:,NP.newaxis,:,:], seg_starts, axis=0, dtype=accumtype)
 
-                            blgains = blgains * g1_conj * g2 * NP.ones((1,nchan,ntimes), dtype=NP.complex)
-                        else:
-                            g12 = None
-                            for labelind,label in enumerate(bl_labels):
-                                if label in labels:
-                                    ind = NP.where(self.gaintable[key]['label'] == label)[0]
-                                    if self.splinefuncs[key]['dims'].size == 1:
-                                        if g12 is None:
-                                            g12 = (self.splinefuncs[key]['interp']['real'][ind[0]](inp) + 1j * self.splinefuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)
-                                        else:
-                                            g12 = NP.concatenate((g12, (self.splinefuncs[key]['interp']['real'][ind[0]](inp) + 1j * self.splinefuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)), axis=0)
-                                    else:
-                                        if g12 is None:
-                                            g12 = (self.splinefuncs[key]['interp']['real'][ind[0]].ev(tvec,fvec) + 1j * self.splinefuncs[key]['interp']['imag'][ind[0]].ev(tvec,fvec)).reshape(1,nchan,ntimes)
-                                        else:
-                                            g12 = NP.concatenate((g12, (self.splinefuncs[key]['interp']['real'][ind[0]].ev(tvec,fvec) + 1j * self.splinefuncs[key]['interp']['imag'][ind[0]].ev(tvec,fvec)).reshape(1,nchan,ntimes)), axis=0)
-                                elif NP.asarray([tuple(reversed(label))], dtype=bl_labels.dtype)[0] in labels:
-                                    ind = NP.where(labels == NP.asarray([tuple(reversed(label))], dtype=bl_labels.dtype)[0])[0]
-                                    if self.splinefuncs[key]['dims'].size == 1:
-                                        if g12 is None:
-                                            g12 = (self.splinefuncs[key]['interp']['real'][ind[0]](inp) - 1j * self.splinefuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)
-                                        else:
-                                            g12 = NP.concatenate((g12, (self.splinefuncs[key]['interp']['real'][ind[0]](inp) - 1j * self.splinefuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)), axis=0)
-                                    else:
-                                        if g12 is None:
-                                            g12 = (self.splinefuncs[key]['interp']['real'][ind[0]].ev(tvec,fvec) - 1j * self.splinefuncs[key]['interp']['imag'][ind[0]].ev(tvec,fvec)).reshape(1,nchan,ntimes)
-                                        else:
-                                            g12 = NP.concatenate((g12, (self.splinefuncs[key]['interp']['real'][ind[0]].ev(tvec,fvec) - 1j * self.splinefuncs[key]['interp']['imag'][ind[0]].ev(tvec,fvec)).reshape(1,nchan,ntimes)), axis=0)
-                                else:
-                                    if g12 is None:
-                                        g12 = NP.ones((1,nchan,ntimes), dtype=NP.complex)
-                                    else:
-                                        g12 = NP.concatenate((g12, NP.ones((1,nchan,ntimes), dtype=NP.complex)), axis=0)
-                            blgains = blgains * g12 * NP.ones((1,nchan,ntimes), dtype=NP.complex)
+    return (seg_snaps, skyvis, skyvis_gradient)
 
-        interp_axes_order = ['label', 'frequency', 'time']
-        if axes_order is None:
-            axes_order = self.gaintable['antenna-based']['ordering']
-        elif not isinstance(axes_order, (list, NP.ndarray)):
-            raise TypeError('axes_order must be a list')
-        else:
-            if len(axes_order) != 3:
-                raise ValueError('axes_order must be a three element list')
-            for orderkey in ['label', 'frequency', 'time']:
-                if orderkey not in axes_order:
-                    raise ValueError('axes_order does not contain key "{0}"'.format(orderkey))
+#################################################################################
 
-        transpose_order = NMO.find_list_in_list(interp_axes_order, axes_order)
-        blgains = NP.transpose(blgains, axes=transpose_order)
+def beam_weighted_culling(pbfluxes, tolerance):
 
-        return blgains
+    """
+    ---------------------------------------------------------------------------
+    Select the sources whose primary beam weighted flux densities contribute
+    significantly to the visibilities. Sources are sorted by their peak
+    primary beam weighted flux density over frequency and the faintest ones
+    are dropped as long as the sum of their peak primary beam weighted flux
+    densities does not exceed the specified fraction of the total primary
+    beam weighted flux density in any frequency channel. Since the magnitude
+    of the contribution of a source to any visibility cannot exceed its
+    primary beam weighted flux density, this fraction bounds the error in
+    the visibilities of all baselines and frequency channels relative to the
+    total apparent flux density.
 
-    #############################################################################
+    Inputs:
 
-    def nearest_gains(self, bl_labels, freqs=None, times=None, axes_order=None):
+    pbfluxes    [numpy array] Primary beam weighted flux densities as a
+                nsrc x nchan array
 
-        """
-        ------------------------------------------------------------------------
-        Extract complex instrument gains for given baselines from the gain table
-        determined by nearest neighbor logic
+    tolerance   [scalar] Fractional tolerance on the error of the visibilities
+                relative to the total primary beam weighted flux density in
+                each frequency channel. Must be non-negative. If set to 0,
+                only sources with zero primary beam weighted flux density are
+                dropped
 
-        Inputs:
+    Output:
 
-        bl_labels   [Numpy structured array tuples] Labels of antennas in the
-                    pair used to produce the baseline vector under fields 'A2'
-                    and 'A1' for second and first antenna respectively. The
-                    baseline vector is obtained by position of antennas under
-                    'A2' minus position of antennas under 'A1'
+    Tuple consisting of the indices (in ascending order) of the sources that
+    are retained, the number of sources culled and the bound on the
+    fractional error of the visibilities owing to the culled sources
+    ---------------------------------------------------------------------------
+    """
 
-        freqs       [None or numpy array] Array of frequencies at which the
-                    gains are to be interpolated using the attribute
-                    splinefuncs. If set to None (default), all frequencies in
-                    the gaintable are assumed. The specified frequencies must
-                    always lie within the range which was used in creating the
-                    interpolation functions, otherwise an exception will be
-                    raised. The array is of size nchan
+    if not isinstance(tolerance, (int,float)):
+        raise TypeError('Input tolerance must be a scalar')
+    if tolerance < 0.0:
+        raise ValueError('Input tolerance must be non-negative')
+
+    pbfluxes = NP.abs(NP.asarray(pbfluxes))
+    if pbfluxes.ndim == 1:
+        pbfluxes = pbfluxes.reshape(-1,1)
+    nsrc = pbfluxes.shape[0]
+    if nsrc == 0:
+        return (NP.arange(nsrc), 0, 0.0)
+
+    peak_pbfluxes = NP.amax(pbfluxes, axis=1)
+    total_pbflux = NP.amin(NP.sum(pbfluxes, axis=0)) # Total apparent flux density in the faintest channel
+    sortind = NP.argsort(peak_pbfluxes, kind='mergesort')
+    dropped_pbflux = NP.cumsum(peak_pbfluxes[sortind])
+    ncull = NP.searchsorted(dropped_pbflux, tolerance * total_pbflux, side='right')
+    ncull = min(ncull, nsrc-1) # Retain at least one source
+    keep_ind = NP.sort(sortind[ncull:])
+    error_bound = 0.0
+    if (ncull > 0) and (total_pbflux > 0.0):
+        error_bound = float(dropped_pbflux[ncull-1] / total_pbflux)
+
+    return (keep_ind, int(ncull), error_bound)
 
-        times       [None or numpy array] Array of times at which the gains
-                    are to be interpolated using the attribute splinefuncs. If
-                    set to None (default), all times in the gaintable are
-                    assumed. The specified times must always lie within the
-                    range which was used in creating the interpolation
-                    functions, otherwise an exception will be raised. The array
-                    is of size nts
+#################################################################################
 
-        axes_order  [None or list or numpy array] Axes ordering for extracted
-                    gains. It must contain the three elements 'label',
-                    'frequency', and 'time'. If set to None, it will be
-                    returned in the same order as in the input gaintable.
+def _cull_info_from_table(nsrc, ncull, error_bound):
 
-        Outputs:
+    """
+    ---------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    Converts the columns of source culling information saved to disk into the
+    list held in attribute cull_info of class InterferometerArray. Snapshots
+    in which sources were not culled are saved with a negative number of
+    sources and converted to None
+    ---------------------------------------------------------------------------
+    """
 
-        [numpy array] Complex gains of shape nbl x nchan x nts for the specified
-        baselines, frequencies and times.
-        ------------------------------------------------------------------------
-        """
+    return [None if n < 0 else {'nsrc': int(n), 'ncull': int(nc), 'error_bound': float(eb)} for n, nc, eb in zip(nsrc, ncull, error_bound)]
 
-        try:
-            bl_labels
-        except NameError:
-            raise NameError('Input bl_labels must be specified')
+#################################################################################
 
-        blgains = NP.asarray(1.0).reshape(1,1,1)
-        if self.gaintable is not None:
-            a1_labels = bl_labels['A1']
-            a2_labels = bl_labels['A2']
-            for gainkey in ['antenna-based', 'baseline-based']:
-                if gainkey in self.gaintable:
-                    temp_axes_order = ['label', 'frequency', 'time']
-                    inp_order = self.gaintable[gainkey]['ordering']
-                    temp_transpose_order = NMO.find_list_in_list(inp_order, temp_axes_order)
-                    if NP.all(inp_order == temp_axes_order):
-                        gains = NP.copy(self.gaintable[gainkey]['gains'])
-                    else:
-                        gains = NP.transpose(NP.copy(self.gaintable[gainkey]['gains']), axes=temp_transpose_order)
-
-                    freqs_to_search = copy.copy(freqs)
-                    if freqs_to_search is None:
-                        freqs_to_search = copy.copy(self.gaintable[gainkey]['frequency'])
-
-                    if freqs_to_search is not None:
-                        if self.gaintable[gainkey]['frequency'] is not None:
-                            inpind, refind_freqs, distNN= LKP.find_1NN(self.gaintable[gainkey]['frequency'].reshape(-1,1), freqs_to_search.reshape(-1,1), remove_oob=True)
-                        else:
-                            refind_freqs = None
-                    if refind_freqs is None:
-                        refind_freqs = NP.arange(gains.shape[1])
-
-                    times_to_search = copy.copy(times)
-                    if times_to_search is None:
-                        times_to_search = copy.copy(self.gaintable[gainkey]['time'])
-
-                    if times_to_search is not None:
-                        if self.gaintable[gainkey]['time'] is not None:
-                            inpind, refind_times, distNN = LKP.find_1NN(self.gaintable[gainkey]['time'].reshape(-1,1), times_to_search.reshape(-1,1), remove_oob=True)
-                        else:
-                            refind_times = None
-                    if refind_times is None:
-                        refind_times = NP.arange(gains.shape[2])
-
-                    if gains.shape[0] == 1:
-                        blgains = blgains * gains[:,refind_freqs,refind_times].reshape(1,refind_freqs.size,refind_times.size)
-                    else:
-                        labels = self.gaintable[gainkey]['label']
-                        if gainkey == 'antenna-based':
-                            ind1 = NMO.find_list_in_list(labels, a1_labels)
-                            ind2 = NMO.find_list_in_list(labels, a2_labels)
-                            if NP.sum(ind1.mask) > 0:
-                                raise IndexError('Some antenna gains could not be found')
-                            if NP.sum(ind2.mask) > 0:
-                                raise IndexError('Some antenna gains could not be found')
-                            blgains = blgains * gains[NP.ix_(ind2,refind_freqs,refind_times)].reshape(ind2.size,refind_freqs.size,refind_times.size) * gains[NP.ix_(ind1,refind_freqs,refind_times)].conj().reshape(ind1.size,refind_freqs.size,refind_times.size)
-                        else:
-                            labels_conj = [tuple(reversed(label)) for label in labels]
-                            labels_conj = NP.asarray(labels_conj, dtype=labels.dtype)
-                            labels_conj_appended = NP.concatenate((labels, labels_conj), axis=0)
-                            gains_conj_appended = NP.concatenate((gains, gains.conj()), axis=0)
-                            ind = NMO.find_list_in_list(labels_conj_appended, bl_labels)
-                            selected_gains = gains_conj_appended[NP.ix_(ind.compressed(),refind_freqs,refind_times)]
-                            if ind.compressed().size == 1:
-                                selected_gains = selected_gains.reshape(NP.sum(~ind.mask),refind_freqs.size,refind_times.size)
-                            blgains[~ind.mask, ...] = blgains[~ind.mask, ...] * selected_gains
-                    if axes_order is None:
-                        axes_order = inp_order
-                    elif not isinstance(axes_order, (list, NP.ndarray)):
-                        raise TypeError('axes_order must be a list')
-                    else:
-                        if len(axes_order) != 3:
-                            raise ValueError('axes_order must be a three element list')
-                        for orderkey in ['label', 'frequency', 'time']:
-                            if orderkey not in axes_order:
-                                raise ValueError('axes_order does not contain key "{0}"'.format(orderkey))
-
-                    transpose_order = NMO.find_list_in_list(inp_order, axes_order)
-                    blgains = NP.transpose(blgains, axes=transpose_order)
-
-        return blgains
-
-    #############################################################################
-
-    def eval_gains(self, bl_labels, freq_index=None, time_index=None,
-                   axes_order=None):
-
-        """
-        ------------------------------------------------------------------------
-        Extract complex instrument gains for given baselines from the gain table
-
-        Inputs:
-
-        bl_labels   [Numpy structured array tuples] Labels of antennas in the
-                    pair used to produce the baseline vector under fields 'A2'
-                    and 'A1' for second and first antenna respectively. The
-                    baseline vector is obtained by position of antennas under
-                    'A2' minus position of antennas under 'A1'
-
-        freq_index  [None, int, list or numpy array] Index (scalar) or indices
-                    (list or numpy array) along the frequency axis at which
-                    gains are to be extracted. If set to None, gains at all
-                    frequencies in the gain table will be extracted.
-
-        time_index  [None, int, list or numpy array] Index (scalar) or indices
-                    (list or numpy array) along the time axis at which gains
-                    are to be extracted. If set to None, gains at all timesin
-                    the gain table will be extracted.
-
-        axes_order  [None or list or numpy array] Axes ordering for extracted
-                    gains. It must contain the three elements 'label',
-                    'frequency', and 'time'. If set to None, it will be
-                    returned in the same order as in the input gaintable.
-
-        Outputs:
-
-        [numpy array] Complex gains of shape nbl x nchan x nts for the specified
-        baselines, frequencies and times.
-        ------------------------------------------------------------------------
-        """
-
-        return extract_gains(self.gaintable, bl_labels, freq_index=None,
-                             time_index=None, axes_order=None)
-
-    #############################################################################
+def _merge_cull_info(cull_infos):
 
-    def write_gaintable(self, outfile, axes_order=None, compress=True,
-                        compress_fmt='gzip', compress_opts=9):
+    """
+    ---------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    Combines the source culling information of a snapshot from pieces which
+    split the baselines or frequency channels. Sources are culled in each
+    piece independently, so the number of culled sources and the bound on the
+    fractional error are the largest over the pieces. It is None if sources
+    were not culled in any piece
+    ---------------------------------------------------------------------------
+    """
 
-        """
-        ------------------------------------------------------------------------
-        Write gain table with specified axes ordering to external file in HDF5
-        format
+    cull_infos = [elem for elem in cull_infos if elem is not None]
+    if not cull_infos:
+        return None
+    return {'nsrc': max([elem['nsrc'] for elem in cull_infos]), 'ncull': max([elem['ncull'] for elem in cull_infos]), 'error_bound': max([elem['error_bound'] for elem in cull_infos])}
 
-        Inputs:
+#################################################################################
 
-        outfile     [string] Filename including full path into which the gain
-                    table will be written
+# Axes along which the datasets of an instance of class InterferometerArray
+# saved in HDF5 format vary with baselines, frequency channels and timestamps
+# (None if the dataset does not vary with them). The gradients, shaped as
+# 3 x nbl x nchan x ntimes, vary along axes (1, 2, 3). Datasets not listed are the same in all pieces of a data set
 
-        axes_order  [None or list or numpy array] The axes ordering of gain
-                    table that will be written to external file specified in
-                    outfile. If set to None, it will store in the same order
-                    as in the attribute gaintable
+_hdf5_dataset_axes = {'spectral_info/freqs': (None, 0, None), 'spectral_info/bp': (0, 1, 2), 'spectral_info/bp_wts': (0, 1, 2), 'timing/timestamps': (None, None, 0), 'timing/t_acc': (None, None, 0), 'culling/nsrc': (None, None, 0), 'culling/ncull': (None, None, 0), 'culling/error_bound': (None, None, 0), 'skyparms/LST': (None, None, 0), 'skyparms/pointing_center': (None, None, 0), 'skyparms/phase_center': (None, None, 0), 'array/labels': (0, None, None), 'array/baselines': (0, None, None), 'array/projected_baselines': (0, None, None), 'instrument/effective_area': (0, 1, None), 'instrument/efficiency': (0, 1, None), 'instrument/Trx': (None, None, 0), 'instrument/Tant0': (None, None, 0), 'instrument/f0': (None, None, 0), 'instrument/spindex': (None, None, 0), 'instrument/Tsys': (0, 1, 2), 'visibilities/freq_spectrum/rms': (0, 1, 2), 'visibilities/freq_spectrum/vis': (0, 1, 2), 'visibilities/freq_spectrum/skyvis': (0, 1, 2), 'visibilities/freq_spectrum/noise': (0, 1, 2), 'visibilities/delay_spectrum/vis': (0, None, 2), 'visibilities/delay_spectrum/skyvis': (0, None, 2), 'visibilities/delay_spectrum/noise': (0, None, 2)}
 
-        compress    [boolean] Specifies if the gain table is written in
-                    compressed format. The compression format and compression
-                    parameters are specified in compress_fmt and compress_opts
-                    respectively
+def virtual_concatenate(infiles, outfile, overwrite=False, verbose=True):
 
-        compress_fmt
-                    [string] Accepted values are 'gzip' (default) or 'lzf'. See
-                    h5py module documentation for comparison of these
-                    compression formats
+    """
+    ---------------------------------------------------------------------------
+    Consolidate the pieces of a visibility data set, saved by instances of
+    class InterferometerArray in HDF5 format, into a single HDF5 file without
+    copying the visibilities. The pieces tile the data set along baselines,
+    frequency channels and timestamps. The visibilities, noise, bandpasses,
+    system temperatures, gradients and delay spectra in the output file are
+    HDF5 virtual datasets which map onto the datasets in the files of the
+    pieces, while the baseline, frequency and timing information, which is
+    much smaller, is concatenated. The output file can be read like any file
+    saved by an instance of class InterferometerArray (for instance, as
+    init_file) as long as the files of the pieces are kept with it.
+    Requires h5py >= 2.9 built on HDF5 >= 1.10.
 
-        compress_opts
-                    [integer] Applies only if compress_fmt is set to 'gzip'. It
-                    must be an integer in the range 0 to 9. Default=9 implies
-                    maximum compression
-        ------------------------------------------------------------------------
-        """
+    Inputs:
 
-        try:
-            outfile
-        except NameError:
-            raise NameError('outfile not specified')
+    infiles     [list] Nested list of the names (with full path and without
+                the '.hdf5' extension) of the files of the pieces, such that
+                infiles[i][j][k] holds the i-th tile of baselines, the j-th
+                tile of frequency channels and the k-th block of timestamps.
+                The pieces in the same tile of baselines must contain the
+                same baselines, and likewise for frequency channels and
+                timestamps
 
-        if axes_order is not None:
-            if not isinstance(axes_order, (list, NP.ndarray)):
-                raise TypeError('axes_order must be a list')
-            else:
-                if len(axes_order) != 3:
-                    raise ValueError('axes_order must be a three element list')
-                for orderkey in ['label', 'frequency', 'time']:
-                    if orderkey not in axes_order:
-                        raise ValueError('axes_order does not contain key "{0}"'.format(orderkey))
+    outfile     [string] Filename with full path to be saved to. Will be
+                appended with '.hdf5' extension. The files of the pieces are
+                referred to by their paths relative to its directory
 
-        if not isinstance(compress, bool):
-            raise TypeError('Input parameter compress must be boolean')
+    Keyword Inputs:
 
-        if compress:
-            if not isinstance(compress_fmt, str):
-                raise TypeError('Input parameter compress_fmt must be a string')
-            compress_fmt = compress_fmt.lower()
-            if compress_fmt not in ['gzip', 'lzf']:
-                raise ValueError('Input parameter compress_fmt invalid')
-            if compress_fmt == 'gzip':
-                if not isinstance(compress_opts, int):
-                    raise TypeError('Input parameter compress_opts must be an integer')
-                compress_opts = NP.clip(compress_opts, 0, 9)
+    overwrite   [boolean] True indicates overwrite even if a file already
+                exists. Default = False (does not overwrite)
 
-        with h5py.File(outfile, 'w') as fileobj:
-            for gainkey in self.gaintable:
-                if self.gaintable[gainkey] is not None:
-                    if axes_order is not None:
-                        transpose_order = NMO.find_list_in_list(self.gaintable[gainkey]['ordering'], axes_order)
-                    else:
-                        axes_order = self.gaintable[gainkey]['ordering']
-                    if NP.all(self.gaintable[gainkey]['ordering'] == axes_order):
-                        gains = NP.copy(self.gaintable[gainkey]['gains'])
-                    else:
-                        gains = NP.transpose(NP.copy(self.gaintable[gainkey]['gains']), axes=transpose_order)
+    verbose     [boolean] If True (default), prints diagnostic and progress
+                messages. If False, suppress printing such messages.
+    ---------------------------------------------------------------------------
+    """
 
-                    grp = fileobj.create_group(gainkey)
-                    for subkey in self.gaintable[gainkey]:
-                        if subkey == 'gains':
-                            if compress:
-                                chunkshape = []
-                                for ind,axis in enumerate(axes_order):
-                                    if axis == 'frequency':
-                                        chunkshape += [gains.shape[ind]]
-                                    else:
-                                        chunkshape += [1]
-                                chunkshape = tuple(chunkshape)
-                                if compress_fmt == 'gzip':
-                                    dset = grp.create_dataset(subkey, data=gains, chunks=chunkshape, compression=compress_fmt, compression_opts=compress_opts)
-                                else:
-                                    dset = grp.create_dataset(subkey, data=gains, chunks=chunkshape, compression=compress_fmt)
-                            else:
-                                grp.create_dataset(subkey, data=gains, chunks=chunkshape)
-                        elif subkey == 'ordering':
-                            dset = grp.create_dataset(subkey, data=axes_order)
+    if (not hasattr(h5py, 'VirtualLayout')) or (h5py.version.hdf5_version_tuple < (1,10,0)):
+        raise NotImplementedError('Virtual datasets require h5py >= 2.9 built on HDF5 >= 1.10')
+    if not isinstance(infiles, list):
+        raise TypeError('Input infiles must be a nested list')
+    if not isinstance(outfile, str):
+        raise TypeError('Input outfile must be a string')
+    nbl_tiles = len(infiles)
+    if nbl_tiles == 0:
+        raise ValueError('Input infiles must not be empty')
+    nfreq_tiles = len(infiles[0])
+    if nfreq_tiles == 0:
+        raise ValueError('Input infiles must not be empty')
+    ntime_blocks = len(infiles[0][0])
+    if ntime_blocks == 0:
+        raise ValueError('Input infiles must not be empty')
+    for ib in range(nbl_tiles):
+        if len(infiles[ib]) != nfreq_tiles:
+            raise ValueError('Input infiles must have the same number of frequency tiles for every tile of baselines')
+        for jf in range(nfreq_tiles):
+            if len(infiles[ib][jf]) != ntime_blocks:
+                raise ValueError('Input infiles must have the same number of blocks of timestamps for every tile')
+
+    filename = outfile + '.hdf5'
+    if overwrite:
+        write_str = 'w'
+    else:
+        write_str = 'w-'
+    outdir = os.path.dirname(os.path.abspath(filename))
+
+    # Only the shapes of the large datasets and the values of the small ones
+    # are needed from the pieces. They are read one file at a time so that
+    # the number of files open at once does not grow with the number of
+    # pieces
+    grid_shape = (nbl_tiles, nfreq_tiles, ntime_blocks)
+    with h5py.File(infiles[0][0][0]+'.hdf5', 'r') as first:
+        dsetnames = []
+        first.visit(lambda name: dsetnames.append(name) if isinstance(first[name], h5py.Dataset) else None)
+        dset_ndim = {name: first[name].ndim for name in dsetnames}
+    dset_axes = {}
+    for name in dsetnames:
+        if name.startswith('gradients/'):
+            dset_axes[name] = (1, 2, 3)
+        else:
+            dset_axes[name] = _hdf5_dataset_axes.get(name, (None, None, None))
+    shapes = {}
+    values = {}
+    for ib in range(nbl_tiles):
+        for jf in range(nfreq_tiles):
+            for kt in range(ntime_blocks):
+                tile = (ib, jf, kt)
+                with h5py.File(infiles[ib][jf][kt]+'.hdf5', 'r') as piece:
+                    for name in dsetnames:
+                        axes = dset_axes[name]
+                        if name in ['timing/n_acc', 'timing/t_obs']:
+                            if (ib == 0) and (jf == 0):
+                                values[(name,tile)] = piece[name].value
+                        elif axes == (None, None, None):
+                            continue
+                        elif dset_ndim[name] < 3:
+                            if all([(axes[dim] is not None) or (tile[dim] == 0) for dim in range(3)]):
+                                values[(name,tile)] = piece[name].value
                         else:
-                            if isinstance(self.gaintable[gainkey][subkey], NP.ndarray):
-                                dset = grp.create_dataset(subkey, data=self.gaintable[gainkey][subkey])
+                            shapes[(name,tile)] = piece[name].shape
+
+    with h5py.File(infiles[0][0][0]+'.hdf5', 'r') as first:
+        with h5py.File(filename, write_str) as fileobj:
+            for name in dsetnames:
+                parent, dsetname = os.path.split(name)
+                group = fileobj.require_group(parent) if parent else fileobj
+                axes = dset_axes[name]
+                tile_ranges = [range(grid_shape[dim]) if axes[dim] is not None else [0] for dim in range(3)]
+                if name in ['timing/n_acc', 'timing/t_obs']: # Totals over the blocks of timestamps
+                    group[dsetname] = sum([values[(name,(0,0,kt))] for kt in range(ntime_blocks)])
+                elif axes == (None, None, None):
+                    first.copy(first[name], group, name=dsetname)
+                    continue
+                elif dset_ndim[name] < 3: # Concatenate baseline, frequency and timing information
+                    bl_tiles = []
+                    for ib in tile_ranges[0]:
+                        freq_tiles = []
+                        for jf in tile_ranges[1]:
+                            time_blocks = [values[(name,(ib,jf,kt))] for kt in tile_ranges[2]]
+                            freq_tiles += [NP.concatenate(time_blocks, axis=axes[2]) if axes[2] is not None else time_blocks[0]]
+                        bl_tiles += [NP.concatenate(freq_tiles, axis=axes[1]) if axes[1] is not None else freq_tiles[0]]
+                    group[dsetname] = NP.concatenate(bl_tiles, axis=axes[0]) if axes[0] is not None else bl_tiles[0]
+                else: # Map the tiles of the virtual dataset onto the pieces
+                    shape = list(first[name].shape)
+                    offsets = [None, None, None]
+                    for dim in range(3):
+                        if axes[dim] is not None:
+                            extents = [shapes[(name,tuple([tile if d == dim else 0 for d in range(3)]))][axes[dim]] for tile in tile_ranges[dim]]
+                            offsets[dim] = NP.concatenate(([0], NP.cumsum(extents)))
+                            shape[axes[dim]] = int(offsets[dim][-1])
+                    layout = h5py.VirtualLayout(shape=tuple(shape), dtype=first[name].dtype)
+                    for ib in tile_ranges[0]:
+                        for jf in tile_ranges[1]:
+                            for kt in tile_ranges[2]:
+                                tile = (ib, jf, kt)
+                                piece_shape = shapes[(name,tile)]
+                                slices = [slice(None)] * len(shape)
+                                for dim in range(3):
+                                    if axes[dim] is not None:
+                                        slices[axes[dim]] = slice(int(offsets[dim][tile[dim]]), int(offsets[dim][tile[dim]+1]))
+                                        if piece_shape[axes[dim]] != offsets[dim][tile[dim]+1] - offsets[dim][tile[dim]]:
+                                            raise ValueError('Dataset {0} in {1} does not match the tiling of the pieces'.format(name, infiles[ib][jf][kt]))
+                                layout[tuple(slices)] = h5py.VirtualSource(os.path.relpath(infiles[ib][jf][kt]+'.hdf5', outdir), name, shape=piece_shape, dtype=first[name].dtype)
+                    group.create_virtual_dataset(dsetname, layout)
+                for key, value in first[name].attrs.items():
+                    group[dsetname].attrs[key] = value
+
+    if verbose:
+        print '\tConsolidated {0:0d} pieces of interferometer array information in file on disk:\n\t\t{1}\n'.format(nbl_tiles*nfreq_tiles*ntime_blocks, filename)
 
 #################################################################################
 
-class ROI_parameters(object):
+class GainInfo(object):
 
     """
     ----------------------------------------------------------------------------
-    Class to manage information on the regions of interest for different
-    snapshots in an observation.
+    Class to manage instrument gains
 
     Attributes:
 
-    skymodel    [instance of class SkyModel] The common sky model for all the
-                observing instances from which the ROI is determined based on
-                a subset corresponding to each snapshot observation.
-
-    freq        [numpy vector] Frequency channels (with units specified by the
-                attribute freq_scale)
-
-    freq_scale  [string] string specifying the units of frequency. Accepted
-                values are 'GHz', 'MHz' and 'Hz'. Default = 'GHz'
-
-    telescope   [dictionary] Contains information about the telescope parameters
-                using which the primary beams in the regions of interest are
-                determined. It specifies the type of element, element size and
-                orientation. It consists of the following keys and information:
-                'id'          [string] If set, will ignore the other keys and use
-                              telescope details for known telescopes. Accepted
-                              values are 'mwa', 'vla', 'gmrt', 'hera', 'paper',
-                              'hirax', 'chime' and 'mwa_tools'. If using
-                              'mwa_tools', the MWA_Tools and mwapb modules must
-                              be installed and imported.
-                'shape'       [string] Shape of antenna element. Accepted values
-                              are 'dipole', 'delta', and 'dish'. Will be ignored
-                              if key 'id' is set. 'delta' denotes a delta
-                              function for the antenna element which has an
-                              isotropic radiation pattern. 'delta' is the default
-                              when keys 'id' and 'shape' are not set.
-                'size'        [scalar] Diameter of the telescope dish (in meters)
-                              if the key 'shape' is set to 'dish' or length of
-                              the dipole if key 'shape' is set to 'dipole'. Will
-                              be ignored if key 'shape' is set to 'delta'. Will
-                              be ignored if key 'id' is set and a preset value
-                              used for the diameter or dipole.
-                'orientation' [list or numpy array] If key 'shape' is set to
-                              dipole, it refers to the orientation of the dipole
-                              element unit vector whose magnitude is specified by
-                              length. If key 'shape' is set to 'dish', it refers
-                              to the position on the sky to which the dish is
-                              pointed. For a dipole, this unit vector must be
-                              provided in the local ENU coordinate system aligned
-                              with the direction cosines coordinate system or in
-                              the Alt-Az coordinate system. This will be
-                              used only when key 'shape' is set to 'dipole'.
+    gaintable   [None or dictionary] If set to None, all antenna- and
+                baseline-based gains will be set to unity. If returned as
+                dictionary, it contains the loaded gains. It contains the
+                following keys and values:
+                'antenna-based'     [None or dictionary] Contains antenna-
+                                    based instrument gain information. If
+                                    set to None, all antenna-based gains are
+                                    set to unity. If returned as dictionary,
+                                    it has the following keys and values:
+                                    'ordering'  [list or numpy array] Three
+                                                element list of strings
+                                                indicating the ordering of
+                                                axes - 'time', 'label',
+                                                and 'frequency' as specified
+                                                in input axes_order
+                                    'gains'     [scalar or numpy array]
+                                                Complex antenna-based
+                                                instrument gains. Must be
+                                                of shape (nant, nchan, nts)
+                                                If there is no variations in
+                                                gains along an axis, then
+                                                the corresponding nax may be
+                                                set to 1 and the gains will
+                                                be replicated along that
+                                                axis using numpy array
+                                                broadcasting. For example,
+                                                shapes (nant,1,1), (1,1,1),
+                                                (1,nchan,nts) are
+                                                acceptable. If specified as
+                                                a scalar, it will be
+                                                replicated along all three
+                                                axes, namely, 'label',
+                                                'frequency' and 'time'.
+                                    'label'     [None or list or numpy
+                                                array] List or antenna
+                                                labels that correspond to
+                                                nant along the 'label' axis.
+                                                If nant=1, this may be set
+                                                to None, else it will be
+                                                specified and will match the
+                                                nant.
+                                    'frequency' [None or list or numpy array]
+                                                Frequency channels that
+                                                correspond to the nax along
+                                                the 'frequency' axis. If the
+                                                nchan=1 along the 'frequency'
+                                                axis, this may be set to None,
+                                                else it must be specified and
+                                                must match the nchan
+                                    'time'      [None or list or numpy array]
+                                                Observation times that
+                                                correspond to the nax along
+                                                the 'time' axis. If the
+                                                ntimes=1 along the 'time'
+                                                axis, this may be set to None,
+                                                else it must be specified and
+                                                must match the ntimes. It must
+                                                be a float and can be in
+                                                seconds, hours, days, etc.
+                'baseline-based'    [None or dictionary] Contains baseline-
+                                    based instrument gain information. If
+                                    set to None, all baseline-based gains
+                                    are set to unity. If returned as
+                                    dictionary, it has the following keys
+                                    and values:
+                                    'ordering'  [list or numpy array] Three
+                                                element list of strings
+                                                indicating the ordering of
+                                                axes - 'time', 'label',
+                                                and 'frequency' as
+                                                specified in input
+                                                axes_order
+                                    'gains'     [scalar or numpy array]
+                                                Complex baseline-based
+                                                instrument gains. Must be
+                                                of shape (nbl, nchan, nts)
+                                                If there is no variations in
+                                                gains along an axis, then
+                                                the corresponding nax may be
+                                                set to 1 and the gains will
+                                                be replicated along that
+                                                axis using numpy array
+                                                broadcasting. For example,
+                                                shapes (nant,1,1), (1,1,1),
+                                                (1,nchan,nts) are
+                                                acceptable. If specified as
+                                                a scalar, it will be
+                                                replicated along all three
+                                                axes, namely, 'label',
+                                                'frequency' and 'time'.
+                                    'label'     [None or list or numpy
+                                                array] List or baseline
+                                                labels that correspond to
+                                                nbl along the 'label' axis.
+                                                If nbl=1 along the 'label'
+                                                axis this may be set to
+                                                None, else it will be
+                                                specified and will match nbl
+                                    'frequency' [None or list or numpy array]
+                                                Frequency channels that
+                                                correspond to the nax along
+                                                the 'frequency' axis. If the
+                                                nchan=1 along the 'frequency'
+                                                axis, this may be set to None,
+                                                else it must be specified and
+                                                must match the nchan
+                                    'time'      [None or list or numpy array]
+                                                Observation times that
+                                                correspond to the nax along
+                                                the 'time' axis. If the
+                                                ntimes=1 along the 'time'
+                                                axis, this may be set to None,
+                                                else it must be specified and
+                                                must match the ntimes. It must
+                                                be a float and can be in
+                                                seconds, hours, days, etc.
+
+    interpfuncs [dictionary] Determined in member function interpolator().
+                Contains interpolation information under two keys, namely,
+                'antenna-based' and 'baseline-based'. Under each of these keys
+                is another dictionary with the following keys and values:
+                'dims'      [numpy array of strings] Contains the axes labels
+                            of the interpolated axes for antenna or baseline
+                            labels. It could contain a single element ['time'],
+                            of ['frequency'] indicating 1D splines along that
+                            axis or contain two elements 'time' and 'frequency'
+                            indicating 2D splines. 1D splines will have been
+                            obtained with scipy.interpolate.interp1d while
+                            2D splines obtained with scipy.interpolate.interp2d
+                'interp'    [numpy recArray] Holds the interpolation functions
+                            (instances of scipy.interpolate.interp1d or
+                            scipy.interpolate.interp2d depending on the value
+                            under 'dims' key) for each antenna or baseline
+                            label. It is of size nbl. Each entry in this
+                            numpy recArray has two fields, 'real' for
+                            interpolation of real part and 'imag' for the
+                            imaginary part. If it is a one element recarray,
+                            then it applies to all antennas and baselines
+                Member function interpolate_gains() uses this attribute to
+                return interpolated gains
+
+    splinefuncs [dictionary] Determined in member function splinator().
+                Contains spline information under two keys, namely,
+                'antenna-based' and 'baseline-based'. Under each of these keys
+                is another dictionary with the following keys and values:
+                'dims'      [numpy array of strings] Contains the axes labels
+                            of the interpolated axes for antenna or baseline
+                            labels. It could contain a single element ['time'],
+                            of ['frequency'] indicating 1D splines along that
+                            axis or contain two elements 'time' and 'frequency'
+                            indicating 2D splines. 1D splines will have been
+                            obtained with scipy.interpolate.UnivariateSpline
+                            while 2D splines obtained with
+                            scipy.interpolate.RectBivariateSpline
+                'interp'    [numpy recArray] Holds the spline functions
+                            (instances of scipy.interpolate.UnivariateSpline or
+                            scipy.interpolate.RectBivariateSpline depending on
+                            the value under 'dims' key) for each antenna or
+                            baseline label. It is of size nbl. Each entry in
+                            this numpy recArray has two fields, 'real' for
+                            interpolation of real part and 'imag' for the
+                            imaginary part. If it is a one element recarray,
+                            then it applies to all antennas and baselines.
+                Member function spline_gains() uses this attribute to return
+                spline-interpolated gains
+
+    Member functions:
+
+    __init__()  Initialize an instance of class GainInfo from a file
+
+    read_gaintable()
+                Read gain table from file in HDF5 format and return and/or
+                store as attribute
+
+    eval_gains()
+                Extract complex instrument gains for given baselines from the
+                gain table
+
+    interpolator()
+                Sets up interpolation functions and stores them in the
+                attribute interpfuncs. Better alternative is to use splinator()
+
+    splinator() Sets up spline functions and stores them in the attribute
+                splinefuncs. Better alternative to interpolator()
+
+    interpolate_gains()
+                Interpolate at the specified baselines for the given
+                frequencies and times using attribute interpfuncs. Better
+                alternative is to use spline_gains()
+
+    spline_gains()
+                Evaluate spline at the specified baselines for the given
+                frequencies and times using attribute splinefuncs. Better
+                alternative to interpolate_gains()
+
+    nearest_gains()
+                Extract complex instrument gains for given baselines from the
+                gain table determined by nearest neighbor logic
+
+    write_gaintable()
+                Write gain table with specified axes ordering to external file
+                in HDF5 format
+    -----------------------------------------------------------------------------
+    """
+
+    def __init__(self, init_file=None, axes_order=None):
+
+        """
+        ------------------------------------------------------------------------
+        Initialize an instance of class GainInfo from a file
+
+        Attributes initialized are:
+        gaintable, interpfuncs, splinefuncs
+
+        Read docstring of class GainInfo for details on these attributes
+
+        Keyword Inputs:
+
+        gainsfile   [string] Filename including the full path that contains the
+                    instrument gains. It must be in HDF5 format. It must contain
+                    the following structure:
+                    'antenna-based'     [dictionary] Contains antenna-based
+                                        instrument gain information. It has the
+                                        following keys and values:
+                                        'ordering'  [list or numpy array] Three
+                                                    element list of strings
+                                                    indicating the ordering of
+                                                    axes - 'time', 'label',
+                                                    and 'frequency'. Must be
+                                                    specified (no defaults)
+                                        'gains'     [scalar or numpy array]
+                                                    Complex antenna-based
+                                                    instrument gains. Must be
+                                                    of shape (nax1, nax2, nax3)
+                                                    where ax1, ax2 and ax3 are
+                                                    specified by the axes
+                                                    ordering under key
+                                                    'ordering'. If there is no
+                                                    variations in gains along an
+                                                    axis, then the corresponding
+                                                    nax may be set to 1 and the
+                                                    gains will be replicated
+                                                    along that axis using numpy
+                                                    array broadcasting. For
+                                                    example, shapes (nax1,1,1),
+                                                    (1,1,1), (1,nax2,nax3) are
+                                                    acceptable. If specified as
+                                                    a scalar, it will be
+                                                    replicated along all three
+                                                    axes, namely, 'label',
+                                                    'frequency' and 'time'.
+                                        'label'     [None or list or numpy array]
+                                                    List or antenna labels that
+                                                    correspond to the nax along
+                                                    the 'label' axis. If the
+                                                    nax=1 along the 'label' axis,
+                                                    this may be set to None, else
+                                                    it must be specified and must
+                                                    match the nax.
+                                        'frequency' [None or list or numpy
+                                                    array] Frequency channels
+                                                    that correspond to the
+                                                    nax along the 'frequency'
+                                                    axis. If the nax=1 along the
+                                                    'frequency' axis, this may
+                                                    be set to None, else it must
+                                                    be specified and must match
+                                                    the nax.
+                                        'time'      [None or list or numpy
+                                                    array] Observation times
+                                                    that correspond to the nax
+                                                    along the 'time' axis. If
+                                                    the nax=1 along the 'time'
+                                                    axis, this may be set to
+                                                    None, else it must be
+                                                    specified and must match the
+                                                    nax. It must be a float and
+                                                    can be in seconds, hours,
+                                                    days, etc.
+                    'baseline-based'    [dictionary] Contains baseline-based
+                                        instrument gain information. It has the
+                                        following keys and values:
+                                        'ordering'  [list or numpy array] Three
+                                                    element list of strings
+                                                    indicating the ordering of
+                                                    axes - 'time', 'label',
+                                                    and 'frequency'. Must be
+                                                    specified (no defaults)
+                                        'gains'     [scalar or numpy array]
+                                                    Complex baseline-based
+                                                    instrument gains. Must be
+                                                    of shape (nax1, nax2, nax3)
+                                                    where ax1, ax2 and ax3 are
+                                                    specified by the axes
+                                                    ordering under key
+                                                    'ordering'. If there is no
+                                                    variations in gains along an
+                                                    axis, then the corresponding
+                                                    nax may be set to 1 and the
+                                                    gains will be replicated
+                                                    along that axis using numpy
+                                                    array broadcasting. For
+                                                    example, shapes (nax1,1,1),
+                                                    (1,1,1), (1,nax2,nax3) are
+                                                    acceptable. If specified as
+                                                    a scalar, it will be
+                                                    replicated along all three
+                                                    axes, namely, 'label',
+                                                    'frequency' and 'time'.
+                                        'label'     [None or list or numpy
+                                                    array] List of baseline
+                                                    labels that correspond to
+                                                    the nax along the 'label'
+                                                    axis. If the nax=1 along the
+                                                    'label' axis this may be set
+                                                    to None, else it must be
+                                                    specified and must match the
+                                                    nax.
+                                        'frequency' [None or list or numpy
+                                                    array] Frequency channels
+                                                    that correspond to the
+                                                    nax along the 'frequency'
+                                                    axis. If the nax=1 along the
+                                                    'frequency' axis, this may
+                                                    be set to None, else it must
+                                                    be specified and must match
+                                                    the nax.
+                                        'time'      [None or list or numpy
+                                                    array] Observation times
+                                                    that correspond to the nax
+                                                    along the 'time' axis. If
+                                                    the nax=1 along the 'time'
+                                                    axis, this may be set to
+                                                    None, else it must be
+                                                    specified and must match the
+                                                    nax. It must be a float and
+                                                    can be in seconds, hours,
+                                                    days, etc.
+
+        axes_order  [None or list or numpy array] The gaintable which is read is
+                    stored in this axes ordering. If set to None, it will store
+                    in this order ['label', 'frequency', 'time']
+        ------------------------------------------------------------------------
+        """
+
+        self.gaintable = None
+        self.interpfuncs = {key: None for key in ['antenna-based', 'baseline-based']}
+        self.splinefuncs = {key: None for key in ['antenna-based', 'baseline-based']}
+        if init_file is not None:
+            self.gaintable = self.read_gaintable(init_file, axes_order=axes_order, action='return')
+        self.interpolator()
+        self.splinator(smoothness=None)
+
+    #############################################################################
+
+    def read_gaintable(self, gainsfile, axes_order=None, action='return'):
+
+        """
+        ------------------------------------------------------------------------
+        Read gain table from file in HDF5 format and return and/or store as
+        attribute
+
+        Input:
+
+        gainsfile   [string] Filename including the full path that contains the
+                    instrument gains. It must be in HDF5 format. It must contain
+                    the following structure:
+                    'antenna-based'     [dictionary] Contains antenna-based
+                                        instrument gain information. It has the
+                                        following keys and values:
+                                        'ordering'  [list or numpy array] Three
+                                                    element list of strings
+                                                    indicating the ordering of
+                                                    axes - 'time', 'label',
+                                                    and 'frequency'. Must be
+                                                    specified (no defaults)
+                                        'gains'     [scalar or numpy array]
+                                                    Complex antenna-based
+                                                    instrument gains. Must be
+                                                    of shape (nax1, nax2, nax3)
+                                                    where ax1, ax2 and ax3 are
+                                                    specified by the axes
+                                                    ordering under key
+                                                    'ordering'. If there is no
+                                                    variations in gains along an
+                                                    axis, then the corresponding
+                                                    nax may be set to 1 and the
+                                                    gains will be replicated
+                                                    along that axis using numpy
+                                                    array broadcasting. For
+                                                    example, shapes (nax1,1,1),
+                                                    (1,1,1), (1,nax2,nax3) are
+                                                    acceptable. If specified as
+                                                    a scalar, it will be
+                                                    replicated along all three
+                                                    axes, namely, 'label',
+                                                    'frequency' and 'time'.
+                                        'label'     [None or list or numpy
+                                                    array] List or antenna
+                                                    labels that correspond to
+                                                    the nax along the 'label'
+                                                    axis. If the nax=1 along the
+                                                    'label' axis, this may be
+                                                    set to None, else it must be
+                                                    specified and must match the
+                                                    nax.
+                                        'frequency' [None or list or numpy
+                                                    array] Frequency channels
+                                                    that correspond to the nax
+                                                    along the 'frequency' axis.
+                                                    If the nax=1 along the
+                                                    'frequency' axis, this may
+                                                    be set to None, else it must
+                                                    be specified and must match
+                                                    the nax.
+                                        'time'      [None or list or numpy
+                                                    array] Observation times
+                                                    that correspond to the nax
+                                                    along the 'time' axis. If
+                                                    the nax=1 along the 'time'
+                                                    axis, this may be set to
+                                                    None, else it must be
+                                                    specified and must match the
+                                                    nax. It must be a float and
+                                                    can be in seconds, hours,
+                                                    days, etc.
+                    'baseline-based'    [dictionary] Contains baseline-based
+                                        instrument gain information. It has the
+                                        following keys and values:
+                                        'ordering'  [list or numpy array] Three
+                                                    element list of strings
+                                                    indicating the ordering of
+                                                    axes - 'time', 'label',
+                                                    and 'frequency'. Must be
+                                                    specified (no defaults)
+                                        'gains'     [scalar or numpy array]
+                                                    Complex baseline-based
+                                                    instrument gains. Must be
+                                                    of shape (nax1, nax2, nax3)
+                                                    where ax1, ax2 and ax3 are
+                                                    specified by the axes
+                                                    ordering under key
+                                                    'ordering'. If there is no
+                                                    variations in gains along an
+                                                    axis, then the corresponding
+                                                    nax may be set to 1 and the
+                                                    gains will be replicated
+                                                    along that axis using numpy
+                                                    array broadcasting. For
+                                                    example, shapes (nax1,1,1),
+                                                    (1,1,1), (1,nax2,nax3) are
+                                                    acceptable. If specified as
+                                                    a scalar, it will be
+                                                    replicated along all three
+                                                    axes, namely, 'label',
+                                                    'frequency' and 'time'.
+                                        'label'     [None or list or numpy
+                                                    array] List of baseline
+                                                    labels that correspond to
+                                                    the nax along the 'label'
+                                                    axis. If the nax=1 along the
+                                                    'label' axis this may be set
+                                                    to None, else it must be
+                                                    specified and must match the
+                                                    nax.
+                                        'frequency' [None or list or numpy
+                                                    array] Frequency channels
+                                                    that correspond to the nax
+                                                    along the 'frequency' axis.
+                                                    If the nax=1 along the
+                                                    'frequency' axis, this may
+                                                    be set to None, else it must
+                                                    be specified and must match
+                                                    the nax.
+                                        'time'      [None or list or numpy
+                                                    array] Observation times
+                                                    that correspond to the nax
+                                                    along the 'time' axis. If
+                                                    the nax=1 along the 'time'
+                                                    axis, this may be set to
+                                                    None, else it must be
+                                                    specified and must match the
+                                                    nax. It must be a float and
+                                                    can be in seconds, hours,
+                                                    days, etc.
+
+        axes_order  [None or list or numpy array] The gaintable which is read is
+                    stored in this axes ordering. If set to None, it will store
+                    in this order ['label', 'frequency', 'time']
+
+        action      [string] If set to 'store' (default), the gain table will
+                    be stored as attribute in addition to being returned. If set
+                    to 'return' the gain table will be returned.
+
+        Output:
+
+        gaintable   [None or dictionary] If set to None, all antenna- and
+                    baseline-based gains will be set to unity. If returned as
+                    dictionary, it contains the loaded gains. It contains the
+                    following keys and values:
+                    'antenna-based'     [None or dictionary] Contains antenna-
+                                        based instrument gain information. If
+                                        set to None, all antenna-based gains are
+                                        set to unity. If returned as dictionary,
+                                        it has the following keys and values:
+                                        'ordering'  [list or numpy array] Three
+                                                    element list of strings
+                                                    indicating the ordering of
+                                                    axes - 'time', 'label',
+                                                    and 'frequency' as specified
+                                                    in input axes_order
+                                        'gains'     [scalar or numpy array]
+                                                    Complex antenna-based
+                                                    instrument gains. Must be
+                                                    of shape (nant, nchan, nts)
+                                                    If there is no variations in
+                                                    gains along an axis, then
+                                                    the corresponding nax may be
+                                                    set to 1 and the gains will
+                                                    be replicated along that
+                                                    axis using numpy array
+                                                    broadcasting. For example,
+                                                    shapes (nant,1,1), (1,1,1),
+                                                    (1,nchan,nts) are
+                                                    acceptable. If specified as
+                                                    a scalar, it will be
+                                                    replicated along all three
+                                                    axes, namely, 'label',
+                                                    'frequency' and 'time'.
+                                        'label'     [None or list or numpy
+                                                    array] List or antenna
+                                                    labels that correspond to
+                                                    nant along the 'label' axis.
+                                                    If nant=1, this may be set
+                                                    to None, else it will be
+                                                    specified and will match the
+                                                    nant.
+                                        'frequency' [None or list or numpy
+                                                    array] Frequency channels
+                                                    that correspond to the nax
+                                                    along the 'frequency' axis.
+                                                    If the nchan=1 along the
+                                                    'frequency' axis, this may
+                                                    be set to None, else it must
+                                                    be specified and must match
+                                                    the nchan.
+                                        'time'      [None or list or numpy
+                                                    array] Observation times
+                                                    that correspond to the nax
+                                                    along the 'time' axis. If
+                                                    the ntimes=1 along the
+                                                    'time' axis, this may be set
+                                                    to None, else it must be
+                                                    specified and must match the
+                                                    ntimes. It will be a float
+                                                    and in same units as given
+                                                    in input
+                    'baseline-based'    [None or dictionary] Contains baseline-
+                                        based instrument gain information. If
+                                        set to None, all baseline-based gains
+                                        are set to unity. If returned as
+                                        dictionary, it has the following keys
+                                        and values:
+                                        'ordering'  [list or numpy array] Three
+                                                    element list of strings
+                                                    indicating the ordering of
+                                                    axes - 'time', 'label',
+                                                    and 'frequency' as
+                                                    specified in input
+                                                    axes_order
+                                        'gains'     [scalar or numpy array]
+                                                    Complex baseline-based
+                                                    instrument gains. Must be
+                                                    of shape (nbl, nchan, nts)
+                                                    If there is no variations in
+                                                    gains along an axis, then
+                                                    the corresponding nax may be
+                                                    set to 1 and the gains will
+                                                    be replicated along that
+                                                    axis using numpy array
+                                                    broadcasting. For example,
+                                                    shapes (nant,1,1), (1,1,1),
+                                                    (1,nchan,nts) are
+                                                    acceptable. If specified as
+                                                    a scalar, it will be
+                                                    replicated along all three
+                                                    axes, namely, 'label',
+                                                    'frequency' and 'time'.
+                                        'label'     [None or list or numpy
+                                                    array] List or baseline
+                                                    labels that correspond to
+                                                    nbl along the 'label' axis.
+                                                    If nbl=1 along the 'label'
+                                                    axis this may be set to
+                                                    None, else it will be
+                                                    specified and will match nbl
+                                        'frequency' [None or list or numpy
+                                                    array] Frequency channels
+                                                    that correspond to the nax
+                                                    along the 'frequency' axis.
+                                                    If the nchan=1 along the
+                                                    'frequency' axis, this may
+                                                    be set to None, else it must
+                                                    be specified and must match
+                                                    the nchan.
+                                        'time'      [None or list or numpy
+                                                    array] Observation times
+                                                    that correspond to the nax
+                                                    along the 'time' axis. If
+                                                    the ntimes=1 along the
+                                                    'time' axis, this may be set
+                                                    to None, else it must be
+                                                    specified and must match the
+                                                    ntimes. It will be a float
+                                                    and in same units as given
+                                                    in input
+        ------------------------------------------------------------------------
+        """
+
+        if not isinstance(action, str):
+            return TypeError('Input parameter action must be a string')
+        action = action.lower()
+        if action not in ['store', 'return']:
+            raise ValueError('Invalid value specified for input parameter action')
+
+        gaintable = read_gaintable(gainsfile, axes_order=axes_order)
+        if action == 'store':
+            self.gaintable = gaintable
+        return gaintable
+
+    #############################################################################
+
+    def interpolator(self, kind='linear'):
+
+        """
+        ------------------------------------------------------------------------
+        Sets up interpolation functions and stores them in the attribute
+        interpfuncs. Better alternative is to use splinator()
+
+        Inputs:
+
+        kind    [string] Type of interpolation. Accepted values are
+                'linear' (default), 'cubic' or 'quintic'. See documentation
+                of scipy.interpolate.interp1d and scipy.interpolate.interp2d
+                for details
+        ------------------------------------------------------------------------
+        """
+
+        kind = kind.lower()
+        if kind not in ['linear', 'cubic', 'quintic']:
+            raise ValueError('Specified kind of interpolation invalid')
+
+        if self.gaintable is not None:
+            for gainkey in self.gaintable:
+                if self.gaintable[gainkey] is not None:
+                    self.interpfuncs[gainkey] = None
+                    if self.gaintable[gainkey]['gains'] is not None:
+                        if isinstance(self.gaintable[gainkey]['gains'], NP.ndarray):
+                            if self.gaintable[gainkey]['gains'].ndim != 3:
+                                raise ValueError('Gains must be a 3D numpy array')
+                            # if self.gaintable[gainkey]['gains'].size > 1:
+                            if (self.gaintable[gainkey]['gains'].shape[self.gaintable[gainkey]['ordering'].index('frequency')] > 1) or (self.gaintable[gainkey]['gains'].shape[self.gaintable[gainkey]['ordering'].index('time')] > 1):
+                                temp_axes_order = ['label', 'frequency', 'time']
+                                inp_order = self.gaintable[gainkey]['ordering']
+                                temp_transpose_order = NMO.find_list_in_list(inp_order, temp_axes_order)
+                                if NP.all(inp_order == temp_axes_order):
+                                    gains = NP.copy(self.gaintable[gainkey]['gains'])
+                                else:
+                                    gains = NP.transpose(NP.copy(self.gaintable[gainkey]['gains']), axes=temp_transpose_order)
+                                dims = []
+                                for ax in NP.arange(1,3):
+                                    if gains.shape[ax] > 1:
+                                        dims += [temp_axes_order[ax]]
+                                dims = NP.asarray(dims)
+                                interpf = []
+                                for labelind in xrange(gains.shape[0]):
+                                    if dims.size == 1:
+                                        interpf_real = interpolate.interp1d(self.gaintable[gainkey][dims[0]], gains[labelind,:,:].real.ravel(), kind=kind, bounds_error=True)
+                                        interpf_imag = interpolate.interp1d(self.gaintable[gainkey][dims[0]], gains[labelind,:,:].imag.ravel(), kind=kind, bounds_error=True)
+                                    else:
+                                        interpf_real = interpolate.interp2d(self.gaintable[gainkey]['time'], self.gaintable[gainkey]['frequency'], gains[labelind,:,:].real, kind=kind, bounds_error=True)
+                                        interpf_imag = interpolate.interp2d(self.gaintable[gainkey]['time'], self.gaintable[gainkey]['frequency'], gains[labelind,:,:].imag, kind=kind, bounds_error=True)
+                                    interpf += [(copy.copy(interpf_real), copy.copy(interpf_imag))]
+                                self.interpfuncs[gainkey] = {'interp': NP.asarray(interpf, dtype=[('real', NP.object), ('imag', NP.object)]), 'dims': dims}
+
+    ############################################################################
+
+    def splinator(self, smoothness=None):
+
+        """
+        -----------------------------------------------------------------------
+        Sets up spline functions and stores them in the attribute splinefuncs.
+        Better alternative to interpolator()
+
+        Inputs:
+
+        smoothness  [integer or float] Smoothness of spline interpolation. Must
+                    be positive. If set to None (default), it will set equal to
+                    the number of samples using which the spline functions are
+                    estimated. Read documentation of
+                    scipy.interpolate.UnivariateSpline and
+                    scipy.interpolate.RectBivariateSpline for more details
+        -----------------------------------------------------------------------
+        """
+        if smoothness is not None:
+            if not isinstance(smoothness, (int,float)):
+                raise TypeError('Input smoothness must be a scalar')
+            if smoothness <= 0.0:
+                raise ValueError('Input smoothness must be a positive number')
+
+        if self.gaintable is not None:
+            for gainkey in self.gaintable:
+                if self.gaintable[gainkey] is not None:
+                    self.splinefuncs[gainkey] = None
+                    if self.gaintable[gainkey]['gains'] is not None:
+                        if isinstance(self.gaintable[gainkey]['gains'], NP.ndarray):
+                            if self.gaintable[gainkey]['gains'].ndim != 3:
+                                raise ValueError('Gains must be a 3D numpy array')
+                            # if self.gaintable[gainkey]['gains'].size > 1:
+                            if (self.gaintable[gainkey]['gains'].shape[self.gaintable[gainkey]['ordering'].index('frequency')] > 1) or (self.gaintable[gainkey]['gains'].shape[self.gaintable[gainkey]['ordering'].index('time')] > 1):
+                                temp_axes_order = ['label', 'frequency', 'time']
+                                inp_order = self.gaintable[gainkey]['ordering']
+                                temp_transpose_order = NMO.find_list_in_list(inp_order, temp_axes_order)
+                                if NP.all(inp_order == temp_axes_order):
+                                    gains = NP.copy(self.gaintable[gainkey]['gains'])
+                                else:
+                                    gains = NP.transpose(NP.copy(self.gaintable[gainkey]['gains']), axes=temp_transpose_order)
+                                dims = []
+                                for ax in NP.arange(1,3):
+                                    if gains.shape[ax] > 1:
+                                        dims += [temp_axes_order[ax]]
+                                dims = NP.asarray(dims)
+                                interpf = []
+                                for labelind in xrange(gains.shape[0]):
+                                    if dims.size == 1:
+                                        if smoothness is None:
+                                            smoothness = self.gaintable[gainkey][dims[0]].size
+                                        interpf_real = interpolate.UnivariateSpline(self.gaintable[gainkey][dims[0]], gains[labelind,:,:].real.ravel(), s=smoothness, ext='raise')
+                                        interpf_imag = interpolate.UnivariateSpline(self.gaintable[gainkey][dims[0]], gains[labelind,:,:].imag.ravel(), s=smoothness, ext='raise')
+                                    else:
+                                        if smoothness is None:
+                                            smoothness = gains.shape[1]*gains.shape[2]
+                                        interpf_real = interpolate.RectBivariateSpline(self.gaintable[gainkey]['time'], self.gaintable[gainkey]['frequency'], gains[labelind,:,:].real.T, bbox=[self.gaintable[gainkey]['time'].min(), self.gaintable[gainkey]['time'].max(), self.gaintable[gainkey]['frequency'].min(), self.gaintable[gainkey]['frequency'].max()], s=smoothness)
+                                        interpf_imag = interpolate.RectBivariateSpline(self.gaintable[gainkey]['time'], self.gaintable[gainkey]['frequency'], gains[labelind,:,:].imag.T, bbox=[self.gaintable[gainkey]['time'].min(), self.gaintable[gainkey]['time'].max(), self.gaintable[gainkey]['frequency'].min(), self.gaintable[gainkey]['frequency'].max()], s=smoothness)
+                                    interpf += [(copy.copy(interpf_real), copy.copy(interpf_imag))]
+                                self.splinefuncs[gainkey] = {'interp': NP.asarray(interpf, dtype=[('real', NP.object), ('imag', NP.object)]), 'dims': dims}
+
+    #############################################################################
+
+    def interpolate_gains(self, bl_labels, freqs=None, times=None,
+                          axes_order=None):
+
+        """
+        ------------------------------------------------------------------------
+        Interpolate at the specified baselines for the given frequencies and
+        times using attribute interpfuncs. Better alternative is to use
+        spline_gains()
+
+        Inputs:
+
+        bl_labels   [Numpy structured array tuples] Labels of antennas in the
+                    pair used to produce the baseline vector under fields 'A2'
+                    and 'A1' for second and first antenna respectively. The
+                    baseline vector is obtained by position of antennas under
+                    'A2' minus position of antennas under 'A1'. The array is of
+                    size nbl
+
+        freqs       [None or numpy array] Array of frequencies at which the
+                    gains are to be interpolated using the attribute
+                    interpfuncs. If set to None (default), all frequencies in
+                    the gaintable are assumed. The specified frequencies must
+                    always lie within the range which was used in creating the
+                    interpolation functions, otherwise an exception will be
+                    raised. The array is of size nchan
+
+        times       [None or numpy array] Array of times at which the gains
+                    are to be interpolated using the attribute interpfuncs. If
+                    set to None (default), all times in the gaintable are
+                    assumed. The specified times must always lie within the
+                    range which was used in creating the interpolation
+                    functions, otherwise an exception will be raised. The
+                    array is of size nts
+
+        axes_order  [None or list or numpy array] Axes ordering for extracted
+                    gains. It must contain the three elements 'label',
+                    'frequency', and 'time'. If set to None, it will be
+                    returned in the same order as in the input gaintable.
+
+        Outputs:
+
+        [numpy array] Complex gains of shape nbl x nchan x nts for the
+        specified baselines, frequencies and times.
+        ------------------------------------------------------------------------
+        """
+        try:
+            bl_labels
+        except NameError:
+            raise NameError('Input bl_labels must be specified')
+
+        blgains = NP.asarray(1.0).reshape(1,1,1)
+        if self.gaintable is not None:
+            a1_labels = bl_labels['A1']
+            a2_labels = bl_labels['A2']
+            for key in ['antenna-based', 'baseline-based']:
+                if self.interpfuncs[key] is not None:
+                    labels = self.gaintable[key]['label']
+                    if freqs is None:
+                        if self.gaintable[key]['frequency'] is not None:
+                            freqs = self.gaintable[key]['frequency']
+                    elif isinstance(freqs, (int,list,NP.ndarray)):
+                        freqs = NP.asarray(freqs).ravel()
+                    else:
+                        raise TypeError('Input freqs must be a scalar, list or numpy array')
+
+                    if times is None:
+                        if self.gaintable[key]['time'] is not None:
+                            times = self.gaintable[key]['time']
+                    elif isinstance(times, (int,list,NP.ndarray)):
+                        times = NP.asarray(times).ravel()
+                    else:
+                        raise TypeError('Input times must be a scalar, list or numpy array')
+
+                    if self.gaintable[key]['frequency'] is not None:
+                        ib_freq_index = NP.logical_and(freqs <= NP.amax(self.gaintable[key]['frequency']), freqs >= NP.amin(self.gaintable[key]['frequency']))
+                        oobl_freq_index = freqs < NP.amin(self.gaintable[key]['frequency'])
+                        oobr_freq_index = freqs > NP.amax(self.gaintable[key]['frequency'])
+                        oob_freq_index = NP.logical_not(ib_freq_index)
+                        if NP.any(oob_freq_index):
+                            raise ValueError('One or more of the frequencies outside interpolation range')
+                    else:
+                        if freqs is not None:
+                            ib_freq_index = NP.ones(freqs.size, dtype=NP.bool)
+                            oob_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
+                            oobl_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
+                            oobr_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
+                        else:
+                            ib_freq_index = None
+                            oob_freq_index = None
+
+                    if self.gaintable[key]['time'] is not None:
+                        ib_time_index = NP.logical_and(times <= NP.amax(self.gaintable[key]['time']), times >= NP.amin(self.gaintable[key]['time']))
+                        oobl_time_index = times < NP.amin(self.gaintable[key]['time'])
+                        oobr_time_index = times > NP.amax(self.gaintable[key]['time'])
+                        oob_time_index = NP.logical_not(ib_time_index)
+                        if NP.any(oob_time_index):
+                            raise ValueError('One or more of the times outside interpolation range')
+                    else:
+                        if times is not None:
+                            ib_time_index = NP.ones(times.size, dtype=NP.bool)
+                            oob_time_index = NP.zeros(times.size, dtype=NP.bool)
+                            oobl_time_index = NP.zeros(times.size, dtype=NP.bool)
+                            oobr_time_index = NP.zeros(times.size, dtype=NP.bool)
+                        else:
+                            ib_time_index = None
+                            oob_time_index = None
+
+                    if isinstance(self.interpfuncs[key], dict):
+                        if 'dims' not in self.interpfuncs[key]:
+                            raise KeyError('Key "dims" not found in attribute interpfuncs[{0}]'.format(key))
+                        if not isinstance(self.interpfuncs[key]['dims'], NP.ndarray):
+                            raise TypeError('Key "dims" in attribute interpfuncs[{0}] must contain a numpy array'.format(key))
+
+                        if self.interpfuncs[key]['dims'].size == 1:
+                            if self.interpfuncs[key]['dims'][0] == 'time':
+                                ntimes = ib_time_index.size
+                                if freqs is None:
+                                    nchan = 1
+                                else:
+                                    nchan = ib_freq_index.size
+                                inp = times[ib_time_index]
+                            else:
+                                nchan = ib_freq_index.size
+                                if times is None:
+                                    ntimes = 1
+                                else:
+                                    ntimes = ib_time_index.size
+                                inp = freqs[ib_freq_index]
+                        else:
+                            inp_times = times[ib_time_index]
+                            inp_freqs = freqs[ib_freq_index]
+                            ntimes = ib_time_index.size
+                            nchan = ib_freq_index.size
+
+                        if key == 'antenna-based':
+                            ind1 = NMO.find_list_in_list(labels, a1_labels)
+                            ind2 = NMO.find_list_in_list(labels, a2_labels)
+                            if NP.sum(ind1.mask) > 0:
+                                raise IndexError('Some antenna gains could not be found')
+                            if NP.sum(ind2.mask) > 0:
+                                raise IndexError('Some antenna gains could not be found')
+                            g1_conj = None
+                            g2 = None
+                            for i in xrange(ind1.size):
+                                if self.interpfuncs[key]['dims'].size == 1:
+                                    if g1_conj is None:
+                                        g1_conj = (self.interpfuncs[key]['interp']['real'][ind1[i]](inp) - 1j * self.interpfuncs[key]['interp']['imag'][ind1[i]](inp)).reshape(1,nchan,ntimes)
+                                        g2 = (self.interpfuncs[key]['interp']['real'][ind2[i]](inp) + 1j * self.interpfuncs[key]['interp']['imag'][ind2[i]](inp)).reshape(1,nchan,ntimes)
+                                    else:
+                                        g1_conj = NP.concatenate((g1_conj, (self.interpfuncs[key]['interp']['real'][ind1[i]](inp) - 1j * self.interpfuncs[key]['interp']['imag'][ind1[i]](inp)).reshape(1,nchan,ntimes)), axis=0)
+                                        g2 = NP.concatenate((g2, (self.interpfuncs[key]['interp']['real'][ind2[i]](inp) + 1j * self.interpfuncs[key]['interp']['imag'][ind2[i]](inp)).reshape(1,nchan,ntimes)), axis=0)
+                                else:
+                                    if g1_conj is None:
+                                        g1_conj = (self.interpfuncs[key]['interp']['real'][ind1[i]](inp_times,inp_freqs) - 1j * self.interpfuncs[key]['interp']['imag'][ind1[i]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)
+                                        g2 = (self.interpfuncs[key]['interp']['real'][ind2[i]](inp_times,inp_freqs) + 1j * self.interpfuncs[key]['interp']['imag'][ind2[i]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)
+                                    else:
+                                        g1_conj = NP.concatenate((g1_conj, (self.interpfuncs[key]['interp']['real'][ind1[i]](inp_times,inp_freqs) - 1j * self.interpfuncs[key]['interp']['imag'][ind1[i]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)), axis=0)
+                                        g2 = NP.concatenate((g2, (self.interpfuncs[key]['interp']['real'][ind2[i]](inp_times,inp_freqs) + 1j * self.interpfuncs[key]['interp']['imag'][ind2[i]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)), axis=0)
+
+                            blgains = blgains * g1_conj * g2 * NP.ones((1,nchan,ntimes), dtype=NP.complex)
+                        else:
+                            g12 = None
+                            for labelind,label in enumerate(bl_labels):
+                                if label in labels:
+                                    ind = NP.where(self.gaintable[key]['label'] == label)[0]
+                                    if self.interpfuncs[key]['dims'].size == 1:
+                                        if g12 is None:
+                                            g12 = (self.interpfuncs[key]['interp']['real'][ind[0]](inp) + 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)
+                                        else:
+                                            g12 = NP.concatenate((g12, (self.interpfuncs[key]['interp']['real'][ind[0]](inp) + 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)), axis=0)
+                                    else:
+                                        if g12 is None:
+                                            g12 = (self.interpfuncs[key]['interp']['real'][ind[0]](inp_times,inp_freqs) + 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)
+                                        else:
+                                            g12 = NP.concatenate((g12, (self.interpfuncs[key]['interp']['real'][ind[0]](inp_times,inp_freqs) + 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)), axis=0)
+                                elif NP.asarray([tuple(reversed(label))], dtype=bl_labels.dtype)[0] in labels:
+                                    ind = NP.where(labels == NP.asarray([tuple(reversed(label))], dtype=bl_labels.dtype)[0])[0]
+                                    if self.interpfuncs[key]['dims'].size == 1:
+                                        if g12 is None:
+                                            g12 = (self.interpfuncs[key]['interp']['real'][ind[0]](inp) - 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)
+                                        else:
+                                            g12 = NP.concatenate((g12, (self.interpfuncs[key]['interp']['real'][ind[0]](inp) - 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)), axis=0)
+                                    else:
+                                        if g12 is None:
+                                            g12 = (self.interpfuncs[key]['interp']['real'][ind[0]](inp_times,inp_freqs) - 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)
+                                        else:
+                                            g12 = NP.concatenate((g12, (self.interpfuncs[key]['interp']['real'][ind[0]](inp_times,inp_freqs) - 1j * self.interpfuncs[key]['interp']['imag'][ind[0]](inp_times,inp_freqs)).reshape(1,nchan,ntimes)), axis=0)
+                                else:
+                                    if g12 is None:
+                                        g12 = NP.ones((1,nchan,ntimes), dtype=NP.complex)
+                                    else:
+                                        g12 = NP.concatenate((g12, NP.ones((1,nchan,ntimes), dtype=NP.complex)), axis=0)
+                            blgains = blgains * g12 * NP.ones((1,nchan,ntimes), dtype=NP.complex)
+
+        interp_axes_order = ['label', 'frequency', 'time']
+        if axes_order is None:
+            axes_order = self.gaintable['antenna-based']['ordering']
+        elif not isinstance(axes_order, (list, NP.ndarray)):
+            raise TypeError('axes_order must be a list')
+        else:
+            if len(axes_order) != 3:
+                raise ValueError('axes_order must be a three element list')
+            for orderkey in ['label', 'frequency', 'time']:
+                if orderkey not in axes_order:
+                    raise ValueError('axes_order does not contain key "{0}"'.format(orderkey))
+
+        transpose_order = NMO.find_list_in_list(interp_axes_order, axes_order)
+        blgains = NP.transpose(blgains, axes=transpose_order)
+
+        return blgains
+
+    #############################################################################
+
+    def spline_gains(self, bl_labels, freqs=None, times=None, axes_order=None):
+
+        """
+        ------------------------------------------------------------------------
+        Evaluate spline at the specified baselines for the given frequencies and
+        times using attribute splinefuncs. Better alternative to
+        interpolate_gains()
+
+        Inputs:
+
+        bl_labels   [Numpy structured array tuples] Labels of antennas in the
+                    pair used to produce the baseline vector under fields 'A2'
+                    and 'A1' for second and first antenna respectively. The
+                    baseline vector is obtained by position of antennas under
+                    'A2' minus position of antennas under 'A1'. The array is of
+                    size nbl
+
+        freqs       [None or numpy array] Array of frequencies at which the
+                    gains are to be interpolated using the attribute
+                    splinefuncs. If set to None (default), all frequencies in
+                    the gaintable are assumed. The specified frequencies must
+                    always lie within the range which was used in creating the
+                    interpolation functions, otherwise an exception will be
+                    raised. The array is of size nchan
+
+        times       [None or numpy array] Array of times at which the gains
+                    are to be interpolated using the attribute splinefuncs. If
+                    set to None (default), all times in the gaintable are
+                    assumed. The specified times must always lie within the
+                    range which was used in creating the interpolation
+                    functions, otherwise an exception will be raised. The array
+                    is of size nts
+
+        axes_order  [None or list or numpy array] Axes ordering for extracted
+                    gains. It must contain the three elements 'label',
+                    'frequency', and 'time'. If set to None, it will be
+                    returned in the same order as in the input gaintable.
+
+        Outputs:
+
+        [numpy array] Complex gains of shape nbl x nchan x nts for the specified
+        baselines, frequencies and times.
+        ---------------------------------------------------------------------------
+        """
+
+        try:
+            bl_labels
+        except NameError:
+            raise NameError('Input bl_labels must be specified')
+
+        blgains = NP.asarray(1.0).reshape(1,1,1)
+        if self.gaintable is not None:
+            a1_labels = bl_labels['A1']
+            a2_labels = bl_labels['A2']
+            for key in ['antenna-based', 'baseline-based']:
+                if self.splinefuncs[key] is not None:
+                    labels = self.gaintable[key]['label']
+                    if freqs is None:
+                        if self.gaintable[key]['frequency'] is not None:
+                            freqs = self.gaintable[key]['frequency']
+                    elif isinstance(freqs, (int,list,NP.ndarray)):
+                        freqs = NP.asarray(freqs).ravel()
+                    else:
+                        raise TypeError('Input freqs must be a scalar, list or numpy array')
+
+                    if times is None:
+                        if self.gaintable[key]['time'] is not None:
+                            times = self.gaintable[key]['time']
+                    elif isinstance(times, (int,list,NP.ndarray)):
+                        times = NP.asarray(times).ravel()
+                    else:
+                        raise TypeError('Input times must be a scalar, list or numpy array')
+
+                    if self.gaintable[key]['frequency'] is not None:
+                        ib_freq_index = NP.logical_and(freqs <= NP.amax(self.gaintable[key]['frequency']), freqs >= NP.amin(self.gaintable[key]['frequency']))
+                        oobl_freq_index = freqs < NP.amin(self.gaintable[key]['frequency'])
+                        oobr_freq_index = freqs > NP.amax(self.gaintable[key]['frequency'])
+                        oob_freq_index = NP.logical_not(ib_freq_index)
+                        if NP.any(oob_freq_index):
+                            raise IndexError('One or more of the frequencies outside interpolation range')
+                    else:
+                        if freqs is not None:
+                            ib_freq_index = NP.ones(freqs.size, dtype=NP.bool)
+                            oob_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
+                            oobl_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
+                            oobr_freq_index = NP.zeros(freqs.size, dtype=NP.bool)
+                        else:
+                            ib_freq_index = None
+                            oob_freq_index = None
+
+                    if self.gaintable[key]['time'] is not None:
+                        ib_time_index = NP.logical_and(times <= NP.amax(self.gaintable[key]['time']), times >= NP.amin(self.gaintable[key]['time']))
+                        oobl_time_index = times < NP.amin(self.gaintable[key]['time'])
+                        oobr_time_index = times > NP.amax(self.gaintable[key]['time'])
+                        oob_time_index = NP.logical_not(ib_time_index)
+                        if NP.any(oob_time_index):
+                            raise IndexError('One or more of the times outside interpolation range')
+                    else:
+                        if times is not None:
+                            ib_time_index = NP.ones(times.size, dtype=NP.bool)
+                            oob_time_index = NP.zeros(times.size, dtype=NP.bool)
+                            oobl_time_index = NP.zeros(times.size, dtype=NP.bool)
+                            oobr_time_index = NP.zeros(times.size, dtype=NP.bool)
+                        else:
+                            ib_time_index = None
+                            oob_time_index = None
+
+                    if isinstance(self.splinefuncs[key], dict):
+                        if 'dims' not in self.splinefuncs[key]:
+                            raise KeyError('Key "dims" not found in attribute splinefuncs[{0}]'.format(key))
+                        if not isinstance(self.splinefuncs[key]['dims'], NP.ndarray):
+                            raise TypeError('Key "dims" in attribute splinefuncs[{0}] must contain a numpy array'.format(key))
+
+                        if self.splinefuncs[key]['dims'].size == 1:
+                            if self.splinefuncs[key]['dims'][0] == 'time':
+                                ntimes = ib_time_index.size
+                                if freqs is None:
+                                    nchan = 1
+                                else:
+                                    nchan = ib_freq_index.size
+                                inp = times[ib_time_index]
+                            else:
+                                nchan = ib_freq_index.size
+                                if times is None:
+                                    ntimes = 1
+                                else:
+                                    ntimes = ib_time_index.size
+                                inp = freqs[ib_freq_index]
+                        else:
+                            inp_times = times[ib_time_index]
+                            inp_freqs = freqs[ib_freq_index]
+                            ntimes = ib_time_index.size
+                            nchan = ib_freq_index.size
+
+                        tgrid, fgrid = NP.meshgrid(inp_times, inp_freqs)
+                        tvec = tgrid.ravel()
+                        fvec = fgrid.ravel()
+
+                        if key == 'antenna-based':
+                            ind1 = NMO.find_list_in_list(labels, a1_labels)
+                            ind2 = NMO.find_list_in_list(labels, a2_labels)
+                            if NP.sum(ind1.mask) > 0:
+                                raise IndexError('Some antenna gains could not be found')
+                            if NP.sum(ind2.mask) > 0:
+                                raise IndexError('Some antenna gains could not be found')
+                            g1_conj = None
+                            g2 = None
+                            for i in xrange(ind1.size):
+                                if self.splinefuncs[key]['dims'].size == 1:
+                                    if g1_conj is None:
+                                        g1_conj = (self.splinefuncs[key]['interp']['real'][ind1[i]](inp) - 1j * self.splinefuncs[key]['interp']['imag'][ind1[i]](inp)).reshape(1,nchan,ntimes)
+                                        g2 = (self.splinefuncs[key]['interp']['real'][ind2[i]](inp) + 1j * self.splinefuncs[key]['interp']['imag'][ind2[i]](inp)).reshape(1,nchan,ntimes)
+                                    else:
+                                        g1_conj = NP.concatenate((g1_conj, (self.splinefuncs[key]['interp']['real'][ind1[i]](inp) - 1j * self.splinefuncs[key]['interp']['imag'][ind1[i]](inp)).reshape(1,nchan,ntimes)), axis=0)
+                                        g2 = NP.concatenate((g2, (self.splinefuncs[key]['interp']['real'][ind2[i]](inp) + 1j * self.splinefuncs[key]['interp']['imag'][ind2[i]](inp)).reshape(1,nchan,ntimes)), axis=0)
+                                else:
+                                    if g1_conj is None:
+                                        g1_conj = (self.splinefuncs[key]['interp']['real'][ind1[i]].ev(tvec,fvec) - 1j * self.splinefuncs[key]['interp']['imag'][ind1[i]].ev(tvec,fvec)).reshape(1,nchan,ntimes)
+                                        g2 = (self.splinefuncs[key]['interp']['real'][ind2[i]].ev(tvec,fvec) + 1j * self.splinefuncs[key]['interp']['imag'][ind2[i]].ev(tvec,fvec)).reshape(1,nchan,ntimes)
+                                    else:
+                                        g1_conj = NP.concatenate((g1_conj, (self.splinefuncs[key]['interp']['real'][ind1[i]].ev(tvec,fvec) - 1j * self.splinefuncs[key]['interp']['imag'][ind1[i]].ev(tvec,fvec)).reshape(1,nchan,ntimes)), axis=0)
+                                        g2 = NP.concatenate((g2, (self.splinefuncs[key]['interp']['real'][ind2[i]].ev(tvec,fvec) + 1j * self.splinefuncs[key]['interp']['imag'][ind2[i]].ev(tvec,fvec)).reshape(1,nchan,ntimes)), axis=0)
+
+                            blgains = blgains * g1_conj * g2 * NP.ones((1,nchan,ntimes), dtype=NP.complex)
+                        else:
+                            g12 = None
+                            for labelind,label in enumerate(bl_labels):
+                                if label in labels:
+                                    ind = NP.where(self.gaintable[key]['label'] == label)[0]
+                                    if self.splinefuncs[key]['dims'].size == 1:
+                                        if g12 is None:
+                                            g12 = (self.splinefuncs[key]['interp']['real'][ind[0]](inp) + 1j * self.splinefuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)
+                                        else:
+                                            g12 = NP.concatenate((g12, (self.splinefuncs[key]['interp']['real'][ind[0]](inp) + 1j * self.splinefuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)), axis=0)
+                                    else:
+                                        if g12 is None:
+                                            g12 = (self.splinefuncs[key]['interp']['real'][ind[0]].ev(tvec,fvec) + 1j * self.splinefuncs[key]['interp']['imag'][ind[0]].ev(tvec,fvec)).reshape(1,nchan,ntimes)
+                                        else:
+                                            g12 = NP.concatenate((g12, (self.splinefuncs[key]['interp']['real'][ind[0]].ev(tvec,fvec) + 1j * self.splinefuncs[key]['interp']['imag'][ind[0]].ev(tvec,fvec)).reshape(1,nchan,ntimes)), axis=0)
+                                elif NP.asarray([tuple(reversed(label))], dtype=bl_labels.dtype)[0] in labels:
+                                    ind = NP.where(labels == NP.asarray([tuple(reversed(label))], dtype=bl_labels.dtype)[0])[0]
+                                    if self.splinefuncs[key]['dims'].size == 1:
+                                        if g12 is None:
+                                            g12 = (self.splinefuncs[key]['interp']['real'][ind[0]](inp) - 1j * self.splinefuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)
+                                        else:
+                                            g12 = NP.concatenate((g12, (self.splinefuncs[key]['interp']['real'][ind[0]](inp) - 1j * self.splinefuncs[key]['interp']['imag'][ind[0]](inp)).reshape(1,nchan,ntimes)), axis=0)
+                                    else:
+                                        if g12 is None:
+                                            g12 = (self.splinefuncs[key]['interp']['real'][ind[0]].ev(tvec,fvec) - 1j * self.splinefuncs[key]['interp']['imag'][ind[0]].ev(tvec,fvec)).reshape(1,nchan,ntimes)
+                                        else:
+                                            g12 = NP.concatenate((g12, (self.splinefuncs[key]['interp']['real'][ind[0]].ev(tvec,fvec) - 1j * self.splinefuncs[key]['interp']['imag'][ind[0]].ev(tvec,fvec)).reshape(1,nchan,ntimes)), axis=0)
+                                else:
+                                    if g12 is None:
+                                        g12 = NP.ones((1,nchan,ntimes), dtype=NP.complex)
+                                    else:
+                                        g12 = NP.concatenate((g12, NP.ones((1,nchan,ntimes), dtype=NP.complex)), axis=0)
+                            blgains = blgains * g12 * NP.ones((1,nchan,ntimes), dtype=NP.complex)
+
+        interp_axes_order = ['label', 'frequency', 'time']
+        if axes_order is None:
+            axes_order = self.gaintable['antenna-based']['ordering']
+        elif not isinstance(axes_order, (list, NP.ndarray)):
+            raise TypeError('axes_order must be a list')
+        else:
+            if len(axes_order) != 3:
+                raise ValueError('axes_order must be a three element list')
+            for orderkey in ['label', 'frequency', 'time']:
+                if orderkey not in axes_order:
+                    raise ValueError('axes_order does not contain key "{0}"'.format(orderkey))
+
+        transpose_order = NMO.find_list_in_list(interp_axes_order, axes_order)
+        blgains = NP.transpose(blgains, axes=transpose_order)
+
+        return blgains
+
+    #############################################################################
+
+    def nearest_gains(self, bl_labels, freqs=None, times=None, axes_order=None):
+
+        """
+        ------------------------------------------------------------------------
+        Extract complex instrument gains for given baselines from the gain table
+        determined by nearest neighbor logic
+
+        Inputs:
+
+        bl_labels   [Numpy structured array tuples] Labels of antennas in the
+                    pair used to produce the baseline vector under fields 'A2'
+                    and 'A1' for second and first antenna respectively. The
+                    baseline vector is obtained by position of antennas under
+                    'A2' minus position of antennas under 'A1'
+
+        freqs       [None or numpy array] Array of frequencies at which the
+                    gains are to be interpolated using the attribute
+                    splinefuncs. If set to None (default), all frequencies in
+                    the gaintable are assumed. The specified frequencies must
+                    always lie within the range which was used in creating the
+                    interpolation functions, otherwise an exception will be
+                    raised. The array is of size nchan
+
+        times       [None or numpy array] Array of times at which the gains
+                    are to be interpolated using the attribute splinefuncs. If
+                    set to None (default), all times in the gaintable are
+                    assumed. The specified times must always lie within the
+                    range which was used in creating the interpolation
+                    functions, otherwise an exception will be raised. The array
+                    is of size nts
+
+        axes_order  [None or list or numpy array] Axes ordering for extracted
+                    gains. It must contain the three elements 'label',
+                    'frequency', and 'time'. If set to None, it will be
+                    returned in the same order as in the input gaintable.
+
+        Outputs:
+
+        [numpy array] Complex gains of shape nbl x nchan x nts for the specified
+        baselines, frequencies and times.
+        ------------------------------------------------------------------------
+        """
+
+        try:
+            bl_labels
+        except NameError:
+            raise NameError('Input bl_labels must be specified')
+
+        blgains = NP.asarray(1.0).reshape(1,1,1)
+        if self.gaintable is not None:
+            a1_labels = bl_labels['A1']
+            a2_labels = bl_labels['A2']
+            for gainkey in ['antenna-based', 'baseline-based']:
+                if gainkey in self.gaintable:
+                    temp_axes_order = ['label', 'frequency', 'time']
+                    inp_order = self.gaintable[gainkey]['ordering']
+                    temp_transpose_order = NMO.find_list_in_list(inp_order, temp_axes_order)
+                    if NP.all(inp_order == temp_axes_order):
+                        gains = NP.copy(self.gaintable[gainkey]['gains'])
+                    else:
+                        gains = NP.transpose(NP.copy(self.gaintable[gainkey]['gains']), axes=temp_transpose_order)
+
+                    freqs_to_search = copy.copy(freqs)
+                    if freqs_to_search is None:
+                        freqs_to_search = copy.copy(self.gaintable[gainkey]['frequency'])
+
+                    if freqs_to_search is not None:
+                        if self.gaintable[gainkey]['frequency'] is not None:
+                            inpind, refind_freqs, distNN= LKP.find_1NN(self.gaintable[gainkey]['frequency'].reshape(-1,1), freqs_to_search.reshape(-1,1), remove_oob=True)
+                        else:
+                            refind_freqs = None
+                    if refind_freqs is None:
+                        refind_freqs = NP.arange(gains.shape[1])
+
+                    times_to_search = copy.copy(times)
+                    if times_to_search is None:
+                        times_to_search = copy.copy(self.gaintable[gainkey]['time'])
+
+                    if times_to_search is not None:
+                        if self.gaintable[gainkey]['time'] is not None:
+                            inpind, refind_times, distNN = LKP.find_1NN(self.gaintable[gainkey]['time'].reshape(-1,1), times_to_search.reshape(-1,1), remove_oob=True)
+                        else:
+                            refind_times = None
+                    if refind_times is None:
+                        refind_times = NP.arange(gains.shape[2])
+
+                    if gains.shape[0] == 1:
+                        blgains = blgains * gains[:,refind_freqs,refind_times].reshape(1,refind_freqs.size,refind_times.size)
+                    else:
+                        labels = self.gaintable[gainkey]['label']
+                        if gainkey == 'antenna-based':
+                            ind1 = NMO.find_list_in_list(labels, a1_labels)
+                            ind2 = NMO.find_list_in_list(labels, a2_labels)
+                            if NP.sum(ind1.mask) > 0:
+                                raise IndexError('Some antenna gains could not be found')
+                            if NP.sum(ind2.mask) > 0:
+                                raise IndexError('Some antenna gains could not be found')
+                            blgains = blgains * gains[NP.ix_(ind2,refind_freqs,refind_times)].reshape(ind2.size,refind_freqs.size,refind_times.size) * gains[NP.ix_(ind1,refind_freqs,refind_times)].conj().reshape(ind1.size,refind_freqs.size,refind_times.size)
+                        else:
+                            labels_conj = [tuple(reversed(label)) for label in labels]
+                            labels_conj = NP.asarray(labels_conj, dtype=labels.dtype)
+                            labels_conj_appended = NP.concatenate((labels, labels_conj), axis=0)
+                            gains_conj_appended = NP.concatenate((gains, gains.conj()), axis=0)
+                            ind = NMO.find_list_in_list(labels_conj_appended, bl_labels)
+                            selected_gains = gains_conj_appended[NP.ix_(ind.compressed(),refind_freqs,refind_times)]
+                            if ind.compressed().size == 1:
+                                selected_gains = selected_gains.reshape(NP.sum(~ind.mask),refind_freqs.size,refind_times.size)
+                            blgains[~ind.mask, ...] = blgains[~ind.mask, ...] * selected_gains
+                    if axes_order is None:
+                        axes_order = inp_order
+                    elif not isinstance(axes_order, (list, NP.ndarray)):
+                        raise TypeError('axes_order must be a list')
+                    else:
+                        if len(axes_order) != 3:
+                            raise ValueError('axes_order must be a three element list')
+                        for orderkey in ['label', 'frequency', 'time']:
+                            if orderkey not in axes_order:
+                                raise ValueError('axes_order does not contain key "{0}"'.format(orderkey))
+
+                    transpose_order = NMO.find_list_in_list(inp_order, axes_order)
+                    blgains = NP.transpose(blgains, axes=transpose_order)
+
+        return blgains
+
+    #############################################################################
+
+    def eval_gains(self, bl_labels, freq_index=None, time_index=None,
+                   axes_order=None):
+
+        """
+        ------------------------------------------------------------------------
+        Extract complex instrument gains for given baselines from the gain table
+
+        Inputs:
+
+        bl_labels   [Numpy structured array tuples] Labels of antennas in the
+                    pair used to produce the baseline vector under fields 'A2'
+                    and 'A1' for second and first antenna respectively. The
+                    baseline vector is obtained by position of antennas under
+                    'A2' minus position of antennas under 'A1'
+
+        freq_index  [None, int, list or numpy array] Index (scalar) or indices
+                    (list or numpy array) along the frequency axis at which
+                    gains are to be extracted. If set to None, gains at all
+                    frequencies in the gain table will be extracted.
+
+        time_index  [None, int, list or numpy array] Index (scalar) or indices
+                    (list or numpy array) along the time axis at which gains
+                    are to be extracted. If set to None, gains at all timesin
+                    the gain table will be extracted.
+
+        axes_order  [None or list or numpy array] Axes ordering for extracted
+                    gains. It must contain the three elements 'label',
+                    'frequency', and 'time'. If set to None, it will be
+                    returned in the same order as in the input gaintable.
+
+        Outputs:
+
+        [numpy array] Complex gains of shape nbl x nchan x nts for the specified
+        baselines, frequencies and times.
+        ------------------------------------------------------------------------
+        """
+
+        return extract_gains(self.gaintable, bl_labels, freq_index=None,
+                             time_index=None, axes_order=None)
+
+    #############################################################################
+
+    def write_gaintable(self, outfile, axes_order=None, compress=True,
+                        compress_fmt='gzip', compress_opts=9):
+
+        """
+        ------------------------------------------------------------------------
+        Write gain table with specified axes ordering to external file in HDF5
+        format
+
+        Inputs:
+
+        outfile     [string] Filename including full path into which the gain
+                    table will be written
+
+        axes_order  [None or list or numpy array] The axes ordering of gain
+                    table that will be written to external file specified in
+                    outfile. If set to None, it will store in the same order
+                    as in the attribute gaintable
+
+        compress    [boolean] Specifies if the gain table is written in
+                    compressed format. The compression format and compression
+                    parameters are specified in compress_fmt and compress_opts
+                    respectively
+
+        compress_fmt
+                    [string] Accepted values are 'gzip' (default) or 'lzf'. See
+                    h5py module documentation for comparison of these
+                    compression formats
+
+        compress_opts
+                    [integer] Applies only if compress_fmt is set to 'gzip'. It
+                    must be an integer in the range 0 to 9. Default=9 implies
+                    maximum compression
+        ------------------------------------------------------------------------
+        """
+
+        try:
+            outfile
+        except NameError:
+            raise NameError('outfile not specified')
+
+        if axes_order is not None:
+            if not isinstance(axes_order, (list, NP.ndarray)):
+                raise TypeError('axes_order must be a list')
+            else:
+                if len(axes_order) != 3:
+                    raise ValueError('axes_order must be a three element list')
+                for orderkey in ['label', 'frequency', 'time']:
+                    if orderkey not in axes_order:
+                        raise ValueError('axes_order does not contain key "{0}"'.format(orderkey))
+
+        if not isinstance(compress, bool):
+            raise TypeError('Input parameter compress must be boolean')
+
+        if compress:
+            if not isinstance(compress_fmt, str):
+                raise TypeError('Input parameter compress_fmt must be a string')
+            compress_fmt = compress_fmt.lower()
+            if compress_fmt not in ['gzip', 'lzf']:
+                raise ValueError('Input parameter compress_fmt invalid')
+            if compress_fmt == 'gzip':
+                if not isinstance(compress_opts, int):
+                    raise TypeError('Input parameter compress_opts must be an integer')
+                compress_opts = NP.clip(compress_opts, 0, 9)
+
+        with h5py.File(outfile, 'w') as fileobj:
+            for gainkey in self.gaintable:
+                if self.gaintable[gainkey] is not None:
+                    if axes_order is not None:
+                        transpose_order = NMO.find_list_in_list(self.gaintable[gainkey]['ordering'], axes_order)
+                    else:
+                        axes_order = self.gaintable[gainkey]['ordering']
+                    if NP.all(self.gaintable[gainkey]['ordering'] == axes_order):
+                        gains = NP.copy(self.gaintable[gainkey]['gains'])
+                    else:
+                        gains = NP.transpose(NP.copy(self.gaintable[gainkey]['gains']), axes=transpose_order)
+
+                    grp = fileobj.create_group(gainkey)
+                    for subkey in self.gaintable[gainkey]:
+                        if subkey == 'gains':
+                            if compress:
+                                chunkshape = []
+                                for ind,axis in enumerate(axes_order):
+                                    if axis == 'frequency':
+                                        chunkshape += [gains.shape[ind]]
+                                    else:
+                                        chunkshape += [1]
+                                chunkshape = tuple(chunkshape)
+                                if compress_fmt == 'gzip':
+                                    dset = grp.create_dataset(subkey, data=gains, chunks=chunkshape, compression=compress_fmt, compression_opts=compress_opts)
+                                else:
+                                    dset = grp.create_dataset(subkey, data=gains, chunks=chunkshape, compression=compress_fmt)
+                            else:
+                                grp.create_dataset(subkey, data=gains, chunks=chunkshape)
+                        elif subkey == 'ordering':
+                            dset = grp.create_dataset(subkey, data=axes_order)
+                        else:
+                            if isinstance(self.gaintable[gainkey][subkey], NP.ndarray):
+                                dset = grp.create_dataset(subkey, data=self.gaintable[gainkey][subkey])
+
+#################################################################################
+
+class ROI_parameters(object):
+
+    """
+    ----------------------------------------------------------------------------
+    Class to manage information on the regions of interest for different
+    snapshots in an observation.
+
+    Attributes:
+
+    skymodel    [instance of class SkyModel] The common sky model for all the
+                observing instances from which the ROI is determined based on
+                a subset corresponding to each snapshot observation.
+
+    freq        [numpy vector] Frequency channels (with units specified by the
+                attribute freq_scale)
+
+    freq_scale  [string] string specifying the units of frequency. Accepted
+                values are 'GHz', 'MHz' and 'Hz'. Default = 'GHz'
+
+    telescope   [dictionary] Contains information about the telescope parameters
+                using which the primary beams in the regions of interest are
+                determined. It specifies the type of element, element size and
+                orientation. It consists of the following keys and information:
+                'id'          [string] If set, will ignore the other keys and use
+                              telescope details for known telescopes. Accepted
+                              values are 'mwa', 'vla', 'gmrt', 'hera', 'paper',
+                              'hirax', 'chime' and 'mwa_tools'. If using
+                              'mwa_tools', the MWA_Tools and mwapb modules must
+                              be installed and imported.
+                'shape'       [string] Shape of antenna element. Accepted values
+                              are 'dipole', 'delta', and 'dish'. Will be ignored
+                              if key 'id' is set. 'delta' denotes a delta
+                              function for the antenna element which has an
+                              isotropic radiation pattern. 'delta' is the default
+                              when keys 'id' and 'shape' are not set.
+                'size'        [scalar] Diameter of the telescope dish (in meters)
+                              if the key 'shape' is set to 'dish' or length of
+                              the dipole if key 'shape' is set to 'dipole'. Will
+                              be ignored if key 'shape' is set to 'delta'. Will
+                              be ignored if key 'id' is set and a preset value
+                              used for the diameter or dipole.
+                'orientation' [list or numpy array] If key 'shape' is set to
+                              dipole, it refers to the orientation of the dipole
+                              element unit vector whose magnitude is specified by
+                              length. If key 'shape' is set to 'dish', it refers
+                              to the position on the sky to which the dish is
+                              pointed. For a dipole, this unit vector must be
+                              provided in the local ENU coordinate system aligned
+                              with the direction cosines coordinate system or in
+                              the Alt-Az coordinate system. This will be
+                              used only when key 'shape' is set to 'dipole'.
                               This could be a 2-element vector (transverse
                               direction cosines) where the third (line-of-sight)
                               component is determined, or a 3-element vector
@@ -3532,6 +4574,13 @@ class ROI_parameters(object):
                               'max'   [scalar] positive value to clip the
                                       modified and scaled values to. If not set,
                                       there is no upper limit
+                'tabulated_kernels'
+                              [boolean] If set to True, the Airy pattern of a
+                              dish is interpolated from a precomputed table
+                              (see function primary_beam_generator() in module
+                              primary_beams). It is saved and restored with
+                              the telescope parameters. If not set, it
+                              defaults to False
                 'latitude'    [scalar] specifies latitude of the telescope site
                               (in degrees). Default = None (advisable to specify
                               a real value)
@@ -3568,7 +4617,11 @@ class ROI_parameters(object):
                           values in the region of interest. The size of each
                           element in the list corresponding to each snapshot is
                           n_roi x nchan where n_roi is the number of pixels in
-                          region of interest.
+                          region of interest. If the primary beam of a snapshot
+                          is compressed in a reduced spectral basis (see input
+                          pbeam_rtol of member function append_settings()), the
+                          element is a dictionary as returned by function
+                          lowrank_beam_compress() in module primary_beams
 
     pinfo       [list of dictionaries] Each dictionary element in the list
                 corresponds to a specific snapshot. It contains information
@@ -3617,7 +4670,7 @@ class ROI_parameters(object):
                 values in the region of interest using the telescope parameters.
 
     save()      Saves the information about the regions of interest to a FITS
-                file on disk
+                or HDF5 file on disk
 
     -----------------------------------------------------------------------------
     """
@@ -3639,13 +4692,104 @@ class ROI_parameters(object):
         init_file    [string] Location of the initialization file from which an
                      instance of class ROI_parameters will be created. File
                      format must be compatible with the one saved to disk by
-                     member function save()
+                     member function save(). If the file name ends with
+                     '.hdf5', it is read as a HDF5 file, otherwise as a FITS
+                     file
         -------------------------------------------------------------------------
         """
 
         argument_init = False
         init_file_success = False
-        if init_file is not None:
+        if (init_file is not None) and init_file.endswith('.hdf5'):
+            try:
+                fileobj = h5py.File(init_file, 'r')
+            except IOError:
+                argument_init = True
+                print '\tinit_file provided but could not open the initialization file. Attempting to initialize with input parameters...'
+            if not argument_init:
+                n_obs = fileobj['header']['n_obs'].value
+
+                self.info = {}
+                self.info['radius'] = []
+                self.info['center'] = []
+                self.info['ind'] = []
+                self.info['pbeam'] = []
+                self.telescope = {}
+
+                tlscp_group = fileobj['telescope_parms']
+                if 'id' in tlscp_group:
+                    self.telescope['id'] = tlscp_group['id'].value
+                if 'latitude' in tlscp_group:
+                    self.telescope['latitude'] = tlscp_group['latitude'].value
+                else:
+                    self.telescope['latitude'] = None
+                if 'longitude' in tlscp_group:
+                    self.telescope['longitude'] = tlscp_group['longitude'].value
+                else:
+                    self.telescope['longitude'] = 0.0
+                if 'altitude' in tlscp_group:
+                    self.telescope['altitude'] = tlscp_group['altitude'].value
+                else:
+                    self.telescope['altitude'] = 0.0
+
+                antelem_group = fileobj['antenna_element']
+                for key in ['shape', 'size', 'ocoords', 'orientation']:
+                    if key not in antelem_group:
+                        raise KeyError('Antenna element {0} not found in the init_file'.format(key))
+                    self.telescope[key] = antelem_group[key].value
+                self.telescope['orientation'] = self.telescope['orientation'].reshape(1,-1)
+                if 'element_locs' in antelem_group:
+                    self.telescope['element_locs'] = antelem_group['element_locs'].value
+                if 'groundplane' in antelem_group:
+                    self.telescope['groundplane'] = antelem_group['groundplane'].value
+                    for key in ['scale', 'max']:
+                        if 'ground_modify_'+key in antelem_group:
+                            if 'ground_modify' not in self.telescope:
+                                self.telescope['ground_modify'] = {}
+                            self.telescope['ground_modify'][key] = antelem_group['ground_modify_'+key].value
+                else:
+                    self.telescope['groundplane'] = None
+                if 'tabulated_kernels' in antelem_group:
+                    self.telescope['tabulated_kernels'] = bool(antelem_group['tabulated_kernels'].value)
+
+                if 'freqs' not in fileobj['spectral_info']:
+                    raise KeyError('Frequencies not found in init_file.')
+                self.freq = fileobj['spectral_info']['freqs'].value
+
+                self.pinfo = []
+                for i in range(n_obs):
+                    snap_group = fileobj['roi']['{0:0d}'.format(i)]
+                    self.info['ind'] += [snap_group['ind'].value]
+                    if 'pbeam_basis' in snap_group:
+                        self.info['pbeam'] += [{'coeffs': snap_group['pbeam_coeffs'].value, 'basis': snap_group['pbeam_basis'].value, 'rel_error': snap_group['pbeam_basis'].attrs['rel_error']}]
+                    else:
+                        self.info['pbeam'] += [snap_group['pbeam'].value]
+                    if ('delays' in snap_group) or ('pointing_center' in snap_group):
+                        self.pinfo += [{}]
+                        if 'delays' in snap_group:
+                            self.pinfo[-1]['delays'] = snap_group['delays'].value
+                            if 'delayerr' in snap_group['delays'].attrs:
+                                delayerr = snap_group['delays'].attrs['delayerr']
+                                if delayerr <= 0.0:
+                                    self.pinfo[-1]['delayerr'] = None
+                                else:
+                                    self.pinfo[-1]['delayerr'] = delayerr
+                        if 'pointing_center' in snap_group:
+                            self.pinfo[-1]['pointing_center'] = snap_group['pointing_center'].value
+                            try:
+                                self.pinfo[-1]['pointing_coords'] = snap_group['pointing_center'].attrs['pointing_coords']
+                            except KeyError:
+                                raise KeyError('Attribute "pointing_coords" of pointing center of snapshot {0:0d} not found in init_file'.format(i))
+
+                len_pinfo = len(self.pinfo)
+                if len_pinfo > 0:
+                    if len_pinfo != n_obs:
+                        raise ValueError('Inconsistency in number of pointings in header and number of pointing settings')
+
+                fileobj.close()
+                init_file_success = True
+                return
+        elif init_file is not None:
             try:
                 hdulist = fits.open(init_file)
             except IOError:
@@ -3714,6 +4858,8 @@ class ROI_parameters(object):
                         self.telescope['ground_modify']['max'] = hdulist[0].header['ground_modify_max']
                 else:
                     self.telescope['groundplane'] = None
+                if 'tabulated_kernels' in hdulist[0].header:
+                    self.telescope['tabulated_kernels'] = hdulist[0].header['tabulated_kernels']
 
                 if 'FREQ' in extnames:
                     self.freq = hdulist['FREQ'].data
@@ -3787,7 +4933,8 @@ class ROI_parameters(object):
     #############################################################################
 
     def append_settings(self, skymodel, freq, pinfo=None, lst=None,
-                        roi_info=None, telescope=None, freq_scale='GHz'):
+                        roi_info=None, telescope=None, freq_scale='GHz',
+                        beam_cache=None, nthreads=None, pbeam_rtol=None):
 
         """
         ------------------------------------------------------------------------
@@ -3943,6 +5090,33 @@ class ROI_parameters(object):
                               of telescope is set to 'mwa_tools', it defaults
                               to X-polarization.
 
+    beam_cache  [instance of class PrimaryBeamCache or PhasedArrayBeamCache]
+                Primary beam tabulated on a grid of the local sky (see class
+                PrimaryBeamCache in module primary_beams) from which the
+                primary beam in the region of interest is looked up instead of
+                being evaluated afresh. It must be tabulated at the frequency
+                channels freq and is valid only if the primary beam is fixed
+                in the local frame, as in drift scans. If an instance of class
+                PhasedArrayBeamCache, the primary beam is looked up from the
+                grid tabulated for the beamformer settings in pinfo, which is
+                tabulated and cached if it is not already. Used only if the
+                primary beam is not provided in roi_info. If set to None
+                (default), the primary beam is evaluated using the telescope
+                parameters
+
+    nthreads    [integer] Number of threads over which the frequency channels
+                of the MWA_Tools primary beam (if key 'id' of telescope is set
+                to 'mwa_tools') are evaluated. If set to None (default) or 1,
+                they are evaluated serially
+
+    pbeam_rtol  [NoneType or scalar] If set, the primary beam of the snapshot
+                is stored compressed in a reduced spectral basis using function
+                lowrank_beam_compress() in module primary_beams with this
+                tolerance on the relative reconstruction error of the primary
+                beam spectrum of every sky position. It is stored
+                uncompressed if the compression does not reduce its size. If
+                set to None (default), it is stored uncompressed
+
         ------------------------------------------------------------------------
         """
 
@@ -3995,7 +5169,7 @@ class ROI_parameters(object):
                             raise ValueError('Number of columns of primary beam in key "pbeam" of dictionary roi_info must be equal to number of frequency channels.')
 
                         if NP.asarray(roi_info['ind']).size == pb.shape[0]:
-                            self.info['pbeam'] += [roi_info['pbeam'].astype(NP.float32)]
+                            self.info['pbeam'] += [self._compress_pbeam(pb.astype(NP.float32), pbeam_rtol)]
                         else:
                             raise ValueError('Number of elements in values in key "ind" and number of rows of values in key "pbeam" must be identical.')
                         pbeam_input = True
@@ -4100,55 +5274,101 @@ class ROI_parameters(object):
                     self.pinfo[-1]['pointing_coords'] = 'altaz'
 
             ind = self.info['ind'][-1]
-            if 'id' in self.telescope:
+            if isinstance(beam_cache, PB.PhasedArrayBeamCache):
+                pbeam = beam_cache.lookup(skypos_altaz[ind,:], skyunits='altaz', freqs=self.freq, freq_scale=self.freq_scale, pointing_info=self.pinfo[-1])
+            elif beam_cache is not None:
+                pbeam = beam_cache.lookup(skypos_altaz[ind,:], skyunits='altaz', freqs=self.freq, freq_scale=self.freq_scale)
+            elif 'id' in self.telescope:
                 if self.telescope['id'] == 'mwa_tools':
                     if not mwa_tools_found:
                         raise ImportError('MWA_Tools could not be imported which is required for power pattern computation.')
 
-                    pbeam = NP.empty((ind.size, self.freq.size))
-                    for i in xrange(self.freq.size):
-                        pbx_MWA, pby_MWA = MWAPB.MWA_Tile_advanced(NP.radians(90.0-skypos_altaz[ind,0]).reshape(-1,1), NP.radians(skypos_altaz[ind,1]).reshape(-1,1), freq=self.freq[i], delays=self.pinfo[-1]['delays']/435e-12)
-                        if 'pol' in self.telescope:
-                            if (self.telescope['pol'] == 'X') or (self.telescope['pol'] == 'x'):
-                                pbeam[:,i] = pbx_MWA.ravel()
-                            elif (self.telescope['pol'] == 'Y') or (self.telescope['pol'] == 'y'):
-                                pbeam[:,i] = pby_MWA.ravel()
-                            else:
-                                raise ValueError('Key "pol" in attribute dictionary telescope is invalid.')
-                        else:
-                            self.telescope['pol'] = 'X'
-                            pbeam[:,i] = pbx_MWA.ravel()
+                    if 'pol' in self.telescope:
+                        if self.telescope['pol'] not in ['X', 'x', 'Y', 'y']:
+                            raise ValueError('Key "pol" in attribute dictionary telescope is invalid.')
+                    else:
+                        self.telescope['pol'] = 'X'
+                    pbeam = PB.MWA_Tools_primary_beam(skypos_altaz[ind,:], self.freq, delays=self.pinfo[-1]['delays'], pol=self.telescope['pol'], skyunits='altaz', freq_scale=self.freq_scale, nthreads=nthreads)
                 else:
                     pbeam = PB.primary_beam_generator(skypos_altaz[ind,:], self.freq, self.telescope, freq_scale=self.freq_scale, skyunits='altaz', pointing_info=self.pinfo[-1])
             else:
                 pbeam = PB.primary_beam_generator(skypos_altaz[ind,:], self.freq, self.telescope, freq_scale=self.freq_scale, skyunits='altaz', pointing_info=self.pinfo[-1])
 
-            self.info['pbeam'] += [pbeam.astype(NP.float32)]
+            self.info['pbeam'] += [self._compress_pbeam(pbeam.astype(NP.float32), pbeam_rtol)]
+
+    #############################################################################
+
+    def _compress_pbeam(self, pbeam, pbeam_rtol):
+
+        """
+        ------------------------------------------------------------------------
+        !!! FOR INTERNAL USE ONLY !!!
+        Returns the primary beam compressed in a reduced spectral basis if
+        pbeam_rtol is set and the compression reduces its size, otherwise the
+        primary beam as is. Read docstring of member function append_settings()
+        for details on the inputs.
+        ------------------------------------------------------------------------
+        """
+
+        if pbeam_rtol is None:
+            return pbeam
+        pbeam_lowrank = PB.lowrank_beam_compress(pbeam, rtol=pbeam_rtol)
+        if pbeam_lowrank['coeffs'].size + pbeam_lowrank['basis'].size < pbeam.size:
+            return pbeam_lowrank
+        return pbeam
 
     #############################################################################
 
-    def save(self, infile, tabtype='BinTableHDU', overwrite=False, verbose=True):
+    def save(self, infile, fmt='FITS', tabtype='BinTableHDU', overwrite=False,
+             compress=False, compress_fmt='gzip', compress_opts=9,
+             verbose=True):
 
         """
         ------------------------------------------------------------------------
-        Saves the information about the regions of interest to a FITS file on
-        disk
+        Saves the information about the regions of interest to a FITS or HDF5
+        file on disk
 
         Inputs:
 
         infile       [string] Filename with full path to be saved to. Will be
-                     appended with '.fits' extension
+                     appended with '.fits' or '.hdf5' extension depending on
+                     input keyword fmt
 
         Keyword Input(s):
 
+        fmt          [string] string specifying the format of the output.
+                     Accepted values are 'FITS' (default) and 'HDF5'. In HDF5
+                     format, the indices and primary beams of each snapshot
+                     are stored in datasets of group 'roi/<snapshot>', the
+                     primary beams being chunked along both the sky and
+                     frequency axes. The file can then be read by snapshot and
+                     by frequency channels without reading the rest of the
+                     file using class ROI_store
+
         tabtype      [string] indicates table type for one of the extensions in
                      the FITS file. Allowed values are 'BinTableHDU' and
                      'TableHDU' for binary ascii tables respectively. Default is
-                     'BinTableHDU'.
+                     'BinTableHDU'. Only applies if input fmt is set to 'FITS'
 
         overwrite    [boolean] True indicates overwrite even if a file already
                      exists. Default = False (does not overwrite)
 
+        compress     [boolean] Specifies if the primary beams are written in
+                     compressed format. The compression format and compression
+                     parameters are specified in compress_fmt and compress_opts
+                     respectively. Only applies if input fmt is set to 'HDF5'.
+                     Default=False
+
+        compress_fmt
+                     [string] Accepted values are 'gzip' (default) or 'lzf'. See
+                     h5py module documentation for comparison of these
+                     compression formats
+
+        compress_opts
+                     [integer] Applies only if compress_fmt is set to 'gzip'. It
+                     must be an integer in the range 0 to 9. Default=9 implies
+                     maximum compression
+
         verbose      [boolean] If True (default), prints diagnostic and progress
                      messages. If False, suppress printing such messages.
         ----------------------------------------------------------------------------
@@ -4159,6 +5379,17 @@ class ROI_parameters(object):
         except NameError:
             raise NameError('No filename provided. Aborting ROI_parameters.save()...')
 
+        if not isinstance(fmt, str):
+            raise TypeError('Input parameter fmt must be a string')
+        if fmt.lower() not in ['fits', 'hdf5']:
+            raise ValueError('Input parameter fmt must be set to "FITS" or "HDF5"')
+
+        if fmt.lower() == 'hdf5':
+            self._save_hdf5(infile, overwrite=overwrite, compress=compress,
+                            compress_fmt=compress_fmt,
+                            compress_opts=compress_opts, verbose=verbose)
+            return
+
         filename = infile + '.fits'
 
         if verbose:
@@ -4186,6 +5417,8 @@ class ROI_parameters(object):
                     hdulist[0].header['ground_modify_scale'] = (self.telescope['ground_modify']['scale'], 'Ground plane modification scale factor')
                 if 'max' in self.telescope['ground_modify']:
                     hdulist[0].header['ground_modify_max'] = (self.telescope['ground_modify']['max'], 'Maximum ground plane modification')
+        if self.telescope.get('tabulated_kernels', False):
+            hdulist[0].header['tabulated_kernels'] = (True, 'Tabulated primary beam kernels')
 
         hdulist += [fits.ImageHDU(self.telescope['orientation'], name='Antenna element orientation')]
         if verbose:
@@ -4200,7 +5433,10 @@ class ROI_parameters(object):
 
         for i in range(len(self.info['ind'])):
             hdulist += [fits.ImageHDU(self.info['ind'][i], name='IND_{0:0d}'.format(i))]
-            hdulist += [fits.ImageHDU(self.info['pbeam'][i], name='PB_{0:0d}'.format(i))]
+            if isinstance(self.info['pbeam'][i], dict):
+                hdulist += [fits.ImageHDU(PB.lowrank_beam_expand(self.info['pbeam'][i]), name='PB_{0:0d}'.format(i))]
+            else:
+                hdulist += [fits.ImageHDU(self.info['pbeam'][i], name='PB_{0:0d}'.format(i))]
             if self.pinfo: # if self.pinfo is not empty
                 if 'delays' in self.pinfo[i]:
                     hdulist += [fits.ImageHDU(self.pinfo[i]['delays'], name='DELAYS_{0:0d}'.format(i))]
@@ -4229,6 +5465,303 @@ class ROI_parameters(object):
         if verbose:
             print '\tRegions of interest information written successfully to FITS file on disk:\n\t\t{0}\n'.format(filename)
 
+    #############################################################################
+
+    def _save_hdf5(self, infile, overwrite=False, compress=False,
+                   compress_fmt='gzip', compress_opts=9, verbose=True):
+
+        """
+        ------------------------------------------------------------------------
+        !!! FOR INTERNAL USE ONLY !!!
+        Saves the information about the regions of interest to a HDF5 file on
+        disk. Read docstring of member function save() for details on the
+        inputs.
+        ------------------------------------------------------------------------
+        """
+
+        if not isinstance(compress, bool):
+            raise TypeError('Input parameter compress must be boolean')
+
+        if compress:
+            if not isinstance(compress_fmt, str):
+                raise TypeError('Input parameter compress_fmt must be a string')
+            compress_fmt = compress_fmt.lower()
+            if compress_fmt not in ['gzip', 'lzf']:
+                raise ValueError('Input parameter compress_fmt invalid')
+            if compress_fmt == 'gzip':
+                if not isinstance(compress_opts, int):
+                    raise TypeError('Input parameter compress_opts must be an integer')
+                compress_opts = NP.clip(compress_opts, 0, 9)
+            else:
+                compress_opts = None
+        else:
+            compress_fmt = None
+            compress_opts = None
+
+        filename = infile + '.hdf5'
+
+        if verbose:
+            print '\nSaving information about regions of interest...'
+
+        if overwrite:
+            write_str = 'w'
+        else:
+            write_str = 'w-'
+        with h5py.File(filename, write_str) as fileobj:
+            hdr_group = fileobj.create_group('header')
+            hdr_group['n_obs'] = len(self.info['ind'])
+            tlscp_group = fileobj.create_group('telescope_parms')
+            if 'id' in self.telescope:
+                tlscp_group['id'] = self.telescope['id']
+            if self.telescope['latitude'] is not None:
+                tlscp_group['latitude'] = self.telescope['latitude']
+                tlscp_group['latitude'].attrs['units'] = 'deg'
+            tlscp_group['longitude'] = self.telescope['longitude']
+            tlscp_group['longitude'].attrs['units'] = 'deg'
+            if self.telescope['altitude'] is not None:
+                tlscp_group['altitude'] = self.telescope['altitude']
+                tlscp_group['altitude'].attrs['units'] = 'm'
+            antelem_group = fileobj.create_group('antenna_element')
+            antelem_group['shape'] = self.telescope['shape']
+            antelem_group['size'] = self.telescope['size']
+            antelem_group['size'].attrs['units'] = 'm'
+            antelem_group['ocoords'] = self.telescope['ocoords']
+            antelem_group['orientation'] = self.telescope['orientation']
+            if 'element_locs' in self.telescope:
+                antelem_group['element_locs'] = self.telescope['element_locs']
+                antelem_group['element_locs'].attrs['units'] = 'm'
+            if self.telescope['groundplane'] is not None:
+                antelem_group['groundplane'] = self.telescope['groundplane']
+                antelem_group['groundplane'].attrs['units'] = 'm'
+                if 'ground_modify' in self.telescope:
+                    if 'scale' in self.telescope['ground_modify']:
+                        antelem_group['ground_modify_scale'] = self.telescope['ground_modify']['scale']
+                    if 'max' in self.telescope['ground_modify']:
+                        antelem_group['ground_modify_max'] = self.telescope['ground_modify']['max']
+            if self.telescope.get('tabulated_kernels', False):
+                antelem_group['tabulated_kernels'] = True
+            spec_group = fileobj.create_group('spectral_info')
+            spec_group['freqs'] = self.freq
+            if verbose:
+                print '\tCreated groups for telescope parameters and {0:0d} frequency channels'.format(self.freq.size)
+
+            roi_group = fileobj.create_group('roi')
+            for i in range(len(self.info['ind'])):
+                snap_group = roi_group.create_group('{0:0d}'.format(i))
+                snap_group['ind'] = NP.asarray(self.info['ind'][i])
+                if isinstance(self.info['pbeam'][i], dict):
+                    snap_group['pbeam_coeffs'] = self.info['pbeam'][i]['coeffs']
+                    snap_group['pbeam_basis'] = self.info['pbeam'][i]['basis']
+                    snap_group['pbeam_basis'].attrs['rel_error'] = self.info['pbeam'][i]['rel_error']
+                else:
+                    pbeam = NP.asarray(self.info['pbeam'][i]).reshape(-1,self.freq.size)
+                    if pbeam.size > 0:
+                        # Chunk along both axes so that a subset of frequency
+                        # channels can be read without reading all of them
+                        chunkshape = (min(pbeam.shape[0], 4096), min(pbeam.shape[1], 64))
+                        snap_group.create_dataset('pbeam', data=pbeam, chunks=chunkshape, compression=compress_fmt, compression_opts=compress_opts)
+                    else:
+                        snap_group['pbeam'] = pbeam
+                if self.pinfo: # if self.pinfo is not empty
+                    if 'delays' in self.pinfo[i]:
+                        snap_group['delays'] = self.pinfo[i]['delays']
+                        snap_group['delays'].attrs['units'] = 's'
+                        if 'delayerr' in self.pinfo[i]:
+                            if self.pinfo[i]['delayerr'] is not None:
+                                snap_group['delays'].attrs['delayerr'] = self.pinfo[i]['delayerr']
+                            else:
+                                snap_group['delays'].attrs['delayerr'] = 0.0
+
+                    if 'pointing_center' in self.pinfo[i]:
+                        snap_group['pointing_center'] = self.pinfo[i]['pointing_center']
+                        if 'pointing_coords' in self.pinfo[i]:
+                            snap_group['pointing_center'].attrs['pointing_coords'] = self.pinfo[i]['pointing_coords']
+                        else:
+                            raise KeyError('Key "pointing_coords" not found in attribute pinfo.')
+
+            if verbose:
+                print '\tCreated groups for {0:0d} observations containing ROI indices and primary beams'.format(len(self.info['ind']))
+
+        if verbose:
+            print '\tRegions of interest information written successfully to HDF5 file on disk:\n\t\t{0}\n'.format(filename)
+
+#################################################################################
+
+class ROI_store(object):
+
+    """
+    ----------------------------------------------------------------------------
+    Class to provide random access to the regions of interest and primary beams
+    of snapshots saved to disk in HDF5 format by member function save() of
+    class ROI_parameters. The file is opened once and the indices and primary
+    beams of any snapshot and subset of frequency channels are read on demand
+    without reading the rest of the file.
+
+    Attributes:
+
+    filename    [string] Name of the HDF5 file including the '.hdf5' extension
+
+    fileobj     [instance of class h5py.File] Open file object. Set to None
+                after member function close() is called
+
+    n_obs       [integer] Number of snapshots in the file
+
+    freq        [numpy vector] Frequency channels of the primary beams
+
+    Member functions:
+
+    __init__()  Initializes an instance of class ROI_store by opening the
+                HDF5 file
+
+    read()      Reads the indices and primary beam of a snapshot, optionally
+                restricted to a subset of frequency channels and a share of
+                the sources
+
+    close()     Closes the HDF5 file
+
+    ----------------------------------------------------------------------------
+    """
+
+    def __init__(self, infile):
+
+        """
+        ------------------------------------------------------------------------
+        Initializes an instance of class ROI_store
+
+        Inputs:
+
+        infile      [string] Filename with full path of the file written by
+                    member function save() of class ROI_parameters with fmt set
+                    to 'HDF5'. Should not include the '.hdf5' extension
+        ------------------------------------------------------------------------
+        """
+
+        if not isinstance(infile, str):
+            raise TypeError('Input infile must be a string')
+
+        self.filename = infile + '.hdf5'
+        self.fileobj = h5py.File(self.filename, 'r')
+        self.n_obs = self.fileobj['header']['n_obs'].value
+        self.freq = self.fileobj['spectral_info']['freqs'].value
+
+    #############################################################################
+
+    def read(self, snapshot, chans=None, share=None, expand=True):
+
+        """
+        ------------------------------------------------------------------------
+        Reads the indices and primary beam of a snapshot, optionally restricted
+        to a subset of frequency channels and a share of the sources
+
+        Inputs:
+
+        snapshot    [integer] Index of the snapshot in the file
+
+        Keyword Inputs:
+
+        chans       [NoneType, slice, list or numpy array] Indices of frequency
+                    channels of the primary beam to be read. If set to None
+                    (default), all frequency channels are read. Contiguous
+                    channels are read as a hyperslab of the dataset
+
+        share       [NoneType or tuple] Tuple (i, n) selecting the i-th of n
+                    contiguous shares of the sources in the region of interest
+                    which differ in size by at most one source. Used when
+                    processes split the sources of a snapshot between them. If
+                    set to None (default), all the sources are read
+
+        expand      [boolean] Applies only if the primary beam of the snapshot
+                    is stored compressed in a reduced spectral basis. If set to
+                    True (default), the primary beam is reconstructed. If set
+                    to False, it is returned in the compressed form with the
+                    spectral basis restricted to the channels selected by
+                    chans
+
+        Output:
+
+        Dictionary with the following keys and values:
+        'ind'       [numpy vector] Indices of the sky model in the region of
+                    interest of the snapshot
+        'pbeam'     [numpy array or dictionary] Primary beam of shape
+                    n_roi x nchan where nchan is the number of channels selected
+                    by chans. If it is stored compressed and input expand is
+                    set to False, it is a dictionary as returned by function
+                    lowrank_beam_compress() in module primary_beams
+        ------------------------------------------------------------------------
+        """
+
+        if self.fileobj is None:
+            raise IOError('File {0} has been closed'.format(self.filename))
+        if not isinstance(snapshot, (int, NP.integer)):
+            raise TypeError('Input snapshot must be an integer')
+        if (snapshot < 0) or (snapshot >= self.n_obs):
+            raise IndexError('Input snapshot out of range')
+
+        snap_group = self.fileobj['roi']['{0:0d}'.format(snapshot)]
+        n_roi = snap_group['ind'].shape[0]
+        if share is None:
+            rows = slice(0, n_roi)
+        else:
+            if not isinstance(share, tuple):
+                raise TypeError('Input share must be a tuple')
+            if len(share) != 2:
+                raise ValueError('Input share must be a tuple of two integers')
+            if (share[1] < 1) or (share[0] < 0) or (share[0] >= share[1]):
+                raise ValueError('Input share out of range')
+            rows = slice(share[0] * (n_roi // share[1]) + min(share[0], n_roi % share[1]), (share[0]+1) * (n_roi // share[1]) + min(share[0]+1, n_roi % share[1]))
+        if n_roi > 0:
+            ind = snap_group['ind'][rows]
+        else:
+            ind = snap_group['ind'][...]
+        if 'pbeam_basis' in snap_group:
+            basis = snap_group['pbeam_basis'][...]
+            if chans is not None:
+                basis = basis[:,chans]
+            if n_roi > 0:
+                coeffs = snap_group['pbeam_coeffs'][rows,:]
+            else:
+                coeffs = snap_group['pbeam_coeffs'][...]
+            pbeam = {'coeffs': coeffs, 'basis': basis, 'rel_error': snap_group['pbeam_basis'].attrs['rel_error']}
+            if expand:
+                pbeam = PB.lowrank_beam_expand(pbeam)
+            return {'ind': ind, 'pbeam': pbeam}
+
+        pbeam_dset = snap_group['pbeam']
+        if ind.size == 0:
+            pbeam = pbeam_dset[...][rows,:]
+            if chans is not None:
+                pbeam = pbeam[:,chans]
+        elif chans is None:
+            pbeam = pbeam_dset[rows,:]
+        elif isinstance(chans, slice):
+            pbeam = pbeam_dset[rows,chans]
+        else:
+            chans = NP.asarray(chans, dtype=int).ravel()
+            if chans.size == 0:
+                pbeam = NP.empty((ind.size,0), dtype=pbeam_dset.dtype)
+            elif NP.all(NP.diff(chans) == 1):
+                pbeam = pbeam_dset[rows,chans[0]:chans[-1]+1]
+            elif (ind.size > 0) and NP.all(NP.diff(chans) > 0):
+                pbeam = pbeam_dset[rows,chans.tolist()]
+            else:
+                pbeam = pbeam_dset[rows,:][:,chans]
+
+        return {'ind': ind, 'pbeam': pbeam}
+
+    #############################################################################
+
+    def close(self):
+
+        """
+        ------------------------------------------------------------------------
+        Closes the HDF5 file
+        ------------------------------------------------------------------------
+        """
+
+        if self.fileobj is not None:
+            self.fileobj.close()
+            self.fileobj = None
+
 #################################################################################
 
 class InterferometerArray(object):
@@ -4307,6 +5840,22 @@ class InterferometerArray(object):
 
     n_acc       [scalar] Number of accumulations
 
+    n_acc_hint  [None or integer] Expected number of accumulations for which
+                storage along the time axis is preallocated. If more
+                accumulations are observed, the storage capacity is doubled
+                as needed
+
+    time_major  [boolean] If True, the visibilities, gradients, system
+                temperatures and bandpasses are laid out in memory with the
+                time axis first (ntime x nbl x nchan) so that each snapshot
+                occupies contiguous memory when it is appended, written to
+                disk or converted to the time-major baseline-time ordering of
+                UVFITS. The attributes skyvis_freq, vis_freq, vis_noise_freq,
+                gradient, Tsys, bp and bp_wts are views of this memory which
+                retain the usual axis order with time as the last axis. If
+                False (default), they are laid out in memory in the usual
+                axis order
+
     groups      [dictionary] Contains the grouping of unique baselines and the
                 redundant baselines as numpy recarray under each unique baseline 
                 category/flavor. It contains as keys the labels (tuple of A1, A2) 
@@ -4345,6 +5894,18 @@ class InterferometerArray(object):
                 timestamp. Inside each top list is a list of indices of sources
                 from the catalog which are observed inside the region of
                 interest. This is computed inside member function observe().
+                It is not saved to disk and, in an instance initialized from a
+                file, covers only the timestamps observed after initialization
+
+    cull_info   [list] Each element corresponds to a timestamp. It is None if
+                the sources were not culled by their primary beam weighted
+                flux densities, otherwise it is a dictionary with keys 'nsrc'
+                (number of sources in the region of interest), 'ncull'
+                (number of sources culled) and 'error_bound' (bound on the
+                fractional error of the visibilities relative to the total
+                primary beam weighted flux density). This is computed inside
+                member functions observe() and observe_batch(). It is saved
+                to disk and concatenated along with the timestamps
 
     pointing_center
                 [2-column numpy array] Pointing center (latitude and
@@ -4447,6 +6008,13 @@ class InterferometerArray(object):
                               'max'   [scalar] positive value to clip the
                                       modified and scaled values to. If not set,
                                       there is no upper limit
+                'tabulated_kernels'
+                              [boolean] If set to True, the Airy pattern of a
+                              dish is interpolated from a precomputed table
+                              (see function primary_beam_generator() in module
+                              primary_beams). It is saved and restored with
+                              the telescope parameters. If not set, it
+                              defaults to False
 
     layout      [dictionary] contains array layout information (on the full
                 array even if only a subset of antennas or baselines are used
@@ -4560,6 +6128,14 @@ class InterferometerArray(object):
                         observed by the interferometer for the specified
                         parameters.
 
+    observe_batch()     Simulates a block of snapshot observations with the
+                        interferometer specifications and an external sky
+                        catalog. Equivalent to calling observe() for each
+                        snapshot but coordinate transformations, source
+                        selection, source spectra and primary beams are
+                        evaluated once for the block and the visibilities are
+                        computed over blocks of snapshots and sources
+
     observing_run()     Simulate an extended observing run in 'track' or 'drift'
                         mode, by an instance of the InterferometerArray class, of
                         the sky when a sky catalog is provided. The simulation
@@ -4586,6 +6162,12 @@ class InterferometerArray(object):
                         efficient to simulate unique baselines and duplicate 
                         measurements for redundant baselines
 
+    deduplicate_measurements()
+                        Retain only one representative baseline from each group
+                        of redundant baselines specified. The other baselines
+                        are only referenced in the baseline groups. This is the
+                        inverse of duplicate_measurements()
+
     getThreePointCombinations()
                         Return all unique 3-point combinations of baselines
 
@@ -4621,6 +6203,9 @@ class InterferometerArray(object):
     save()             Saves the interferometer array information to disk in
                        HDF5, FITS, NPZ and UVFITS formats
 
+    save_npz()         Saves the essential attributes of the interferometer
+                       array information to disk in NPZ format
+
     write_uvfits()     Saves the interferometer array information to disk in
                        UVFITS format
 
@@ -4632,7 +6217,8 @@ class InterferometerArray(object):
                  skycoords='radec', A_eff=NP.pi*(25.0/2)**2,
                  pointing_coords='hadec', layout=None, blgroupinfo=None,
                  baseline_coords='localenu', freq_scale=None, gaininfo=None,
-                 init_file=None, simparms_file=None):
+                 init_file=None, simparms_file=None, simulate_unique=False,
+                 n_acc_hint=None, time_major=False):
 
         """
         ------------------------------------------------------------------------
@@ -4647,7 +6233,7 @@ class InterferometerArray(object):
         timestamp, t_acc, Tsys, Tsysinfo, vis_freq, vis_lag, t_obs, n_acc,
         vis_noise_freq, vis_noise_lag, vis_rms_freq, geometric_delays,
         projected_baselines, simparms_file, layout, gradient, gradient_mode,
-        gaininfo, blgroups, bl_reversemap
+        gaininfo, blgroups, bl_reversemap, n_acc_hint, time_major
 
         Read docstring of class InterferometerArray for details on these
         attributes.
@@ -4663,11 +6249,55 @@ class InterferometerArray(object):
                      [string] Location of the simulation parameters in YAML
                      format that went into making the simulated data product
 
+        simulate_unique
+                     [boolean] If set to True and redundant baseline groups
+                     are provided in input blgroupinfo, only one
+                     representative baseline from each redundant group is
+                     retained (see member function deduplicate_measurements())
+                     so that visibilities are simulated only on unique
+                     baselines. The other members of each group are only
+                     referenced in attributes blgroups and bl_reversemap and
+                     can be expanded with member function
+                     duplicate_measurements(). Default = False simulates all
+                     the baselines provided. Ignored if init_file is provided
+
+        n_acc_hint   [None or integer] Expected number of accumulations. If
+                     set, storage along the time axis for visibilities,
+                     gradients, system temperatures, bandpasses, pointing and
+                     phase centers is preallocated for these many
+                     accumulations and filled in as snapshots are observed.
+                     If more accumulations are observed, the capacity is
+                     doubled as needed. If set to None (default), the
+                     capacity is grown by doubling starting from a single
+                     accumulation
+
+        time_major   [boolean] If set to True, the visibilities, gradients,
+                     system temperatures and bandpasses are laid out in memory
+                     with the time axis first while the attributes holding
+                     them retain the usual axis order as views. Read the
+                     docstring of class InterferometerArray for details.
+                     Default = False
+
         Other input parameters have their usual meanings. Read the docstring of
         class InterferometerArray for details on these inputs.
         ------------------------------------------------------------------------
         """
 
+        if n_acc_hint is not None:
+            if not isinstance(n_acc_hint, int):
+                raise TypeError('Input n_acc_hint must be an integer')
+            if n_acc_hint < 1:
+                raise ValueError('Input n_acc_hint must be positive')
+        self.n_acc_hint = n_acc_hint
+        if not isinstance(time_major, bool):
+            raise TypeError('Input time_major must be a boolean')
+        self.time_major = time_major
+        self._time_buffers = {}
+        self._scratch = {}
+        self.obs_catalog_indices = []
+        self.geometric_delays = []
+        self.cull_info = []
+
         argument_init = False
         init_file_success = False
         if init_file is not None:
@@ -4694,11 +6324,11 @@ class InterferometerArray(object):
                     self.gradient_mode = None
                     self.gradient = {}
                     self.gaininfo = None
-                    for key in ['header', 'telescope_parms', 'spectral_info', 'simparms', 'antenna_element', 'timing', 'skyparms', 'array', 'layout', 'instrument', 'visibilities', 'gradients', 'gaininfo', 'blgroupinfo']:
+                    for key in ['header', 'telescope_parms', 'spectral_info', 'simparms', 'antenna_element', 'timing', 'skyparms', 'array', 'layout', 'instrument', 'visibilities', 'gradients', 'gaininfo', 'blgroupinfo', 'culling']:
                         try:
                             grp = fileobj[key]
                         except KeyError:
-                            if key in ['gradients', 'gaininfo']:
+                            if key in ['gradients', 'gaininfo', 'culling']:
                                 pass
                             elif key not in ['simparms', 'blgroupinfo']:
                                 raise KeyError('Key {0} not found in init_file'.format(key))
@@ -4745,724 +6375,1265 @@ class InterferometerArray(object):
                                 raise KeyError('Key "orientation" not found in init_file')
                             if 'groundplane' in grp:
                                 self.telescope['groundplane'] = grp['groundplane'].value
+                            if 'tabulated_kernels' in grp:
+                                self.telescope['tabulated_kernels'] = bool(grp['tabulated_kernels'].value)
+
+                        if key == 'simparms':
+                            if 'simfile' in grp:
+                                self.simparms_file = grp['simfile'].value
+                        if key == 'spectral_info':
+                            self.freq_resolution = grp['freq_resolution'].value
+                            self.channels = grp['freqs'].value
+                            if 'lags' in grp:
+                                self.lags = grp['lags'].value
+                            if 'bp' in grp:
+                                self.bp = grp['bp'].value
+                            else:
+                                raise KeyError('Key "bp" not found in init_file')
+                            if 'bp_wts' in grp:
+                                self.bp_wts = grp['bp_wts'].value
+                            else:
+                                self.bp_wts = NP.ones_like(self.bp)
+                            self.bp_wts = grp['bp_wts'].value
+                        if key == 'skyparms':
+                            if 'pointing_coords' in grp:
+                                self.pointing_coords = grp['pointing_coords'].value
+                            if 'phase_center_coords' in grp:
+                                self.phase_center_coords = grp['phase_center_coords'].value
+                            if 'skycoords' in grp:
+                                self.skycoords = grp['skycoords'].value
+                            self.lst = grp['LST'].value.tolist()
+                            self.pointing_center = grp['pointing_center'].value
+                            self.phase_center = grp['phase_center'].value
+                        if key == 'timing':
+                            if 'timestamps' in grp:
+                                self.timestamp = grp['timestamps'].value.tolist()
+                            else:
+                                raise KeyError('Key "timestamps" not found in init_file')
+                            if 't_acc' in grp:
+                                self.t_acc = grp['t_acc'].value.tolist()
+                                self.t_obs = grp['t_obs'].value
+                                self.n_acc = grp['n_acc'].value
+                            else:
+                                raise KeyError('Key "t_acc" not found in init_file')
+
+                        if key == 'instrument':
+                            if ('Trx' in grp) and ('Tant0' in grp) and ('f0' in grp) and ('spindex' in grp):
+                                for ti in xrange(grp['Trx'].value.size):
+                                    tsysinfo = {}
+                                    tsysinfo['Trx'] = grp['Trx'].value[ti]
+                                    tsysinfo['Tant'] = {'T0': grp['Tant0'].value[ti], 'f0': grp['f0'].value[ti], 'spindex': grp['spindex'].value[ti]}
+                                    tsysinfo['Tnet'] = None
+                                    self.Tsysinfo += [tsysinfo]
+                            if 'Tsys' in grp:
+                                self.Tsys = grp['Tsys'].value
+                            else:
+                                raise KeyError('Key "Tsys" not found in init_file')
+                            if 'effective_area' in grp:
+                                self.A_eff = grp['effective_area'].value
+                            else:
+                                raise KeyError('Key "effective_area" not found in init_file')
+                            if 'efficiency' in grp:
+                                self.eff_Q = grp['efficiency'].value
+                            else:
+                                raise KeyError('Key "effeciency" not found in init_file')
+
+                        if key == 'array':
+                            if 'labels' in grp:
+                                self.labels = grp['labels'].value
+                            else:
+                                self.labels = ['B{0:0d}'.format(i+1) for i in range(self.baseline_lengths.size)]
+                            if 'baselines' in grp:
+                                self.baselines = grp['baselines'].value
+                                self.baseline_lengths = NP.sqrt(NP.sum(self.baselines**2, axis=1))
+                            else:
+                                raise KeyError('Key "baselines" not found in init_file')
+                            if 'baseline_coords' in grp:
+                                self.baseline_coords = grp['baseline_coords'].value
+                            else:
+                                self.baseline_coords = 'localenu'
+                            if 'projected_baselines' in grp:
+                                self.projected_baselines = grp['projected_baselines'].value
+
+                        if key == 'visibilities':
+                            if 'freq_spectrum' in grp:
+                                subgrp = grp['freq_spectrum']
+                                if 'rms' in subgrp:
+                                    self.vis_rms_freq = subgrp['rms'].value
+                                else:
+                                    self.vis_rms_freq = None
+                                    # raise KeyError('Key "rms" not found in init_file')
+                                if 'vis' in subgrp:
+                                    self.vis_freq = subgrp['vis'].value
+                                else:
+                                    self.vis_freq = None
+                                if 'skyvis' in subgrp:
+                                    self.skyvis_freq = subgrp['skyvis'].value
+                                else:
+                                    raise KeyError('Key "skyvis" not found in init_file')
+                                if 'noise' in subgrp:
+                                    self.vis_noise_freq = subgrp['noise'].value
+                                else:
+                                    self.vis_noise_freq = None
+                            else:
+                                raise KeyError('Key "freq_spectrum" not found in init_file')
+                            if 'delay_spectrum' in grp:
+                                subgrp = grp['delay_spectrum']
+                                if 'vis' in subgrp:
+                                    self.vis_lag = subgrp['vis'].value
+                                if 'skyvis' in subgrp:
+                                    self.skyvis_lag = subgrp['skyvis'].value
+                                if 'noise' in subgrp:
+                                    self.vis_noise_lag = subgrp['noise'].value
+
+                        if key == 'gradients':
+                            if key in fileobj:
+                                for gradkey in grp:
+                                    self.gradient_mode = gradkey
+                                    self.gradient[gradkey] = grp[gradkey].value
+
+                        if key == 'gaininfo':
+                            if key in fileobj:
+                                self.gaininfo = GainInfo(init_file=grp['gainsfile'].value)
+
+                        if key == 'culling':
+                            if key in fileobj:
+                                self.cull_info = _cull_info_from_table(grp['nsrc'].value, grp['ncull'].value, grp['error_bound'].value)
+
+                        if key == 'blgroupinfo':
+                            if key in fileobj:
+                                self.blgroups = {}
+                                self.bl_reversemap = {}
+                                for blkey in grp['groups']:
+                                    self.blgroups[ast.literal_eval(blkey)] = grp['groups'][blkey].value
+                                for blkey in grp['reversemap']:
+                                    self.bl_reversemap[ast.literal_eval(blkey)] = grp['reversemap'][blkey].value
+                                    
+
+            except IOError: # Check if a FITS file is available
+                try:
+                    hdulist = fits.open(init_file+'.fits')
+                except IOError:
+                    argument_init = True
+                    print '\tinit_file provided but could not open the initialization file. Attempting to initialize with input parameters...'
+
+                extnames = [hdulist[i].header['EXTNAME'] for i in xrange(1,len(hdulist))]
+
+                self.simparms_file = None
+                if 'simparms' in hdulist[0].header:
+                    if isinstance(hdulist[0].header['simparms'], str):
+                        self.simparms_file = hdulist[0].header['simparms']
+                    else:
+                        warnings.warn('\tInvalid specification found in header for simulation parameters file. Proceeding with None as default.')
+
+                try:
+                    self.gradient_mode = hdulist[0].header['gradient_mode']
+                except KeyError:
+                    self.gradient_mode = None
+                    self.gradient = {}
+
+                try:
+                    self.freq_resolution = hdulist[0].header['freq_resolution']
+                except KeyError:
+                    hdulist.close()
+                    raise KeyError('Keyword "freq_resolution" not found in header.')
+
+                try:
+                    self.latitude = hdulist[0].header['latitude']
+                except KeyError:
+                    print '\tKeyword "latitude" not found in header. Assuming 34.0790 degrees for attribute latitude.'
+                    self.latitude = 34.0790
+
+                try:
+                    self.longitude = hdulist[0].header['longitude']
+                except KeyError:
+                    print '\tKeyword "longitude" not found in header. Assuming 0.0 degrees for attribute longitude.'
+                    self.longitude = 0.0
+
+                try:
+                    self.altitude = hdulist[0].header['altitude']
+                except KeyError:
+                    print '\tKeyword "altitude" not found in header. Assuming 0m for attribute altitude.'
+                    self.altitude = 0.0
+                self.telescope = {}
+                if 'telescope' in hdulist[0].header:
+                    self.telescope['id'] = hdulist[0].header['telescope']
+
+                try:
+                    self.telescope['shape'] = hdulist[0].header['element_shape']
+                except KeyError:
+                    print '\tKeyword "element_shape" not found in header. Assuming "delta" for attribute antenna element shape.'
+                    self.telescope['shape'] = 'delta'
+
+                try:
+                    self.telescope['size'] = hdulist[0].header['element_size']
+                except KeyError:
+                    print '\tKeyword "element_size" not found in header. Assuming 25.0m for attribute antenna element size.'
+                    self.telescope['size'] = 1.0
+
+                try:
+                    self.telescope['ocoords'] = hdulist[0].header['element_ocoords']
+                except KeyError:
+                    raise KeyError('\tKeyword "element_ocoords" not found in header. No defaults.')
+
+                try:
+                    self.telescope['groundplane'] = hdulist[0].header['groundplane']
+                except KeyError:
+                    self.telescope['groundplane'] = None
+
+                if 'tabulated_kernels' in hdulist[0].header:
+                    self.telescope['tabulated_kernels'] = hdulist[0].header['tabulated_kernels']
+
+                if 'ANTENNA ELEMENT ORIENTATION' not in extnames:
+                    raise KeyError('No extension found containing information on element orientation.')
+                else:
+                    self.telescope['orientation'] = hdulist['ANTENNA ELEMENT ORIENTATION'].data.reshape(1,-1)
+
+                try:
+                    self.baseline_coords = hdulist[0].header['baseline_coords']
+                except KeyError:
+                    print '\tKeyword "baseline_coords" not found in header. Assuming "localenu" for attribute baseline_coords.'
+                    self.baseline_coords = 'localenu'
+
+                try:
+                    self.pointing_coords = hdulist[0].header['pointing_coords']
+                except KeyError:
+                    print '\tKeyword "pointing_coords" not found in header. Assuming "hadec" for attribute pointing_coords.'
+                    self.pointing_coords = 'hadec'
+
+                try:
+                    self.phase_center_coords = hdulist[0].header['phase_center_coords']
+                except KeyError:
+                    print '\tKeyword "phase_center_coords" not found in header. Assuming "hadec" for attribute phase_center_coords.'
+                    self.phase_center_coords = 'hadec'
+
+                try:
+                    self.skycoords = hdulist[0].header['skycoords']
+                except KeyError:
+                    print '\tKeyword "skycoords" not found in header. Assuming "radec" for attribute skycoords.'
+                    self.skycoords = 'radec'
+
+                try:
+                    self.flux_unit = hdulist[0].header['flux_unit']
+                except KeyError:
+                    print '\tKeyword "flux_unit" not found in header. Assuming "jy" for attribute flux_unit.'
+                    self.flux_unit = 'JY'
+
+                if 'POINTING AND PHASE CENTER INFO' not in extnames:
+                    raise KeyError('No extension table found containing pointing information.')
+                else:
+                    self.lst = hdulist['POINTING AND PHASE CENTER INFO'].data['LST'].tolist()
+                    self.pointing_center = NP.hstack((hdulist['POINTING AND PHASE CENTER INFO'].data['pointing_longitude'].reshape(-1,1), hdulist['POINTING AND PHASE CENTER INFO'].data['pointing_latitude'].reshape(-1,1)))
+                    self.phase_center = NP.hstack((hdulist['POINTING AND PHASE CENTER INFO'].data['phase_center_longitude'].reshape(-1,1), hdulist['POINTING AND PHASE CENTER INFO'].data['phase_center_latitude'].reshape(-1,1)))
+
+                if 'TIMESTAMPS' in extnames:
+                    self.timestamp = hdulist['TIMESTAMPS'].data['timestamps'].tolist()
+                else:
+                    raise KeyError('Extension named "TIMESTAMPS" not found in init_file.')
+
+                self.Tsysinfo = []
+                if 'TSYSINFO' in extnames:
+                    self.Tsysinfo = [{'Trx': elem['Trx'], 'Tant': {'T0': elem['Tant0'], 'f0': elem['f0'], 'spindex': elem['spindex']}, 'Tnet': None} for elem in hdulist['TSYSINFO'].data]
 
-                        if key == 'simparms':
-                            if 'simfile' in grp:
-                                self.simparms_file = grp['simfile'].value
-                        if key == 'spectral_info':
-                            self.freq_resolution = grp['freq_resolution'].value
-                            self.channels = grp['freqs'].value
-                            if 'lags' in grp:
-                                self.lags = grp['lags'].value
-                            if 'bp' in grp:
-                                self.bp = grp['bp'].value
-                            else:
-                                raise KeyError('Key "bp" not found in init_file')
-                            if 'bp_wts' in grp:
-                                self.bp_wts = grp['bp_wts'].value
-                            else:
-                                self.bp_wts = NP.ones_like(self.bp)
-                            self.bp_wts = grp['bp_wts'].value
-                        if key == 'skyparms':
-                            if 'pointing_coords' in grp:
-                                self.pointing_coords = grp['pointing_coords'].value
-                            if 'phase_center_coords' in grp:
-                                self.phase_center_coords = grp['phase_center_coords'].value
-                            if 'skycoords' in grp:
-                                self.skycoords = grp['skycoords'].value
-                            self.lst = grp['LST'].value
-                            self.pointing_center = grp['pointing_center'].value
-                            self.phase_center = grp['phase_center'].value
-                        if key == 'timing':
-                            if 'timestamps' in grp:
-                                self.timestamp = grp['timestamps'].value.tolist()
-                            else:
-                                raise KeyError('Key "timestamps" not found in init_file')
-                            if 't_acc' in grp:
-                                self.t_acc = grp['t_acc'].value.tolist()
-                                self.t_obs = grp['t_obs'].value
-                                self.n_acc = grp['n_acc'].value
-                            else:
-                                raise KeyError('Key "t_acc" not found in init_file')
+                if 'CULLING' in extnames:
+                    self.cull_info = _cull_info_from_table(hdulist['CULLING'].data['nsrc'], hdulist['CULLING'].data['ncull'], hdulist['CULLING'].data['error_bound'])
 
-                        if key == 'instrument':
-                            if ('Trx' in grp) and ('Tant' in grp) and ('spindex' in grp) and ('Tnet' in grp):
-                                for ti in xrange(grp['Trx'].value.size):
-                                    tsysinfo = {}
-                                    tsysinfo['Trx'] = grp['Trx'].value[ti]
-                                    tsysinfo['Tant'] = {'Tant0': grp['Tant0'].value[ti], 'f0': grp['f0'].value[ti], 'spindex': grp['spindex'].value[ti]}
-                                    tsysinfo['Tnet'] = None
-                                    self.Tsysinfo += [tsysinfo]
-                            if 'Tsys' in grp:
-                                self.Tsys = grp['Tsys'].value
-                            else:
-                                raise KeyError('Key "Tsys" not found in init_file')
-                            if 'effective_area' in grp:
-                                self.A_eff = grp['effective_area'].value
-                            else:
-                                raise KeyError('Key "effective_area" not found in init_file')
-                            if 'efficiency' in grp:
-                                self.eff_Q = grp['efficiency'].value
-                            else:
-                                raise KeyError('Key "effeciency" not found in init_file')
+                if 'TSYS' in extnames:
+                    self.Tsys = hdulist['Tsys'].data
+                else:
+                    raise KeyError('Extension named "Tsys" not found in init_file.')
 
-                        if key == 'array':
-                            if 'labels' in grp:
-                                self.labels = grp['labels'].value
-                            else:
-                                self.labels = ['B{0:0d}'.format(i+1) for i in range(self.baseline_lengths.size)]
-                            if 'baselines' in grp:
-                                self.baselines = grp['baselines'].value
-                                self.baseline_lengths = NP.sqrt(NP.sum(self.baselines**2, axis=1))
-                            else:
-                                raise KeyError('Key "baselines" not found in init_file')
-                            if 'baseline_coords' in grp:
-                                self.baseline_coords = grp['baseline_coords'].value
-                            else:
-                                self.baseline_coords = 'localenu'
-                            if 'projected_baselines' in grp:
-                                self.projected_baselines = grp['projected_baselines'].value
+                if 'BASELINES' in extnames:
+                    self.baselines = hdulist['BASELINES'].data.reshape(-1,3)
+                    self.baseline_lengths = NP.sqrt(NP.sum(self.baselines**2, axis=1))
+                else:
+                    raise KeyError('Extension named "BASELINES" not found in init_file.')
 
-                        if key == 'visibilities':
-                            if 'freq_spectrum' in grp:
-                                subgrp = grp['freq_spectrum']
-                                if 'rms' in subgrp:
-                                    self.vis_rms_freq = subgrp['rms'].value
-                                else:
-                                    self.vis_rms_freq = None
-                                    # raise KeyError('Key "rms" not found in init_file')
-                                if 'vis' in subgrp:
-                                    self.vis_freq = subgrp['vis'].value
-                                else:
-                                    self.vis_freq = None
-                                if 'skyvis' in subgrp:
-                                    self.skyvis_freq = subgrp['skyvis'].value
-                                else:
-                                    raise KeyError('Key "skyvis" not found in init_file')
-                                if 'noise' in subgrp:
-                                    self.vis_noise_freq = subgrp['noise'].value
-                                else:
-                                    self.vis_noise_freq = None
-                            else:
-                                raise KeyError('Key "freq_spectrum" not found in init_file')
-                            if 'delay_spectrum' in grp:
-                                subgrp = grp['delay_spectrum']
-                                if 'vis' in subgrp:
-                                    self.vis_lag = subgrp['vis'].value
-                                if 'skyvis' in subgrp:
-                                    self.skyvis_lag = subgrp['skyvis'].value
-                                if 'noise' in subgrp:
-                                    self.vis_noise_lag = subgrp['noise'].value
+                if 'PROJ_BASELINES' in extnames:
+                    self.projected_baselines = hdulist['PROJ_BASELINES'].data
 
-                        if key == 'gradients':
-                            if key in fileobj:
-                                for gradkey in grp:
-                                    self.gradient_mode = gradkey
-                                    self.gradient[gradkey] = grp[gradkey].value
+                if 'LABELS' in extnames:
+                    # self.labels = hdulist['LABELS'].data.tolist()
+                    a1 = hdulist['LABELS'].data['A1']
+                    a2 = hdulist['LABELS'].data['A2']
+                    self.labels = zip(a2,a1)
+                else:
+                    self.labels = ['B{0:0d}'.format(i+1) for i in range(self.baseline_lengths.size)]
 
-                        if key == 'gaininfo':
-                            if key in fileobj:
-                                self.gaininfo = GainInfo(init_file=grp['gainsfile'].value)
+                self.layout = {}
+                if 'LAYOUT' in extnames:
+                    for key in ['positions', 'ids', 'labels']:
+                        self.layout[key] = hdulist['LAYOUT'].data[key]
+                    self.layout['coords'] = hdulist['LAYOUT'].header['COORDS']
 
-                        if key == 'blgroupinfo':
-                            if key in fileobj:
-                                self.blgroups = {}
-                                self.bl_reversemap = {}
-                                for blkey in grp['groups']:
-                                    self.blgroups[ast.literal_eval(blkey)] = grp['groups'][blkey].value
-                                for blkey in grp['reversemap']:
-                                    self.bl_reversemap[ast.literal_eval(blkey)] = grp['reversemap'][blkey].value
-                                    
+                if 'EFFECTIVE AREA' in extnames:
+                    self.A_eff = hdulist['EFFECTIVE AREA'].data
+                else:
+                    raise KeyError('Extension named "EFFECTIVE AREA" not found in init_file.')
+
+                if 'INTERFEROMETER EFFICIENCY' in extnames:
+                    self.eff_Q = hdulist['INTERFEROMETER EFFICIENCY'].data
+                else:
+                    raise KeyError('Extension named "INTERFEROMETER EFFICIENCY" not found in init_file.')
+
+                if 'SPECTRAL INFO' not in extnames:
+                    raise KeyError('No extension table found containing spectral information.')
+                else:
+                    self.channels = hdulist['SPECTRAL INFO'].data['frequency']
+                    try:
+                        self.lags = hdulist['SPECTRAL INFO'].data['lag']
+                    except KeyError:
+                        self.lags = None
+
+                if 'BANDPASS' in extnames:
+                    self.bp = hdulist['BANDPASS'].data
+                else:
+                    raise KeyError('Extension named "BANDPASS" not found in init_file.')
+
+                if 'BANDPASS_WEIGHTS' in extnames:
+                    self.bp_wts = hdulist['BANDPASS_WEIGHTS'].data
+                else:
+                    self.bp_wts = NP.ones_like(self.bp)
+
+                if 'T_ACC' in extnames:
+                    self.t_acc = hdulist['t_acc'].data.tolist()
+                    self.n_acc = len(self.t_acc)
+                    self.t_obs = sum(self.t_acc)
+                else:
+                    raise KeyError('Extension named "T_ACC" not found in init_file.')
+
+                if 'FREQ_CHANNEL_NOISE_RMS_VISIBILITY' in extnames:
+                    self.vis_rms_freq = hdulist['freq_channel_noise_rms_visibility'].data
+                else:
+                    self.vis_rms_freq = None
+
+                if 'REAL_FREQ_OBS_VISIBILITY' in extnames:
+                    self.vis_freq = hdulist['real_freq_obs_visibility'].data
+                    if 'IMAG_FREQ_OBS_VISIBILITY' in extnames:
+                        self.vis_freq = self.vis_freq.astype(NP.complex128)
+                        self.vis_freq += 1j * hdulist['imag_freq_obs_visibility'].data
+                else:
+                    self.vis_freq = None
+
+                if 'REAL_FREQ_SKY_VISIBILITY' in extnames:
+                    self.skyvis_freq = hdulist['real_freq_sky_visibility'].data
+                    if 'IMAG_FREQ_SKY_VISIBILITY' in extnames:
+                        self.skyvis_freq = self.skyvis_freq.astype(NP.complex128)
+                        self.skyvis_freq += 1j * hdulist['imag_freq_sky_visibility'].data
+                else:
+                    raise KeyError('Extension named "REAL_FREQ_SKY_VISIBILITY" not found in init_file.')
+
+                if 'REAL_FREQ_NOISE_VISIBILITY' in extnames:
+                    self.vis_noise_freq = hdulist['real_freq_noise_visibility'].data
+                    if 'IMAG_FREQ_NOISE_VISIBILITY' in extnames:
+                        self.vis_noise_freq = self.vis_noise_freq.astype(NP.complex128)
+                        self.vis_noise_freq += 1j * hdulist['imag_freq_noise_visibility'].data
+                else:
+                    self.vis_noise_freq = None
+
+                if self.gradient_mode is not None:
+                    self.gradient = {}
+                    if 'real_freq_sky_visibility_gradient_wrt_{0}'.format(self.gradient_mode) in extnames:
+                        self.gradient[self.gradient_mode] = hdulist['real_freq_sky_visibility_gradient_wrt_{0}'.format(self.gradient_mode)].data
+                        if 'imag_freq_sky_visibility_gradient_wrt_{0}'.format(self.gradient_mode) in extnames:
+                            self.gradient[self.gradient_mode] = self.gradient[self.gradient_mode].astype(NP.complex128)
+                            self.gradient[self.gradient_mode] += 1j * hdulist['imag_freq_sky_visibility_gradient_wrt_{0}'.format(self.gradient_mode)].data
 
-            except IOError: # Check if a FITS file is available
                 try:
-                    hdulist = fits.open(init_file+'.fits')
-                except IOError:
-                    argument_init = True
-                    print '\tinit_file provided but could not open the initialization file. Attempting to initialize with input parameters...'
+                    gainsfile = hdulist[0].header['gainsfile']
+                except KeyError:
+                    print '\tKeyword "gainsfile" not found in header. Assuming default unity gains.'
+                    self.gaininfo = None
+                else:
+                    self.gaininfo = GainInfo(init_file=gainsfile, axes_order=['label', 'frequency', 'time'])
+
+                if 'REAL_LAG_VISIBILITY' in extnames:
+                    self.vis_lag = hdulist['real_lag_visibility'].data
+                    if 'IMAG_LAG_VISIBILITY' in extnames:
+                        self.vis_lag = self.vis_lag.astype(NP.complex128)
+                        self.vis_lag += 1j * hdulist['imag_lag_visibility'].data
+                else:
+                    self.vis_lag = None
+
+                if 'REAL_LAG_SKY_VISIBILITY' in extnames:
+                    self.skyvis_lag = hdulist['real_lag_sky_visibility'].data
+                    if 'IMAG_LAG_SKY_VISIBILITY' in extnames:
+                        self.skyvis_lag = self.skyvis_lag.astype(NP.complex128)
+                        self.skyvis_lag += 1j * hdulist['imag_lag_sky_visibility'].data
+                else:
+                    self.skyvis_lag = None
+
+                if 'REAL_LAG_NOISE_VISIBILITY' in extnames:
+                    self.vis_noise_lag = hdulist['real_lag_noise_visibility'].data
+                    if 'IMAG_LAG_NOISE_VISIBILITY' in extnames:
+                        self.vis_noise_lag = self.vis_noise_lag.astype(NP.complex128)
+                        self.vis_noise_lag += 1j * hdulist['imag_lag_noise_visibility'].data
+                else:
+                    self.vis_noise_lag = None
+
+                hdulist.close()
+            if not self.cull_info:
+                self.cull_info = [None] * len(self.timestamp) # Sources were not culled in the snapshots read from init_file
+            if self.time_major:
+                self._time_major_layout()
+            init_file_success = True
+            return
+        else:
+            argument_init = True
+
+        if (not argument_init) and (not init_file_success):
+            raise ValueError('Initialization failed with the use of init_file.')
 
-                extnames = [hdulist[i].header['EXTNAME'] for i in xrange(1,len(hdulist))]
+        self.baselines = NP.asarray(baselines)
+        if len(self.baselines.shape) == 1:
+            if self.baselines.size == 2:
+                self.baselines = NP.hstack((self.baselines.reshape(1,-1), NP.zeros(1)))
+            elif self.baselines.size == 3:
+                self.baselines = self.baselines.reshape(1,-1)
+            else:
+                raise ValueError('Baseline(s) must be a 2- or 3-column array.')
+        elif len(self.baselines.shape) == 2:
+            if self.baselines.shape[1] == 2:
+                self.baselines = NP.hstack((self.baselines, NP.zeros(self.baselines.shape[0]).reshape(-1,1)))
+            elif self.baselines.shape[1] != 3:
+                raise ValueError('Baseline(s) must be a 2- or 3-column array')
+        else:
+            raise ValueError('Baseline(s) array contains more than 2 dimensions.')
 
-                self.simparms_file = None
-                if 'simparms' in hdulist[0].header:
-                    if isinstance(hdulist[0].header['simparms'], str):
-                        self.simparms_file = hdulist[0].header['simparms']
-                    else:
-                        warnings.warn('\tInvalid specification found in header for simulation parameters file. Proceeding with None as default.')
+        self.baseline_lengths = NP.sqrt(NP.sum(self.baselines**2, axis=1))
+        self.baseline_orientations = NP.angle(self.baselines[:,0] + 1j * self.baselines[:,1])
+        self.projected_baselines = None
 
-                try:
-                    self.gradient_mode = hdulist[0].header['gradient_mode']
-                except KeyError:
-                    self.gradient_mode = None
-                    self.gradient = {}
+        if not isinstance(labels, (list, tuple)):
+            raise TypeError('Interferometer array labels must be a list or tuple of unique identifiers')
+        elif len(labels) != self.baselines.shape[0]:
+            raise ValueError('Number of labels do not match the number of baselines specified.')
+        else:
+            self.labels = labels
 
-                try:
-                    self.freq_resolution = hdulist[0].header['freq_resolution']
-                except KeyError:
-                    hdulist.close()
-                    raise KeyError('Keyword "freq_resolution" not found in header.')
+        self.simparms_file = None
+        if isinstance(simparms_file, str):
+            self.simparms_file = simparms_file
+        else:
+            warnings.warn('\tInvalid specification found in header for simulation parameters file. Proceeding with None as default.')
 
-                try:
-                    self.latitude = hdulist[0].header['latitude']
-                except KeyError:
-                    print '\tKeyword "latitude" not found in header. Assuming 34.0790 degrees for attribute latitude.'
-                    self.latitude = 34.0790
+        if isinstance(telescope, dict):
+            self.telescope = telescope
+        else:
+            self.telescope = {}
+            self.telescope['id'] = 'vla'
+            self.telescope['shape'] = 'dish'
+            self.telescope['size'] = 25.0
+            self.telescope['ocoords'] = 'altaz'
+            self.telescope['orientation'] = NP.asarray([90.0, 270.0]).reshape(1,-1)
+            self.telescope['groundplane'] = None
 
-                try:
-                    self.longitude = hdulist[0].header['longitude']
-                except KeyError:
-                    print '\tKeyword "longitude" not found in header. Assuming 0.0 degrees for attribute longitude.'
-                    self.longitude = 0.0
+        self.layout = {}
+        if isinstance(layout, dict):
+            if 'positions' in layout:
+                if isinstance(layout['positions'], NP.ndarray):
+                    if layout['positions'].ndim == 2:
+                        if (layout['positions'].shape[1] == 2) or (layout['positions'].shape[1] == 3):
+                            if layout['positions'].shape[1] == 2:
+                                layout['positions'] = NP.hstack((layout['positions'], NP.zeros(layout['positions'].shape[0]).reshape(-1,1)))
+                            self.layout['positions'] = layout['positions']
+                        else:
+                            raise ValueError('Incompatible shape in array layout')
+                    else:
+                        raise ValueError('Incompatible shape in array layout')
+                else:
+                    raise TypeError('Array layout positions must be a numpy array')
+            else:
+                raise KeyError('Array layout positions missing')
+            if 'coords' in layout:
+                if isinstance(layout['coords'], str):
+                    self.layout['coords'] = layout['coords']
+                else:
+                    raise TypeError('Array layout coordinates must be a string')
+            else:
+                raise KeyError('Array layout coordinates missing')
+            if 'labels' in layout:
+                if isinstance(layout['labels'], (list,NP.ndarray)):
+                    self.layout['labels'] = layout['labels']
+                else:
+                    raise TypeError('Array antenna labels must be a list or numpy array')
+            else:
+                raise KeyError('Array antenna labels missing')
+            if 'ids' in layout:
+                if isinstance(layout['ids'], (list,NP.ndarray)):
+                    self.layout['ids'] = layout['ids']
+                else:
+                    raise TypeError('Array antenna ids must be a list or numpy array')
+            else:
+                raise KeyError('Array antenna ids missing')
+            if (layout['positions'].shape[0] != layout['labels'].size) or (layout['ids'].size != layout['labels'].size):
+                raise ValueError('Antenna layout positions, labels and IDs must all be for same number of antennas')
 
-                try:
-                    self.altitude = hdulist[0].header['altitude']
-                except KeyError:
-                    print '\tKeyword "altitude" not found in header. Assuming 0m for attribute altitude.'
-                    self.altitude = 0.0
-                self.telescope = {}
-                if 'telescope' in hdulist[0].header:
-                    self.telescope['id'] = hdulist[0].header['telescope']
+        self.blgroups = None
+        self.bl_reversemap = None
+        if blgroupinfo is not None:
+            if not isinstance(blgroupinfo, dict):
+                raise TypeError('Input blgroupinfo must be a dictionary')
+            self.blgroups = blgroupinfo['groups']
+            self.bl_reversemap = blgroupinfo['reversemap']
 
-                try:
-                    self.telescope['shape'] = hdulist[0].header['element_shape']
-                except KeyError:
-                    print '\tKeyword "element_shape" not found in header. Assuming "delta" for attribute antenna element shape.'
-                    self.telescope['shape'] = 'delta'
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.vis_freq = None
+        self.skyvis_freq = None
+        self.vis_noise_freq = None
+        self.gradient_mode = None
+        self.gradient = {}
+        self.gaininfo = None
+        if gaininfo is not None:
+            if not isinstance(gaininfo, GainInfo):
+                raise TypeError('Input gaininfo must be an instance of class GainInfo')
+            self.gaininfo = gaininfo
 
-                try:
-                    self.telescope['size'] = hdulist[0].header['element_size']
-                except KeyError:
-                    print '\tKeyword "element_size" not found in header. Assuming 25.0m for attribute antenna element size.'
-                    self.telescope['size'] = 1.0
+        if (freq_scale is None) or (freq_scale == 'Hz') or (freq_scale == 'hz'):
+            self.channels = NP.asarray(channels)
+        elif freq_scale == 'GHz' or freq_scale == 'ghz':
+            self.channels = NP.asarray(channels) * 1.0e9
+        elif freq_scale == 'MHz' or freq_scale == 'mhz':
+            self.channels = NP.asarray(channels) * 1.0e6
+        elif freq_scale == 'kHz' or freq_scale == 'khz':
+            self.channels = NP.asarray(channels) * 1.0e3
+        else:
+            raise ValueError('Frequency units must be "GHz", "MHz", "kHz" or "Hz". If not set, it defaults to "Hz"')
 
-                try:
-                    self.telescope['ocoords'] = hdulist[0].header['element_ocoords']
-                except KeyError:
-                    raise KeyError('\tKeyword "element_ocoords" not found in header. No defaults.')
+        self.bp = NP.ones((self.baselines.shape[0],self.channels.size)) # Inherent bandpass shape
+        self.bp_wts = NP.ones((self.baselines.shape[0],self.channels.size)) # Additional bandpass weights
+        self.lag_kernel = DSP.FT1D(self.bp*self.bp_wts, ax=1, inverse=True, use_real=False, shift=True)
 
-                try:
-                    self.telescope['groundplane'] = hdulist[0].header['groundplane']
-                except KeyError:
-                    self.telescope['groundplane'] = None
+        self.Tsys = NP.zeros((self.baselines.shape[0],self.channels.size))
+        self.Tsysinfo = []
 
-                if 'ANTENNA ELEMENT ORIENTATION' not in extnames:
-                    raise KeyError('No extension found containing information on element orientation.')
-                else:
-                    self.telescope['orientation'] = hdulist['ANTENNA ELEMENT ORIENTATION'].data.reshape(1,-1)
+        self.flux_unit = 'JY'
+        self.timestamp = []
+        self.t_acc = []
+        self.t_obs = 0.0
+        self.n_acc = 0
+        self.pointing_center = NP.empty([1,2])
+        self.phase_center = NP.empty([1,2])
+        self.lst = []
 
-                try:
-                    self.baseline_coords = hdulist[0].header['baseline_coords']
-                except KeyError:
-                    print '\tKeyword "baseline_coords" not found in header. Assuming "localenu" for attribute baseline_coords.'
-                    self.baseline_coords = 'localenu'
+        if isinstance(eff_Q, (int, float)):
+            if (eff_Q >= 0.0) or (eff_Q <= 1.0):
+                self.eff_Q = eff_Q * NP.ones((self.baselines.shape[0], self.channels.size))
+            else:
+                raise ValueError('Efficiency value of interferometer is invalid.')
+        elif isinstance(eff_Q, (list, tuple, NP.ndarray)):
+            eff_Q = NP.asarray(eff_Q)
+            if (NP.any(eff_Q < 0.0)) or (NP.any(eff_Q > 1.0)):
+                raise ValueError('One or more values of eff_Q found to be outside the range [0,1].')
+            if eff_Q.size == self.baselines.shape[0]:
+                self.eff_Q = NP.repeat(eff_Q.reshape(-1,1), self.channels.size, axis=1)
+            elif eff_Q.size == self.channels.size:
+                self.eff_Q = NP.repeat(eff_Q.reshape(1,-1), self.channels.size, axis=0)
+            elif eff_Q.size == self.baselines.shape[0]*self.channels.size:
+                self.eff_Q = eff_Q.reshape(-1,self.channels.size)
+            else:
+                raise ValueError('Efficiency values of interferometers incompatible with the number of interferometers and/or frequency channels.')
+        else:
+            raise TypeError('Efficiency values of interferometers must be provided as a scalar, list, tuple or numpy array.')
 
-                try:
-                    self.pointing_coords = hdulist[0].header['pointing_coords']
-                except KeyError:
-                    print '\tKeyword "pointing_coords" not found in header. Assuming "hadec" for attribute pointing_coords.'
-                    self.pointing_coords = 'hadec'
+        if isinstance(A_eff, (int, float)):
+            if A_eff >= 0.0:
+                self.A_eff = A_eff * NP.ones((self.baselines.shape[0], self.channels.size))
+            else:
+                raise ValueError('Negative value for effective area is invalid.')
+        elif isinstance(A_eff, (list, tuple, NP.ndarray)):
+            A_eff = NP.asarray(A_eff)
+            if NP.any(A_eff < 0.0):
+                raise ValueError('One or more values of A_eff found to be negative.')
+            if A_eff.size == self.baselines.shape[0]:
+                self.A_eff = NP.repeat(A_eff.reshape(-1,1), self.channels.size, axis=1)
+            elif A_eff.size == self.channels.size:
+                self.A_eff = NP.repeat(A_eff.reshape(1,-1), self.channels.size, axis=0)
+            elif A_eff.size == self.baselines.shape[0]*self.channels.size:
+                self.A_eff = A_eff.reshape(-1,self.channels.size)
+            else:
+                raise ValueError('Effective area(s) of interferometers incompatible with the number of interferometers and/or frequency channels.')
+        else:
+            raise TypeError('Effective area(s) of interferometers must be provided as a scalar, list, tuple or numpy array.')
 
-                try:
-                    self.phase_center_coords = hdulist[0].header['phase_center_coords']
-                except KeyError:
-                    print '\tKeyword "phase_center_coords" not found in header. Assuming "hadec" for attribute phase_center_coords.'
-                    self.phase_center_coords = 'hadec'
+        self.vis_rms_freq = None
+        self.freq_resolution = self.channels[1] - self.channels[0]
+        self.baseline_coords = baseline_coords
+        self.lags = None
+        self.skyvis_lag = None
+        self.vis_noise_lag = None
+        self.vis_lag = None
 
-                try:
-                    self.skycoords = hdulist[0].header['skycoords']
-                except KeyError:
-                    print '\tKeyword "skycoords" not found in header. Assuming "radec" for attribute skycoords.'
-                    self.skycoords = 'radec'
+        if (pointing_coords == 'radec') or (pointing_coords == 'hadec') or (pointing_coords == 'altaz'):
+            self.pointing_coords = pointing_coords
+            self.phase_center_coords = pointing_coords
+        else:
+            raise ValueError('Pointing center of the interferometer must be "radec", "hadec" or "altaz". Check inputs.')
+
+        if (skycoords == 'radec') or (skycoords == 'hadec') or (skycoords == 'altaz'):
+            self.skycoords = skycoords
+        else:
+            raise ValueError('Sky coordinates must be "radec", "hadec" or "altaz". Check inputs.')
 
-                try:
-                    self.flux_unit = hdulist[0].header['flux_unit']
-                except KeyError:
-                    print '\tKeyword "flux_unit" not found in header. Assuming "jy" for attribute flux_unit.'
-                    self.flux_unit = 'JY'
+        if (baseline_coords == 'equatorial') or (baseline_coords == 'localenu'):
+            self.baseline_coords = baseline_coords
+        else:
+            raise ValueError('Baseline coordinates must be "equatorial" or "local". Check inputs.')
 
-                if 'POINTING AND PHASE CENTER INFO' not in extnames:
-                    raise KeyError('No extension table found containing pointing information.')
-                else:
-                    self.lst = hdulist['POINTING AND PHASE CENTER INFO'].data['LST'].tolist()
-                    self.pointing_center = NP.hstack((hdulist['POINTING AND PHASE CENTER INFO'].data['pointing_longitude'].reshape(-1,1), hdulist['POINTING AND PHASE CENTER INFO'].data['pointing_latitude'].reshape(-1,1)))
-                    self.phase_center = NP.hstack((hdulist['POINTING AND PHASE CENTER INFO'].data['phase_center_longitude'].reshape(-1,1), hdulist['POINTING AND PHASE CENTER INFO'].data['phase_center_latitude'].reshape(-1,1)))
+        if simulate_unique:
+            if self.blgroups is None:
+                raise ValueError('Input blgroupinfo must be provided to simulate only unique baselines')
+            self.deduplicate_measurements()
 
-                if 'TIMESTAMPS' in extnames:
-                    self.timestamp = hdulist['TIMESTAMPS'].data['timestamps'].tolist()
-                else:
-                    raise KeyError('Extension named "TIMESTAMPS" not found in init_file.')
+    #############################################################################
 
-                self.Tsysinfo = []
-                if 'TSYSINFO' in extnames:
-                    self.Tsysinfo = [{'Trx': elem['Trx'], 'Tant': {'T0': elem['Tant0'], 'f0': elem['f0'], 'spindex': elem['spindex']}, 'Tnet': None} for elem in hdulist['TSYSINFO'].data]
+    def _time_major_layout(self, attributes=None):
 
-                if 'TSYS' in extnames:
-                    self.Tsys = hdulist['Tsys'].data
-                else:
-                    raise KeyError('Extension named "Tsys" not found in init_file.')
+        """
+        -------------------------------------------------------------------------
+        !!! FOR INTERNAL USE ONLY !!!
+        Lays out the specified attributes in memory with the time axis first
+        and replaces them with views of that memory in the usual axis order.
+        The buffers are registered so that subsequent snapshots are appended
+        in place.
 
-                if 'BASELINES' in extnames:
-                    self.baselines = hdulist['BASELINES'].data.reshape(-1,3)
-                    self.baseline_lengths = NP.sqrt(NP.sum(self.baselines**2, axis=1))
-                else:
-                    raise KeyError('Extension named "BASELINES" not found in init_file.')
+        Inputs:
 
-                if 'PROJ_BASELINES' in extnames:
-                    self.projected_baselines = hdulist['PROJ_BASELINES'].data
+        attributes  [list of strings] Attributes to be laid out. Accepted
+                    values are 'skyvis_freq', 'vis_freq', 'vis_noise_freq',
+                    'gradient', 'Tsys', 'bp' and 'bp_wts'. Attributes which
+                    are not set or carry no time axis are skipped. If set to
+                    None (default), all of them are laid out
+        -------------------------------------------------------------------------
+        """
 
-                if 'LABELS' in extnames:
-                    # self.labels = hdulist['LABELS'].data.tolist()
-                    a1 = hdulist['LABELS'].data['A1']
-                    a2 = hdulist['LABELS'].data['A2']
-                    self.labels = zip(a2,a1)
-                else:
-                    self.labels = ['B{0:0d}'.format(i+1) for i in range(self.baseline_lengths.size)]
+        if attributes is None:
+            attributes = ['skyvis_freq', 'vis_freq', 'vis_noise_freq', 'gradient', 'Tsys', 'bp', 'bp_wts']
+        for attr in attributes:
+            if attr == 'gradient':
+                if self.gradient_mode is not None:
+                    if self.gradient_mode in self.gradient:
+                        if self.gradient[self.gradient_mode].ndim == 4:
+                            self.gradient[self.gradient_mode], self._time_buffers['gradient'] = _time_major_view(self.gradient[self.gradient_mode], 3)
+            else:
+                current = getattr(self, attr)
+                if current is not None:
+                    if current.ndim == 3:
+                        current, self._time_buffers[attr] = _time_major_view(current, 2)
+                        setattr(self, attr, current)
 
-                self.layout = {}
-                if 'LAYOUT' in extnames:
-                    for key in ['positions', 'ids', 'labels']:
-                        self.layout[key] = hdulist['LAYOUT'].data[key]
-                    self.layout['coords'] = hdulist['LAYOUT'].header['COORDS']
+    #############################################################################
 
-                if 'EFFECTIVE AREA' in extnames:
-                    self.A_eff = hdulist['EFFECTIVE AREA'].data
-                else:
-                    raise KeyError('Extension named "EFFECTIVE AREA" not found in init_file.')
+    def observe(self, timestamp, Tsysinfo, bandpass, pointing_center, skymodel,
+                t_acc, pb_info=None, brightness_units=None, bpcorrect=None,
+                roi_info=None, roi_radius=None, roi_center=None, lst=None,
+                gradient_mode=None, memsave=False, vis_engine=None,
+                phasor_mode=None, memory_budget=None, tile_hook=None,
+                nthreads=None, cull_tol=None, beam_cache=None):
 
-                if 'INTERFEROMETER EFFICIENCY' in extnames:
-                    self.eff_Q = hdulist['INTERFEROMETER EFFICIENCY'].data
-                else:
-                    raise KeyError('Extension named "INTERFEROMETER EFFICIENCY" not found in init_file.')
+        """
+        -------------------------------------------------------------------------
+        Simulate a snapshot observation, by an instance of the
+        InterferometerArray class, of the sky when a sky catalog is provided. The
+        simulation generates visibilities observed by the interferometers for the
+        specified parameters. See member function observing_run() for simulating
+        an extended observing run in 'track' or 'drift' mode.
 
-                if 'SPECTRAL INFO' not in extnames:
-                    raise KeyError('No extension table found containing spectral information.')
-                else:
-                    self.channels = hdulist['SPECTRAL INFO'].data['frequency']
-                    try:
-                        self.lags = hdulist['SPECTRAL INFO'].data['lag']
-                    except KeyError:
-                        self.lags = None
+        Inputs:
 
-                if 'BANDPASS' in extnames:
-                    self.bp = hdulist['BANDPASS'].data
-                else:
-                    raise KeyError('Extension named "BANDPASS" not found in init_file.')
+        timestamp    [scalar] Timestamp associated with each integration in the
+                     observation
 
-                if 'BANDPASS_WEIGHTS' in extnames:
-                    self.bp_wts = hdulist['BANDPASS_WEIGHTS'].data
-                else:
-                    self.bp_wts = NP.ones_like(self.bp)
+        Tsysinfo     [dictionary] Contains system temperature information for
+                     specified timestamp of observation. It contains the
+                     following keys and values:
+                     'Trx'      [scalar] Recevier temperature (in K) that is
+                                applicable to all frequencies and baselines
+                     'Tant'     [dictionary] contains antenna temperature info
+                                from which the antenna temperature is estimated.
+                                Used only if the key 'Tnet' is absent or set to
+                                None. It has the following keys and values:
+                                'f0'      [scalar] Reference frequency (in Hz)
+                                          from which antenna temperature will
+                                          be estimated (see formula below)
+                                'T0'      [scalar] Antenna temperature (in K) at
+                                          the reference frequency specified in
+                                          key 'f0'. See formula below.
+                                'spindex' [scalar] Antenna temperature spectral
+                                          index. See formula below.
 
-                if 'T_ACC' in extnames:
-                    self.t_acc = hdulist['t_acc'].data.tolist()
-                    self.n_acc = len(self.t_acc)
-                    self.t_obs = sum(self.t_acc)
-                else:
-                    raise KeyError('Extension named "T_ACC" not found in init_file.')
+                                Tsys = Trx + Tant['T0'] * (f/Tant['f0'])**spindex
 
-                if 'FREQ_CHANNEL_NOISE_RMS_VISIBILITY' in extnames:
-                    self.vis_rms_freq = hdulist['freq_channel_noise_rms_visibility'].data
-                else:
-                    self.vis_rms_freq = None
+                     'Tnet'     [numpy array] Pre-computed Tsys (in K)
+                                information that will be used directly to set the
+                                Tsys. If specified, the information under keys
+                                'Trx' and 'Tant' will be ignored. If a scalar
+                                value is provided, it will be assumed to be
+                                identical for all interferometers and all
+                                frequencies. If a vector is provided whose length
+                                is equal to the number of interferoemters, it
+                                will be assumed identical for all frequencies. If
+                                a vector is provided whose length is equal to the
+                                number of frequency channels, it will be assumed
+                                identical for all interferometers. If a 2D array
+                                is provided, it should be of size
+                                n_baselines x nchan. Tsys = Tnet
 
-                if 'REAL_FREQ_OBS_VISIBILITY' in extnames:
-                    self.vis_freq = hdulist['real_freq_obs_visibility'].data
-                    if 'IMAG_FREQ_OBS_VISIBILITY' in extnames:
-                        self.vis_freq = self.vis_freq.astype(NP.complex128)
-                        self.vis_freq += 1j * hdulist['imag_freq_obs_visibility'].data
-                else:
-                    self.vis_freq = None
+        bandpass     [numpy array] Bandpass weights associated with the
+                     interferometers for the specified timestamp of observation
 
-                if 'REAL_FREQ_SKY_VISIBILITY' in extnames:
-                    self.skyvis_freq = hdulist['real_freq_sky_visibility'].data
-                    if 'IMAG_FREQ_SKY_VISIBILITY' in extnames:
-                        self.skyvis_freq = self.skyvis_freq.astype(NP.complex128)
-                        self.skyvis_freq += 1j * hdulist['imag_freq_sky_visibility'].data
-                else:
-                    raise KeyError('Extension named "REAL_FREQ_SKY_VISIBILITY" not found in init_file.')
+        pointing_center
+                     [2-element numpy vector or list] Pointing center (latitude
+                     and longitude) of the observation at a given timestamp.
+                     This is where the telescopes will be phased up to as
+                     reference. Coordinate system for the pointing_center is
+                     specified by the attribute pointing_coords initialized in
+                     __init__().
 
-                if 'REAL_FREQ_NOISE_VISIBILITY' in extnames:
-                    self.vis_noise_freq = hdulist['real_freq_noise_visibility'].data
-                    if 'IMAG_FREQ_NOISE_VISIBILITY' in extnames:
-                        self.vis_noise_freq = self.vis_noise_freq.astype(NP.complex128)
-                        self.vis_noise_freq += 1j * hdulist['imag_freq_noise_visibility'].data
-                else:
-                    self.vis_noise_freq = None
+        skymodel     [instance of class SkyModel] It consists of source flux
+                     densities, their positions, and spectral indices. Read
+                     class SkyModel docstring for more information.
 
-                if self.gradient_mode is not None:
-                    self.gradient = {}
-                    if 'real_freq_sky_visibility_gradient_wrt_{0}'.format(self.gradient_mode) in extnames:
-                        self.gradient[self.gradient_mode] = hdulist['real_freq_sky_visibility_gradient_wrt_{0}'.format(self.gradient_mode)].data
-                        if 'imag_freq_sky_visibility_gradient_wrt_{0}'.format(self.gradient_mode) in extnames:
-                            self.gradient[self.gradient_mode] = self.gradient[self.gradient_mode].astype(NP.complex128)
-                            self.gradient[self.gradient_mode] += 1j * hdulist['imag_freq_sky_visibility_gradient_wrt_{0}'.format(self.gradient_mode)].data
+        t_acc        [scalar] Accumulation time (sec) corresponding to timestamp
 
-                try:
-                    gainsfile = hdulist[0].header['gainsfile']
-                except KeyError:
-                    print '\tKeyword "gainsfile" not found in header. Assuming default unity gains.'
-                    self.gaininfo = None
-                else:
-                    self.gaininfo = GainInfo(init_file=gainsfile, axes_order=['label', 'frequency', 'time'])
+        brightness_units
+                     [string] Units of flux density in the catalog and for the
+                     generated visibilities. Accepted values are 'Jy' (Jansky)
+                     and 'K' (Kelvin for temperature). If None set, it defaults
+                     to 'Jy'
 
-                if 'REAL_LAG_VISIBILITY' in extnames:
-                    self.vis_lag = hdulist['real_lag_visibility'].data
-                    if 'IMAG_LAG_VISIBILITY' in extnames:
-                        self.vis_lag = self.vis_lag.astype(NP.complex128)
-                        self.vis_lag += 1j * hdulist['imag_lag_visibility'].data
-                else:
-                    self.vis_lag = None
+        Keyword Inputs:
 
-                if 'REAL_LAG_SKY_VISIBILITY' in extnames:
-                    self.skyvis_lag = hdulist['real_lag_sky_visibility'].data
-                    if 'IMAG_LAG_SKY_VISIBILITY' in extnames:
-                        self.skyvis_lag = self.skyvis_lag.astype(NP.complex128)
-                        self.skyvis_lag += 1j * hdulist['imag_lag_sky_visibility'].data
-                else:
-                    self.skyvis_lag = None
+        roi_info     [instance of class ROI_parameters] It consists of indices
+                     in the polskymodel object, polarized beams for different
+                     baseline types for every time stamp that will be simulated
 
-                if 'REAL_LAG_NOISE_VISIBILITY' in extnames:
-                    self.vis_noise_lag = hdulist['real_lag_noise_visibility'].data
-                    if 'IMAG_LAG_NOISE_VISIBILITY' in extnames:
-                        self.vis_noise_lag = self.vis_noise_lag.astype(NP.complex128)
-                        self.vis_noise_lag += 1j * hdulist['imag_lag_noise_visibility'].data
-                else:
-                    self.vis_noise_lag = None
+        roi_radius   [scalar] Radius of the region of interest (degrees) inside
+                     which sources are to be observed. Default = 90 degrees,
+                     which is the entire horizon.
 
-                hdulist.close()
-            init_file_success = True
-            return
-        else:
-            argument_init = True
+        roi_center   [string] Center of the region of interest around which
+                     roi_radius is used. Accepted values are 'pointing_center'
+                     and 'zenith'. If set to None, it defaults to 'zenith'.
 
-        if (not argument_init) and (not init_file_success):
-            raise ValueError('Initialization failed with the use of init_file.')
+        lst          [scalar] LST (in degrees) associated with the timestamp
 
-        self.baselines = NP.asarray(baselines)
-        if len(self.baselines.shape) == 1:
-            if self.baselines.size == 2:
-                self.baselines = NP.hstack((self.baselines.reshape(1,-1), NP.zeros(1)))
-            elif self.baselines.size == 3:
-                self.baselines = self.baselines.reshape(1,-1)
-            else:
-                raise ValueError('Baseline(s) must be a 2- or 3-column array.')
-        elif len(self.baselines.shape) == 2:
-            if self.baselines.shape[1] == 2:
-                self.baselines = NP.hstack((self.baselines, NP.zeros(self.baselines.shape[0]).reshape(-1,1)))
-            elif self.baselines.shape[1] != 3:
-                raise ValueError('Baseline(s) must be a 2- or 3-column array')
-        else:
-            raise ValueError('Baseline(s) array contains more than 2 dimensions.')
+        gradient_mode
+                     [string] If set to None, visibilities will be simulated as
+                     usual. If set to string, both visibilities and visibility
+                     gradients with respect to the quantity specified in the
+                     string will be simulated. Currently accepted value is
+                     'baseline'. Plan to incorporate gradients with respect to
+                     'skypos' and 'frequency' as well in the future.
 
-        self.baseline_lengths = NP.sqrt(NP.sum(self.baselines**2, axis=1))
-        self.baseline_orientations = NP.angle(self.baselines[:,0] + 1j * self.baselines[:,1])
-        self.projected_baselines = None
+        memsave      [boolean or string] If set to True, enforce computations
+                     in single precision, otherwise enforce double precision
+                     (default). If set to 'mixed', the phases are evaluated in
+                     double precision, the phasors are stored in single
+                     precision and the visibilities are accumulated in double
+                     precision before they are stored in single precision
+                     (see function tiled_visibilities()). This is nearly as
+                     fast and as compact as single precision but retains the
+                     accuracy of the sum over a large number of sources
+
+        vis_engine   [string] Specifies how the visibilities are computed.
+                     Accepted values are 'baseline' and 'antenna'. If set to
+                     'baseline' or None (default), the phase of every
+                     baseline, source and frequency channel is computed
+                     directly. If set to 'antenna', per-antenna phasors are
+                     computed and the baselines are formed by matrix products
+                     for each frequency channel (see function
+                     antenna_factored_visibilities()). This requires the
+                     attribute layout to contain the antenna positions and
+                     labels of all the antennas that make up the baselines. It
+                     is beneficial when the number of baselines is much larger
+                     than the number of antennas. Sources with a finite
+                     extent cannot be factored into per-antenna phasors and
+                     will revert to 'baseline'
+
+        phasor_mode  [string] Specifies how the phasors of the baseline based
+                     visibility computation are evaluated. Accepted values are
+                     'direct' and 'recurrence'. If set to 'direct' or None
+                     (default), the complex exponential is evaluated for every
+                     source, baseline and frequency channel. If set to
+                     'recurrence', the complex exponential is evaluated only
+                     on a subset of channels and the phasors at the other
+                     channels are obtained by complex multiplication (see
+                     function phasor_recurrence() for the accuracy bound). It
+                     requires evenly spaced frequency channels, otherwise it
+                     will revert to 'direct'
+
+        memory_budget
+                     [scalar] Memory (in bytes) that may be used for the
+                     phasors of the baseline based visibility computation. If
+                     specified, the phasors are computed over tiles of
+                     sources, baselines and frequency channels planned within
+                     this budget (see function visibility_tile_plan()), using
+                     scratch buffers that are reused across tiles and
+                     snapshots. If set to None (default), the phasors of all
+                     sources are computed at once if the available system
+                     memory permits, otherwise they are tiled within the
+                     available system memory
+
+        tile_hook    [function] If provided, it is called with the dictionary
+                     describing the tiles (see function visibility_tile_plan())
+                     whenever the phasors are tiled. Useful for debugging.
+                     Default=None
+
+        nthreads     [integer] Number of threads used to compute the tiles of
+                     the baseline based visibility computation. The sources
+                     are divided among the threads which accumulate partial
+                     visibilities that are summed at the end (see function
+                     tiled_visibilities()). If set to None (default) or 1,
+                     the computation is single-threaded. The antenna based
+                     visibility computation relies on the threads of the
+                     underlying BLAS library instead
+
+        cull_tol     [scalar] Fractional tolerance on the error of the
+                     visibilities for culling faint sources. If specified, the
+                     sources in the region of interest are sorted by their
+                     peak primary beam weighted flux density over frequency
+                     and the faintest ones are dropped as long as the sum of
+                     their peak primary beam weighted flux densities stays
+                     below this fraction of the total primary beam weighted
+                     flux density in each frequency channel (see function
+                     beam_weighted_culling()). The number of sources culled
+                     and the bound on the fractional error are recorded in
+                     attribute cull_info. If set to None (default), no
+                     sources are culled
+
+        beam_cache   [instance of class PrimaryBeamCache or
+                     PhasedArrayBeamCache] Primary beam tabulated on a grid of
+                     the local sky (see class PrimaryBeamCache in module
+                     primary_beams) from which the primary beam at the
+                     sources is looked up instead of being evaluated afresh.
+                     It must be tabulated at the frequency channels of the
+                     instance and is valid only if the primary beam is fixed
+                     in the local frame, as in drift scans. If an instance of
+                     class PhasedArrayBeamCache, the primary beam is looked up
+                     from the grid tabulated for the beamformer settings in
+                     pb_info (and the pointing center), which is tabulated
+                     and cached if it is not already, so that snapshots
+                     sharing the same delay settings cost only a lookup. Used
+                     only if the primary beam is not provided in roi_info. If
+                     set to None (default), the primary beam is evaluated
+                     using pb_info
+        ------------------------------------------------------------------------
+        """
 
-        if not isinstance(labels, (list, tuple)):
-            raise TypeError('Interferometer array labels must be a list or tuple of unique identifiers')
-        elif len(labels) != self.baselines.shape[0]:
-            raise ValueError('Number of labels do not match the number of baselines specified.')
+        if vis_engine is None:
+            vis_engine = 'baseline'
+        elif not isinstance(vis_engine, str):
+            raise TypeError('Input vis_engine must be a string')
+        elif vis_engine.lower() not in ['baseline', 'antenna']:
+            raise ValueError('Invalid value specified in input vis_engine')
+        vis_engine = vis_engine.lower()
+
+        if phasor_mode is None:
+            phasor_mode = 'direct'
+        elif not isinstance(phasor_mode, str):
+            raise TypeError('Input phasor_mode must be a string')
+        elif phasor_mode.lower() not in ['direct', 'recurrence']:
+            raise ValueError('Invalid value specified in input phasor_mode')
+        phasor_mode = phasor_mode.lower()
+        if (phasor_mode == 'recurrence') and (self.channels.size > 1):
+            if _channel_spacing(self.channels) is None:
+                warnings.warn('Frequency channels are not evenly spaced. Reverting to direct evaluation of phasors.')
+                phasor_mode = 'direct'
+
+        if nthreads is None:
+            nthreads = 1
+        elif not isinstance(nthreads, int):
+            raise TypeError('Input nthreads must be an integer')
+        elif nthreads < 1:
+            raise ValueError('Input nthreads must be positive')
+
+        if memsave not in [True, False, 'mixed']:
+            raise ValueError('Input memsave must be True, False or "mixed"')
+
+        if cull_tol is not None:
+            if not isinstance(cull_tol, (int,float)):
+                raise TypeError('Input cull_tol must be a scalar')
+            if cull_tol < 0.0:
+                raise ValueError('Input cull_tol must be non-negative')
+
+        bandpass, Tsys = self._snapshot_bandpass_Tsys(bandpass, Tsysinfo, bpcorrect=bpcorrect)
+
+        if len(self.bp.shape) == 2:
+            self.bp, self._time_buffers['bp'] = _append_along_axis(None, bandpass[:,:,NP.newaxis], 2, capacity=self.n_acc_hint, leading=self.time_major)
+            self.bp_wts, self._time_buffers['bp_wts'] = _append_along_axis(None, NP.ones_like(bandpass[:,:,NP.newaxis]), 2, capacity=self.n_acc_hint, leading=self.time_major)
         else:
-            self.labels = labels
+            self.bp, self._time_buffers['bp'] = _append_along_axis(self.bp, bandpass[:,:,NP.newaxis], 2, buf=self._time_buffers.get('bp'), capacity=self.n_acc_hint, leading=self.time_major)
+            self.bp_wts, self._time_buffers['bp_wts'] = _append_along_axis(self.bp_wts, NP.ones_like(bandpass[:,:,NP.newaxis]), 2, buf=self._time_buffers.get('bp_wts'), capacity=self.n_acc_hint, leading=self.time_major) # All additional bandpass shaping weights are set to unity.
 
-        self.simparms_file = None
-        if isinstance(simparms_file, str):
-            self.simparms_file = simparms_file
+        self.Tsysinfo += [Tsysinfo]
+
+        if self.Tsys.ndim == 2:
+            self.Tsys, self._time_buffers['Tsys'] = _append_along_axis(None, Tsys[:,:,NP.newaxis], 2, capacity=self.n_acc_hint, leading=self.time_major)
         else:
-            warnings.warn('\tInvalid specification found in header for simulation parameters file. Proceeding with None as default.')
+            self.Tsys, self._time_buffers['Tsys'] = _append_along_axis(self.Tsys, Tsys[:,:,NP.newaxis], 2, buf=self._time_buffers.get('Tsys'), capacity=self.n_acc_hint, leading=self.time_major)
 
-        if isinstance(telescope, dict):
-            self.telescope = telescope
+        # if (brightness_units is None) or (brightness_units=='Jy') or (brightness_units=='JY') or (brightness_units=='jy'):
+        #     if self.vis_rms_freq is None:
+        #         self.vis_rms_freq = 2.0 * FCNST.k / NP.sqrt(2.0*t_acc*self.freq_resolution) * NP.expand_dims(self.Tsys[:,:,-1]/self.A_eff/self.eff_Q, axis=2) / CNST.Jy
+        #     elif len(self.vis_rms_freq.shape) == 3:
+        #         self.vis_rms_freq = NP.dstack((self.vis_rms_freq, 2.0 * FCNST.k / NP.sqrt(2.0*t_acc*self.freq_resolution) * NP.expand_dims(self.Tsys[:,:,-1]/self.A_eff/self.eff_Q, axis=2)/CNST.Jy))
+        #     self.flux_unit = 'JY'
+        # elif (brightness_units=='K') or (brightness_units=='k'):
+        #     if len(self.vis_rms_freq.shape) == 2:
+        #         self.vis_rms_freq = 1 / NP.sqrt(2.0*t_acc*self.freq_resolution) * NP.expand_dims(self.Tsys[:,:,-1]/self.eff_Q, axis=2)
+        #     elif len(self.vis_rms_freq.shape) == 3:
+        #         self.vis_rms_freq = NP.dstack((self.vis_rms_freq, 1 / NP.sqrt(2.0*t_acc*self.freq_resolution) * NP.expand_dims(self.Tsys[:,:,-1]/self.eff_Q, axis=2)))
+        #     self.flux_unit = 'K'
+        # else:
+        #     raise ValueError('Invalid brightness temperature units specified.')
+
+        if not self.timestamp:
+            self.pointing_center, self._time_buffers['pointing_center'] = _append_along_axis(None, NP.asarray(pointing_center).reshape(1,-1), 0, capacity=self.n_acc_hint)
+            self.phase_center, self._time_buffers['phase_center'] = _append_along_axis(None, NP.asarray(pointing_center).reshape(1,-1), 0, capacity=self.n_acc_hint)
         else:
-            self.telescope = {}
-            self.telescope['id'] = 'vla'
-            self.telescope['shape'] = 'dish'
-            self.telescope['size'] = 25.0
-            self.telescope['ocoords'] = 'altaz'
-            self.telescope['orientation'] = NP.asarray([90.0, 270.0]).reshape(1,-1)
-            self.telescope['groundplane'] = None
+            self.pointing_center, self._time_buffers['pointing_center'] = _append_along_axis(self.pointing_center, NP.asarray(pointing_center).reshape(1,-1), 0, buf=self._time_buffers.get('pointing_center'), capacity=self.n_acc_hint)
+            self.phase_center, self._time_buffers['phase_center'] = _append_along_axis(self.phase_center, NP.asarray(pointing_center).reshape(1,-1), 0, buf=self._time_buffers.get('phase_center'), capacity=self.n_acc_hint)
 
-        self.layout = {}
-        if isinstance(layout, dict):
-            if 'positions' in layout:
-                if isinstance(layout['positions'], NP.ndarray):
-                    if layout['positions'].ndim == 2:
-                        if (layout['positions'].shape[1] == 2) or (layout['positions'].shape[1] == 3):
-                            if layout['positions'].shape[1] == 2:
-                                layout['positions'] = NP.hstack((layout['positions'], NP.zeros(layout['positions'].shape[0]).reshape(-1,1)))
-                            self.layout['positions'] = layout['positions']
-                        else:
-                            raise ValueError('Incompatible shape in array layout')
-                    else:
-                        raise ValueError('Incompatible shape in array layout')
-                else:
-                    raise TypeError('Array layout positions must be a numpy array')
-            else:
-                raise KeyError('Array layout positions missing')
-            if 'coords' in layout:
-                if isinstance(layout['coords'], str):
-                    self.layout['coords'] = layout['coords']
+        pointing_lon = self.pointing_center[-1,0]
+        pointing_lat = self.pointing_center[-1,1]
+
+        if self.skycoords == 'radec':
+            if self.pointing_coords == 'hadec':
+                if lst is not None:
+                    pointing_lon = lst - self.pointing_center[-1,0]
+                    pointing_lat = self.pointing_center[-1,1]
                 else:
-                    raise TypeError('Array layout coordinates must be a string')
-            else:
-                raise KeyError('Array layout coordinates missing')
-            if 'labels' in layout:
-                if isinstance(layout['labels'], (list,NP.ndarray)):
-                    self.layout['labels'] = layout['labels']
+                    raise ValueError('LST must be provided. Sky coordinates are in RA-Dec format while pointing center is in HA-Dec format.')
+            elif self.pointing_coords == 'altaz':
+                pointing_lonlat = GEOM.altaz2hadec(self.pointing_center[-1,:], self.latitude, units='degrees')
+                pointing_lon = lst - pointing_lonlat[0]
+                pointing_lat = pointing_lonlat[1]
+        elif self.skycoords == 'hadec':
+            if self.pointing_coords == 'radec':
+                if lst is not None:
+                    pointing_lon = lst - self.pointing_center[-1,0]
+                    pointing_lat = self.pointing_center[-1,1]
                 else:
-                    raise TypeError('Array antenna labels must be a list or numpy array')
-            else:
-                raise KeyError('Array antenna labels missing')
-            if 'ids' in layout:
-                if isinstance(layout['ids'], (list,NP.ndarray)):
-                    self.layout['ids'] = layout['ids']
+                    raise ValueError('LST must be provided. Sky coordinates are in RA-Dec format while pointing center is in HA-Dec format.')
+            elif self.pointing_coords == 'altaz':
+                pointing_lonlat = lst - GEOM.altaz2hadec(self.pointing_center[-1,:], self.latitude, units='degrees')
+                pointing_lon = pointing_lonlat[0]
+                pointing_lat = pointing_lonlat[1]
+        else:
+            if self.pointing_coords == 'radec':
+                if lst is not None:
+                    pointing_lonlat = GEOM.hadec2altaz(NP.asarray([lst-self.pointing_center[-1,0], self.pointing_center[-1,1]]), self.latitude, units='degrees')
+                    pointing_lon = pointing_lonlat[0]
+                    pointing_lat = pointing_lonlat[1]
                 else:
-                    raise TypeError('Array antenna ids must be a list or numpy array')
+                    raise ValueError('LST must be provided. Sky coordinates are in Alt-Az format while pointing center is in RA-Dec format.')
+            elif self.pointing_coords == 'hadec':
+                pointing_lonlat = GEOM.hadec2altaz(self.pointing_center,
+                                                   self.latitude,
+                                                   units='degrees')
+                pointing_lon = pointing_lonlat[0]
+                pointing_lat = pointing_lonlat[1]
+
+        baselines_in_local_frame = self.baselines
+        if self.baseline_coords == 'equatorial':
+            baselines_in_local_frame = GEOM.xyz2enu(self.baselines, self.latitude, 'degrees')
+
+        pc_altaz = self.pointing_center[-1,:] # Convert pointing center to Alt-Az coordinates
+        if self.pointing_coords == 'hadec':
+            pc_altaz = GEOM.hadec2altaz(self.pointing_center[-1,:], self.latitude, units='degrees')
+        elif self.pointing_coords == 'radec':
+            if lst is not None:
+                pc_altaz = GEOM.hadec2altaz(NP.asarray([lst-self.pointing_center[-1,0], self.pointing_center[-1,1]]), self.latitude, units='degrees')
             else:
-                raise KeyError('Array antenna ids missing')
-            if (layout['positions'].shape[0] != layout['labels'].size) or (layout['ids'].size != layout['labels'].size):
-                raise ValueError('Antenna layout positions, labels and IDs must all be for same number of antennas')
+                raise ValueError('LST must be provided. Sky coordinates are in Alt-Az format while pointing center is in RA-Dec format.')
 
-        self.blgroups = None
-        self.bl_reversemap = None
-        if blgroupinfo is not None:
-            if not isinstance(blgroupinfo, dict):
-                raise TypeError('Input blgroupinfo must be a dictionary')
-            self.blgroups = blgroupinfo['groups']
-            self.bl_reversemap = blgroupinfo['reversemap']
+        pc_dircos = GEOM.altaz2dircos(pc_altaz, 'degrees') # Convert pointing center to direction cosine coordinates
+        pc_delay_offsets = DLY.geometric_delay(baselines_in_local_frame, pc_dircos, altaz=False, hadec=False, dircos=True, latitude=self.latitude)
+        if memsave and (memsave != 'mixed'):
+            pc_delay_offsets = pc_delay_offsets.astype(NP.float32)
 
-        self.latitude = latitude
-        self.longitude = longitude
-        self.altitude = altitude
-        self.vis_freq = None
-        self.skyvis_freq = None
-        self.vis_noise_freq = None
-        self.gradient_mode = None
-        self.gradient = {}
-        self.gaininfo = None
-        if gaininfo is not None:
-            if not isinstance(gaininfo, GainInfo):
-                raise TypeError('Input gaininfo must be an instance of class GainInfo')
-            self.gaininfo = gaininfo
+        # pointing_phase = 2.0 * NP.pi * NP.repeat(NP.dot(baselines_in_local_frame, pc_dircos.reshape(-1,1)), self.channels.size, axis=1) * NP.repeat(self.channels.reshape(1,-1), self.baselines.shape[0], axis=0)/FCNST.c
 
-        if (freq_scale is None) or (freq_scale == 'Hz') or (freq_scale == 'hz'):
-            self.channels = NP.asarray(channels)
-        elif freq_scale == 'GHz' or freq_scale == 'ghz':
-            self.channels = NP.asarray(channels) * 1.0e9
-        elif freq_scale == 'MHz' or freq_scale == 'mhz':
-            self.channels = NP.asarray(channels) * 1.0e6
-        elif freq_scale == 'kHz' or freq_scale == 'khz':
-            self.channels = NP.asarray(channels) * 1.0e3
-        else:
-            raise ValueError('Frequency units must be "GHz", "MHz", "kHz" or "Hz". If not set, it defaults to "Hz"')
+        if not isinstance(skymodel, SM.SkyModel):
+            raise TypeError('skymodel should be an instance of class SkyModel.')
 
-        self.bp = NP.ones((self.baselines.shape[0],self.channels.size)) # Inherent bandpass shape
-        self.bp_wts = NP.ones((self.baselines.shape[0],self.channels.size)) # Additional bandpass weights
-        self.lag_kernel = DSP.FT1D(self.bp*self.bp_wts, ax=1, inverse=True, use_real=False, shift=True)
+        if self.skycoords == 'hadec':
+            skypos_altaz = GEOM.hadec2altaz(skymodel.location, self.latitude, units='degrees')
+        elif self.skycoords == 'radec':
+            skypos_altaz = GEOM.hadec2altaz(NP.hstack((NP.asarray(lst-skymodel.location[:,0]).reshape(-1,1), skymodel.location[:,1].reshape(-1,1))), self.latitude, units='degrees')
 
-        self.Tsys = NP.zeros((self.baselines.shape[0],self.channels.size))
-        self.Tsysinfo = []
+        pb = None
+        if roi_info is not None:
+            if ('ind' not in roi_info) or ('pbeam' not in roi_info):
+                raise KeyError('Both "ind" and "pbeam" keys must be present in dictionary roi_info')
 
-        self.flux_unit = 'JY'
-        self.timestamp = []
-        self.t_acc = []
-        self.t_obs = 0.0
-        self.n_acc = 0
-        self.pointing_center = NP.empty([1,2])
-        self.phase_center = NP.empty([1,2])
-        self.lst = []
+            if (roi_info['ind'] is not None) and (roi_info['pbeam'] is not None):
+                try:
+                    if isinstance(roi_info['pbeam'], dict): # Reconstruct from reduced spectral basis
+                        pb = PB.lowrank_beam_expand(roi_info['pbeam']).reshape(-1,len(self.channels))
+                    else:
+                        pb = roi_info['pbeam'].reshape(-1,len(self.channels))
+                except ValueError:
+                    raise ValueError('Number of columns of primary beam in key "pbeam" of dictionary roi_info must be equal to number of frequency channels.')
 
-        if isinstance(eff_Q, (int, float)):
-            if (eff_Q >= 0.0) or (eff_Q <= 1.0):
-                self.eff_Q = eff_Q * NP.ones((self.baselines.shape[0], self.channels.size))
-            else:
-                raise ValueError('Efficiency value of interferometer is invalid.')
-        elif isinstance(eff_Q, (list, tuple, NP.ndarray)):
-            eff_Q = NP.asarray(eff_Q)
-            if (NP.any(eff_Q < 0.0)) or (NP.any(eff_Q > 1.0)):
-                raise ValueError('One or more values of eff_Q found to be outside the range [0,1].')
-            if eff_Q.size == self.baselines.shape[0]:
-                self.eff_Q = NP.repeat(eff_Q.reshape(-1,1), self.channels.size, axis=1)
-            elif eff_Q.size == self.channels.size:
-                self.eff_Q = NP.repeat(eff_Q.reshape(1,-1), self.channels.size, axis=0)
-            elif eff_Q.size == self.baselines.shape[0]*self.channels.size:
-                self.eff_Q = eff_Q.reshape(-1,self.channels.size)
-            else:
-                raise ValueError('Efficiency values of interferometers incompatible with the number of interferometers and/or frequency channels.')
+                if NP.asarray(roi_info['ind']).size == pb.shape[0]:
+                    m2 = roi_info['ind']
+                else:
+                    raise ValueError('Values in keys ind and pbeam in must carry same number of elements.')
         else:
-            raise TypeError('Efficiency values of interferometers must be provided as a scalar, list, tuple or numpy array.')
+            if roi_radius is None:
+                roi_radius = 90.0
 
-        if isinstance(A_eff, (int, float)):
-            if A_eff >= 0.0:
-                self.A_eff = A_eff * NP.ones((self.baselines.shape[0], self.channels.size))
-            else:
-                raise ValueError('Negative value for effective area is invalid.')
-        elif isinstance(A_eff, (list, tuple, NP.ndarray)):
-            A_eff = NP.asarray(A_eff)
-            if NP.any(A_eff < 0.0):
-                raise ValueError('One or more values of A_eff found to be negative.')
-            if A_eff.size == self.baselines.shape[0]:
-                self.A_eff = NP.repeat(A_eff.reshape(-1,1), self.channels.size, axis=1)
-            elif A_eff.size == self.channels.size:
-                self.A_eff = NP.repeat(A_eff.reshape(1,-1), self.channels.size, axis=0)
-            elif A_eff.size == self.baselines.shape[0]*self.channels.size:
-                self.A_eff = A_eff.reshape(-1,self.channels.size)
-            else:
-                raise ValueError('Effective area(s) of interferometers incompatible with the number of interferometers and/or frequency channels.')
-        else:
-            raise TypeError('Effective area(s) of interferometers must be provided as a scalar, list, tuple or numpy array.')
+            if roi_center is None:
+                roi_center = 'zenith'
+            elif (roi_center != 'zenith') and (roi_center != 'pointing_center'):
+                raise ValueError('Center of region of interest, roi_center, must be set to "zenith" or "pointing_center".')
 
-        self.vis_rms_freq = None
-        self.freq_resolution = self.channels[1] - self.channels[0]
-        self.baseline_coords = baseline_coords
-        self.lags = None
-        self.skyvis_lag = None
-        self.vis_noise_lag = None
-        self.vis_lag = None
-        self.obs_catalog_indices = []
-        self.geometric_delays = []
+            if roi_center == 'pointing_center':
+                m1, m2, d12 = GEOM.spherematch(pointing_lon, pointing_lat, skymodel.location[:,0], skymodel.location[:,1], roi_radius, maxmatches=0)
+            else: # roi_center = 'zenith'
+                m2 = NP.arange(skypos_altaz.shape[0])
+                m2 = m2[NP.where(skypos_altaz[:,0] >= 90.0-roi_radius)] # select sources whose altitude (angle above horizon) is 90-roi_radius
 
-        if (pointing_coords == 'radec') or (pointing_coords == 'hadec') or (pointing_coords == 'altaz'):
-            self.pointing_coords = pointing_coords
-            self.phase_center_coords = pointing_coords
+        if memsave:
+            datatype = NP.complex64
         else:
-            raise ValueError('Pointing center of the interferometer must be "radec", "hadec" or "altaz". Check inputs.')
+            datatype = NP.complex128
+        skyvis = NP.zeros( (self.baselines.shape[0], self.channels.size), dtype=datatype)
+        cull_info = None
+        if cull_tol is not None:
+            cull_info = {'nsrc': len(m2), 'ncull': 0, 'error_bound': 0.0}
+        if len(m2) != 0:
+            skypos_altaz_roi = skypos_altaz[m2,:]
+            coords_str = 'altaz'
+
+            skymodel_subset = skymodel.subset(indices=m2)
+            fluxes = skymodel_subset.generate_spectrum()
+
+            if pb is None:
+                if isinstance(beam_cache, PB.PhasedArrayBeamCache):
+                    pb = beam_cache.lookup(skypos_altaz_roi, skyunits='altaz', freqs=self.channels, freq_scale='Hz', pointing_info=pb_info, pointing_center=pc_altaz)
+                elif beam_cache is not None:
+                    pb = beam_cache.lookup(skypos_altaz_roi, skyunits='altaz', freqs=self.channels, freq_scale='Hz')
+                else:
+                    pb = PB.primary_beam_generator(skypos_altaz_roi, self.channels/1.0e9, skyunits='altaz', telescope=self.telescope, pointing_info=pb_info, pointing_center=pc_altaz, freq_scale='GHz')
 
-        if (skycoords == 'radec') or (skycoords == 'hadec') or (skycoords == 'altaz'):
-            self.skycoords = skycoords
-        else:
-            raise ValueError('Sky coordinates must be "radec", "hadec" or "altaz". Check inputs.')
+            pbfluxes = pb * fluxes
+            if cull_tol is not None:
+                keep_ind, cull_info['ncull'], cull_info['error_bound'] = beam_weighted_culling(pbfluxes, cull_tol)
+                if cull_info['ncull'] > 0:
+                    print '\t\tCulled {0:0d} of {1:0d} sources with a bound of {2:.2e} on the fractional error of the visibilities.'.format(cull_info['ncull'], cull_info['nsrc'], cull_info['error_bound'])
+                    m2 = NP.asarray(m2)[keep_ind]
+                    skypos_altaz_roi = skypos_altaz_roi[keep_ind,:]
+                    pbfluxes = pbfluxes[keep_ind,:]
+                    if skymodel_subset.src_shape is not None:
+                        skymodel_subset = skymodel_subset.subset(indices=keep_ind)
+            geometric_delays = DLY.geometric_delay(baselines_in_local_frame, skypos_altaz_roi, altaz=(coords_str=='altaz'), hadec=(coords_str=='hadec'), latitude=self.latitude)
 
-        if (baseline_coords == 'equatorial') or (baseline_coords == 'localenu'):
-            self.baseline_coords = baseline_coords
-        else:
-            raise ValueError('Baseline coordinates must be "equatorial" or "local". Check inputs.')
+            vis_wts = None
+            if skymodel_subset.src_shape is not None:
+                eps = 1.0e-13
+                f0 = self.channels[int(0.5*self.channels.size)]
+                wl0 = FCNST.c / f0
+                wl = FCNST.c / self.channels
+                skypos_dircos_roi = GEOM.altaz2dircos(skypos_altaz_roi, units='degrees')
+                # projected_spatial_frequencies = NP.sqrt(self.baseline_lengths.reshape(1,-1)**2 - (FCNST.c * geometric_delays)**2) / wl0
+                projected_spatial_frequencies = NP.sqrt(self.baseline_lengths.reshape(1,-1,1)**2 - (FCNST.c * geometric_delays[:,:,NP.newaxis])**2) / wl.reshape(1,1,-1)
 
-    #############################################################################
+                src_FWHM = NP.sqrt(skymodel_subset.src_shape[:,0] * skymodel_subset.src_shape[:,1])
+                src_FWHM_dircos = 2.0 * NP.sin(0.5*NP.radians(src_FWHM)).reshape(-1,1) # assuming the projected baseline is perpendicular to source direction
+                # src_sigma_spatial_frequencies = 2.0 * NP.sqrt(2.0 * NP.log(2.0)) / (2 * NP.pi * src_FWHM_dircos)  # estimate 1
+                src_sigma_spatial_frequencies = 1.0 / NP.sqrt(2.0*NP.log(2.0)) / src_FWHM_dircos  # estimate 2 created by constraint that at lambda/D_proj, visibility weights are half
 
-    def observe(self, timestamp, Tsysinfo, bandpass, pointing_center, skymodel,
-                t_acc, pb_info=None, brightness_units=None, bpcorrect=None,
-                roi_info=None, roi_radius=None, roi_center=None, lst=None,
-                gradient_mode=None, memsave=False):
+	        # # Tried deriving below an alternate expression but previous expression for src_FWHM_dircos seems better
+                # dtheta_radial = NP.radians(src_FWHM).reshape(-1,1)
+                # dtheta_circum = NP.radians(src_FWHM).reshape(-1,1)
+                # src_FWHM_dircos = NP.sqrt(skypos_dircos_roi[:,2].reshape(-1,1)**2 * dtheta_radial**2 + dtheta_circum**2) / NP.sqrt(2.0) # from 2D error propagation (another approximation to commented expression above for the same quantity). Add in quadrature and divide by sqrt(2) to get radius of error circle
+                # arbitrary_factor_for_src_width = NP.sqrt(2.0) # An arbitrary factor that can be adjusted based on what the longest baseline measures for a source of certain finite width
+                # src_sigma_spatial_frequencies = 2.0 * NP.sqrt(2.0 * NP.log(2.0)) / (2 * NP.pi * src_FWHM_dircos) * arbitrary_factor_for_src_width
 
-        """
-        -------------------------------------------------------------------------
-        Simulate a snapshot observation, by an instance of the
-        InterferometerArray class, of the sky when a sky catalog is provided. The
-        simulation generates visibilities observed by the interferometers for the
-        specified parameters. See member function observing_run() for simulating
-        an extended observing run in 'track' or 'drift' mode.
+                # extended_sources_flag = 1/NP.clip(projected_spatial_frequencies, 0.5, NP.amax(projected_spatial_frequencies)) < src_FWHM_dircos
 
-        Inputs:
+                vis_wts = NP.ones_like(projected_spatial_frequencies)
+                # vis_wts = NP.exp(-0.5 * (projected_spatial_frequencies/src_sigma_spatial_frequencies)**2)
+                vis_wts = NP.exp(-0.5 * (projected_spatial_frequencies/src_sigma_spatial_frequencies[:,:,NP.newaxis])**2) # nsrc x nbl x nchan
 
-        timestamp    [scalar] Timestamp associated with each integration in the
-                     observation
+            if memsave:
+                pbfluxes = pbfluxes.astype(NP.float32, copy=False)
+                self.geometric_delays.append(geometric_delays.astype(NP.float32))
+                if vis_wts is not None:
+                    vis_wts = vis_wts.astype(NP.float32, copy=False)
+            else:
+                self.geometric_delays.append(geometric_delays)
 
-        Tsysinfo     [dictionary] Contains system temperature information for
-                     specified timestamp of observation. It contains the
-                     following keys and values:
-                     'Trx'      [scalar] Recevier temperature (in K) that is
-                                applicable to all frequencies and baselines
-                     'Tant'     [dictionary] contains antenna temperature info
-                                from which the antenna temperature is estimated.
-                                Used only if the key 'Tnet' is absent or set to
-                                None. It has the following keys and values:
-                                'f0'      [scalar] Reference frequency (in Hz)
-                                          from which antenna temperature will
-                                          be estimated (see formula below)
-                                'T0'      [scalar] Antenna temperature (in K) at
-                                          the reference frequency specified in
-                                          key 'f0'. See formula below.
-                                'spindex' [scalar] Antenna temperature spectral
-                                          index. See formula below.
+            # memory_available = psutil.phymem_usage().available
+            memory_available = psutil.virtual_memory().available
 
-                                Tsys = Trx + Tant['T0'] * (f/Tant['f0'])**spindex
+            if gradient_mode is None:
+                if memsave:
+                    memory_required = len(m2) * self.channels.size * self.baselines.shape[0] * 4.0 * 2 # bytes, 4 bytes per float, factor 2 is because the phase involves complex values
+                else:
+                    memory_required = len(m2) * self.channels.size * self.baselines.shape[0] * 8.0 * 2 # bytes, 8 bytes per float, factor 2 is because the phase involves complex values
+            else:
+                if not isinstance(gradient_mode, str):
+                    raise TypeError('Input gradient_mode must be a string')
+                if gradient_mode.lower() not in ['baseline', 'skypos', 'frequency']:
+                    raise ValueError('Invalid value specified in input gradient_mode')
+                if self.gradient_mode is None:
+                    self.gradient_mode = gradient_mode
+                if gradient_mode.lower() == 'baseline':
+                    skyvis_gradient = NP.zeros((3, self.baselines.shape[0], self.channels.size), dtype=datatype)
+                    if memsave:
+                        memory_required = 3 * len(m2) * self.channels.size * self.baselines.shape[0] * 4.0 * 2 # bytes, 4 bytes per float, factor 2 is because the phase involves complex values, factor 3 because of three vector components of the gradient
+                    else:
+                        memory_required = 3 * len(m2) * self.channels.size * self.baselines.shape[0] * 8.0 * 2 # bytes, 8 bytes per float, factor 2 is because the phase involves complex values, factor 3 because of three vector components of the gradient
 
-                     'Tnet'     [numpy array] Pre-computed Tsys (in K)
-                                information that will be used directly to set the
-                                Tsys. If specified, the information under keys
-                                'Trx' and 'Tant' will be ignored. If a scalar
-                                value is provided, it will be assumed to be
-                                identical for all interferometers and all
-                                frequencies. If a vector is provided whose length
-                                is equal to the number of interferoemters, it
-                                will be assumed identical for all frequencies. If
-                                a vector is provided whose length is equal to the
-                                number of frequency channels, it will be assumed
-                                identical for all interferometers. If a 2D array
-                                is provided, it should be of size
-                                n_baselines x nchan. Tsys = Tnet
+            if (vis_engine == 'antenna') and (vis_wts is not None):
+                warnings.warn('Extended sources cannot be factored into antenna phasors. Reverting to baseline based visibility computation.')
+                vis_engine = 'baseline'
+
+            if vis_engine == 'antenna':
+                if not self.layout:
+                    raise KeyError('Attribute layout must be set to use antenna based visibility computation')
+                if self.layout['coords'] != 'ENU':
+                    raise ValueError('Antenna positions in attribute layout must be in local ENU coordinates')
+                antlabel_index = {str(antlabel): aind for aind,antlabel in enumerate(self.layout['labels'])}
+                bl_labels = NP.asarray(self.labels)
+                if bl_labels.dtype.names is not None:
+                    a1_labels = bl_labels['A1']
+                    a2_labels = bl_labels['A2']
+                else: # list of (A2, A1) tuples
+                    a1_labels = bl_labels[:,1]
+                    a2_labels = bl_labels[:,0]
+                try:
+                    a1_ind = NP.asarray([antlabel_index[str(antlabel)] for antlabel in a1_labels])
+                    a2_ind = NP.asarray([antlabel_index[str(antlabel)] for antlabel in a2_labels])
+                except KeyError:
+                    raise KeyError('Antenna labels of baselines not found in attribute layout')
+                if not NP.allclose(self.layout['positions'][a2_ind,:] - self.layout['positions'][a1_ind,:], baselines_in_local_frame, atol=1e-3):
+                    raise ValueError('Baseline vectors are inconsistent with antenna positions in attribute layout')
+                skypos_dircos_roi = GEOM.altaz2dircos(skypos_altaz_roi, units='degrees')
+                if (gradient_mode is not None) and (gradient_mode.lower() == 'baseline'):
+                    skyvis, skyvis_gradient = antenna_factored_visibilities(self.layout['positions'], a1_ind, a2_ind, skypos_dircos_roi, pbfluxes, self.channels, pc_dircos=pc_dircos, gradient=True, memsave=memsave, memory_limit=memory_available)
+                else:
+                    skyvis = antenna_factored_visibilities(self.layout['positions'], a1_ind, a2_ind, skypos_dircos_roi, pbfluxes, self.channels, pc_dircos=pc_dircos, gradient=False, memsave=memsave, memory_limit=memory_available)
+            elif (memory_budget is None) and (nthreads == 1) and (memsave != 'mixed') and (float(memory_available) > memory_required):
+                if memsave:
+                    if phasor_mode == 'recurrence':
+                        phase_matrix = phasor_recurrence(self.geometric_delays[-1].astype(NP.float64) - pc_delay_offsets.astype(NP.float64).reshape(1,-1), self.channels, memsave=True)
+                    else:
+                        phase_matrix = NP.exp(-1j * NP.asarray(2.0 * NP.pi).astype(NP.float32) *  (self.geometric_delays[-1][:,:,NP.newaxis].astype(NP.float32) - pc_delay_offsets.astype(NP.float32).reshape(1,-1,1)) * self.channels.astype(NP.float32).reshape(1,1,-1)).astype(NP.complex64)
+                    if vis_wts is not None:
+                        # phase_matrix *= vis_wts[:,:,NP.newaxis]
+                        phase_matrix *= vis_wts
+                    skyvis = NP.sum(pbfluxes[:,NP.newaxis,:] * phase_matrix, axis=0) # SUM(nsrc x nbl x nchan, axis=0) = nbl x nchan
+                    if gradient_mode is not None:
+                        if gradient_mode.lower() == 'baseline':
+                            skyvis_gradient = NP.sum(skypos_dircos_roi[:,:,NP.newaxis,NP.newaxis].astype(NP.float32) * pbfluxes[:,NP.newaxis,NP.newaxis,:] * phase_matrix[:,NP.newaxis,:,:], axis=0) # SUM(nsrc x 3 x nbl x nchan, axis=0) = 3 x nbl x nchan
+                elif phasor_mode == 'recurrence':
+                    phase_matrix = phasor_recurrence(self.geometric_delays[-1].astype(NP.float64) - pc_delay_offsets.astype(NP.float64).reshape(1,-1), self.channels, memsave=False)
+                    if vis_wts is not None:
+                        phase_matrix *= vis_wts
+                    skyvis = NP.sum(pbfluxes[:,NP.newaxis,:] * phase_matrix, axis=0) # SUM(nsrc x nbl x nchan, axis=0) = nbl x nchan
+                    if gradient_mode is not None:
+                        if gradient_mode.lower() == 'baseline':
+                            skyvis_gradient = NP.sum(skypos_dircos_roi[:,:,NP.newaxis,NP.newaxis].astype(NP.float64) * pbfluxes[:,NP.newaxis,NP.newaxis,:] * phase_matrix[:,NP.newaxis,:,:], axis=0) # SUM(nsrc x 3 x nbl x nchan, axis=0) = 3 x nbl x nchan
+                else:
+                    phase_matrix = 2.0 * NP.pi * (self.geometric_delays[-1][:,:,NP.newaxis].astype(NP.float64) - pc_delay_offsets.astype(NP.float64).reshape(1,-1,1)) * self.channels.astype(NP.float64).reshape(1,1,-1)
+                    if vis_wts is not None:
+                        # skyvis = NP.sum(pbfluxes[:,NP.newaxis,:] * NP.exp(-1j*phase_matrix) * vis_wts[:,:,NP.newaxis], axis=0) # Don't apply bandpass here
+                        skyvis = NP.sum(pbfluxes[:,NP.newaxis,:] * NP.exp(-1j*phase_matrix) * vis_wts, axis=0) # SUM(nsrc x nbl x nchan, axis=0) = nbl x nchan
+                        if gradient_mode is not None:
+                            if gradient_mode.lower() == 'baseline':
+                                skyvis_gradient = NP.sum(skypos_dircos_roi[:,:,NP.newaxis,NP.newaxis].astype(NP.float64) * pbfluxes[:,NP.newaxis,NP.newaxis,:] * NP.exp(-1j*phase_matrix[:,NP.newaxis,:,:]) * vis_wts[:,NP.newaxis,:,:], axis=0) # SUM(nsrc x 3 x nbl x nchan, axis=0) = 3 x nbl x nchan
+                    else:
+                        skyvis = NP.sum(pbfluxes[:,NP.newaxis,:] * NP.exp(-1j*phase_matrix), axis=0) # SUM(nsrc x nbl x nchan, axis=0) = nbl x nchan
+                        if gradient_mode is not None:
+                            if gradient_mode.lower() == 'baseline':
+                                skyvis_gradient = NP.sum(skypos_dircos_roi[:,:,NP.newaxis,NP.newaxis].astype(NP.float64) * pbfluxes[:,NP.newaxis,NP.newaxis,:] * NP.exp(-1j*phase_matrix[:,NP.newaxis,:,:]), axis=0) # SUM(nsrc x 3 x nbl x nchan, axis=0) = 3 x nbl x nchan
+            else:
+                if memory_budget is None:
+                    if float(memory_available) <= memory_required:
+                        print '\t\tDetecting memory shortage. Tiling over sky directions, baselines and frequency channels.'
+                    memory_budget = memory_available
+                skypos_dircos_roi = None
+                if (gradient_mode is not None) and (gradient_mode.lower() == 'baseline'):
+                    skypos_dircos_roi = GEOM.altaz2dircos(skypos_altaz_roi, units='degrees')
+                    skyvis, skyvis_gradient = tiled_visibilities(geometric_delays.astype(NP.float64) - pc_delay_offsets.astype(NP.float64).reshape(1,-1), pbfluxes, self.channels, vis_wts=vis_wts, skypos_dircos=skypos_dircos_roi, phasor_mode=phasor_mode, memsave=memsave, memory_budget=memory_budget, scratch=self._scratch, debug_hook=tile_hook, nthreads=nthreads)
+                else:
+                    skyvis = tiled_visibilities(geometric_delays.astype(NP.float64) - pc_delay_offsets.astype(NP.float64).reshape(1,-1), pbfluxes, self.channels, vis_wts=vis_wts, skypos_dircos=None, phasor_mode=phasor_mode, memsave=memsave, memory_budget=memory_budget, scratch=self._scratch, debug_hook=tile_hook, nthreads=nthreads)
+            self.obs_catalog_indices.append(m2)
+        else:
+            print 'No sources found in the catalog within matching radius. Simply populating the observed visibilities and/or gradients with noise.'
+            if gradient_mode is not None:
+                if gradient_mode.lower() == 'baseline':
+                    skyvis_gradient = NP.zeros( (3, self.baselines.shape[0], self.channels.size), dtype=datatype)
 
-        bandpass     [numpy array] Bandpass weights associated with the
-                     interferometers for the specified timestamp of observation
+        if self.timestamp == []:
+            self.skyvis_freq, self._time_buffers['skyvis_freq'] = _append_along_axis(None, skyvis[:,:,NP.newaxis], 2, capacity=self.n_acc_hint, leading=self.time_major)
+            if gradient_mode is not None:
+                if gradient_mode.lower() == 'baseline':
+                    self.gradient[gradient_mode], self._time_buffers['gradient'] = _append_along_axis(None, skyvis_gradient[:,:,:,NP.newaxis], 3, capacity=self.n_acc_hint, leading=self.time_major)
+        else:
+            self.skyvis_freq, self._time_buffers['skyvis_freq'] = _append_along_axis(self.skyvis_freq, skyvis[:,:,NP.newaxis], 2, buf=self._time_buffers.get('skyvis_freq'), capacity=self.n_acc_hint, leading=self.time_major)
+            if gradient_mode is not None:
+                if gradient_mode.lower() == 'baseline':
+                    self.gradient[gradient_mode], self._time_buffers['gradient'] = _append_along_axis(self.gradient[gradient_mode], skyvis_gradient[:,:,:,NP.newaxis], 3, buf=self._time_buffers.get('gradient'), capacity=self.n_acc_hint, leading=self.time_major)
 
-        pointing_center
-                     [2-element numpy vector or list] Pointing center (latitude
-                     and longitude) of the observation at a given timestamp.
-                     This is where the telescopes will be phased up to as
-                     reference. Coordinate system for the pointing_center is
-                     specified by the attribute pointing_coords initialized in
-                     __init__().
+        self.timestamp = self.timestamp + [timestamp]
+        self.t_acc = self.t_acc + [t_acc]
+        self.t_obs += t_acc
+        self.n_acc += 1
+        self.lst = self.lst + [lst]
+        self.cull_info += [cull_info]
 
-        skymodel     [instance of class SkyModel] It consists of source flux
-                     densities, their positions, and spectral indices. Read
-                     class SkyModel docstring for more information.
+    ############################################################################
 
-        t_acc        [scalar] Accumulation time (sec) corresponding to timestamp
+    def _snapshot_bandpass_Tsys(self, bandpass, Tsysinfo, bpcorrect=None):
 
-        brightness_units
-                     [string] Units of flux density in the catalog and for the
-                     generated visibilities. Accepted values are 'Jy' (Jansky)
-                     and 'K' (Kelvin for temperature). If None set, it defaults
-                     to 'Jy'
+        """
+        -------------------------------------------------------------------------
+        !!! FOR INTERNAL USE ONLY !!!
+        Verify and reshape the bandpass and system temperature of a snapshot to
+        the shape n_baselines x nchan. Used by member functions observe() and
+        observe_batch()
 
-        Keyword Inputs:
+        Inputs:
 
-        roi_info     [instance of class ROI_parameters] It consists of indices
-                     in the polskymodel object, polarized beams for different
-                     baseline types for every time stamp that will be simulated
+        bandpass     [numpy array] Bandpass weights associated with the
+                     interferometers for the snapshot. Read docstring of
+                     member function observe() for details
 
-        roi_radius   [scalar] Radius of the region of interest (degrees) inside
-                     which sources are to be observed. Default = 90 degrees,
-                     which is the entire horizon.
+        Tsysinfo     [dictionary] Contains system temperature information for
+                     the snapshot. Read docstring of member function observe()
+                     for details
 
-        roi_center   [string] Center of the region of interest around which
-                     roi_radius is used. Accepted values are 'pointing_center'
-                     and 'zenith'. If set to None, it defaults to 'zenith'.
+        Keyword Inputs:
 
-        lst          [scalar] LST (in degrees) associated with the timestamp
+        bpcorrect    [numpy array] Bandpass correction applied to the system
+                     temperature. Read docstring of member function observe()
+                     for details
 
-        gradient_mode
-                     [string] If set to None, visibilities will be simulated as
-                     usual. If set to string, both visibilities and visibility
-                     gradients with respect to the quantity specified in the
-                     string will be simulated. Currently accepted value is
-                     'baseline'. Plan to incorporate gradients with respect to
-                     'skypos' and 'frequency' as well in the future.
+        Output:
 
-        memsave      [boolean] If set to True, enforce computations in single
-                     precision, otherwise enforce double precision (default)
-        ------------------------------------------------------------------------
+        Tuple consisting of bandpass and system temperature, each of shape
+        n_baselines x nchan
+        -------------------------------------------------------------------------
         """
 
         if len(bandpass.shape) == 1:
             if bandpass.size != self.channels.size:
                 raise ValueError('Specified bandpass incompatible with the number of frequency channels')
 
-            if len(self.bp.shape) == 2:
-                self.bp = NP.expand_dims(NP.repeat(bandpass.reshape(1,-1), self.baselines.shape[0], axis=0), axis=2)
-            else:
-                self.bp = NP.dstack((self.bp, NP.repeat(bandpass.reshape(1,-1), self.baselines.shape[0], axis=0)))
+            bandpass = NP.repeat(bandpass.reshape(1,-1), self.baselines.shape[0], axis=0)
         elif len(bandpass.shape) == 2:
             if bandpass.shape[1] != self.channels.size:
                 raise ValueError('Specified bandpass incompatible with the number of frequency channels')
             elif bandpass.shape[0] != self.baselines.shape[0]:
                 raise ValueError('Specified bandpass incompatible with the number of interferometers')
-
-            if len(self.bp.shape) == 2:
-                self.bp = NP.expand_dims(bandpass, axis=2)
-            else:
-                self.bp = NP.dstack((self.bp, bandpass))
         elif len(bandpass.shape) == 3:
             if bandpass.shape[1] != self.channels.size:
                 raise ValueError('Specified bandpass incompatible with the number of frequency channels')
@@ -5470,13 +7641,7 @@ class InterferometerArray(object):
                 raise ValueError('Specified bandpass incompatible with the number of interferometers')
             elif bandpass.shape[2] != 1:
                 raise ValueError('Bandpass can have only one layer for this instance of accumulation.')
-
-            if len(self.bp.shape) == 2:
-                self.bp = bandpass
-            else:
-                self.bp = NP.dstack((self.bp, bandpass))
-
-        self.bp_wts = NP.ones_like(self.bp) # All additional bandpass shaping weights are set to unity.
+            bandpass = bandpass[:,:,0]
 
         if isinstance(Tsysinfo, dict):
             set_Tsys = False
@@ -5493,7 +7658,6 @@ class InterferometerArray(object):
         else:
             raise TypeError('Input Tsysinfo must be a dictionary')
 
-        self.Tsysinfo += [Tsysinfo]
         if bpcorrect is not None:
             if not isinstance(bpcorrect, NP.ndarray):
                 raise TypeError('Input specifying bandpass correction must be a numpy array')
@@ -5510,141 +7674,346 @@ class InterferometerArray(object):
         if isinstance(Tsys, (int,float)):
             if Tsys < 0.0:
                 raise ValueError('Tsys found to be negative.')
-
-            if len(self.Tsys.shape) == 2:
-                self.Tsys = Tsys + NP.zeros((self.baselines.shape[0], self.channels.size, 1))
-            else:
-                self.Tsys = NP.dstack((self.Tsys, Tsys + NP.zeros((self.baselines.shape[0], self.channels.size, 1))))
+            Tsys = Tsys + NP.zeros((self.baselines.shape[0], self.channels.size))
         elif isinstance(Tsys, (list, tuple, NP.ndarray)):
             Tsys = NP.asarray(Tsys)
             if NP.any(Tsys < 0.0):
                 raise ValueError('Tsys should be non-negative.')
 
             if Tsys.size == self.baselines.shape[0]:
-                if self.Tsys.ndim == 2:
-                    self.Tsys = NP.expand_dims(NP.repeat(Tsys.reshape(-1,1), self.channels.size, axis=1), axis=2)
-                elif self.Tsys.ndim == 3:
-                    self.Tsys = NP.dstack((self.Tsys, NP.expand_dims(NP.repeat(Tsys.reshape(-1,1), self.channels.size, axis=1), axis=2)))
+                Tsys = NP.repeat(Tsys.reshape(-1,1), self.channels.size, axis=1)
             elif Tsys.size == self.channels.size:
-                if self.Tsys.ndim == 2:
-                    self.Tsys = NP.expand_dims(NP.repeat(Tsys.reshape(1,-1), self.baselines.shape[0], axis=0), axis=2)
-                elif self.Tsys.ndim == 3:
-                    self.Tsys = NP.dstack((self.Tsys, NP.expand_dims(NP.repeat(Tsys.reshape(1,-1), self.baselines.shape[0], axis=0), axis=2)))
+                Tsys = NP.repeat(Tsys.reshape(1,-1), self.baselines.shape[0], axis=0)
             elif Tsys.size == self.baselines.shape[0]*self.channels.size:
-                if self.Tsys.ndim == 2:
-                    self.Tsys = NP.expand_dims(Tsys.reshape(-1,self.channels.size), axis=2)
-                elif self.Tsys.ndim == 3:
-                    self.Tsys = NP.dstack((self.Tsys, NP.expand_dims(Tsys.reshape(-1,self.channels.size), axis=2)))
+                Tsys = Tsys.reshape(-1,self.channels.size)
             else:
                 raise ValueError('Specified Tsys has incompatible dimensions with the number of baselines and/or number of frequency channels.')
         else:
             raise TypeError('Tsys should be a scalar, list, tuple, or numpy array')
 
-        # if (brightness_units is None) or (brightness_units=='Jy') or (brightness_units=='JY') or (brightness_units=='jy'):
-        #     if self.vis_rms_freq is None:
-        #         self.vis_rms_freq = 2.0 * FCNST.k / NP.sqrt(2.0*t_acc*self.freq_resolution) * NP.expand_dims(self.Tsys[:,:,-1]/self.A_eff/self.eff_Q, axis=2) / CNST.Jy
-        #     elif len(self.vis_rms_freq.shape) == 3:
-        #         self.vis_rms_freq = NP.dstack((self.vis_rms_freq, 2.0 * FCNST.k / NP.sqrt(2.0*t_acc*self.freq_resolution) * NP.expand_dims(self.Tsys[:,:,-1]/self.A_eff/self.eff_Q, axis=2)/CNST.Jy))
-        #     self.flux_unit = 'JY'
-        # elif (brightness_units=='K') or (brightness_units=='k'):
-        #     if len(self.vis_rms_freq.shape) == 2:
-        #         self.vis_rms_freq = 1 / NP.sqrt(2.0*t_acc*self.freq_resolution) * NP.expand_dims(self.Tsys[:,:,-1]/self.eff_Q, axis=2)
-        #     elif len(self.vis_rms_freq.shape) == 3:
-        #         self.vis_rms_freq = NP.dstack((self.vis_rms_freq, 1 / NP.sqrt(2.0*t_acc*self.freq_resolution) * NP.expand_dims(self.Tsys[:,:,-1]/self.eff_Q, axis=2)))
-        #     self.flux_unit = 'K'
-        # else:
-        #     raise ValueError('Invalid brightness temperature units specified.')
+        return (bandpass, Tsys)
+
+    ############################################################################
+
+    def observe_batch(self, timestamps, Tsysinfo, bandpass, pointing_centers,
+                      skymodel, t_acc, pb_info=None, brightness_units=None,
+                      bpcorrect=None, roi_info=None, roi_radius=None,
+                      roi_center=None, lsts=None, gradient_mode=None,
+                      memsave=False, vis_engine=None, phasor_mode=None,
+                      memory_budget=None, nthreads=None, cull_tol=None,
+                      beam_cache=None):
+
+        """
+        -------------------------------------------------------------------------
+        Simulate a block of snapshot observations, by an instance of the
+        InterferometerArray class, of the sky when a sky catalog is provided.
+        The result is identical to calling member function observe() for each
+        snapshot in turn, but the input verification, the coordinate
+        transformations of the sky catalog, the selection of sources in the
+        region of interest, the spectra of the sources and the primary beam
+        are evaluated once for the entire block of snapshots. The visibilities
+        are computed over blocks of (snapshot x source) combinations so that
+        the Python overhead per snapshot is amortized and the array operations
+        act on larger operands.
+
+        Inputs:
+
+        timestamps   [list] Timestamps associated with each snapshot in the
+                     block
+
+        Tsysinfo     [dictionary or list of dictionaries] Contains system
+                     temperature information. If a dictionary is provided, it
+                     is applicable to all the snapshots, otherwise the list
+                     must contain one dictionary per snapshot. Read docstring
+                     of member function observe() for the keys and values
+
+        bandpass     [numpy array] Bandpass weights associated with the
+                     interferometers. If it is of shape nchan or n_baselines x
+                     nchan, it is applicable to all the snapshots. If it is of
+                     shape n_baselines x nchan x n_snapshots, the last axis
+                     corresponds to the snapshots
+
+        pointing_centers
+                     [numpy array] Pointing centers (longitude and latitude)
+                     of the snapshots of shape n_snapshots x 2. If a 2-element
+                     vector is provided, it is applicable to all the
+                     snapshots. Coordinate system for the pointing centers is
+                     specified by the attribute pointing_coords initialized in
+                     __init__().
+
+        skymodel     [instance of class SkyModel] It consists of source flux
+                     densities, their positions, and spectral indices. Read
+                     class SkyModel docstring for more information.
+
+        t_acc        [scalar or list] Accumulation time (sec) of the
+                     snapshots. If a scalar is provided, it is applicable to
+                     all the snapshots
+
+        Keyword Inputs:
+
+        pb_info      [dictionary or list of dictionaries] Information about
+                     the primary beam. If a dictionary is provided, it is
+                     applicable to all the snapshots, otherwise the list must
+                     contain one dictionary per snapshot. Default=None
+
+        brightness_units
+                     [string] Units of flux density in the catalog and for the
+                     generated visibilities. Accepted values are 'Jy' (Jansky)
+                     and 'K' (Kelvin for temperature). If None set, it defaults
+                     to 'Jy'
+
+        bpcorrect    [numpy array] Bandpass correction applied to the system
+                     temperature of all the snapshots. Read docstring of member
+                     function observe() for details
+
+        roi_info     [list of dictionaries] One dictionary per snapshot which
+                     contains the keys 'ind' and 'pbeam' holding the indices of
+                     the sources in skymodel and the primary beam at these
+                     sources respectively. If set to None (default), they are
+                     determined from roi_radius and roi_center
+
+        roi_radius   [scalar] Radius of the region of interest (degrees) inside
+                     which sources are to be observed. Default = 90 degrees,
+                     which is the entire horizon.
+
+        roi_center   [string] Center of the region of interest around which
+                     roi_radius is used. Accepted values are 'pointing_center'
+                     and 'zenith'. If set to None, it defaults to 'zenith'.
+
+        lsts         [list or numpy array] LST (in degrees) associated with
+                     each snapshot
+
+        gradient_mode
+                     [string] If set to None, visibilities will be simulated as
+                     usual. If set to 'baseline', visibility gradients with
+                     respect to the baseline vectors are simulated as well.
+                     Read docstring of member function observe() for details
+
+        memsave      [boolean or string] If set to True, enforce computations
+                     in single precision, otherwise enforce double precision
+                     (default). If set to 'mixed', the phases are evaluated in
+                     double precision, the phasors are stored in single
+                     precision and the visibilities are accumulated in double
+                     precision before they are stored in single precision
+                     (see function tiled_visibilities()). This is nearly as
+                     fast and as compact as single precision but retains the
+                     accuracy of the sum over a large number of sources
+
+        vis_engine   [string] Specifies how the visibilities are computed.
+                     Accepted values are 'baseline' (default) and 'antenna'.
+                     Read docstring of member function observe() for details
+
+        phasor_mode  [string] Specifies how the phasors are evaluated.
+                     Accepted values are 'direct' (default) and 'recurrence'.
+                     Read docstring of member function observe() for details
+
+        memory_budget
+                     [scalar] Memory (in bytes) that may be used for the
+                     phasors of a block of (snapshot x source) combinations.
+                     If set to None (default), the available system memory
+                     is used
+
+        nthreads     [integer] Number of threads over which the blocks of
+                     (snapshot x source) combinations are distributed. The
+                     memory budget is shared equally by the threads. If set
+                     to None (default) or 1, the blocks are computed serially
+
+        cull_tol     [scalar] Fractional tolerance on the error of the
+                     visibilities for culling faint sources in each snapshot.
+                     If set to None (default), no sources are culled. Read
+                     docstring of member function observe() for details
+
+        beam_cache   [instance of class PrimaryBeamCache or
+                     PhasedArrayBeamCache] Primary beam tabulated on a grid of
+                     the local sky from which the primary beam at the sources
+                     of all the snapshots is looked up at once, or per
+                     snapshot from the grid of its beamformer settings if an
+                     instance of class PhasedArrayBeamCache. Read docstring of
+                     member function observe() for details. If set to None
+                     (default), the primary beam is evaluated using pb_info
+        ------------------------------------------------------------------------
+        """
+
+        if not isinstance(timestamps, (list, tuple, NP.ndarray)):
+            raise TypeError('Input timestamps must be a list, tuple or numpy array')
+        timestamps = list(timestamps)
+        n_snaps = len(timestamps)
+        if n_snaps == 0:
+            raise ValueError('Input timestamps must contain at least one timestamp')
+
+        if vis_engine is None:
+            vis_engine = 'baseline'
+        elif not isinstance(vis_engine, str):
+            raise TypeError('Input vis_engine must be a string')
+        elif vis_engine.lower() not in ['baseline', 'antenna']:
+            raise ValueError('Invalid value specified in input vis_engine')
+        vis_engine = vis_engine.lower()
+
+        if phasor_mode is None:
+            phasor_mode = 'direct'
+        elif not isinstance(phasor_mode, str):
+            raise TypeError('Input phasor_mode must be a string')
+        elif phasor_mode.lower() not in ['direct', 'recurrence']:
+            raise ValueError('Invalid value specified in input phasor_mode')
+        phasor_mode = phasor_mode.lower()
+        if (phasor_mode == 'recurrence') and (self.channels.size > 1):
+            if _channel_spacing(self.channels) is None:
+                warnings.warn('Frequency channels are not evenly spaced. Reverting to direct evaluation of phasors.')
+                phasor_mode = 'direct'
+
+        if gradient_mode is not None:
+            if not isinstance(gradient_mode, str):
+                raise TypeError('Input gradient_mode must be a string')
+            if gradient_mode.lower() not in ['baseline', 'skypos', 'frequency']:
+                raise ValueError('Invalid value specified in input gradient_mode')
+            if self.gradient_mode is None:
+                self.gradient_mode = gradient_mode
+
+        if nthreads is None:
+            nthreads = 1
+        elif not isinstance(nthreads, int):
+            raise TypeError('Input nthreads must be an integer')
+        elif nthreads < 1:
+            raise ValueError('Input nthreads must be positive')
+
+        if memsave not in [True, False, 'mixed']:
+            raise ValueError('Input memsave must be True, False or "mixed"')
+
+        if cull_tol is not None:
+            if not isinstance(cull_tol, (int,float)):
+                raise TypeError('Input cull_tol must be a scalar')
+            if cull_tol < 0.0:
+                raise ValueError('Input cull_tol must be non-negative')
+
+        if not isinstance(skymodel, SM.SkyModel):
+            raise TypeError('skymodel should be an instance of class SkyModel.')
+
+        if isinstance(Tsysinfo, dict):
+            Tsysinfo = [Tsysinfo] * n_snaps
+        elif isinstance(Tsysinfo, (list, tuple)):
+            if len(Tsysinfo) != n_snaps:
+                raise ValueError('Number of elements in input Tsysinfo must equal the number of timestamps')
+            Tsysinfo = list(Tsysinfo)
+        else:
+            raise TypeError('Input Tsysinfo must be a dictionary or a list of dictionaries')
+
+        if isinstance(t_acc, (int, float)):
+            t_acc = [t_acc] * n_snaps
+        elif isinstance(t_acc, (list, tuple, NP.ndarray)):
+            t_acc = NP.asarray(t_acc).ravel().tolist()
+            if len(t_acc) != n_snaps:
+                raise ValueError('Number of elements in input t_acc must equal the number of timestamps')
+        else:
+            raise TypeError('Input t_acc must be a scalar, list or numpy array')
+
+        if (pb_info is None) or isinstance(pb_info, dict):
+            pb_info_shared = True
+            pb_info = [pb_info] * n_snaps
+        elif isinstance(pb_info, (list, tuple)):
+            if len(pb_info) != n_snaps:
+                raise ValueError('Number of elements in input pb_info must equal the number of timestamps')
+            pb_info_shared = all([pbi is None for pbi in pb_info])
+        else:
+            raise TypeError('Input pb_info must be a dictionary or a list of dictionaries')
 
-        if not self.timestamp:
-            self.pointing_center = NP.asarray(pointing_center).reshape(1,-1)
-            self.phase_center = NP.asarray(pointing_center).reshape(1,-1)
+        if lsts is None:
+            lsts = [None] * n_snaps
+            lst_arr = None
         else:
-            self.pointing_center = NP.vstack((self.pointing_center, NP.asarray(pointing_center).reshape(1,-1)))
-            self.phase_center = NP.vstack((self.phase_center, NP.asarray(pointing_center).reshape(1,-1)))
+            lst_arr = NP.asarray(lsts, dtype=NP.float64).ravel()
+            if lst_arr.size != n_snaps:
+                raise ValueError('Number of elements in input lsts must equal the number of timestamps')
+            lsts = lst_arr.tolist()
+
+        pointing_centers = NP.asarray(pointing_centers, dtype=NP.float64)
+        if pointing_centers.size == 2:
+            pointing_centers = NP.repeat(pointing_centers.reshape(1,-1), n_snaps, axis=0)
+        elif pointing_centers.size == 2 * n_snaps:
+            pointing_centers = pointing_centers.reshape(n_snaps,2)
+        else:
+            raise ValueError('Input pointing_centers must be of shape n_snapshots x 2')
+
+        bandpass = NP.asarray(bandpass)
+        snaps_bandpass = NP.empty((self.baselines.shape[0], self.channels.size, n_snaps), dtype=NP.float64)
+        snaps_Tsys = NP.empty((self.baselines.shape[0], self.channels.size, n_snaps), dtype=NP.float64)
+        for ti in xrange(n_snaps):
+            if (bandpass.ndim == 3) and (bandpass.shape[2] == n_snaps):
+                snaps_bandpass[:,:,ti], snaps_Tsys[:,:,ti] = self._snapshot_bandpass_Tsys(bandpass[:,:,ti], Tsysinfo[ti], bpcorrect=bpcorrect)
+            else:
+                snaps_bandpass[:,:,ti], snaps_Tsys[:,:,ti] = self._snapshot_bandpass_Tsys(bandpass, Tsysinfo[ti], bpcorrect=bpcorrect)
 
-        pointing_lon = self.pointing_center[-1,0]
-        pointing_lat = self.pointing_center[-1,1]
+        if (lst_arr is None) and ((self.skycoords == 'radec') or (self.pointing_coords == 'radec')):
+            raise ValueError('LSTs must be provided when the sky coordinates or the pointing centers are in RA-Dec format.')
 
+        # Pointing centers of all the snapshots in the coordinates of the sky
+        # model (used with roi_center='pointing_center') and in Alt-Az
+
+        pointing_lon = pointing_centers[:,0]
+        pointing_lat = pointing_centers[:,1]
         if self.skycoords == 'radec':
             if self.pointing_coords == 'hadec':
-                if lst is not None:
-                    pointing_lon = lst - self.pointing_center[-1,0]
-                    pointing_lat = self.pointing_center[-1,1]
-                else:
-                    raise ValueError('LST must be provided. Sky coordinates are in RA-Dec format while pointing center is in HA-Dec format.')
+                pointing_lon = lst_arr - pointing_centers[:,0]
             elif self.pointing_coords == 'altaz':
-                pointing_lonlat = GEOM.altaz2hadec(self.pointing_center[-1,:], self.latitude, units='degrees')
-                pointing_lon = lst - pointing_lonlat[0]
-                pointing_lat = pointing_lonlat[1]
+                pointing_lonlat = GEOM.altaz2hadec(pointing_centers, self.latitude, units='degrees').reshape(-1,2)
+                pointing_lon = lst_arr - pointing_lonlat[:,0]
+                pointing_lat = pointing_lonlat[:,1]
         elif self.skycoords == 'hadec':
             if self.pointing_coords == 'radec':
-                if lst is not None:
-                    pointing_lon = lst - self.pointing_center[-1,0]
-                    pointing_lat = self.pointing_center[-1,1]
-                else:
-                    raise ValueError('LST must be provided. Sky coordinates are in RA-Dec format while pointing center is in HA-Dec format.')
+                pointing_lon = lst_arr - pointing_centers[:,0]
             elif self.pointing_coords == 'altaz':
-                pointing_lonlat = lst - GEOM.altaz2hadec(self.pointing_center[-1,:], self.latitude, units='degrees')
-                pointing_lon = pointing_lonlat[0]
-                pointing_lat = pointing_lonlat[1]
+                pointing_lonlat = GEOM.altaz2hadec(pointing_centers, self.latitude, units='degrees').reshape(-1,2)
+                pointing_lon = pointing_lonlat[:,0]
+                pointing_lat = pointing_lonlat[:,1]
         else:
             if self.pointing_coords == 'radec':
-                if lst is not None:
-                    pointing_lonlat = GEOM.hadec2altaz(NP.asarray([lst-self.pointing_center[-1,0], self.pointing_center[-1,1]]), self.latitude, units='degrees')
-                    pointing_lon = pointing_lonlat[0]
-                    pointing_lat = pointing_lonlat[1]
-                else:
-                    raise ValueError('LST must be provided. Sky coordinates are in Alt-Az format while pointing center is in RA-Dec format.')
+                pointing_lonlat = GEOM.hadec2altaz(NP.hstack(((lst_arr-pointing_centers[:,0]).reshape(-1,1), pointing_centers[:,1].reshape(-1,1))), self.latitude, units='degrees').reshape(-1,2)
+                pointing_lon = pointing_lonlat[:,0]
+                pointing_lat = pointing_lonlat[:,1]
             elif self.pointing_coords == 'hadec':
-                pointing_lonlat = GEOM.hadec2altaz(self.pointing_center,
-                                                   self.latitude,
-                                                   units='degrees')
-                pointing_lon = pointing_lonlat[0]
-                pointing_lat = pointing_lonlat[1]
-
-        baselines_in_local_frame = self.baselines
-        if self.baseline_coords == 'equatorial':
-            baselines_in_local_frame = GEOM.xyz2enu(self.baselines, self.latitude, 'degrees')
+                pointing_lonlat = GEOM.hadec2altaz(pointing_centers, self.latitude, units='degrees').reshape(-1,2)
+                pointing_lon = pointing_lonlat[:,0]
+                pointing_lat = pointing_lonlat[:,1]
 
-        pc_altaz = self.pointing_center[-1,:] # Convert pointing center to Alt-Az coordinates
+        pc_altaz = pointing_centers
         if self.pointing_coords == 'hadec':
-            pc_altaz = GEOM.hadec2altaz(self.pointing_center[-1,:], self.latitude, units='degrees')
+            pc_altaz = GEOM.hadec2altaz(pointing_centers, self.latitude, units='degrees').reshape(-1,2)
         elif self.pointing_coords == 'radec':
-            if lst is not None:
-                pc_altaz = GEOM.hadec2altaz(NP.asarray([lst-self.pointing_center[-1,0], self.pointing_center[-1,1]]), self.latitude, units='degrees')
-            else:
-                raise ValueError('LST must be provided. Sky coordinates are in Alt-Az format while pointing center is in RA-Dec format.')
-
-        pc_dircos = GEOM.altaz2dircos(pc_altaz, 'degrees') # Convert pointing center to direction cosine coordinates
-        pc_delay_offsets = DLY.geometric_delay(baselines_in_local_frame, pc_dircos, altaz=False, hadec=False, dircos=True, latitude=self.latitude)
-        if memsave:
-            pc_delay_offsets = pc_delay_offsets.astype(NP.float32)
+            pc_altaz = GEOM.hadec2altaz(NP.hstack(((lst_arr-pointing_centers[:,0]).reshape(-1,1), pointing_centers[:,1].reshape(-1,1))), self.latitude, units='degrees').reshape(-1,2)
 
-        # pointing_phase = 2.0 * NP.pi * NP.repeat(NP.dot(baselines_in_local_frame, pc_dircos.reshape(-1,1)), self.channels.size, axis=1) * NP.repeat(self.channels.reshape(1,-1), self.baselines.shape[0], axis=0)/FCNST.c
+        baselines_in_local_frame = self.baselines
+        if self.baseline_coords == 'equatorial':
+            baselines_in_local_frame = GEOM.xyz2enu(self.baselines, self.latitude, 'degrees')
 
-        if not isinstance(skymodel, SM.SkyModel):
-            raise TypeError('skymodel should be an instance of class SkyModel.')
+        pc_dircos = GEOM.altaz2dircos(pc_altaz, 'degrees').reshape(-1,3) # n_snaps x 3
+        pc_delay_offsets = DLY.geometric_delay(baselines_in_local_frame, pc_dircos, altaz=False, hadec=False, dircos=True, latitude=self.latitude).reshape(n_snaps,-1) # n_snaps x nbl
 
-        if self.skycoords == 'hadec':
-            skypos_altaz = GEOM.hadec2altaz(skymodel.location, self.latitude, units='degrees')
-        elif self.skycoords == 'radec':
-            skypos_altaz = GEOM.hadec2altaz(NP.hstack((NP.asarray(lst-skymodel.location[:,0]).reshape(-1,1), skymodel.location[:,1].reshape(-1,1))), self.latitude, units='degrees')
+        # Select the sources in the region of interest of all the snapshots
 
+        skypos_altaz = None
         pb = None
         if roi_info is not None:
-            if ('ind' not in roi_info) or ('pbeam' not in roi_info):
-                raise KeyError('Both "ind" and "pbeam" keys must be present in dictionary roi_info')
-
-            if (roi_info['ind'] is not None) and (roi_info['pbeam'] is not None):
+            if not isinstance(roi_info, (list, tuple)):
+                raise TypeError('Input roi_info must be a list of dictionaries')
+            if len(roi_info) != n_snaps:
+                raise ValueError('Number of elements in input roi_info must equal the number of timestamps')
+            m2 = []
+            pb = []
+            for ti in xrange(n_snaps):
+                if ('ind' not in roi_info[ti]) or ('pbeam' not in roi_info[ti]):
+                    raise KeyError('Both "ind" and "pbeam" keys must be present in dictionary roi_info')
+                ind = NP.asarray(roi_info[ti]['ind']).astype(NP.int64).ravel()
                 try:
-                    pb = roi_info['pbeam'].reshape(-1,len(self.channels))
+                    if isinstance(roi_info[ti]['pbeam'], dict): # Reconstruct from reduced spectral basis
+                        pbeam = PB.lowrank_beam_expand(roi_info[ti]['pbeam']).reshape(-1,len(self.channels))
+                    else:
+                        pbeam = NP.asarray(roi_info[ti]['pbeam']).reshape(-1,len(self.channels))
                 except ValueError:
                     raise ValueError('Number of columns of primary beam in key "pbeam" of dictionary roi_info must be equal to number of frequency channels.')
-
-                if NP.asarray(roi_info['ind']).size == pb.shape[0]:
-                    m2 = roi_info['ind']
-                else:
+                if ind.size != pbeam.shape[0]:
                     raise ValueError('Values in keys ind and pbeam in must carry same number of elements.')
+                m2 += [ind]
+                pb += [pbeam]
+            pb = NP.concatenate(pb, axis=0)
         else:
             if roi_radius is None:
                 roi_radius = 90.0
@@ -5655,169 +8024,246 @@ class InterferometerArray(object):
                 raise ValueError('Center of region of interest, roi_center, must be set to "zenith" or "pointing_center".')
 
             if roi_center == 'pointing_center':
-                m1, m2, d12 = GEOM.spherematch(pointing_lon, pointing_lat, skymodel.location[:,0], skymodel.location[:,1], roi_radius, maxmatches=0)
+                m2 = []
+                for ti in xrange(n_snaps):
+                    m1, m2_snap, d12 = GEOM.spherematch(pointing_lon[ti], pointing_lat[ti], skymodel.location[:,0], skymodel.location[:,1], roi_radius, maxmatches=0)
+                    m2 += [NP.asarray(m2_snap).astype(NP.int64).ravel()]
             else: # roi_center = 'zenith'
-                m2 = NP.arange(skypos_altaz.shape[0])
-                m2 = m2[NP.where(skypos_altaz[:,0] >= 90.0-roi_radius)] # select sources whose altitude (angle above horizon) is 90-roi_radius
+                if self.skycoords == 'radec':
+                    skypos_hadec = NP.hstack(((lst_arr.reshape(-1,1) - skymodel.location[:,0].reshape(1,-1)).reshape(-1,1), NP.repeat(skymodel.location[:,1].reshape(1,-1), n_snaps, axis=0).reshape(-1,1)))
+                    skypos_altaz = GEOM.hadec2altaz(skypos_hadec, self.latitude, units='degrees').reshape(n_snaps,-1,2) # n_snaps x nsrc x 2
+                    del skypos_hadec
+                elif self.skycoords == 'hadec':
+                    skypos_altaz = GEOM.hadec2altaz(skymodel.location, self.latitude, units='degrees').reshape(1,-1,2)
+                else:
+                    skypos_altaz = skymodel.location.reshape(1,-1,2)
+                m2 = [NP.where(skypos_altaz[ti%skypos_altaz.shape[0],:,0] >= 90.0-roi_radius)[0] for ti in xrange(n_snaps)] # select sources whose altitude (angle above horizon) is 90-roi_radius
+
+        # Stack the selected sources of all the snapshots along a single axis
+        # of (snapshot x source) combinations
+
+        n_src_snap = NP.asarray([ind.size for ind in m2], dtype=NP.int64)
+        src_offsets = NP.concatenate(([0], NP.cumsum(n_src_snap)))
+        n_rows = src_offsets[-1]
+        row_snap = NP.repeat(NP.arange(n_snaps), n_src_snap)
 
         if memsave:
             datatype = NP.complex64
         else:
             datatype = NP.complex128
-        skyvis = NP.zeros( (self.baselines.shape[0], self.channels.size), dtype=datatype)
-        if len(m2) != 0:
-            skypos_altaz_roi = skypos_altaz[m2,:]
-            coords_str = 'altaz'
+        if memsave == 'mixed':
+            accumtype = NP.complex128
+        else:
+            accumtype = datatype
+        skyvis = NP.zeros((self.baselines.shape[0], self.channels.size, n_snaps), dtype=accumtype)
+        if (gradient_mode is not None) and (gradient_mode.lower() == 'baseline'):
+            skyvis_gradient = NP.zeros((3, self.baselines.shape[0], self.channels.size, n_snaps), dtype=accumtype)
+
+        cull_info = [None] * n_snaps
+        if cull_tol is not None:
+            cull_info = [{'nsrc': int(n_src_snap[ti]), 'ncull': 0, 'error_bound': 0.0} for ti in xrange(n_snaps)]
+
+        if n_rows > 0:
+            row_src = NP.concatenate(m2)
+            if skypos_altaz is not None:
+                skypos_altaz_rows = skypos_altaz[row_snap%skypos_altaz.shape[0],row_src,:]
+            elif self.skycoords == 'radec':
+                skypos_altaz_rows = GEOM.hadec2altaz(NP.hstack(((lst_arr[row_snap]-skymodel.location[row_src,0]).reshape(-1,1), skymodel.location[row_src,1].reshape(-1,1))), self.latitude, units='degrees').reshape(-1,2)
+            elif self.skycoords == 'hadec':
+                skypos_altaz_rows = GEOM.hadec2altaz(skymodel.location[row_src,:], self.latitude, units='degrees').reshape(-1,2)
+            else:
+                skypos_altaz_rows = skymodel.location[row_src,:]
+            skypos_altaz = None
+            skypos_dircos_rows = GEOM.altaz2dircos(skypos_altaz_rows, units='degrees').reshape(-1,3)
 
-            skymodel_subset = skymodel.subset(indices=m2)
-            fluxes = skymodel_subset.generate_spectrum()
+            # The source spectra do not depend on time and are generated once
+            # for all sources selected in any of the snapshots
+
+            src_ind, row_subset_ind = NP.unique(row_src, return_inverse=True)
+            skymodel_subset = skymodel.subset(indices=src_ind)
+            fluxes = skymodel_subset.generate_spectrum()[row_subset_ind,:]
 
             if pb is None:
-                pb = PB.primary_beam_generator(skypos_altaz_roi, self.channels/1.0e9, skyunits='altaz', telescope=self.telescope, pointing_info=pb_info, pointing_center=pc_altaz, freq_scale='GHz')
+                if isinstance(beam_cache, PB.PhasedArrayBeamCache):
+                    pb = NP.empty((n_rows, self.channels.size), dtype=NP.float64)
+                    for ti in xrange(n_snaps):
+                        if n_src_snap[ti] > 0:
+                            pb[src_offsets[ti]:src_offsets[ti+1],:] = beam_cache.lookup(skypos_altaz_rows[src_offsets[ti]:src_offsets[ti+1],:], skyunits='altaz', freqs=self.channels, freq_scale='Hz', pointing_info=pb_info[ti], pointing_center=pc_altaz[ti,:])
+                elif beam_cache is not None:
+                    pb = beam_cache.lookup(skypos_altaz_rows, skyunits='altaz', freqs=self.channels, freq_scale='Hz')
+                elif pb_info_shared and NP.allclose(pc_altaz, pc_altaz[0,:].reshape(1,-1)):
+                    pb = PB.primary_beam_generator(skypos_altaz_rows, self.channels/1.0e9, skyunits='altaz', telescope=self.telescope, pointing_info=pb_info[0], pointing_center=pc_altaz[0,:], freq_scale='GHz')
+                else:
+                    pb = NP.empty((n_rows, self.channels.size), dtype=NP.float64)
+                    for ti in xrange(n_snaps):
+                        if n_src_snap[ti] > 0:
+                            pb[src_offsets[ti]:src_offsets[ti+1],:] = PB.primary_beam_generator(skypos_altaz_rows[src_offsets[ti]:src_offsets[ti+1],:], self.channels/1.0e9, skyunits='altaz', telescope=self.telescope, pointing_info=pb_info[ti], pointing_center=pc_altaz[ti,:], freq_scale='GHz')
 
             pbfluxes = pb * fluxes
-            geometric_delays = DLY.geometric_delay(baselines_in_local_frame, skypos_altaz_roi, altaz=(coords_str=='altaz'), hadec=(coords_str=='hadec'), latitude=self.latitude)
+            del fluxes
+
+            # Cull the faint sources of each snapshot and drop their rows
+
+            if cull_tol is not None:
+                keep_rows = []
+                for ti in xrange(n_snaps):
+                    keep_ind, cull_info[ti]['ncull'], cull_info[ti]['error_bound'] = beam_weighted_culling(pbfluxes[src_offsets[ti]:src_offsets[ti+1],:], cull_tol)
+                    if cull_info[ti]['ncull'] > 0:
+                        print '\t\tCulled {0:0d} of {1:0d} sources in snapshot {2} with a bound of {3:.2e} on the fractional error of the visibilities.'.format(cull_info[ti]['ncull'], cull_info[ti]['nsrc'], timestamps[ti], cull_info[ti]['error_bound'])
+                        m2[ti] = m2[ti][keep_ind]
+                    keep_rows += [src_offsets[ti] + keep_ind]
+                keep_rows = NP.concatenate(keep_rows)
+                if keep_rows.size < n_rows:
+                    pbfluxes = pbfluxes[keep_rows,:]
+                    skypos_altaz_rows = skypos_altaz_rows[keep_rows,:]
+                    skypos_dircos_rows = skypos_dircos_rows[keep_rows,:]
+                    row_snap = row_snap[keep_rows]
+                    row_subset_ind = row_subset_ind[keep_rows]
+                    n_src_snap = NP.asarray([ind.size for ind in m2], dtype=NP.int64)
+                    src_offsets = NP.concatenate(([0], NP.cumsum(n_src_snap)))
+                    n_rows = src_offsets[-1]
+
+            geometric_delays = DLY.geometric_delay(baselines_in_local_frame, skypos_altaz_rows, altaz=True, hadec=False, latitude=self.latitude) # n_rows x nbl
 
             vis_wts = None
             if skymodel_subset.src_shape is not None:
-                eps = 1.0e-13
-                f0 = self.channels[int(0.5*self.channels.size)]
-                wl0 = FCNST.c / f0
                 wl = FCNST.c / self.channels
-                skypos_dircos_roi = GEOM.altaz2dircos(skypos_altaz_roi, units='degrees')
-                # projected_spatial_frequencies = NP.sqrt(self.baseline_lengths.reshape(1,-1)**2 - (FCNST.c * geometric_delays)**2) / wl0
                 projected_spatial_frequencies = NP.sqrt(self.baseline_lengths.reshape(1,-1,1)**2 - (FCNST.c * geometric_delays[:,:,NP.newaxis])**2) / wl.reshape(1,1,-1)
-
-                src_FWHM = NP.sqrt(skymodel_subset.src_shape[:,0] * skymodel_subset.src_shape[:,1])
+                src_FWHM = NP.sqrt(skymodel_subset.src_shape[row_subset_ind,0] * skymodel_subset.src_shape[row_subset_ind,1])
                 src_FWHM_dircos = 2.0 * NP.sin(0.5*NP.radians(src_FWHM)).reshape(-1,1) # assuming the projected baseline is perpendicular to source direction
-                # src_sigma_spatial_frequencies = 2.0 * NP.sqrt(2.0 * NP.log(2.0)) / (2 * NP.pi * src_FWHM_dircos)  # estimate 1
-                src_sigma_spatial_frequencies = 1.0 / NP.sqrt(2.0*NP.log(2.0)) / src_FWHM_dircos  # estimate 2 created by constraint that at lambda/D_proj, visibility weights are half
-
-	        # # Tried deriving below an alternate expression but previous expression for src_FWHM_dircos seems better
-                # dtheta_radial = NP.radians(src_FWHM).reshape(-1,1)
-                # dtheta_circum = NP.radians(src_FWHM).reshape(-1,1)
-                # src_FWHM_dircos = NP.sqrt(skypos_dircos_roi[:,2].reshape(-1,1)**2 * dtheta_radial**2 + dtheta_circum**2) / NP.sqrt(2.0) # from 2D error propagation (another approximation to commented expression above for the same quantity). Add in quadrature and divide by sqrt(2) to get radius of error circle
-                # arbitrary_factor_for_src_width = NP.sqrt(2.0) # An arbitrary factor that can be adjusted based on what the longest baseline measures for a source of certain finite width
-                # src_sigma_spatial_frequencies = 2.0 * NP.sqrt(2.0 * NP.log(2.0)) / (2 * NP.pi * src_FWHM_dircos) * arbitrary_factor_for_src_width
-
-                # extended_sources_flag = 1/NP.clip(projected_spatial_frequencies, 0.5, NP.amax(projected_spatial_frequencies)) < src_FWHM_dircos
-
-                vis_wts = NP.ones_like(projected_spatial_frequencies)
-                # vis_wts = NP.exp(-0.5 * (projected_spatial_frequencies/src_sigma_spatial_frequencies)**2)
-                vis_wts = NP.exp(-0.5 * (projected_spatial_frequencies/src_sigma_spatial_frequencies[:,:,NP.newaxis])**2) # nsrc x nbl x nchan
+                src_sigma_spatial_frequencies = 1.0 / NP.sqrt(2.0*NP.log(2.0)) / src_FWHM_dircos
+                vis_wts = NP.exp(-0.5 * (projected_spatial_frequencies/src_sigma_spatial_frequencies[:,:,NP.newaxis])**2) # n_rows x nbl x nchan
+                del projected_spatial_frequencies
 
             if memsave:
                 pbfluxes = pbfluxes.astype(NP.float32, copy=False)
-                self.geometric_delays = self.geometric_delays + [geometric_delays.astype(NP.float32)]
+                if memsave != 'mixed':
+                    geometric_delays = geometric_delays.astype(NP.float32)
                 if vis_wts is not None:
                     vis_wts = vis_wts.astype(NP.float32, copy=False)
-            else:
-                self.geometric_delays = self.geometric_delays + [geometric_delays]
 
-            # memory_available = psutil.phymem_usage().available
-            memory_available = psutil.virtual_memory().available
+            if (vis_engine == 'antenna') and (vis_wts is not None):
+                warnings.warn('Extended sources cannot be factored into antenna phasors. Reverting to baseline based visibility computation.')
+                vis_engine = 'baseline'
 
-            if gradient_mode is None:
-                if memsave:
-                    memory_required = len(m2) * self.channels.size * self.baselines.shape[0] * 4.0 * 2 # bytes, 4 bytes per float, factor 2 is because the phase involves complex values
-                else:
-                    memory_required = len(m2) * self.channels.size * self.baselines.shape[0] * 8.0 * 2 # bytes, 8 bytes per float, factor 2 is because the phase involves complex values
+            if memory_budget is None:
+                memory_available = psutil.virtual_memory().available
+            else:
+                memory_available = memory_budget
+
+            if vis_engine == 'antenna':
+                if not self.layout:
+                    raise KeyError('Attribute layout must be set to use antenna based visibility computation')
+                if self.layout['coords'] != 'ENU':
+                    raise ValueError('Antenna positions in attribute layout must be in local ENU coordinates')
+                antlabel_index = {str(antlabel): aind for aind,antlabel in enumerate(self.layout['labels'])}
+                bl_labels = NP.asarray(self.labels)
+                if bl_labels.dtype.names is not None:
+                    a1_labels = bl_labels['A1']
+                    a2_labels = bl_labels['A2']
+                else: # list of (A2, A1) tuples
+                    a1_labels = bl_labels[:,1]
+                    a2_labels = bl_labels[:,0]
+                try:
+                    a1_ind = NP.asarray([antlabel_index[str(antlabel)] for antlabel in a1_labels])
+                    a2_ind = NP.asarray([antlabel_index[str(antlabel)] for antlabel in a2_labels])
+                except KeyError:
+                    raise KeyError('Antenna labels of baselines not found in attribute layout')
+                if not NP.allclose(self.layout['positions'][a2_ind,:] - self.layout['positions'][a1_ind,:], baselines_in_local_frame, atol=1e-3):
+                    raise ValueError('Baseline vectors are inconsistent with antenna positions in attribute layout')
+                for ti in xrange(n_snaps):
+                    if n_src_snap[ti] > 0:
+                        rows = slice(src_offsets[ti], src_offsets[ti+1])
+                        if (gradient_mode is not None) and (gradient_mode.lower() == 'baseline'):
+                            skyvis[:,:,ti], skyvis_gradient[:,:,:,ti] = antenna_factored_visibilities(self.layout['positions'], a1_ind, a2_ind, skypos_dircos_rows[rows,:], pbfluxes[rows,:], self.channels, pc_dircos=pc_dircos[ti,:], gradient=True, memsave=memsave, memory_limit=memory_available)
+                        else:
+                            skyvis[:,:,ti] = antenna_factored_visibilities(self.layout['positions'], a1_ind, a2_ind, skypos_dircos_rows[rows,:], pbfluxes[rows,:], self.channels, pc_dircos=pc_dircos[ti,:], gradient=False, memsave=memsave, memory_limit=memory_available)
             else:
-                if not isinstance(gradient_mode, str):
-                    raise TypeError('Input gradient_mode must be a string')
-                if gradient_mode.lower() not in ['baseline', 'skypos', 'frequency']:
-                    raise ValueError('Invalid value specified in input gradient_mode')
-                if self.gradient_mode is None:
-                    self.gradient_mode = gradient_mode
-                if gradient_mode.lower() == 'baseline':
-                    skyvis_gradient = NP.zeros((3, self.baselines.shape[0], self.channels.size), dtype=datatype)
-                    if memsave:
-                        memory_required = 3 * len(m2) * self.channels.size * self.baselines.shape[0] * 4.0 * 2 # bytes, 4 bytes per float, factor 2 is because the phase involves complex values, factor 3 because of three vector components of the gradient
-                    else:
-                        memory_required = 3 * len(m2) * self.channels.size * self.baselines.shape[0] * 8.0 * 2 # bytes, 8 bytes per float, factor 2 is because the phase involves complex values, factor 3 because of three vector components of the gradient
-
-            if float(memory_available) > memory_required:
                 if memsave:
-                    phase_matrix = NP.exp(-1j * NP.asarray(2.0 * NP.pi).astype(NP.float32) *  (self.geometric_delays[-1][:,:,NP.newaxis].astype(NP.float32) - pc_delay_offsets.astype(NP.float32).reshape(1,-1,1)) * self.channels.astype(NP.float32).reshape(1,1,-1)).astype(NP.complex64)
-                    if vis_wts is not None:
-                        # phase_matrix *= vis_wts[:,:,NP.newaxis]
-                        phase_matrix *= vis_wts
-                    skyvis = NP.sum(pbfluxes[:,NP.newaxis,:] * phase_matrix, axis=0) # SUM(nsrc x nbl x nchan, axis=0) = nbl x nchan
-                    if gradient_mode is not None:
-                        if gradient_mode.lower() == 'baseline':
-                            skyvis_gradient = NP.sum(skypos_dircos_roi[:,:,NP.newaxis,NP.newaxis].astype(NP.float32) * pbfluxes[:,NP.newaxis,NP.newaxis,:] * phase_matrix[:,NP.newaxis,:,:], axis=0) # SUM(nsrc x 3 x nbl x nchan, axis=0) = 3 x nbl x nchan
+                    bytes_per_row = self.channels.size * self.baselines.shape[0] * 4.0 * 2 # bytes, 4 bytes per float, factor 2 is because the phase involves complex values
                 else:
-                    phase_matrix = 2.0 * NP.pi * (self.geometric_delays[-1][:,:,NP.newaxis].astype(NP.float64) - pc_delay_offsets.astype(NP.float64).reshape(1,-1,1)) * self.channels.astype(NP.float64).reshape(1,1,-1)
-                    if vis_wts is not None:
-                        # skyvis = NP.sum(pbfluxes[:,NP.newaxis,:] * NP.exp(-1j*phase_matrix) * vis_wts[:,:,NP.newaxis], axis=0) # Don't apply bandpass here
-                        skyvis = NP.sum(pbfluxes[:,NP.newaxis,:] * NP.exp(-1j*phase_matrix) * vis_wts, axis=0) # SUM(nsrc x nbl x nchan, axis=0) = nbl x nchan
-                        if gradient_mode is not None:
-                            if gradient_mode.lower() == 'baseline':
-                                skyvis_gradient = NP.sum(skypos_dircos_roi[:,:,NP.newaxis,NP.newaxis].astype(NP.float64) * pbfluxes[:,NP.newaxis,NP.newaxis,:] * NP.exp(-1j*phase_matrix[:,NP.newaxis,:,:]) * vis_wts[:,NP.newaxis,:,:], axis=0) # SUM(nsrc x 3 x nbl x nchan, axis=0) = 3 x nbl x nchan
-                    else:
-                        skyvis = NP.sum(pbfluxes[:,NP.newaxis,:] * NP.exp(-1j*phase_matrix), axis=0) # SUM(nsrc x nbl x nchan, axis=0) = nbl x nchan
-                        if gradient_mode is not None:
-                            if gradient_mode.lower() == 'baseline':
-                                skyvis_gradient = NP.sum(skypos_dircos_roi[:,:,NP.newaxis,NP.newaxis].astype(NP.float64) * pbfluxes[:,NP.newaxis,NP.newaxis,:] * NP.exp(-1j*phase_matrix[:,NP.newaxis,:,:]), axis=0) # SUM(nsrc x 3 x nbl x nchan, axis=0) = 3 x nbl x nchan
-            else:
-                print '\t\tDetecting memory shortage. Serializing over sky direction.'
-                downsize_factor = NP.ceil(memory_required/float(memory_available))
-                n_src_stepsize = int(len(m2)/downsize_factor)
-                src_indices = range(0,len(m2),n_src_stepsize)
+                    bytes_per_row = self.channels.size * self.baselines.shape[0] * 8.0 * 2 # bytes, 8 bytes per float, factor 2 is because the phase involves complex values
+                if (gradient_mode is not None) and (gradient_mode.lower() == 'baseline'):
+                    bytes_per_row *= 4 # phases and three vector components of the gradient
+                n_row_stepsize = int(max(1, min(n_rows, NP.floor(memory_available/nthreads/bytes_per_row))))
+                if n_row_stepsize * nthreads < n_rows:
+                    print '\t\tDetecting memory shortage. Serializing over blocks of snapshots and sky directions.'
+
+                block_inputs = []
+                for r0 in xrange(0, n_rows, n_row_stepsize):
+                    r1 = min(r0+n_row_stepsize, n_rows)
+                    block_inputs += [(geometric_delays[r0:r1,:], pc_delay_offsets, row_snap[r0:r1], pbfluxes[r0:r1,:], self.channels, None if vis_wts is None else vis_wts[r0:r1,:,:], skypos_dircos_rows[r0:r1,:] if (gradient_mode is not None) and (gradient_mode.lower() == 'baseline') else None, phasor_mode, memsave)]
+                pool = None
+                if nthreads > 1:
+                    pool = ThreadPool(processes=nthreads)
+                    block_outputs = pool.imap(_snapshot_block_visibilities, block_inputs)
+                else:
+                    block_outputs = (_snapshot_block_visibilities(block_input) for block_input in block_inputs)
+                try:
+                    for seg_snaps, block_skyvis, block_skyvis_gradient in block_outputs:
+                        skyvis[:,:,seg_snaps] += NP.rollaxis(block_skyvis, 0, 3)
+                        if block_skyvis_gradient is not None:
+                            skyvis_gradient[:,:,:,seg_snaps] += NP.rollaxis(block_skyvis_gradient, 0, 4)
+                finally:
+                    if pool is not None:
+                        pool.close()
+                        pool.join()
+
+        for ti in xrange(n_snaps):
+            if n_src_snap[ti] > 0:
                 if memsave:
-                    print '\t\tEnforcing single precision computations.'
-                    for i in xrange(len(src_indices)):
-                        phase_matrix = NP.exp(-1j * NP.asarray(2.0 * NP.pi).astype(NP.float32) * (self.geometric_delays[-1][src_indices[i]:min(src_indices[i]+n_src_stepsize,len(m2)),:,NP.newaxis].astype(NP.float32) - pc_delay_offsets.astype(NP.float32).reshape(1,-1,1)) * self.channels.astype(NP.float32).reshape(1,1,-1)).astype(NP.complex64, copy=False)
-                        if vis_wts is not None:
-                            phase_matrix *= vis_wts[src_indices[i]:min(src_indices[i]+n_src_stepsize,len(m2)),:,:].astype(NP.float32)
-                            # phase_matrix *= vis_wts[src_indices[i]:min(src_indices[i]+n_src_stepsize,len(m2)),:,NP.newaxis].astype(NP.float32)
-
-                        phase_matrix *= pbfluxes[src_indices[i]:min(src_indices[i]+n_src_stepsize,len(m2)),NP.newaxis,:].astype(NP.float32)
-                        skyvis += NP.sum(phase_matrix, axis=0)
-                        if gradient_mode is not None:
-                            if gradient_mode.lower() == 'baseline':
-                                skyvis_gradient += NP.sum(skypos_dircos_roi[src_indices[i]:min(src_indices[i]+n_src_stepsize,len(m2)),:,NP.newaxis,NP.newaxis].astype(NP.float32) * phase_matrix[:,NP.newaxis,:,:], axis=0)
+                    self.geometric_delays.append(geometric_delays[src_offsets[ti]:src_offsets[ti+1],:].astype(NP.float32))
                 else:
-                    for i in xrange(len(src_indices)):
-                        phase_matrix = NP.exp(-1j * NP.asarray(2.0 * NP.pi).astype(NP.float64) * (self.geometric_delays[-1][src_indices[i]:min(src_indices[i]+n_src_stepsize,len(m2)),:,NP.newaxis].astype(NP.float64) - pc_delay_offsets.astype(NP.float64).reshape(1,-1,1)) * self.channels.astype(NP.float64).reshape(1,1,-1)).astype(NP.complex128, copy=False)
-                        if vis_wts is not None:
-                            phase_matrix *= vis_wts[src_indices[i]:min(src_indices[i]+n_src_stepsize,len(m2)),:,:].astype(NP.float64)
+                    self.geometric_delays.append(geometric_delays[src_offsets[ti]:src_offsets[ti+1],:])
+                self.obs_catalog_indices.append(m2[ti])
+            else:
+                print 'No sources found in the catalog within matching radius for snapshot {0}. Simply populating the observed visibilities and/or gradients with noise.'.format(timestamps[ti])
 
-                        phase_matrix *= pbfluxes[src_indices[i]:min(src_indices[i]+n_src_stepsize,len(m2)),NP.newaxis,:].astype(NP.float64)
-                        skyvis += NP.sum(phase_matrix, axis=0)
-                        if gradient_mode is not None:
-                            if gradient_mode.lower() == 'baseline':
-                                skyvis_gradient += NP.sum(skypos_dircos_roi[src_indices[i]:min(src_indices[i]+n_src_stepsize,len(m2)),:,NP.newaxis,NP.newaxis].astype(NP.float64) * phase_matrix[:,NP.newaxis,:,:], axis=0)
-            self.obs_catalog_indices = self.obs_catalog_indices + [m2]
+        skyvis = skyvis.astype(datatype, copy=False)
+        if (gradient_mode is not None) and (gradient_mode.lower() == 'baseline'):
+            skyvis_gradient = skyvis_gradient.astype(datatype, copy=False)
+
+        if len(self.bp.shape) == 2:
+            self.bp, self._time_buffers['bp'] = _append_along_axis(None, snaps_bandpass, 2, capacity=self.n_acc_hint, leading=self.time_major)
+            self.bp_wts, self._time_buffers['bp_wts'] = _append_along_axis(None, NP.ones_like(snaps_bandpass), 2, capacity=self.n_acc_hint, leading=self.time_major)
         else:
-            print 'No sources found in the catalog within matching radius. Simply populating the observed visibilities and/or gradients with noise.'
-            if gradient_mode is not None:
-                if gradient_mode.lower() == 'baseline':
-                    skyvis_gradient = NP.zeros( (3, self.baselines.shape[0], self.channels.size), dtype=datatype)
+            self.bp, self._time_buffers['bp'] = _append_along_axis(self.bp, snaps_bandpass, 2, buf=self._time_buffers.get('bp'), capacity=self.n_acc_hint, leading=self.time_major)
+            self.bp_wts, self._time_buffers['bp_wts'] = _append_along_axis(self.bp_wts, NP.ones_like(snaps_bandpass), 2, buf=self._time_buffers.get('bp_wts'), capacity=self.n_acc_hint, leading=self.time_major) # All additional bandpass shaping weights are set to unity.
 
-        if self.timestamp == []:
-            self.skyvis_freq = skyvis[:,:,NP.newaxis]
-            if gradient_mode is not None:
-                if gradient_mode.lower() == 'baseline':
-                    self.gradient[gradient_mode] = skyvis_gradient[:,:,:,NP.newaxis]
+        self.Tsysinfo += Tsysinfo
+        if self.Tsys.ndim == 2:
+            self.Tsys, self._time_buffers['Tsys'] = _append_along_axis(None, snaps_Tsys, 2, capacity=self.n_acc_hint, leading=self.time_major)
         else:
-            self.skyvis_freq = NP.dstack((self.skyvis_freq, skyvis[:,:,NP.newaxis]))
-            if gradient_mode is not None:
-                if gradient_mode.lower() == 'baseline':
-                    self.gradient[gradient_mode] = NP.concatenate((self.gradient[gradient_mode], skyvis_gradient[:,:,:,NP.newaxis]), axis=3)
+            self.Tsys, self._time_buffers['Tsys'] = _append_along_axis(self.Tsys, snaps_Tsys, 2, buf=self._time_buffers.get('Tsys'), capacity=self.n_acc_hint, leading=self.time_major)
 
-        self.timestamp = self.timestamp + [timestamp]
-        self.t_acc = self.t_acc + [t_acc]
-        self.t_obs += t_acc
-        self.n_acc += 1
-        self.lst = self.lst + [lst]
+        if not self.timestamp:
+            self.pointing_center, self._time_buffers['pointing_center'] = _append_along_axis(None, pointing_centers, 0, capacity=self.n_acc_hint)
+            self.phase_center, self._time_buffers['phase_center'] = _append_along_axis(None, pointing_centers, 0, capacity=self.n_acc_hint)
+            self.skyvis_freq, self._time_buffers['skyvis_freq'] = _append_along_axis(None, skyvis, 2, capacity=self.n_acc_hint, leading=self.time_major)
+            if (gradient_mode is not None) and (gradient_mode.lower() == 'baseline'):
+                self.gradient[gradient_mode], self._time_buffers['gradient'] = _append_along_axis(None, skyvis_gradient, 3, capacity=self.n_acc_hint, leading=self.time_major)
+        else:
+            self.pointing_center, self._time_buffers['pointing_center'] = _append_along_axis(self.pointing_center, pointing_centers, 0, buf=self._time_buffers.get('pointing_center'), capacity=self.n_acc_hint)
+            self.phase_center, self._time_buffers['phase_center'] = _append_along_axis(self.phase_center, pointing_centers, 0, buf=self._time_buffers.get('phase_center'), capacity=self.n_acc_hint)
+            self.skyvis_freq, self._time_buffers['skyvis_freq'] = _append_along_axis(self.skyvis_freq, skyvis, 2, buf=self._time_buffers.get('skyvis_freq'), capacity=self.n_acc_hint, leading=self.time_major)
+            if (gradient_mode is not None) and (gradient_mode.lower() == 'baseline'):
+                self.gradient[gradient_mode], self._time_buffers['gradient'] = _append_along_axis(self.gradient[gradient_mode], skyvis_gradient, 3, buf=self._time_buffers.get('gradient'), capacity=self.n_acc_hint, leading=self.time_major)
+
+        self.timestamp = self.timestamp + timestamps
+        self.t_acc = self.t_acc + t_acc
+        self.t_obs += NP.sum(t_acc)
+        self.n_acc += n_snaps
+        self.lst = self.lst + lsts
+        self.cull_info += cull_info
 
     ############################################################################
 
     def observing_run(self, pointing_init, skymodel, t_acc, duration, channels,
                       bpass, Tsys, lst_init, roi_radius=None, roi_center=None,
                       mode='track', pointing_coords=None, freq_scale=None,
-                      brightness_units=None, verbose=True, memsave=False):
+                      brightness_units=None, verbose=True, memsave=False,
+                      vis_engine=None, phasor_mode=None, batch_size=None,
+                      nthreads=None, cull_tol=None, beam_cache=None):
 
         """
         -------------------------------------------------------------------------
@@ -5898,6 +8344,46 @@ class InterferometerArray(object):
 
         verbose       [boolean] If set to True, prints progress and diagnostic
                       messages. Default = True
+
+        memsave       [boolean or string] If set to True, enforce
+                      computations in single precision, otherwise enforce
+                      double precision (default). If set to 'mixed', use
+                      single precision phasors with double precision phases
+                      and accumulation. Read docstring of member function
+                      observe() for details
+
+        vis_engine    [string] Specifies how the visibilities are computed.
+                      Accepted values are 'baseline' (default) and 'antenna'.
+                      Read docstring of member function observe() for details
+
+        phasor_mode   [string] Specifies how the phasors are evaluated.
+                      Accepted values are 'direct' (default) and 'recurrence'.
+                      Read docstring of member function observe() for details
+
+        batch_size    [integer] Number of snapshots simulated together using
+                      member function observe_batch(). If set to None
+                      (default) or 1, the snapshots are simulated one at a
+                      time using member function observe()
+
+        nthreads      [integer] Number of threads used to compute the
+                      visibilities of each snapshot or batch of snapshots.
+                      Read docstring of member function observe() for
+                      details. If set to None (default) or 1, the computation
+                      is single-threaded
+
+        cull_tol      [scalar] Fractional tolerance on the error of the
+                      visibilities for culling faint sources in each snapshot.
+                      Read docstring of member function observe() for
+                      details. If set to None (default), no sources are culled
+
+        beam_cache    [instance of class PrimaryBeamCache or
+                      PhasedArrayBeamCache] Primary beam tabulated on a grid
+                      of the local sky from which the primary beam at the
+                      sources is looked up. It is valid only in 'drift' mode
+                      where the pointing is fixed in the local frame. Read
+                      docstring of member function observe() for details. If
+                      set to None (default), the primary beam is evaluated
+                      afresh in every snapshot
         ------------------------------------------------------------------------
         """
 
@@ -6003,6 +8489,13 @@ class InterferometerArray(object):
         if not isinstance(lst_init, (int, float)):
             raise TypeError('Starting LST should be a scalar')
 
+        if batch_size is None:
+            batch_size = 1
+        elif not isinstance(batch_size, int):
+            raise TypeError('batch_size must be an integer')
+        elif batch_size < 1:
+            raise ValueError('batch_size must be positive')
+
         if verbose:
             print '\tVerified input arguments.'
             print '\tProceeding to schedule the observing run...'
@@ -6011,6 +8504,9 @@ class InterferometerArray(object):
         if verbose:
             print '\tCreated LST range for observing run.'
 
+        if (self.n_acc_hint is None) or (self.n_acc_hint < self.n_acc + n_acc):
+            self.n_acc_hint = self.n_acc + n_acc
+
         if mode == 'track':
             if pointing_coords == 'hadec':
                 pointing = NP.asarray([lst_init - pointing_init[0], pointing_init[1]])
@@ -6023,6 +8519,9 @@ class InterferometerArray(object):
                 raise ValueError('pointing_coords can only be set to "hadec", "radec" or "altaz".')
             self.pointing_coords = 'radec'
             self.phase_center_coords = 'radec'
+            if beam_cache is not None:
+                warnings.warn('Primary beam cache is not valid in "track" mode. Evaluating the primary beam afresh in every snapshot.')
+                beam_cache = None
         elif mode == 'drift':
             if pointing_coords == 'radec':
                 pointing = NP.asarray([lst_init - pointing_init[0], pointing_init[1]])
@@ -6041,17 +8540,36 @@ class InterferometerArray(object):
         if verbose:
             milestones = range(max(1,int(n_acc/10)), int(n_acc), max(1,int(n_acc/10)))
             progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(), PGB.ETA()], maxval=n_acc).start()
-        for i in range(n_acc):
-            # if (verbose) and (i in milestones):
-            #     print '\t\tObserving run {0:.1f} % complete...'.format(100.0*i/n_acc)
-            timestamp = str(DT.datetime.now())
-            self.observe(timestamp, Tsys[:,:,i%Tsys.shape[2]],
-                         bpass[:,:,i%bpass.shape[2]], pointing, skymodel,
-                         t_acc, brightness_units=brightness_units,
-                         roi_radius=roi_radius, roi_center=roi_center,
-                         lst=lst[i], memsave=memsave)
-            if verbose:
-                progress.update(i+1)
+        if batch_size == 1:
+            for i in range(n_acc):
+                # if (verbose) and (i in milestones):
+                #     print '\t\tObserving run {0:.1f} % complete...'.format(100.0*i/n_acc)
+                timestamp = str(DT.datetime.now())
+                self.observe(timestamp, Tsys[:,:,i%Tsys.shape[2]],
+                             bpass[:,:,i%bpass.shape[2]], pointing, skymodel,
+                             t_acc, brightness_units=brightness_units,
+                             roi_radius=roi_radius, roi_center=roi_center,
+                             lst=lst[i], memsave=memsave, vis_engine=vis_engine,
+                             phasor_mode=phasor_mode, nthreads=nthreads,
+                             cull_tol=cull_tol, beam_cache=beam_cache)
+                if verbose:
+                    progress.update(i+1)
+        else:
+            for i in range(0, n_acc, batch_size):
+                ind = NP.arange(i, min(i+batch_size, n_acc))
+                timestamps = [str(DT.datetime.now())] * ind.size
+                Tsysinfo = [{'Tnet': Tsys[:,:,j%Tsys.shape[2]]} for j in ind]
+                self.observe_batch(timestamps, Tsysinfo,
+                                   bpass[:,:,ind%bpass.shape[2]], pointing,
+                                   skymodel, t_acc,
+                                   brightness_units=brightness_units,
+                                   roi_radius=roi_radius, roi_center=roi_center,
+                                   lsts=lst[ind], memsave=memsave,
+                                   vis_engine=vis_engine,
+                                   phasor_mode=phasor_mode, nthreads=nthreads,
+                                   cull_tol=cull_tol, beam_cache=beam_cache)
+                if verbose:
+                    progress.update(ind[-1]+1)
 
         if verbose:
             progress.finish()
@@ -6092,7 +8610,11 @@ class InterferometerArray(object):
         else:
             raise ValueError('Flux density units can only be in Jy or K.')
 
-        self.vis_noise_freq = self.vis_rms_freq / NP.sqrt(2.0) * (NP.random.randn(self.baselines.shape[0], self.channels.size, len(self.timestamp)) + 1j * NP.random.randn(self.baselines.shape[0], self.channels.size, len(self.timestamp))) # sqrt(2.0) is to split equal uncertainty into real and imaginary parts
+        if self.time_major:
+            self.vis_noise_freq = self.vis_rms_freq / NP.sqrt(2.0) * NP.rollaxis(NP.random.randn(len(self.timestamp), self.baselines.shape[0], self.channels.size) + 1j * NP.random.randn(len(self.timestamp), self.baselines.shape[0], self.channels.size), 0, 3) # sqrt(2.0) is to split equal uncertainty into real and imaginary parts
+            self._time_major_layout(['vis_noise_freq'])
+        else:
+            self.vis_noise_freq = self.vis_rms_freq / NP.sqrt(2.0) * (NP.random.randn(self.baselines.shape[0], self.channels.size, len(self.timestamp)) + 1j * NP.random.randn(self.baselines.shape[0], self.channels.size, len(self.timestamp))) # sqrt(2.0) is to split equal uncertainty into real and imaginary parts
 
     #############################################################################
 
@@ -6122,6 +8644,8 @@ class InterferometerArray(object):
             warnings.warn('Gain table absent. Proceeding with default unity gains')
 
         self.vis_freq = gains * self.skyvis_freq + self.vis_noise_freq
+        if self.time_major:
+            self._time_major_layout(['vis_freq'])
 
     #############################################################################
 
@@ -6215,7 +8739,7 @@ class InterferometerArray(object):
             delta_skyvis_freq = -1j * 2.0 * NP.pi / wl.reshape(1,1,-1,1) * NP.sum(perturbations[gradient_mode][...,NP.newaxis,NP.newaxis] * self.gradient[gradient_mode][NP.newaxis,...], axis=1) # nseed x nbl x nchan x ntimes
             
         outshape = list(inpshape[:-2])
-        outshape += [self.labels.size, self.channels.size, self.lst.size]
+        outshape += [self.labels.size, self.channels.size, len(self.lst)]
         outshape = tuple(outshape)
         delta_skyvis_freq = delta_skyvis_freq.reshape(outshape)
         return delta_skyvis_freq
@@ -6304,6 +8828,111 @@ class InterferometerArray(object):
 
     #############################################################################
 
+    def deduplicate_measurements(self, blgroups=None):
+
+        """
+        -------------------------------------------------------------------------
+        Retain only one representative baseline from each group of redundant
+        baselines and discard the measurements on the other baselines of the
+        group. The other baselines of each group are only referenced in the
+        attributes blgroups and bl_reversemap which are updated to be keyed by
+        the retained representative baselines. This is the inverse of member
+        function duplicate_measurements(). Simulating visibilities only on the
+        retained baselines reduces the computations by the redundancy of the
+        array.
+
+        Inputs:
+
+        blgroups    [dictionary] Dictionary of baseline groups where the keys are
+                    tuples containing baseline labels. Under each key is a numpy
+                    recarray of baseline labels that are redundant and fall under
+                    the baseline label key. Baselines that do not belong to any
+                    group are retained. If set to None (default), attribute
+                    blgroups will be used
+        -------------------------------------------------------------------------
+        """
+
+        if blgroups is None:
+            blgroups = self.blgroups
+        if not isinstance(blgroups, dict):
+            raise TypeError('Input blgroups must be a dictionary')
+
+        member_groupkey = {}
+        for blkey in blgroups:
+            for lbl in blgroups[blkey]:
+                member_groupkey[tuple(lbl)] = blkey
+
+        select_ind = []
+        groupkey_representative = {}
+        for ind,label in enumerate(self.labels):
+            label = tuple(label)
+            if label in member_groupkey:
+                blkey = member_groupkey[label]
+            elif tuple(reversed(label)) in member_groupkey:
+                blkey = member_groupkey[tuple(reversed(label))]
+            else: # Baseline does not belong to any redundant group
+                select_ind += [ind]
+                continue
+            if blkey not in groupkey_representative:
+                groupkey_representative[blkey] = label
+                select_ind += [ind]
+
+        self.blgroups = {}
+        self.bl_reversemap = {}
+        for blkey in blgroups:
+            members = NP.asarray(blgroups[blkey])
+            if blkey in groupkey_representative:
+                representative = groupkey_representative[blkey]
+            else: # None of the group members are present in this instance
+                representative = tuple(blkey)
+            self.blgroups[representative] = members
+            for lbl in members:
+                self.bl_reversemap[tuple(lbl)] = NP.asarray([representative], dtype=members.dtype)
+
+        nbl = len(self.labels)
+        if len(select_ind) == nbl:
+            return
+        select_ind = NP.asarray(select_ind)
+
+        if isinstance(self.labels, NP.ndarray):
+            self.labels = self.labels[select_ind]
+        else:
+            self.labels = [self.labels[ind] for ind in select_ind]
+        self.baselines = self.baselines[select_ind,:]
+        self.baseline_lengths = self.baseline_lengths[select_ind]
+        self.baseline_orientations = self.baseline_orientations[select_ind]
+        if self.projected_baselines is not None:
+            self.projected_baselines = self.projected_baselines[select_ind,...]
+        if self.skyvis_freq is not None:
+            self.skyvis_freq = self.skyvis_freq[select_ind,...]
+        if self.vis_freq is not None:
+            self.vis_freq = self.vis_freq[select_ind,...]
+        if self.vis_noise_freq is not None:
+            self.vis_noise_freq = self.vis_noise_freq[select_ind,...]
+        if self.vis_rms_freq is not None:
+            self.vis_rms_freq = self.vis_rms_freq[select_ind,...]
+        if self.skyvis_lag is not None:
+            self.skyvis_lag = self.skyvis_lag[select_ind,...]
+        if self.vis_lag is not None:
+            self.vis_lag = self.vis_lag[select_ind,...]
+        if self.vis_noise_lag is not None:
+            self.vis_noise_lag = self.vis_noise_lag[select_ind,...]
+        if self.gradient_mode is not None:
+            self.gradient[self.gradient_mode] = self.gradient[self.gradient_mode][:,select_ind,...]
+        if self.Tsys.shape[0] == nbl:
+            self.Tsys = self.Tsys[select_ind,...]
+        if self.eff_Q.shape[0] == nbl:
+            self.eff_Q = self.eff_Q[select_ind,...]
+        if self.A_eff.shape[0] == nbl:
+            self.A_eff = self.A_eff[select_ind,...]
+        if self.bp.shape[0] == nbl:
+            self.bp = self.bp[select_ind,...]
+        if self.bp_wts.shape[0] == nbl:
+            self.bp_wts = self.bp_wts[select_ind,...]
+        self.geometric_delays = [geometric_delays[:,select_ind] for geometric_delays in self.geometric_delays]
+
+    #############################################################################
+
     def getThreePointCombinations(self):
 
         """
@@ -7187,6 +9816,8 @@ class InterferometerArray(object):
             for elem in loo:
                 if elem.Tsysinfo:
                     self.Tsysinfo = elem.Tsysinfo
+        if axis != 2:
+            self.cull_info = [_merge_cull_info(snapshot_cull_info) for snapshot_cull_info in zip(*[elem.cull_info for elem in loo])]
         if axis != 1:
             if self.skyvis_lag is not None:
                 self.skyvis_lag = NP.concatenate(tuple([elem.skyvis_lag for elem in loo]), axis=axis)
@@ -7221,6 +9852,7 @@ class InterferometerArray(object):
             self.lst = [lst for elem in loo for lst in elem.lst]
             self.timestamp = [timestamp for elem in loo for timestamp in elem.timestamp]
             self.Tsysinfo = [Tsysinfo for elem in loo for Tsysinfo in elem.Tsysinfo]
+            self.cull_info = [cull_info for elem in loo for cull_info in elem.cull_info]
 
     #############################################################################
 
@@ -7347,6 +9979,8 @@ class InterferometerArray(object):
                 hdulist[0].header['telescope'] = (self.telescope['id'], 'Telescope Name')
             if self.telescope['groundplane'] is not None:
                 hdulist[0].header['groundplane'] = (self.telescope['groundplane'], 'Ground plane height')
+            if self.telescope.get('tabulated_kernels', False):
+                hdulist[0].header['tabulated_kernels'] = (True, 'Tabulated primary beam kernels')
             if self.simparms_file is not None:
                 hdulist[0].header['simparms'] = (self.simparms_file, 'YAML file with simulation parameters')
             if self.gradient_mode is not None:
@@ -7475,6 +10109,18 @@ class InterferometerArray(object):
                 tbhdu.header.set('EXTNAME', 'TSYSINFO')
                 hdulist += [tbhdu]
 
+            if any([elem is not None for elem in self.cull_info]):
+                cols = []
+                cols += [fits.Column(name='nsrc', format='K', array=NP.asarray([-1 if elem is None else elem['nsrc'] for elem in self.cull_info], dtype=NP.int64))]
+                cols += [fits.Column(name='ncull', format='K', array=NP.asarray([-1 if elem is None else elem['ncull'] for elem in self.cull_info], dtype=NP.int64))]
+                cols += [fits.Column(name='error_bound', format='D', array=NP.asarray([NP.nan if elem is None else elem['error_bound'] for elem in self.cull_info], dtype=NP.float))]
+                columns = _astropy_columns(cols, tabtype=tabtype)
+                tbhdu = fits.new_table(columns)
+                tbhdu.header.set('EXTNAME', 'CULLING')
+                hdulist += [tbhdu]
+                if verbose:
+                    print '\tCreated extension table containing source culling information.'
+
             hdulist += [fits.ImageHDU(self.Tsys, name='Tsys')]
             if verbose:
                 print '\tCreated an extension for Tsys.'
@@ -7588,6 +10234,8 @@ class InterferometerArray(object):
                 if 'groundplane' in self.telescope:
                     if self.telescope['groundplane'] is not None:
                         antelem_group['groundplane'] = self.telescope['groundplane']
+                if self.telescope.get('tabulated_kernels', False):
+                    antelem_group['tabulated_kernels'] = True
                 if self.layout:
                     layout_group = fileobj.create_group('layout')
                     layout_group['positions'] = self.layout['positions']
@@ -7601,6 +10249,11 @@ class InterferometerArray(object):
                 if self.t_acc:
                     timing_group['t_acc'] = self.t_acc
                 timing_group['timestamps'] = NP.asarray(self.timestamp)
+                if any([elem is not None for elem in self.cull_info]):
+                    cull_group = fileobj.create_group('culling')
+                    cull_group['nsrc'] = NP.asarray([-1 if elem is None else elem['nsrc'] for elem in self.cull_info], dtype=NP.int64)
+                    cull_group['ncull'] = NP.asarray([-1 if elem is None else elem['ncull'] for elem in self.cull_info], dtype=NP.int64)
+                    cull_group['error_bound'] = NP.asarray([NP.nan if elem is None else elem['error_bound'] for elem in self.cull_info], dtype=NP.float)
                 sky_group = fileobj.create_group('skyparms')
                 sky_group['pointing_coords'] = self.pointing_coords
                 sky_group['phase_center_coords'] = self.phase_center_coords
@@ -7680,18 +10333,41 @@ class InterferometerArray(object):
             print '\tInterferometer array information written successfully to file on disk:\n\t\t{0}\n'.format(filename)
 
         if npz:
-            if (self.vis_freq is not None) and (self.vis_noise_freq is not None):
-                NP.savez_compressed(outfile+'.npz', skyvis_freq=self.skyvis_freq, vis_freq=self.vis_freq, vis_noise_freq=self.vis_noise_freq, lst=self.lst, freq=self.channels, timestamp=self.timestamp, bl=self.baselines, bl_length=self.baseline_lengths)
-            else:
-                NP.savez_compressed(outfile+'.npz', skyvis_freq=self.skyvis_freq, lst=self.lst, freq=self.channels, timestamp=self.timestamp, bl=self.baselines, bl_length=self.baseline_lengths)
-            if verbose:
-                print '\tInterferometer array information written successfully to NPZ file on disk:\n\t\t{0}\n'.format(outfile+'.npz')
+            self.save_npz(outfile, verbose=verbose)
 
         if uvfits_parms is not None:
             self.write_uvfits(outfile, uvfits_parms=uvfits_parms, overwrite=overwrite, verbose=verbose)
 
     #############################################################################
 
+    def save_npz(self, outfile, verbose=True):
+
+        """
+        -------------------------------------------------------------------------
+        Saves the essential attributes of the interferometer array information
+        to disk in numpy NPZ format
+
+        Inputs:
+
+        outfile      [string] Filename with full path to be saved to. Will be
+                     appended with '.npz' extension
+
+        Keyword Input(s):
+
+        verbose      [boolean] If True (default), prints diagnostic and progress
+                     messages. If False, suppress printing such messages.
+        -------------------------------------------------------------------------
+        """
+
+        if (self.vis_freq is not None) and (self.vis_noise_freq is not None):
+            NP.savez_compressed(outfile+'.npz', skyvis_freq=self.skyvis_freq, vis_freq=self.vis_freq, vis_noise_freq=self.vis_noise_freq, lst=self.lst, freq=self.channels, timestamp=self.timestamp, bl=self.baselines, bl_length=self.baseline_lengths)
+        else:
+            NP.savez_compressed(outfile+'.npz', skyvis_freq=self.skyvis_freq, lst=self.lst, freq=self.channels, timestamp=self.timestamp, bl=self.baselines, bl_length=self.baseline_lengths)
+        if verbose:
+            print '\tInterferometer array information written successfully to NPZ file on disk:\n\t\t{0}\n'.format(outfile+'.npz')
+
+    #############################################################################
+
     def write_uvfits(self, outfile, uvfits_parms=None, overwrite=False,
                      verbose=True):
 
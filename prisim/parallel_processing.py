@@ -0,0 +1,821 @@
+import os, glob
+import time
+import numpy as NP
+from mpi4py import MPI
+from astropy.table import Table
+from astropy.io import ascii
+from astroutils import MPI_modules as my_MPI
+
+# MPI datatypes of the numpy types of arrays reduced over processes
+_mpi_datatypes = {NP.dtype(NP.float32): MPI.FLOAT, NP.dtype(NP.float64): MPI.DOUBLE, NP.dtype(NP.complex64): MPI.COMPLEX, NP.dtype(NP.complex128): MPI.DOUBLE_COMPLEX}
+
+#################################################################################
+
+def snapshot_block_size(n_chunks, n_acc, nproc, snapshot_batch=1,
+                        tasks_per_process=4):
+
+    """
+    ---------------------------------------------------------------------------
+    Determine the number of snapshots in a block of snapshots so that the
+    chunks of data split into blocks of snapshots provide enough tasks for
+    the processes to balance their load dynamically. The block size is a
+    multiple of the number of snapshots simulated together.
+
+    Inputs:
+
+    n_chunks    [integer] Number of chunks the data is split into
+
+    n_acc       [integer] Number of snapshots
+
+    nproc       [integer] Number of processes
+
+    Keyword Inputs:
+
+    snapshot_batch
+                [integer] Number of snapshots simulated together. The block
+                size is a multiple of this number unless it exceeds n_acc.
+                Default=1
+
+    tasks_per_process
+                [integer] Desired number of tasks per process. Default=4
+
+    Output:
+
+    Number of snapshots in a block
+    ---------------------------------------------------------------------------
+    """
+
+    for arg in [n_chunks, n_acc, nproc, snapshot_batch, tasks_per_process]:
+        if not isinstance(arg, (int, NP.integer)):
+            raise TypeError('Inputs must be integers')
+        if arg < 1:
+            raise ValueError('Inputs must be positive')
+
+    n_batches = int(NP.ceil(n_acc / float(snapshot_batch)))
+    n_blocks = int(NP.ceil(tasks_per_process * nproc / float(n_chunks)))
+    n_blocks = max(1, min(n_blocks, n_batches))
+    return min(n_acc, int(NP.ceil(n_batches / float(n_blocks))) * snapshot_batch)
+
+#################################################################################
+
+def snapshot_tasks(chunk_costs, n_acc, snapshot_block):
+
+    """
+    ---------------------------------------------------------------------------
+    Split the simulation of chunks of data over all snapshots into tasks
+    each of which simulates one chunk over one block of consecutive
+    snapshots. The tasks are ordered by decreasing cost so that the most
+    expensive tasks are started first and the cheapest ones fill in at the
+    end, which keeps the processes pulling tasks from finishing at widely
+    different times.
+
+    Inputs:
+
+    chunk_costs [list or numpy array] Relative cost of simulating one
+                snapshot of each chunk, e.g. the number of visibilities in
+                the chunk
+
+    n_acc       [integer] Number of snapshots
+
+    snapshot_block
+                [integer] Number of snapshots in a block. The last block
+                may be shorter
+
+    Output:
+
+    List of dictionaries, one per task, in the order the tasks are to be
+    processed. Each dictionary contains the following keys and values:
+    'chunk'     [integer] Index of the chunk
+    'block'     [integer] Index of the block of snapshots
+    'snapshots' [tuple] Indices of the first and one past the last snapshot
+                of the block
+    'cost'      [scalar] Relative cost of the task
+    Tasks of equal cost are ordered by chunk and then by block so that the
+    order is the same on all processes
+    ---------------------------------------------------------------------------
+    """
+
+    chunk_costs = NP.asarray(chunk_costs, dtype=NP.float).reshape(-1)
+    if chunk_costs.size == 0:
+        raise ValueError('Input chunk_costs must not be empty')
+    if NP.any(chunk_costs < 0.0):
+        raise ValueError('Input chunk_costs must be non-negative')
+    if not isinstance(n_acc, (int, NP.integer)):
+        raise TypeError('Input n_acc must be an integer')
+    if n_acc < 1:
+        raise ValueError('Input n_acc must be positive')
+    if not isinstance(snapshot_block, (int, NP.integer)):
+        raise TypeError('Input snapshot_block must be an integer')
+    if snapshot_block < 1:
+        raise ValueError('Input snapshot_block must be positive')
+
+    tasks = []
+    for chunk in range(chunk_costs.size):
+        for block, j0 in enumerate(range(0, n_acc, snapshot_block)):
+            j1 = min(j0+snapshot_block, n_acc)
+            tasks += [{'chunk': chunk, 'block': block, 'snapshots': (j0, j1), 'cost': chunk_costs[chunk] * (j1-j0)}]
+    tasks.sort(key=lambda task: (-task['cost'], task['chunk'], task['block']))
+    return tasks
+
+#################################################################################
+
+def _split_counts(n):
+
+    """
+    ---------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    Numbers of pieces into which n items may be split, chosen such that the
+    sizes of the pieces, 1, 2, 3, 4, 6, 8, 12, ... up to n, are spaced
+    roughly geometrically. Used to keep the search for a decomposition grid
+    small.
+    ---------------------------------------------------------------------------
+    """
+
+    counts = set([1, n])
+    size = 2
+    while size < n:
+        counts.update([int(NP.ceil(n / float(size))), int(NP.ceil(n / float(size + size//2)))])
+        size *= 2
+    return sorted(counts)
+
+#################################################################################
+
+def decomposition_grid(nbl, nchan, nsrc, nproc, memory_per_process,
+                       nbytes_per_element, src_shares=1, reduce_weight=8.0):
+
+    """
+    ---------------------------------------------------------------------------
+    Choose a block decomposition of the visibilities into tiles of baselines
+    and frequency channels, and optionally of the sources into shares, for
+    parallel processing. Tiles are simulated by teams of processes each of
+    which holds one share of the sources of the tile. The grid minimizes an
+    estimate of the time per process under the memory limit. The estimate
+    counts the visibility work, the work per source and channel (primary
+    beams and spectra) and per source (coordinates) that is repeated in
+    every tile, and the summation of the visibilities of a tile over the
+    processes of a team. All tiles of the grid have at most one baseline or
+    channel more than the others.
+
+    Inputs:
+
+    nbl         [integer] Number of baselines
+
+    nchan       [integer] Number of frequency channels
+
+    nsrc        [scalar] Number of sources (may be an estimate, e.g. the
+                number above the horizon)
+
+    nproc       [integer] Number of processes
+
+    memory_per_process
+                [scalar] Memory (in bytes) available to each process for the
+                sources x baselines x channels of a tile
+
+    nbytes_per_element
+                [scalar] Memory (in bytes) per source, baseline and channel,
+                e.g. the size of a complex sample times the number of
+                polarizations
+
+    Keyword Inputs:
+
+    src_shares  [NoneType or integer] Number of shares into which the
+                sources are split. Must divide nproc. If set to 1 (default),
+                the decomposition is two dimensional (baselines x channels).
+                If set to None, it is chosen among the divisors of nproc
+                along with the grid
+
+    reduce_weight
+                [scalar] Cost of summing one visibility over the processes
+                of a team per step of the reduction relative to the cost of
+                adding the contribution of one source to a visibility.
+                Default=8.0
+
+    Output:
+
+    Dictionary with the following keys and values:
+    'bl'        [integer] Number of tiles along baselines
+    'freq'      [integer] Number of tiles along frequency channels
+    'src'       [integer] Number of shares of the sources
+    'memory'    [scalar] Memory (in bytes) used by a process for a tile
+    ---------------------------------------------------------------------------
+    """
+
+    for arg in [nbl, nchan, nproc]:
+        if not isinstance(arg, (int, NP.integer)):
+            raise TypeError('Inputs nbl, nchan and nproc must be integers')
+        if arg < 1:
+            raise ValueError('Inputs nbl, nchan and nproc must be positive')
+    if not isinstance(nsrc, (int, float, NP.integer, NP.floating)):
+        raise TypeError('Input nsrc must be a scalar')
+    nsrc = max(1, int(NP.ceil(nsrc)))
+    if not isinstance(memory_per_process, (int, float, NP.integer, NP.floating)):
+        raise TypeError('Input memory_per_process must be a scalar')
+    if memory_per_process <= 0:
+        raise ValueError('Input memory_per_process must be positive')
+    if not isinstance(nbytes_per_element, (int, float, NP.integer, NP.floating)):
+        raise TypeError('Input nbytes_per_element must be a scalar')
+    if nbytes_per_element <= 0:
+        raise ValueError('Input nbytes_per_element must be positive')
+    if src_shares is None:
+        shares_list = [shares for shares in range(1, nproc+1) if nproc % shares == 0]
+    elif not isinstance(src_shares, (int, NP.integer)):
+        raise TypeError('Input src_shares must be an integer')
+    elif (src_shares < 1) or (nproc % src_shares != 0):
+        raise ValueError('Input src_shares must be positive and divide nproc')
+    else:
+        shares_list = [src_shares]
+
+    best = None
+    for shares in shares_list:
+        nteams = nproc // shares
+        nsrc_share = int(NP.ceil(nsrc / float(shares)))
+        for nbl_tiles in _split_counts(nbl):
+            nbl_tile = int(NP.ceil(nbl / float(nbl_tiles)))
+            for nchan_tiles in _split_counts(nchan):
+                nchan_tile = int(NP.ceil(nchan / float(nchan_tiles)))
+                ntiles = nbl_tiles * nchan_tiles
+                if (ntiles < nteams) and (ntiles < nbl * nchan):
+                    continue # Some teams would stay idle
+                memory = nsrc_share * nbl_tile * nchan_tile * nbytes_per_element
+                if memory > memory_per_process:
+                    continue
+                tile_cost = nsrc_share * (nbl_tile * nchan_tile + nchan_tile + 1.0)
+                if shares > 1:
+                    tile_cost += reduce_weight * nbl_tile * nchan_tile * NP.ceil(NP.log2(shares))
+                cost = NP.ceil(ntiles / float(nteams)) * tile_cost
+                key = (cost, ntiles, shares)
+                if (best is None) or (key < best[0]):
+                    best = (key, {'bl': nbl_tiles, 'freq': nchan_tiles, 'src': shares, 'memory': memory})
+
+    if best is None:
+        raise ValueError('No decomposition fits in the memory available per process. Increase the memory or the number of processes, or allow the sources to be split.')
+    return best[1]
+
+#################################################################################
+
+class TaskScheduler(object):
+
+    """
+    ----------------------------------------------------------------------------
+    Class to hand out tasks to MPI processes and record the time each task
+    took. Tasks are identified by their index in a list shared by all
+    processes. The processes may be grouped into teams of equal size which
+    work on each task together, e.g. by splitting the sources between them.
+    In dynamic mode, a team that becomes idle pulls the next task from a
+    counter shared by all teams so that teams which draw cheap tasks take on
+    more of them. In static mode, the tasks are dealt to the teams in turn.
+
+    Attributes:
+
+    comm        [MPI communicator] Communicator of the processes sharing the
+                tasks
+
+    ntasks      [integer] Number of tasks
+
+    dynamic     [boolean] If True, tasks are pulled from a shared counter. If
+                False, team t processes tasks t, t+nteams, ...
+
+    team_size   [integer] Number of processes in a team. Process with rank r
+                belongs to team r // team_size
+
+    nteams      [integer] Number of teams
+
+    team_comm   [MPI communicator] Communicator of the processes in the team
+                of this process. None if team_size is 1
+
+    team_rank   [integer] Rank of this process in its team. The process with
+                team rank 0 leads the team and pulls the tasks
+
+    log         [list] One dictionary per task processed by this process with
+                the following keys and values:
+                'task'      [integer] Index of the task
+                'rank'      [integer] Rank of the process
+                'start'     [scalar] Time (in seconds since the epoch) at
+                            which the task was started
+                'duration'  [scalar] Time (in seconds) taken by the task
+
+    Member functions:
+
+    __init__()  Initializes an instance of class TaskScheduler
+
+    __iter__()  Yields the indices of the tasks to be processed by this
+                process and records the time taken by each
+
+    free()      Frees the shared counter and the communicators of the teams
+
+    gather_log()
+                Gathers the records of all processes on one process
+    ----------------------------------------------------------------------------
+    """
+
+    def __init__(self, comm, ntasks, dynamic=True, team_size=1):
+
+        """
+        ------------------------------------------------------------------------
+        Initializes an instance of class TaskScheduler. The shared counter and
+        the communicators of the teams are created collectively, so all
+        processes in comm must initialize an instance.
+
+        Inputs:
+
+        comm        [MPI communicator] Communicator of the processes sharing
+                    the tasks
+
+        ntasks      [integer] Number of tasks
+
+        dynamic     [boolean] If True (default), tasks are pulled from a
+                    counter shared by all teams. If False, they are dealt to
+                    the teams in turn
+
+        team_size   [integer] Number of processes working on each task
+                    together. Must divide the number of processes in comm.
+                    Default=1
+        ------------------------------------------------------------------------
+        """
+
+        if not isinstance(ntasks, (int, NP.integer)):
+            raise TypeError('Input ntasks must be an integer')
+        if ntasks < 0:
+            raise ValueError('Input ntasks must be non-negative')
+        if not isinstance(dynamic, bool):
+            raise TypeError('Input dynamic must be a boolean')
+        if not isinstance(team_size, (int, NP.integer)):
+            raise TypeError('Input team_size must be an integer')
+        if (team_size < 1) or (comm.Get_size() % team_size != 0):
+            raise ValueError('Input team_size must be positive and divide the number of processes')
+        self.comm = comm
+        self.ntasks = ntasks
+        self.dynamic = dynamic
+        self.team_size = team_size
+        self.nteams = comm.Get_size() // team_size
+        self.log = []
+        rank = comm.Get_rank()
+        if team_size > 1:
+            self.team_comm = comm.Split(rank // team_size, rank)
+            self.team_rank = self.team_comm.Get_rank()
+            if self.team_rank == 0:
+                self._leader_comm = comm.Split(0, rank)
+            else:
+                self._leader_comm = comm.Split(MPI.UNDEFINED, rank)
+        else:
+            self.team_comm = None
+            self.team_rank = 0
+            self._leader_comm = comm
+        self._counter = None
+        if self.dynamic and (self.team_rank == 0):
+            self._counter = my_MPI.Counter(self._leader_comm)
+
+    ############################################################################
+
+    def __iter__(self):
+
+        """
+        ------------------------------------------------------------------------
+        Yields the indices of the tasks to be processed by this process until
+        the tasks are exhausted. The leader of a team pulls the tasks and
+        broadcasts them to the rest of the team. The time between yielding a
+        task and the request for the next one is recorded as the time taken by
+        the task.
+        ------------------------------------------------------------------------
+        """
+
+        rank = self.comm.Get_rank()
+        team = rank // self.team_size
+        taskid = team - self.nteams
+        while True:
+            if self.team_rank == 0:
+                if self.dynamic:
+                    taskid = self._counter.next()
+                else:
+                    taskid += self.nteams
+            if self.team_comm is not None:
+                taskid = self.team_comm.bcast(taskid, root=0)
+            if taskid >= self.ntasks:
+                break
+            ts = time.time()
+            yield taskid
+            self.log += [{'task': taskid, 'rank': rank, 'start': ts, 'duration': time.time()-ts}]
+
+    ############################################################################
+
+    def free(self):
+
+        """
+        ------------------------------------------------------------------------
+        Frees the shared counter and the communicators of the teams. Must be
+        called by all processes once they are done with the tasks.
+        ------------------------------------------------------------------------
+        """
+
+        if self._counter is not None:
+            self._counter.free()
+            self._counter = None
+        if self.team_comm is not None:
+            self.team_comm.Free()
+            self.team_comm = None
+            if self._leader_comm != MPI.COMM_NULL:
+                self._leader_comm.Free()
+            self._leader_comm = None
+
+    ############################################################################
+
+    def gather_log(self, root=0):
+
+        """
+        ------------------------------------------------------------------------
+        Gathers the records of the tasks processed by all processes. Must be
+        called by all processes.
+
+        Inputs:
+
+        root        [integer] Rank of the process on which the records are
+                    gathered. Default=0
+
+        Output:
+
+        On the root process, a list of the records of all processes ordered by
+        task index. None on the other processes. Read the attribute log for
+        the contents of the records
+        ------------------------------------------------------------------------
+        """
+
+        logs = self.comm.gather(self.log, root=root)
+        if logs is None:
+            return None
+        return sorted([entry for log in logs for entry in log], key=lambda entry: entry['task'])
+
+#################################################################################
+
+def write_task_log(outfile, log, verbose=True):
+
+    """
+    ---------------------------------------------------------------------------
+    Write the records of tasks processed by MPI processes to a text table and
+    summarize the load on each process.
+
+    Inputs:
+
+    outfile     [string] Name of the output file
+
+    log         [list] Records of the tasks, each a dictionary containing at
+                least the keys 'task', 'rank', 'start' and 'duration' (read
+                the docstring of class TaskScheduler). Other keys holding
+                scalars (e.g. 'chunk', 'block') are written as columns as well
+
+    Keyword Inputs:
+
+    verbose     [boolean] If True (default), print the time spent on tasks
+                by each process and the load imbalance
+
+    Output:
+
+    Dictionary with the total time (in seconds) spent on tasks by each
+    process keyed by rank
+    ---------------------------------------------------------------------------
+    """
+
+    if not isinstance(log, list):
+        raise TypeError('Input log must be a list')
+    busy = {}
+    if len(log) == 0:
+        return busy
+    t0 = min([entry['start'] for entry in log])
+    colnames = ['task', 'rank', 'start', 'duration']
+    colnames += sorted([key for key in log[0] if (key not in colnames) and NP.isscalar(log[0][key])])
+    cols = []
+    for colname in colnames:
+        if colname == 'start':
+            cols += [NP.asarray([entry[colname]-t0 for entry in log])]
+        else:
+            cols += [NP.asarray([entry[colname] for entry in log])]
+    ascii.write(Table(cols, names=colnames), output=outfile, format='fixed_width_two_line', formats={'start': '%.2f', 'duration': '%.2f'}, bookend=False, delimiter='|', delimiter_pad=' ')
+
+    for entry in log:
+        busy[entry['rank']] = busy.get(entry['rank'], 0.0) + entry['duration']
+    if verbose:
+        for rank in sorted(busy):
+            print 'Process {0:0d} spent {1:.1f} minutes on {2:0d} tasks'.format(rank, busy[rank]/60, len([entry for entry in log if entry['rank'] == rank]))
+        mean_busy = NP.mean(busy.values())
+        if mean_busy > 0.0:
+            print 'Load imbalance (maximum / mean time per process): {0:.3f}'.format(max(busy.values()) / mean_busy)
+    return busy
+
+#################################################################################
+
+def reduce_sum(comm, array, root=0, max_count=2**30):
+
+    """
+    ---------------------------------------------------------------------------
+    Sum arrays of the same shape and type over MPI processes using the
+    buffer based Reduce (or Allreduce) on contiguous memory, instead of
+    pickling the arrays and adding them up one process at a time. Must be
+    called by all processes in comm.
+
+    Inputs:
+
+    comm        [MPI communicator] Communicator of the processes whose arrays
+                are to be summed
+
+    array       [numpy array] Array of this process. Must be of type float32,
+                float64, complex64 or complex128. The sum is accumulated in
+                place if the array is contiguous, otherwise in a contiguous
+                copy
+
+    Keyword Inputs:
+
+    root        [integer or None] Rank of the process on which the sum is
+                returned. If set to None, the sum is returned on all
+                processes (Allreduce). Default=0
+
+    max_count   [integer] Maximum number of elements reduced in one call so
+                that the element counts stay within the range of MPI
+                integers. Default=2**30
+
+    Output:
+
+    Sum of the arrays over all processes on the root process (or on all
+    processes if root is None) and None on the others
+    ---------------------------------------------------------------------------
+    """
+
+    if not isinstance(array, NP.ndarray):
+        raise TypeError('Input array must be a numpy array')
+    buf = NP.ascontiguousarray(array)
+    if buf.dtype not in _mpi_datatypes:
+        raise TypeError('Input array must be of type float32, float64, complex64 or complex128')
+    if root is not None:
+        if not isinstance(root, (int, NP.integer)):
+            raise TypeError('Input root must be an integer')
+    if not isinstance(max_count, (int, NP.integer)):
+        raise TypeError('Input max_count must be an integer')
+    if max_count < 1:
+        raise ValueError('Input max_count must be positive')
+
+    datatype = _mpi_datatypes[buf.dtype]
+    flatbuf = buf.reshape(-1)
+    on_root = (root is None) or (comm.Get_rank() == root)
+    for ind in range(0, max(flatbuf.size, 1), max_count):
+        segment = flatbuf[ind:ind+max_count]
+        if root is None:
+            comm.Allreduce(MPI.IN_PLACE, [segment, datatype], op=MPI.SUM)
+        elif on_root:
+            comm.Reduce(MPI.IN_PLACE, [segment, datatype], op=MPI.SUM, root=root)
+        else:
+            comm.Reduce([segment, datatype], None, op=MPI.SUM, root=root)
+    if on_root:
+        return buf
+    return None
+
+#################################################################################
+
+def checkpoint_file(outfile, snapshots, share=0):
+
+    """
+    ---------------------------------------------------------------------------
+    Name of the checkpoint file of a task after a number of its snapshots
+    have been simulated. The number of snapshots is part of the name so that
+    a new checkpoint never overwrites the one recorded in the manifest.
+
+    Inputs:
+
+    outfile     [string] Name (with full path and without extension) of the
+                output file of the task
+
+    snapshots   [integer] Number of snapshots of the task simulated
+
+    Keyword Inputs:
+
+    share       [integer] Index of the share of sources of the process in the
+                team working on the task. Default=0
+
+    Output:
+
+    Name of the checkpoint file without extension
+    ---------------------------------------------------------------------------
+    """
+
+    return outfile + '_ckpt_{0:0d}_{1:0d}'.format(share, snapshots)
+
+#################################################################################
+
+def remove_checkpoint(ckptfile):
+
+    """
+    ---------------------------------------------------------------------------
+    Remove a checkpoint file and the gains file saved along with it, if they
+    exist.
+
+    Inputs:
+
+    ckptfile    [string] Name of the checkpoint file without extension (read
+                the docstring of checkpoint_file())
+    ---------------------------------------------------------------------------
+    """
+
+    for ext in ['.hdf5', '.gains.hdf5']:
+        if os.path.isfile(ckptfile+ext):
+            os.remove(ckptfile+ext)
+
+#################################################################################
+
+class ProgressManifest(object):
+
+    """
+    ----------------------------------------------------------------------------
+    Class to record the progress of the tasks of a simulation so that an
+    interrupted simulation can be resumed from its checkpoints. Every process
+    appends its records to its own manifest file in the manifest directory,
+    so that processes never write to the same file. A record is written only
+    after the checkpoints (or the output) it refers to have been saved.
+
+    Attributes:
+
+    manifest_dir
+                [string] Directory containing the manifest files
+
+    progress_file
+                [string] Manifest file of this process. Every line records
+                the sky sector, chunk and block of snapshots of a task, the
+                number of its snapshots simulated, the number of shares of
+                sources the task is split into, whether the task is complete
+                and the time of the record
+
+    Member functions:
+
+    __init__()  Initializes an instance of class ProgressManifest
+
+    record()    Appends the progress of a task to the manifest file
+
+    commit()    Records the progress of a task once all processes sharing it
+                have saved their checkpoints and removes their previous
+                checkpoints
+    ----------------------------------------------------------------------------
+    """
+
+    def __init__(self, manifest_dir, rank):
+
+        """
+        ------------------------------------------------------------------------
+        Initializes an instance of class ProgressManifest.
+
+        Inputs:
+
+        manifest_dir
+                    [string] Directory containing the manifest files
+
+        rank        [integer] Rank of the process
+        ------------------------------------------------------------------------
+        """
+
+        if not isinstance(manifest_dir, str):
+            raise TypeError('Input manifest_dir must be a string')
+        if not isinstance(rank, (int, NP.integer)):
+            raise TypeError('Input rank must be an integer')
+        self.manifest_dir = manifest_dir
+        self.progress_file = os.path.join(manifest_dir, 'progress_{0:0d}.txt'.format(rank))
+
+    ############################################################################
+
+    def record(self, sector, chunk, block, snapshots, shares=1, complete=False):
+
+        """
+        ------------------------------------------------------------------------
+        Appends the progress of a task to the manifest file and flushes it to
+        disk.
+
+        Inputs:
+
+        sector      [integer] Index of the sky sector
+
+        chunk       [integer] Index of the chunk of data
+
+        block       [integer] Index of the block of snapshots
+
+        snapshots   [integer] Number of snapshots of the task simulated
+
+        Keyword Inputs:
+
+        shares      [integer] Number of shares of sources the task is split
+                    into. Default=1
+
+        complete    [boolean] If True, the output of the task has been saved.
+                    Default=False
+        ------------------------------------------------------------------------
+        """
+
+        with open(self.progress_file, 'a') as pfile:
+            pfile.write('{0:0d} {1:0d} {2:0d} {3:0d} {4:0d} {5:0d} {6:.6f}\n'.format(sector, chunk, block, snapshots, shares, int(complete), time.time()))
+            pfile.flush()
+            os.fsync(pfile.fileno())
+
+    ############################################################################
+
+    def commit(self, sector, chunk, block, outfile, snapshots, previous=0,
+               shares=1, complete=False, comm=None):
+
+        """
+        ------------------------------------------------------------------------
+        Records the progress of a task once all processes sharing it have
+        saved their checkpoints (or the leader has saved the output), and then
+        removes the checkpoints they saved previously. Must be called by all
+        processes in comm.
+
+        Inputs:
+
+        sector      [integer] Index of the sky sector
+
+        chunk       [integer] Index of the chunk of data
+
+        block       [integer] Index of the block of snapshots
+
+        outfile     [string] Name (with full path and without extension) of
+                    the output file of the task
+
+        snapshots   [integer] Number of snapshots of the task simulated
+
+        Keyword Inputs:
+
+        previous    [integer] Number of snapshots in the previous checkpoint.
+                    If 0 (default), there is no previous checkpoint
+
+        shares      [integer] Number of shares of sources the task is split
+                    into. Default=1
+
+        complete    [boolean] If True, the output of the task has been saved.
+                    Default=False
+
+        comm        [None or MPI communicator] Communicator of the processes
+                    sharing the task. The process with rank 0 in comm writes
+                    the record. If set to None (default), the task is not
+                    shared
+        ------------------------------------------------------------------------
+        """
+
+        share = 0
+        if comm is not None:
+            share = comm.Get_rank()
+            comm.Barrier()
+        if share == 0:
+            self.record(sector, chunk, block, snapshots, shares=shares, complete=complete)
+        if comm is not None:
+            comm.Barrier()
+        if previous > 0:
+            remove_checkpoint(checkpoint_file(outfile, previous, share=share))
+
+#################################################################################
+
+def read_progress(manifest_dir):
+
+    """
+    ---------------------------------------------------------------------------
+    Read the manifest files of all processes of a simulation and find the
+    latest progress of every task.
+
+    Inputs:
+
+    manifest_dir
+                [string] Directory containing the manifest files
+
+    Output:
+
+    Dictionary keyed by tuples of sky sector, chunk and block of snapshots of
+    the tasks recorded. Each value is a dictionary with the following keys
+    and values:
+    'snapshots' [integer] Number of snapshots of the task simulated
+    'shares'    [integer] Number of shares of sources the task is split into
+    'complete'  [boolean] True if the output of the task has been saved
+    'time'      [scalar] Time (in seconds since the epoch) of the record
+    ---------------------------------------------------------------------------
+    """
+
+    progress = {}
+    for progress_file in glob.glob(os.path.join(manifest_dir, 'progress_*.txt')):
+        with open(progress_file, 'r') as pfile:
+            for line in pfile:
+                fields = line.split()
+                if len(fields) != 7: # Incomplete record of an interrupted write
+                    continue
+                unit = tuple([int(field) for field in fields[:3]])
+                rec = {'snapshots': int(fields[3]), 'shares': int(fields[4]), 'complete': bool(int(fields[5])), 'time': float(fields[6])}
+                if (unit not in progress) or (rec['time'] >= progress[unit]['time']):
+                    progress[unit] = rec
+    return progress
+
+#################################################################################
+
+def clear_progress(manifest_dir):
+
+    """
+    ---------------------------------------------------------------------------
+    Remove the manifest files of the processes of a simulation, e.g. from an
+    earlier simulation with the same simulation ID that is not resumed.
+
+    Inputs:
+
+    manifest_dir
+                [string] Directory containing the manifest files
+    ---------------------------------------------------------------------------
+    """
+
+    for progress_file in glob.glob(os.path.join(manifest_dir, 'progress_*.txt')):
+        os.remove(progress_file)
@@ -2,7 +2,20 @@ import numpy as NP
 import scipy.constants as FCNST
 import scipy.special as SPS
 import h5py
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+import healpy as HP
 from astroutils import geometry as GEOM
+from astroutils import mathops as OPS
+try:
+    from mwapy.pb import primary_beam as MWAPB
+except ImportError:
+    mwa_tools_found = False
+else:
+    mwa_tools_found = True
+
+# Tables of the Airy disk kernel 2 J1(x) / x indexed by their accuracy
+_airy_kernel_tables = {}
 
 #################################################################################
 
@@ -37,8 +50,10 @@ def primary_beam_generator(skypos, frequency, telescope, freq_scale='GHz',
                 and values:
                 'id'          [string] If set, will ignore the other keys and use
                               telescope details for known telescopes. Accepted 
-                              values are 'mwa', 'vla', 'gmrt', 'hera', 'paper', 
-                              'hirax', and 'chime' 
+                              values are 'mwa', 'mwa_tools' (MWA tile power
+                              pattern from MWA_Tools for the polarization in
+                              key 'pol', 'X' by default), 'vla', 'gmrt', 
+                              'hera', 'paper', 'hirax', and 'chime' 
                 'shape'       [string] Shape of antenna element. Accepted values
                               are 'dipole', 'delta', 'dish', 'rect' and 'square'. 
                               Will be ignored if key 'id' is set. 'delta' denotes 
@@ -112,6 +127,16 @@ def primary_beam_generator(skypos, frequency, telescope, freq_scale='GHz',
                               'max'   [scalar] positive value to clip the 
                                       modified and scaled values to. If not set, 
                                       there is no upper limit
+                'tabulated_kernels'
+                              [boolean] If set to True, the Airy pattern of a
+                              dish (key 'shape' set to 'dish' or key 'id' set
+                              to 'hera' or 'hirax') is interpolated from a
+                              precomputed table of the kernel 2 J1(x) / x with
+                              an accuracy of 1e-6 relative to its peak (see
+                              function tabulated_airy_kernel()) instead of
+                              evaluating the Bessel function for every sky
+                              position and frequency. If not set, it defaults
+                              to False
 
     freq_scale  [scalar] string specifying the units of frequency. Accepted
                 values are 'GHz', 'MHz' and 'Hz'. Default = 'GHz'
@@ -219,6 +244,12 @@ def primary_beam_generator(skypos, frequency, telescope, freq_scale='GHz',
     if (telescope is None) or (not isinstance(telescope, dict)):
         raise TypeError('telescope must be specified as a dictionary')
 
+    tabulated = False
+    if 'tabulated_kernels' in telescope:
+        if not isinstance(telescope['tabulated_kernels'], bool):
+            raise TypeError('Key "tabulated_kernels" in telescope dictionary must be a boolean')
+        tabulated = telescope['tabulated_kernels']
+
     if 'id' in telescope:
         if (telescope['id'] == 'vla') or (telescope['id'] == 'gmrt'):
             if skyunits == 'altaz':
@@ -242,7 +273,8 @@ def primary_beam_generator(skypos, frequency, telescope, freq_scale='GHz',
             pb = airy_disk_pattern(dish_dia, skypos, frequency, skyunits=skyunits,
                                    peak=1.0, pointing_center=telescope['orientation'], 
                                    pointing_coords=telescope['ocoords'],
-                                   gaussian=False, power=True, small_angle_tol=1e-10)
+                                   gaussian=False, power=True, small_angle_tol=1e-10,
+                                   tabulated=tabulated)
         elif telescope['id'] == 'mwa':
             if (skyunits == 'altaz') or (skyunits == 'dircos'):
                 if ('orientation' in telescope) and ('ocoords' in telescope):
@@ -280,7 +312,7 @@ def primary_beam_generator(skypos, frequency, telescope, freq_scale='GHz',
                     irap = isotropic_radiators_array_field_pattern(4, 4, 1.1, 1.1, skypos,
                                                                    FCNST.c/frequency, east2ax1=east2ax1,
                                                                    pointing_center=pointing_center,
-                                                                   skycoords=skyunits, power=False)
+                                                                   skycoords=skyunits, power=True)
                     irap = irap[:,:,NP.newaxis]  # add an axis to be compatible with random ralizations
 
                 else: # Call the beamformer
@@ -310,11 +342,20 @@ def primary_beam_generator(skypos, frequency, telescope, freq_scale='GHz',
                                                skycoords=skyunits,
                                                pointing_info=pinfo,
                                                wavelength=FCNST.c/frequency,
-                                               power=False)
-                    nrand = irap.shape[-1]
-                pb = NP.mean(NP.abs(ep * irap)**2, axis=2) # Power pattern is square of the field pattern
+                                               power=True, average=True)
+                    irap = irap[:,:,NP.newaxis]  # Power pattern averaged over random realizations
+                pb = NP.mean(NP.abs(ep)**2 * irap, axis=2) # Power pattern is square of the field pattern
             else:
                 raise ValueError('skyunits must be in Alt-Az or direction cosine coordinates for MWA.')
+        elif telescope['id'] == 'mwa_tools':
+            delays = None
+            if pointing_info is not None:
+                if 'delays' in pointing_info:
+                    delays = pointing_info['delays']
+            pol = 'X'
+            if 'pol' in telescope:
+                pol = telescope['pol']
+            pb = MWA_Tools_primary_beam(skypos, frequency, delays=delays, pol=pol, skyunits=skyunits, freq_scale='Hz')
         elif (telescope['id'] == 'mwa_dipole') or (telescope['id'] == 'paper'):
             if telescope['id'] == 'mwa_dipole':
                 dipole_size = 0.74
@@ -367,7 +408,8 @@ def primary_beam_generator(skypos, frequency, telescope, freq_scale='GHz',
         elif telescope['shape'] == 'dish':
             ep = airy_disk_pattern(telescope['size'], skypos, frequency, skyunits=skyunits,
                                    peak=1.0, pointing_center=pointing_center, 
-                                   gaussian=False, power=False, small_angle_tol=1e-10)
+                                   gaussian=False, power=False, small_angle_tol=1e-10,
+                                   tabulated=tabulated)
             ep = ep[:,:,NP.newaxis]   # add an axis to be compatible with random ralizations
         elif telescope['shape'] == 'rect':
             ep = uniform_rectangular_aperture(telescope['size'], skypos, frequency, skyunits=skyunits, east2ax1=east2ax1, pointing_center=pointing_center, power=False)
@@ -402,12 +444,13 @@ def primary_beam_generator(skypos, frequency, telescope, freq_scale='GHz',
                     pinfo['nrand'] = pointing_info['nrand']
                 irap = array_field_pattern(element_locs, skypos, skycoords=skyunits,
                                            pointing_info=pinfo,
-                                           wavelength=FCNST.c/frequency, power=False)
-                nrand = irap.shape[-1]
+                                           wavelength=FCNST.c/frequency, 
+                                           power=True, average=True)
+                irap = irap[:,:,NP.newaxis]  # Power pattern averaged over random realizations
         else:
             nrand = 1
             irap = NP.ones(skypos.shape[0]*frequency.size).reshape(skypos.shape[0],frequency.size,nrand)  # Last axis indicates number of random realizations
-        pb = NP.mean(NP.abs(ep * irap)**2, axis=2) # Power pattern is square of the field pattern averaged over all random realizations of delays and gains if specified
+        pb = NP.mean(NP.abs(ep)**2 * irap, axis=2) # Power pattern is square of the field pattern averaged over all random realizations of delays and gains if specified
        
     if 'groundplane' in telescope:
         gp = 1.0
@@ -505,7 +548,8 @@ def VLA_primary_beam_PBCOR(skypos, frequency, skyunits='degrees'):
 
 def airy_disk_pattern(diameter, skypos, frequency, skyunits='altaz', peak=1.0, 
                       pointing_center=None, pointing_coords=None,
-                      small_angle_tol=1e-10, power=True, gaussian=False):
+                      small_angle_tol=1e-10, power=True, gaussian=False,
+                      tabulated=False, table_tol=1e-6):
 
     """
     -----------------------------------------------------------------------------
@@ -552,6 +596,15 @@ def airy_disk_pattern(diameter, skypos, frequency, skyunits='altaz', peak=1.0,
                 [scalar] Small angle limit (in radians) below which division by 
                 zero is to be avoided. Default = 1e-10
 
+    tabulated   [boolean] If set to True, the field pattern is interpolated from
+                a precomputed table of the kernel 2 J1(x) / x using function
+                tabulated_airy_kernel(). If False (default), the Bessel function
+                is evaluated at every sky position and frequency
+
+    table_tol   [scalar] Maximum error of the tabulated field pattern relative
+                to its peak. Used only if tabulated is set to True. 
+                Default = 1e-6
+
     Output:
 
     [Numpy array] Field or Power pattern at the specified sky positions. 
@@ -604,11 +657,17 @@ def airy_disk_pattern(diameter, skypos, frequency, skyunits='altaz', peak=1.0,
     small_angles_ind = x < small_angle_tol
     x = NP.where(small_angles_ind, small_angle_tol, x)
     x = x.reshape(-1,1)
-    pattern = 2 * SPS.j1(k*0.5*diameter*NP.sin(x)) / (k*0.5*diameter*NP.sin(x))
+    if tabulated:
+        pattern = tabulated_airy_kernel(k*0.5*diameter*NP.sin(x), tol=table_tol)
+    else:
+        pattern = 2 * SPS.j1(k*0.5*diameter*NP.sin(x)) / (k*0.5*diameter*NP.sin(x))
 
     pattern[zero_ind,:] = 0.0   # Blank all values beyond the horizon
 
-    maxval = 2 * SPS.j1(k*0.5*diameter*NP.sin(small_angle_tol)) / (k*0.5*diameter*NP.sin(small_angle_tol))
+    if tabulated:
+        maxval = tabulated_airy_kernel(k*0.5*diameter*NP.sin(small_angle_tol), tol=table_tol)
+    else:
+        maxval = 2 * SPS.j1(k*0.5*diameter*NP.sin(small_angle_tol)) / (k*0.5*diameter*NP.sin(small_angle_tol))
     if power:
         pattern = NP.abs(pattern)**2
         maxval = maxval**2
@@ -619,6 +678,61 @@ def airy_disk_pattern(diameter, skypos, frequency, skyunits='altaz', peak=1.0,
 
 ##########################################################################
 
+def tabulated_airy_kernel(x, tol=1e-6):
+
+    """
+    -----------------------------------------------------------------------------
+    Evaluate the Airy disk field pattern kernel 2 J1(x) / x, where
+    x = pi D sin(theta) / lambda, by linear interpolation in a table
+    precomputed on a uniform grid. Since the magnitude of the second derivative
+    of the kernel never exceeds 1/4, a grid spacing of sqrt(32 tol) bounds the
+    interpolation error by tol. The kernel peaks at unity at x=0 and hence tol
+    is also the error relative to the peak. The table is computed once for
+    each tolerance and extended when larger arguments are requested.
+
+    Inputs:
+
+    x           [scalar or numpy array] Arguments of the kernel of any shape
+
+    Keyword Inputs:
+
+    tol         [scalar] Maximum error of the interpolated kernel. Must be
+                positive. Default = 1e-6
+
+    Output:
+
+    [Numpy array] Kernel values of the same shape as x
+    -----------------------------------------------------------------------------
+    """
+
+    if not isinstance(tol, (int,float)):
+        raise TypeError('Input tol must be a scalar')
+    if tol <= 0.0:
+        raise ValueError('Input tol must be positive')
+
+    x = NP.abs(NP.asarray(x, dtype=NP.float64))
+    dx = NP.sqrt(32.0 * tol)
+    xmax = 0.0
+    if x.size > 0:
+        xmax = x.max()
+    if (tol not in _airy_kernel_tables) or (_airy_kernel_tables[tol][1].size < xmax/dx + 1):
+        npts = int(NP.ceil(1.25 * xmax / dx)) + 2 # Leave room for larger arguments in later calls
+        xgrid = dx * NP.arange(npts)
+        table = NP.ones(npts)
+        table[1:] = 2 * SPS.j1(xgrid[1:]) / xgrid[1:]
+        _airy_kernel_tables[tol] = (table[:-1], NP.diff(table))
+    table, slopes = _airy_kernel_tables[tol]
+
+    # Interpolate in place to limit the number of temporary arrays
+    u = x / dx
+    ind = u.astype(NP.intp)
+    u -= ind
+    u *= NP.take(slopes, ind)
+    u += NP.take(table, ind)
+    return u
+
+##########################################################################
+
 def GMRT_primary_beam(skypos, frequency, skyunits='degrees'):
 
     """
@@ -682,6 +796,116 @@ def GMRT_primary_beam(skypos, frequency, skyunits='degrees'):
 
 #################################################################################
 
+def MWA_Tools_primary_beam(skypos, frequency, delays=None, pol='X',
+                           skyunits='altaz', freq_scale='GHz', nthreads=None):
+
+    """
+    -----------------------------------------------------------------------------
+    Primary beam power pattern of the MWA tile from MWA_Tools (function
+    MWA_Tile_advanced() of module mwapy.pb.primary_beam). MWA_Tools evaluates
+    one frequency channel per call, so the channels are split into blocks 
+    evaluated in parallel threads
+
+    Inputs:
+
+    skypos      [numpy array] Sky positions at which the power pattern is to be
+                estimated. Size is M x N where M is the number of locations and
+                N = 2 (if skyunits = altaz denoting Alt-Az coordinates in 
+                degrees) or N = 3 (if skyunits = dircos denoting direction 
+                cosine coordinates)
+
+    frequency   [list or numpy vector] frequencies at which the power pattern 
+                is to be estimated. Units are specified by freq_scale
+
+    Keyword Inputs:
+
+    delays      [numpy vector] Beamformer delays (in seconds) of the 16 
+                dipoles of the tile. They are converted to the integer delay 
+                steps of 435 ps of the MWA beamformer. Default = None will set
+                all delays to zero phasing the tile to zenith
+
+    pol         [string] Polarization of the power pattern. Accepted values 
+                are 'X' (default) and 'Y'
+
+    skyunits    [string] string specifying the coordinate system of the sky 
+                positions. Accepted values are 'altaz' (default) and 'dircos'
+
+    freq_scale  [string] Units of frequency. Accepted values are 'GHz' 
+                (default), 'MHz', 'kHz' and 'Hz'
+
+    nthreads    [integer] Number of threads over which the frequency channels
+                are evaluated. If set to None (default) or 1, they are 
+                evaluated serially
+
+    Output:
+
+    [Numpy array] Power pattern at the specified sky positions of size M x 
+    nchan
+    -----------------------------------------------------------------------------
+    """
+
+    if not mwa_tools_found:
+        raise ImportError('MWA_Tools could not be imported which is required for power pattern computation.')
+
+    frequency = NP.asarray(frequency, dtype=NP.float64).ravel()
+    if (freq_scale == 'ghz') or (freq_scale == 'GHz'):
+        frequency = frequency * 1.0e9
+    elif (freq_scale == 'mhz') or (freq_scale == 'MHz'):
+        frequency = frequency * 1.0e6
+    elif (freq_scale == 'khz') or (freq_scale == 'kHz'):
+        frequency = frequency * 1.0e3
+    elif (freq_scale != 'hz') and (freq_scale != 'Hz'):
+        raise ValueError('Input freq_scale must be "GHz", "MHz", "kHz" or "Hz"')
+
+    skypos = NP.asarray(skypos)
+    if skyunits == 'dircos':
+        skypos = GEOM.dircos2altaz(skypos, units='degrees')
+    elif skyunits != 'altaz':
+        raise ValueError('skyunits must be "altaz" or "dircos" for MWA_Tools.')
+    skypos = skypos.reshape(-1,2)
+
+    if delays is None:
+        delays = NP.zeros(16)
+    delays = NP.asarray(delays).ravel() / 435e-12
+
+    if (pol == 'X') or (pol == 'x'):
+        polind = 0
+    elif (pol == 'Y') or (pol == 'y'):
+        polind = 1
+    else:
+        raise ValueError('Input pol must be "X" or "Y".')
+
+    if nthreads is None:
+        nthreads = 1
+    elif not isinstance(nthreads, int):
+        raise TypeError('Input nthreads must be an integer')
+    elif nthreads < 1:
+        raise ValueError('Input nthreads must be positive')
+    nthreads = max(1, min(nthreads, frequency.size))
+
+    za = NP.radians(90.0-skypos[:,0]).reshape(-1,1)
+    az = NP.radians(skypos[:,1]).reshape(-1,1)
+    pb = NP.empty((skypos.shape[0], frequency.size))
+
+    def channel_block(chans):
+        for i in chans:
+            pb[:,i] = MWAPB.MWA_Tile_advanced(za, az, freq=frequency[i], delays=delays)[polind].ravel()
+
+    chan_blocks = NP.array_split(NP.arange(frequency.size), nthreads)
+    if nthreads == 1:
+        channel_block(chan_blocks[0])
+    else:
+        pool = ThreadPool(processes=nthreads)
+        try:
+            pool.map(channel_block, chan_blocks)
+        finally:
+            pool.close()
+            pool.join()
+
+    return pb
+
+#################################################################################
+
 def ground_plane_field_pattern(height, skypos, skycoords=None, wavelength=1.0,
                                angle_units=None, modifier=None, power=True):
 
@@ -1353,7 +1577,8 @@ def isotropic_radiators_array_field_pattern(nax1, nax2, sep1, sep2=None,
 #################################################################################
 
 def array_field_pattern(antpos, skypos, skycoords='altaz', pointing_info=None, 
-                        wavelength=1.0, power=True):
+                        wavelength=1.0, power=True, average=False,
+                        chunk_size=None):
 
     """
     -----------------------------------------------------------------------------
@@ -1441,10 +1666,32 @@ def array_field_pattern(antpos, skypos, skycoords='altaz', pointing_info=None,
     power      [boolean] If set to True (default), compute power pattern,
                otherwise compute field pattern.
 
+    average    [boolean] If set to True, the field or power pattern is averaged
+               over the random realizations of the beamformer settings and
+               the axis of random realizations is removed. Since the memory
+               needed is then independent of the number of realizations, it
+               is preferred for power patterns with many realizations. If set
+               to False (default), all the realizations are returned
+
+    chunk_size [integer] Number of sky positions over which the field pattern
+               is accumulated over the elements at a time. The random 
+               realizations are processed in batches within each chunk so that
+               the memory used is independent of the number of elements and 
+               of the number of realizations. If set to None (default), it is
+               chosen to keep the working arrays to about 2**20 elements
+
     Output:
 
-    Returns a complex electric field or power pattern as a MxN numpy array, 
-    M=number of sky positions, N=number of wavelengths.
+    Returns a complex electric field or power pattern as a MxNxR numpy array, 
+    M=number of sky positions, N=number of wavelengths, R=number of random
+    realizations of the beamformer settings. If average is set to True, it is
+    a MxN numpy array averaged over the random realizations.
+
+    If the elements lie on a regular rectangular grid in a horizontal plane 
+    with equal gains and the beamformer delays are separable along the two 
+    axes of the grid (as for the MWA tile), and there are no random jitters, 
+    the field pattern is computed as a product of the field patterns along 
+    the two axes.
     -----------------------------------------------------------------------------
     """
 
@@ -1602,32 +1849,140 @@ def array_field_pattern(antpos, skypos, skycoords='altaz', pointing_info=None,
 
     wavelength = wavelength.astype(NP.float32)
 
-    geometric_delays = -NP.dot(antpos, skypos.T) / FCNST.c
-    geometric_delays = geometric_delays[:,:,NP.newaxis,NP.newaxis].astype(NP.float32, copy=False) # Add an axis for wavelengths, and random realizations of beamformer settings
-    
-    gains = gains.reshape(antpos.shape[0],1,1,nrand).astype(NP.complex64, copy=False)
-    delays = delays.reshape(antpos.shape[0],1,1,nrand)
-    wavelength = wavelength.reshape(1,1,-1,1).astype(NP.float32, copy=False)
-
-    retvalue = geometric_delays + delays
-    retvalue = retvalue.astype(NP.complex64, copy=False)
-    # retvalue *= 1j * 2*NP.pi * FCNST.c
-    # retvalue = retvalue.astype(NP.complex64, copy=False)
-    # retvalue = retvalue/wavelength
-    retvalue = NP.exp(1j * 2*NP.pi * FCNST.c/wavelength * retvalue).astype(NP.complex64, copy=False)
-    retvalue *= gains/antpos.shape[0]
-    retvalue = NP.sum(retvalue.astype(NP.complex64), axis=0)
-
-    # field_pattern = NP.sum(gains * NP.exp(1j * 2*NP.pi * (geometric_delays+delays) * FCNST.c / wavelength), axis=0) / antpos.shape[0]
-
-    # return field_pattern
+    if chunk_size is not None:
+        if not isinstance(chunk_size, int):
+            raise TypeError('chunk_size must be an integer')
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+
+    nant = antpos.shape[0]
+    nsrc = skypos.shape[0]
+    nchan = wavelength.size
+    delays = delays.reshape(nant,-1)
+    gains = gains.reshape(nant,-1).astype(NP.complex64, copy=False)
+    nreal = max(delays.shape[1], gains.shape[1]) # Realizations that differ. Without jitters, all nrand realizations are identical
+    wavenumber = (2*NP.pi / wavelength).astype(NP.float32)
+
+    max_elements = 2**20
+    rand_batch = min(nreal, max(1, max_elements/nchan))
+    if chunk_size is None:
+        chunk_size = max(1, max_elements/(nchan*rand_batch))
+
+    if average:
+        retvalue = NP.zeros((nsrc,nchan), dtype=NP.complex64)
+    else:
+        retvalue = NP.empty((nsrc,nchan,nreal), dtype=NP.complex64)
+
+    grid = None
+    if nreal == 1:
+        grid = _separable_array_layout(antpos, delays[:,0], gains[:,0], tol=1e-5/(FCNST.c*wavenumber.max()))
+
+    for i in xrange(0, nsrc, chunk_size):
+        skypos_chunk = skypos[i:i+chunk_size,:]
+        if grid is not None:
+            # Separable field pattern along the two axes of a regular grid
+            xlocs, ylocs, zloc, xdelays, ydelays, gain = grid
+            field_pattern = NP.zeros((skypos_chunk.shape[0],nchan), dtype=NP.complex64)
+            for ix in xrange(xlocs.size):
+                field_pattern += NP.exp(1j * wavenumber.reshape(1,-1) * (xdelays[ix]*FCNST.c - xlocs[ix]*skypos_chunk[:,0]).reshape(-1,1).astype(NP.float32))
+            field_pattern_y = NP.zeros((skypos_chunk.shape[0],nchan), dtype=NP.complex64)
+            for iy in xrange(ylocs.size):
+                field_pattern_y += NP.exp(1j * wavenumber.reshape(1,-1) * (ydelays[iy]*FCNST.c - ylocs[iy]*skypos_chunk[:,1]).reshape(-1,1).astype(NP.float32))
+            field_pattern *= field_pattern_y
+            if zloc != 0.0:
+                field_pattern *= NP.exp(-1j * wavenumber.reshape(1,-1) * (zloc*skypos_chunk[:,2]).reshape(-1,1).astype(NP.float32))
+            field_pattern *= gain / nant
+            field_pattern = field_pattern.reshape(-1,nchan,1)
+            if power:
+                field_pattern = NP.abs(field_pattern)**2
+            if average:
+                retvalue[i:i+chunk_size,:] = field_pattern[:,:,0]
+            else:
+                retvalue[i:i+chunk_size,:,:] = field_pattern
+            continue
+
+        geometric_delays = -NP.dot(antpos, skypos_chunk.T) / FCNST.c
+        geometric_delays = geometric_delays.astype(NP.float32, copy=False)
+        for r in xrange(0, nreal, rand_batch):
+            delays_batch = delays[:,r:r+rand_batch] if delays.shape[1] > 1 else delays
+            gains_batch = gains[:,r:r+rand_batch] if gains.shape[1] > 1 else gains
+            nbatch = min(rand_batch, nreal-r)
+            field_pattern = NP.zeros((skypos_chunk.shape[0],nchan,nbatch), dtype=NP.complex64)
+            for j in xrange(nant): # Accumulate over elements
+                phase = (geometric_delays[j,:].reshape(-1,1,1) + delays_batch[j,:].reshape(1,1,-1)) * (FCNST.c * wavenumber).reshape(1,-1,1)
+                field_pattern += gains_batch[j,:].reshape(1,1,-1) * NP.exp(1j * phase.astype(NP.float32, copy=False))
+            field_pattern /= nant
+            if power:
+                field_pattern = NP.abs(field_pattern)**2
+            if average:
+                retvalue[i:i+chunk_size,:] += NP.sum(field_pattern, axis=2)
+            else:
+                retvalue[i:i+chunk_size,:,r:r+nbatch] = field_pattern
 
+    if average:
+        retvalue /= nreal
+    elif nrand > nreal:
+        retvalue = NP.repeat(retvalue, nrand, axis=2)
     if power:
-        retvalue = NP.abs(retvalue)**2
+        retvalue = retvalue.real
     return retvalue
                 
 #################################################################################
 
+def _separable_array_layout(antpos, delays, gains, tol=0.0):
+
+    """
+    -----------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    Determines if the elements of an array lie on a regular rectangular grid in
+    a horizontal plane with equal gains and beamformer delays separable along 
+    the local East and North axes, in which case the array field pattern is the
+    product of the field patterns along the two axes
+
+    Inputs:
+
+    antpos    [3-column numpy array] Positions of elements in the local ENU 
+              coordinate system (in meters)
+
+    delays    [numpy vector] Beamformer delays (in seconds) of the elements
+
+    gains     [numpy vector] Complex gains of the elements
+
+    Keyword Inputs:
+
+    tol       [scalar] Tolerance (in seconds) on the delays for them to be 
+              deemed separable. Default = 0
+
+    Output:
+
+    None if the array is not separable. Otherwise, a tuple (xlocs, ylocs, zloc,
+    xdelays, ydelays, gain) with the grid positions along East and North, the 
+    common height, the separated delays along the two axes and the common gain
+    -----------------------------------------------------------------------------
+    """
+
+    if not NP.allclose(antpos[:,2], antpos[0,2]):
+        return None
+    if not NP.allclose(gains, gains[0]):
+        return None
+    xlocs, xind = NP.unique(antpos[:,0], return_inverse=True)
+    ylocs, yind = NP.unique(antpos[:,1], return_inverse=True)
+    if xlocs.size * ylocs.size != antpos.shape[0]:
+        return None
+    grid_delays = NP.empty((xlocs.size,ylocs.size), dtype=NP.float64)
+    grid_delays.fill(NP.nan)
+    grid_delays[xind,yind] = delays
+    if NP.any(NP.isnan(grid_delays)): # Not every grid point has an element
+        return None
+    xdelays = grid_delays[:,0]
+    ydelays = grid_delays[0,:] - grid_delays[0,0]
+    if NP.abs(grid_delays - xdelays.reshape(-1,1) - ydelays.reshape(1,-1)).max() > tol:
+        return None
+
+    return (xlocs, ylocs, antpos[0,2], xdelays, ydelays, gains[0])
+
+#################################################################################
+
 def uniform_rectangular_aperture(sides, skypos, frequency, skyunits='altaz', 
                                  east2ax1=None, pointing_center=None, 
                                  power=True):
@@ -1914,3 +2269,828 @@ def uniform_square_aperture(side, skypos, frequency, skyunits='altaz',
     return ab
     
 ################################################################################
+
+def lowrank_beam_compress(pbeam, rtol=1e-3, max_rank=None):
+
+    """
+    -----------------------------------------------------------------------------
+    Compress primary beam values of many sky positions in a reduced spectral
+    basis. The primary beam is approximated as the product of an array of
+    coefficients (one row per sky position) and a set of orthonormal spectral
+    basis vectors obtained from the singular value decomposition of the
+    primary beam. The number of basis vectors is the smallest one for which
+    the relative reconstruction error of the primary beam spectrum of every
+    sky position does not exceed the specified tolerance.
+
+    Inputs:
+
+    pbeam       [numpy array] Primary beam values of size nsrc x nchan where
+                nsrc is the number of sky positions and nchan is the number of
+                frequency channels
+
+    Keyword Inputs:
+
+    rtol        [scalar] Tolerance on the relative reconstruction error of
+                each sky position defined as the norm of the difference
+                between the reconstructed and the input primary beam spectrum
+                of the sky position divided by the norm of its input primary
+                beam spectrum. Faint sky positions, such as those in the
+                sidelobes, are thus reconstructed as accurately as the bright
+                ones. Must be positive. Default = 1e-3
+
+    max_rank    [NoneType or integer] Maximum number of spectral basis vectors.
+                If set to None (default), it is limited only by the number of
+                frequency channels. If the tolerance cannot be met with this
+                number of basis vectors, the reconstruction error in the output
+                will exceed rtol
+
+    Output:
+
+    Dictionary containing the following keys and values:
+    'coeffs'    [numpy array] Coefficients of size nsrc x rank in single
+                precision
+    'basis'     [numpy array] Spectral basis vectors of size rank x nchan in
+                single precision
+    'rel_error' [scalar] Maximum relative reconstruction error achieved over
+                all sky positions
+    -----------------------------------------------------------------------------
+    """
+
+    pbeam = NP.asarray(pbeam)
+    if pbeam.ndim != 2:
+        raise ValueError('Input pbeam must be a 2D numpy array')
+    if not isinstance(rtol, (int,float)):
+        raise TypeError('Input rtol must be a scalar')
+    if rtol <= 0.0:
+        raise ValueError('Input rtol must be positive')
+    nsrc, nchan = pbeam.shape
+    if max_rank is None:
+        max_rank = nchan
+    elif not isinstance(max_rank, int):
+        raise TypeError('Input max_rank must be an integer')
+    elif max_rank < 1:
+        raise ValueError('Input max_rank must be positive')
+    max_rank = min(max_rank, nchan)
+
+    pbeam = pbeam.astype(NP.float64)
+    rownorms = NP.sqrt(NP.sum(pbeam**2, axis=1))
+    if (nsrc == 0) or NP.all(rownorms == 0.0):
+        return {'coeffs': NP.zeros((nsrc,1), dtype=NP.float32), 'basis': NP.zeros((1,nchan), dtype=NP.float32), 'rel_error': 0.0}
+    rownorms[rownorms == 0.0] = 1.0 # Rows of zeros are reconstructed exactly
+
+    # The spectral basis vectors are the eigenvectors of the nchan x nchan
+    # Gram matrix which avoids decomposing the nsrc x nchan primary beam. The
+    # residual of each row for every rank follows from its coefficients in
+    # the full orthonormal basis
+    eigvals, eigvecs = NP.linalg.eigh(NP.dot(pbeam.T, pbeam))
+    sortind = NP.argsort(eigvals)[::-1]
+    eigvecs = eigvecs[:,sortind]
+    coeffs = NP.dot(pbeam, eigvecs)**2
+    residual = NP.sqrt(NP.clip(NP.sum(coeffs, axis=1, keepdims=True) - NP.cumsum(coeffs, axis=1), 0.0, None)) / rownorms.reshape(-1,1)
+    residual = NP.max(residual, axis=0)
+    residual = NP.maximum.accumulate(residual[::-1])[::-1] # Not increasing with rank
+    rank = min(NP.searchsorted(-residual, -rtol) + 1, max_rank)
+
+    # The estimate of the residual loses precision for small tolerances and
+    # hence the error is verified on the reconstruction
+    while True:
+        basis = eigvecs[:,:rank].T
+        coeffs = NP.dot(pbeam, basis.T)
+        rel_error = NP.max(NP.sqrt(NP.sum((pbeam - NP.dot(coeffs, basis))**2, axis=1)) / rownorms)
+        if (rel_error <= rtol) or (rank >= max_rank):
+            break
+        rank += 1
+
+    return {'coeffs': coeffs.astype(NP.float32), 'basis': basis.astype(NP.float32), 'rel_error': rel_error}
+
+################################################################################
+
+def lowrank_beam_expand(pbeam_lowrank, chans=None):
+
+    """
+    -----------------------------------------------------------------------------
+    Reconstruct primary beam values from their representation in a reduced
+    spectral basis produced by lowrank_beam_compress()
+
+    Inputs:
+
+    pbeam_lowrank
+                [dictionary] Compressed primary beam as returned by
+                lowrank_beam_compress(). Must contain keys 'coeffs' and 'basis'
+
+    Keyword Inputs:
+
+    chans       [NoneType, slice, list or numpy array] Indices of frequency
+                channels to be reconstructed. If set to None (default), all
+                frequency channels are reconstructed
+
+    Output:
+
+    Primary beam values of size nsrc x nchan in single precision where nchan is
+    the number of frequency channels selected by chans
+    -----------------------------------------------------------------------------
+    """
+
+    if not isinstance(pbeam_lowrank, dict):
+        raise TypeError('Input pbeam_lowrank must be a dictionary')
+    if ('coeffs' not in pbeam_lowrank) or ('basis' not in pbeam_lowrank):
+        raise KeyError('Input pbeam_lowrank must contain keys "coeffs" and "basis"')
+
+    basis = NP.asarray(pbeam_lowrank['basis'])
+    if chans is not None:
+        basis = basis[:,chans]
+    return NP.dot(NP.asarray(pbeam_lowrank['coeffs']), basis).astype(NP.float32)
+
+################################################################################
+
+class PrimaryBeamCache(object):
+
+    """
+    ----------------------------------------------------------------------------
+    Class to manage a primary beam which is fixed in the local Alt-Az frame, as
+    in drift scans, by tabulating it once on a HEALPix grid of the local sky at
+    the frequency channels of the simulation. The primary beam at the sky
+    positions of any snapshot is then obtained by a vectorized lookup of the
+    grid instead of evaluating the analytic or external primary beam afresh.
+
+    Attributes:
+
+    nside       [integer] HEALPix resolution parameter of the grid (RING
+                ordering). The polar angle of the grid is the zenith angle and
+                the azimuthal angle is the azimuth (measured from north towards
+                east)
+
+    freqs       [numpy vector] Frequency channels (in Hz) at which the
+                primary beam is tabulated
+
+    beam        [numpy array] Primary beam (power pattern) tabulated on the
+                grid. It is of shape npix x nchan. Pixels far below the
+                horizon where the primary beam was not evaluated are set to
+                zero. If logscale is True, it holds the logarithm (base 10)
+                of the primary beam instead
+
+    logscale    [boolean] If True, the logarithm of the primary beam is
+                tabulated and interpolated, and the primary beam is obtained
+                by raising 10 to the interpolated value. This is the case for
+                external primary beams, which have always been interpolated in
+                logarithm
+
+    interp_method
+                [string] Method to obtain the primary beam at the sky
+                positions from the grid. Accepted values are 'nearest'
+                (value at the nearest pixel) and 'bilinear' (bilinear
+                interpolation between the four nearest pixels)
+
+    weights_cache_size
+                [integer] Number of most recent sets of sky positions whose
+                neighbouring pixels and interpolation weights are held so that
+                lookups at repeated sky positions skip their computation
+
+    Member functions:
+
+    __init__()  Initializes an instance of class PrimaryBeamCache by
+                tabulating an analytic or external primary beam or using a
+                specified initialization file
+
+    lookup()    Returns the primary beam at the specified sky positions and
+                frequency channels
+
+    save()      Saves the tabulated primary beam to a HDF5 file on disk from
+                which instances can be initialized, such as on other MPI
+                processes
+    ----------------------------------------------------------------------------
+    """
+
+    def __init__(self, freqs=None, telescope=None, nside=None,
+                 freq_scale='GHz', pointing_info=None, pointing_center=None,
+                 short_dipole_approx=False, half_wave_dipole_approx=False,
+                 external_beam=None, external_beam_freqs=None,
+                 spec_interp='cubic', interp_method='bilinear', chunk_size=None,
+                 weights_cache_size=2, init_file=None):
+
+        """
+        ------------------------------------------------------------------------
+        Initializes an instance of class PrimaryBeamCache by tabulating the
+        primary beam on a HEALPix grid of the local sky
+
+        Class attributes initialized are:
+        nside, freqs, beam, logscale, interp_method, weights_cache_size
+
+        Read docstring of class PrimaryBeamCache for details on these
+        attributes.
+
+        Keyword inputs:
+
+        freqs       [list or numpy vector] Frequency channels at which the
+                    primary beam is to be tabulated. Units are specified by
+                    freq_scale. Must be specified unless init_file is
+                    specified
+
+        telescope   [dictionary] Specifies the antenna element, its size and
+                    orientation and the ground plane. Read docstring of
+                    function primary_beam_generator() for details. Used only
+                    if external_beam is not specified
+
+        nside       [integer] HEALPix resolution parameter of the grid on
+                    which an analytic primary beam is tabulated. Must be a
+                    power of 2. Default = 128 (pixels of about 0.46 degrees).
+                    It must be chosen to sample the narrowest features of the
+                    primary beam well. Ignored if external_beam is specified
+
+        freq_scale  [string] Units of freqs. Accepted values are 'GHz'
+                    (default), 'MHz', 'kHz' and 'Hz'
+
+        pointing_info
+                    [dictionary] Pointing information of the phased array
+                    which must remain fixed for the primary beam to be fixed
+                    in the local frame. Read docstring of function
+                    primary_beam_generator() for details. If random jitters in
+                    delays or gains are specified, their realizations are
+                    frozen in the tabulated primary beam
+
+        pointing_center
+                    [list or numpy array] Pointing center (Alt-Az in degrees)
+                    of dishes and apertures. Read docstring of function
+                    primary_beam_generator() for details
+
+        short_dipole_approx
+                    [boolean] Short dipole approximation. Read docstring of
+                    function primary_beam_generator() for details
+
+        half_wave_dipole_approx
+                    [boolean] Half-wave dipole approximation. Read docstring
+                    of function primary_beam_generator() for details
+
+        external_beam
+                    [numpy array] External primary beam given as HEALPix maps
+                    (RING ordering) of the local sky. It is of shape npix x
+                    nfreqs where nfreqs is the number of frequencies in
+                    external_beam_freqs. If specified, the grid takes the
+                    resolution of the external primary beam and it is
+                    interpolated spectrally once to freqs. Its logarithm is
+                    tabulated so that lookups reproduce the spatial
+                    interpolation of the logarithm of the external primary
+                    beam
+
+        external_beam_freqs
+                    [numpy vector] Frequencies (in Hz) of the external primary
+                    beam. If set to None or if it contains a single
+                    frequency, the external primary beam is treated as
+                    achromatic and its first column is used for all the
+                    frequency channels
+
+        spec_interp [string] Method of spectral interpolation of the logarithm
+                    of the external primary beam. Accepted values are those
+                    of function healpix_interp_along_axis() of module
+                    astroutils.mathops. Default = 'cubic'
+
+        interp_method
+                    [string] Method to obtain the primary beam at the sky
+                    positions from the grid. Accepted values are 'bilinear'
+                    (default) and 'nearest'
+
+        chunk_size  [integer] Number of pixels over which an analytic primary
+                    beam is evaluated at a time to limit the memory used.
+                    Default = 16384
+
+        weights_cache_size
+                    [integer] Number of most recent sets of sky positions
+                    whose neighbouring pixels and interpolation weights are
+                    held for reuse by member function lookup(). Each set takes
+                    about 64 bytes per sky position with bilinear
+                    interpolation. Set to 0 to disable. Default = 2
+
+        init_file   [string] Location of the initialization file (without the
+                    '.hdf5' extension) from which an instance of class
+                    PrimaryBeamCache will be created. File format must be
+                    compatible with the one saved to disk by member function
+                    save(). If specified, all other inputs except
+                    weights_cache_size are ignored
+        ------------------------------------------------------------------------
+        """
+
+        if not isinstance(weights_cache_size, int):
+            raise TypeError('Input weights_cache_size must be an integer')
+        if weights_cache_size < 0:
+            raise ValueError('Input weights_cache_size must be non-negative')
+        self.weights_cache_size = weights_cache_size
+        self._interp_weights = OrderedDict()
+
+        if init_file is not None:
+            with h5py.File(init_file+'.hdf5', 'r') as fileobj:
+                self.nside = int(fileobj['header']['nside'].value)
+                self.interp_method = str(fileobj['header']['interp_method'].value)
+                if 'logscale' in fileobj['header']:
+                    self.logscale = bool(fileobj['header']['logscale'].value)
+                else:
+                    self.logscale = False
+                self.freqs = fileobj['freqs'].value
+                self.beam = fileobj['beam'].value
+            return
+
+        if freqs is None:
+            raise NameError('Input freqs must be specified')
+        freqs = NP.asarray(freqs, dtype=NP.float64).ravel()
+        if (freq_scale == 'ghz') or (freq_scale == 'GHz'):
+            freqs = freqs * 1.0e9
+        elif (freq_scale == 'mhz') or (freq_scale == 'MHz'):
+            freqs = freqs * 1.0e6
+        elif (freq_scale == 'khz') or (freq_scale == 'kHz'):
+            freqs = freqs * 1.0e3
+        elif (freq_scale != 'hz') and (freq_scale != 'Hz'):
+            raise ValueError('Input freq_scale must be "GHz", "MHz", "kHz" or "Hz"')
+        self.freqs = freqs
+
+        if interp_method not in ['nearest', 'bilinear']:
+            raise ValueError('Input interp_method must be "nearest" or "bilinear"')
+        self.interp_method = interp_method
+
+        if external_beam is not None:
+            external_beam = NP.asarray(external_beam)
+            if external_beam.ndim == 1:
+                external_beam = external_beam.reshape(-1,1)
+            self.nside = HP.npix2nside(external_beam.shape[0])
+            self.logscale = True
+            if (external_beam_freqs is None) or (NP.asarray(external_beam_freqs).size == 1):
+                self.beam = NP.repeat(NP.log10(external_beam[:,:1]), self.freqs.size, axis=1).astype(NP.float32)
+            else:
+                theta, phi = HP.pix2ang(self.nside, NP.arange(external_beam.shape[0]))
+                theta_phi = NP.hstack((theta.reshape(-1,1), phi.reshape(-1,1)))
+                interp_logbeam = OPS.healpix_interp_along_axis(NP.log10(external_beam), theta_phi=theta_phi, inloc_axis=NP.asarray(external_beam_freqs).ravel(), outloc_axis=self.freqs, axis=1, kind=spec_interp, assume_sorted=True)
+                self.beam = interp_logbeam.astype(NP.float32)
+        else:
+            self.logscale = False
+            if telescope is None:
+                raise NameError('Input telescope must be specified if external_beam is not specified')
+            if nside is None:
+                nside = 128
+            if not HP.isnsideok(nside):
+                raise ValueError('Input nside must be a power of 2')
+            self.nside = nside
+            if chunk_size is None:
+                chunk_size = 16384
+            elif not isinstance(chunk_size, int):
+                raise TypeError('Input chunk_size must be an integer')
+            elif chunk_size < 1:
+                raise ValueError('Input chunk_size must be positive')
+
+            npix = HP.nside2npix(self.nside)
+            theta, phi = HP.pix2ang(self.nside, NP.arange(npix))
+            # Evaluate down to a little below the horizon, where the primary
+            # beam takes its value at the horizon, so that interpolation near
+            # the horizon is well defined. The altitudes are clipped at the
+            # horizon since the ground plane, dipole and array patterns reject
+            # negative altitudes
+            pixind = NP.where(theta <= 0.5*NP.pi + 2*HP.nside2resol(self.nside))[0]
+            self.beam = NP.zeros((npix, self.freqs.size), dtype=NP.float32)
+            for i in xrange(0, pixind.size, chunk_size):
+                ind = pixind[i:i+chunk_size]
+                skypos = NP.hstack((NP.clip(90.0-NP.degrees(theta[ind]), 0.0, 90.0).reshape(-1,1), NP.degrees(phi[ind]).reshape(-1,1)))
+                self.beam[ind,:] = primary_beam_generator(skypos, self.freqs, telescope, freq_scale='Hz', skyunits='altaz', pointing_info=pointing_info, pointing_center=pointing_center, short_dipole_approx=short_dipole_approx, half_wave_dipole_approx=half_wave_dipole_approx)
+
+    ############################################################################
+
+    def lookup(self, skypos, skyunits='altaz', freqs=None, freq_scale='GHz'):
+
+        """
+        ------------------------------------------------------------------------
+        Returns the primary beam at the specified sky positions and frequency
+        channels from the tabulated grid
+
+        Inputs:
+
+        skypos      [numpy array] Sky positions at which the primary beam is to
+                    be obtained. Size is M x N where N = 2 (if skyunits =
+                    altaz, in degrees) or N = 3 (if skyunits = dircos)
+
+        Keyword Inputs:
+
+        skyunits    [string] Coordinate system of the sky positions. Accepted
+                    values are 'altaz' (default) and 'dircos'
+
+        freqs       [list or numpy vector] Frequency channels at which the
+                    primary beam is to be obtained. They must be a subset of
+                    the tabulated frequency channels. Units are specified by
+                    freq_scale. If set to None (default), all the tabulated
+                    frequency channels are returned
+
+        freq_scale  [string] Units of freqs. Accepted values are 'GHz'
+                    (default), 'MHz', 'kHz' and 'Hz'
+
+        Output:
+
+        Numpy array of the primary beam of shape M x nchan
+        ------------------------------------------------------------------------
+        """
+
+        skypos = NP.asarray(skypos)
+        if skyunits == 'dircos':
+            skypos = GEOM.dircos2altaz(skypos, units='degrees')
+        elif skyunits != 'altaz':
+            raise ValueError('Input skyunits must be "altaz" or "dircos"')
+        skypos = skypos.reshape(-1,2)
+
+        if freqs is None:
+            chans = slice(None)
+        else:
+            freqs = NP.asarray(freqs, dtype=NP.float64).ravel()
+            if (freq_scale == 'ghz') or (freq_scale == 'GHz'):
+                freqs = freqs * 1.0e9
+            elif (freq_scale == 'mhz') or (freq_scale == 'MHz'):
+                freqs = freqs * 1.0e6
+            elif (freq_scale == 'khz') or (freq_scale == 'kHz'):
+                freqs = freqs * 1.0e3
+            elif (freq_scale != 'hz') and (freq_scale != 'Hz'):
+                raise ValueError('Input freq_scale must be "GHz", "MHz", "kHz" or "Hz"')
+            chans = NP.argmin(NP.abs(self.freqs.reshape(1,-1) - freqs.reshape(-1,1)), axis=1)
+            if not NP.allclose(self.freqs[chans], freqs, rtol=1e-9, atol=0.0):
+                raise ValueError('Input freqs must be a subset of the tabulated frequency channels')
+
+        pixind, wts = self._neighbour_weights(skypos)
+        if self.interp_method == 'nearest':
+            pb = self.beam[pixind,:][:,chans].astype(NP.float64)
+        else:
+            pb = NP.zeros((skypos.shape[0], self.beam[:1,chans].shape[1]), dtype=NP.float64)
+            for i in xrange(pixind.shape[0]):
+                pb += wts[i,:].reshape(-1,1) * self.beam[pixind[i,:],:][:,chans]
+        if self.logscale:
+            pb = 10**pb
+        return pb
+
+    ############################################################################
+
+    def _neighbour_weights(self, skypos):
+
+        """
+        ------------------------------------------------------------------------
+        !!! FOR INTERNAL USE ONLY !!!
+        Returns the pixels and weights used to interpolate the grid at the sky
+        positions (Alt-Az in degrees, of shape M x 2). For nearest pixel
+        lookup, the pixels are of shape (M,) and the weights are None.
+        Otherwise both are of shape 4 x M. The most recent weights_cache_size
+        of them are held and reused when the same sky positions recur, such as
+        for snapshots at repeated LST.
+        ------------------------------------------------------------------------
+        """
+
+        skypos = NP.ascontiguousarray(skypos, dtype=NP.float64)
+        key = (skypos.shape, hash(skypos.tostring()))
+        if key in self._interp_weights:
+            cached_skypos, pixind, wts = self._interp_weights.pop(key)
+            if NP.array_equal(cached_skypos, skypos):
+                self._interp_weights[key] = (cached_skypos, pixind, wts) # Mark as most recently used
+                return (pixind, wts)
+
+        theta = NP.radians(90.0 - skypos[:,0])
+        phi = NP.radians(skypos[:,1])
+        if self.interp_method == 'nearest':
+            pixind = HP.ang2pix(self.nside, theta, phi)
+            wts = None
+        else:
+            pixind, wts = HP.get_interp_weights(self.nside, theta, phi)
+
+        if self.weights_cache_size > 0:
+            self._interp_weights[key] = (NP.copy(skypos), pixind, wts)
+            while len(self._interp_weights) > self.weights_cache_size:
+                self._interp_weights.popitem(last=False)
+        return (pixind, wts)
+
+    ############################################################################
+
+    def save(self, outfile, overwrite=False, verbose=True):
+
+        """
+        ------------------------------------------------------------------------
+        Saves the tabulated primary beam to a HDF5 file on disk
+
+        Inputs:
+
+        outfile     [string] Filename with full path to be saved to. Will be
+                    appended with '.hdf5' extension
+
+        Keyword Inputs:
+
+        overwrite   [boolean] True indicates overwrite even if a file already
+                    exists. Default = False (does not overwrite)
+
+        verbose     [boolean] If True (default), prints diagnostic and progress
+                    messages. If False, suppress printing such messages.
+        ------------------------------------------------------------------------
+        """
+
+        if verbose:
+            print '\nSaving tabulated primary beam...'
+
+        if overwrite:
+            write_str = 'w'
+        else:
+            write_str = 'w-'
+        with h5py.File(outfile+'.hdf5', write_str) as fileobj:
+            hdr_group = fileobj.create_group('header')
+            hdr_group['nside'] = self.nside
+            hdr_group['interp_method'] = self.interp_method
+            hdr_group['logscale'] = self.logscale
+            fileobj.create_dataset('freqs', data=self.freqs)
+            fileobj.create_dataset('beam', data=self.beam, chunks=(min(self.beam.shape[0], 4096), self.beam.shape[1]))
+
+        if verbose:
+            print '\tSaved tabulated primary beam to {0}.hdf5'.format(outfile)
+
+################################################################################
+
+def _beam_cache_key(obj):
+
+    """
+    ----------------------------------------------------------------------------
+    !!! FOR INTERNAL USE ONLY !!!
+    Converts the beamformer, frequency and telescope parameters into a hashable
+    key for the primary beam cache. Floating point values are represented to
+    10 significant digits so that the same settings arrived at by different
+    arithmetic map to the same key
+
+    Inputs:
+
+    obj         [dictionary, list, tuple, numpy array or scalar] Parameters to
+                be converted. Dictionaries and sequences are converted
+                recursively
+
+    Output:
+
+    Hashable (nested tuple) representation of obj
+    ----------------------------------------------------------------------------
+    """
+
+    if isinstance(obj, dict):
+        return tuple(sorted([(key, _beam_cache_key(val)) for key, val in obj.iteritems()]))
+    if isinstance(obj, (list, tuple, NP.ndarray)):
+        arr = NP.asarray(obj)
+        if arr.dtype == object:
+            return tuple([_beam_cache_key(val) for val in obj])
+        if arr.dtype.kind in 'fc':
+            return (arr.shape,) + tuple(['{0:.10g}'.format(val) for val in arr.ravel()])
+        return (arr.shape,) + tuple(arr.ravel().tolist())
+    if isinstance(obj, (float, NP.floating)):
+        return '{0:.10g}'.format(obj)
+    return obj
+
+################################################################################
+
+class PhasedArrayBeamCache(object):
+
+    """
+    ----------------------------------------------------------------------------
+    Class to manage a least recently used (LRU) cache of primary beams
+    tabulated on HEALPix grids of the local sky, keyed by the beamformer
+    settings (delays and pointing), the frequency channels and the telescope
+    parameters. Observing schedules of phased arrays such as the MWA reuse a
+    handful of delay settings for hours, so the primary beam of any snapshot
+    sharing a delay setting with an earlier one is obtained by a lookup of the
+    grid instead of evaluating the array and element patterns afresh.
+
+    Attributes:
+
+    telescope   [dictionary] Specifies the antenna element, its size and
+                orientation and the ground plane. Read docstring of function
+                primary_beam_generator() for details
+
+    nside       [integer] HEALPix resolution parameter of the grids
+
+    interp_method
+                [string] Method to obtain the primary beam at the sky
+                positions from the grids. Accepted values are 'nearest' and
+                'bilinear'
+
+    maxsize     [integer] Maximum number of primary beams held in the cache
+
+    maxmem      [scalar] Maximum memory (in bytes) occupied by the primary
+                beams held in the cache. If None, there is no limit other than
+                maxsize
+
+    beams       [collections.OrderedDict] Instances of class PrimaryBeamCache
+                keyed by the beamformer, frequency and telescope parameters in
+                order of their last use (most recent last)
+
+    hits        [integer] Number of lookups served from a cached primary beam
+
+    misses      [integer] Number of lookups which required the primary beam to
+                be tabulated
+
+    evictions   [integer] Number of primary beams evicted from the cache
+
+    Member functions:
+
+    __init__()  Initializes an instance of class PhasedArrayBeamCache
+
+    lookup()    Returns the primary beam at the specified sky positions and
+                frequency channels for the specified beamformer settings,
+                tabulating it if it is not in the cache
+
+    stats()     Returns the hit and miss statistics of the cache
+
+    clear()     Empties the cache and resets its statistics
+    ----------------------------------------------------------------------------
+    """
+
+    def __init__(self, telescope, nside=None, interp_method='bilinear',
+                 maxsize=8, maxmem=None, short_dipole_approx=False,
+                 half_wave_dipole_approx=False, chunk_size=None):
+
+        """
+        ------------------------------------------------------------------------
+        Initializes an instance of class PhasedArrayBeamCache
+
+        Class attributes initialized are:
+        telescope, nside, interp_method, maxsize, maxmem, beams, hits, misses,
+        evictions
+
+        Read docstring of class PhasedArrayBeamCache for details on these
+        attributes.
+
+        Inputs:
+
+        telescope   [dictionary] Specifies the antenna element, its size and
+                    orientation and the ground plane. Read docstring of
+                    function primary_beam_generator() for details
+
+        Keyword inputs:
+
+        nside       [integer] HEALPix resolution parameter of the grids. Must
+                    be a power of 2. Default = 128. Read docstring of class
+                    PrimaryBeamCache for details
+
+        interp_method
+                    [string] Method to obtain the primary beam at the sky
+                    positions from the grids. Accepted values are 'bilinear'
+                    (default) and 'nearest'
+
+        maxsize     [integer] Maximum number of primary beams held in the
+                    cache. The least recently used primary beam is evicted
+                    when it is exceeded. Default = 8
+
+        maxmem      [scalar] Maximum memory (in bytes) occupied by the primary
+                    beams held in the cache. The least recently used primary
+                    beams are evicted when it is exceeded. The most recently
+                    used primary beam is always retained. Default = None (no
+                    limit other than maxsize)
+
+        short_dipole_approx
+                    [boolean] Short dipole approximation. Read docstring of
+                    function primary_beam_generator() for details
+
+        half_wave_dipole_approx
+                    [boolean] Half-wave dipole approximation. Read docstring
+                    of function primary_beam_generator() for details
+
+        chunk_size  [integer] Number of pixels over which the primary beam is
+                    evaluated at a time while tabulating. Read docstring of
+                    class PrimaryBeamCache for details
+        ------------------------------------------------------------------------
+        """
+
+        if not isinstance(telescope, dict):
+            raise TypeError('Input telescope must be a dictionary')
+        if not isinstance(maxsize, int):
+            raise TypeError('Input maxsize must be an integer')
+        if maxsize < 1:
+            raise ValueError('Input maxsize must be positive')
+        if maxmem is not None:
+            if not isinstance(maxmem, (int,long,float)):
+                raise TypeError('Input maxmem must be a scalar')
+            if maxmem <= 0.0:
+                raise ValueError('Input maxmem must be positive')
+        if interp_method not in ['nearest', 'bilinear']:
+            raise ValueError('Input interp_method must be "nearest" or "bilinear"')
+
+        self.telescope = telescope
+        self.nside = nside
+        self.interp_method = interp_method
+        self.maxsize = maxsize
+        self.maxmem = maxmem
+        self.short_dipole_approx = short_dipole_approx
+        self.half_wave_dipole_approx = half_wave_dipole_approx
+        self.chunk_size = chunk_size
+        self.beams = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    ############################################################################
+
+    def lookup(self, skypos, skyunits='altaz', freqs=None, freq_scale='GHz',
+               pointing_info=None, pointing_center=None):
+
+        """
+        ------------------------------------------------------------------------
+        Returns the primary beam at the specified sky positions and frequency
+        channels for the specified beamformer settings. The primary beam is
+        tabulated and added to the cache if it is not already in it
+
+        Inputs:
+
+        skypos      [numpy array] Sky positions at which the primary beam is to
+                    be obtained. Size is M x N where N = 2 (if skyunits =
+                    altaz, in degrees) or N = 3 (if skyunits = dircos)
+
+        Keyword Inputs:
+
+        skyunits    [string] Coordinate system of the sky positions. Accepted
+                    values are 'altaz' (default) and 'dircos'
+
+        freqs       [list or numpy vector] Frequency channels at which the
+                    primary beam is to be obtained. Units are specified by
+                    freq_scale. Must be specified
+
+        freq_scale  [string] Units of freqs. Accepted values are 'GHz'
+                    (default), 'MHz', 'kHz' and 'Hz'
+
+        pointing_info
+                    [dictionary] Beamformer settings of the phased array. Read
+                    docstring of function primary_beam_generator() for details.
+                    If random jitters in delays or gains are specified, their
+                    realizations are frozen in the cached primary beam and
+                    shared by all snapshots with the same settings
+
+        pointing_center
+                    [list or numpy array] Pointing center (Alt-Az in degrees)
+                    of dishes and apertures. Read docstring of function
+                    primary_beam_generator() for details. It is ignored if
+                    the delays are specified in pointing_info and the antenna
+                    element is not a dish or aperture of a custom telescope,
+                    since the primary beam is then determined by the delays
+                    alone and snapshots with the same delays share the cached
+                    primary beam irrespective of their pointing centers
+
+        Output:
+
+        Numpy array of the primary beam of shape M x nchan
+        ------------------------------------------------------------------------
+        """
+
+        if freqs is None:
+            raise NameError('Input freqs must be specified')
+
+        if (pointing_info is not None) and ('delays' in pointing_info):
+            if ('id' in self.telescope) or (self.telescope.get('shape', 'delta') not in ['dish', 'rect', 'square']):
+                pointing_center = None # Does not enter the primary beam
+
+        key = _beam_cache_key({'telescope': self.telescope, 'freqs': freqs, 'freq_scale': freq_scale, 'pointing_info': pointing_info, 'pointing_center': pointing_center})
+        if key in self.beams:
+            self.hits += 1
+            beam = self.beams.pop(key)
+        else:
+            self.misses += 1
+            beam = PrimaryBeamCache(freqs=freqs, telescope=self.telescope, nside=self.nside, freq_scale=freq_scale, pointing_info=pointing_info, pointing_center=pointing_center, short_dipole_approx=self.short_dipole_approx, half_wave_dipole_approx=self.half_wave_dipole_approx, interp_method=self.interp_method, chunk_size=self.chunk_size, weights_cache_size=0) # Sky positions rarely recur with the same settings and the weights of each beam in the cache would add up
+        self.beams[key] = beam
+
+        while len(self.beams) > 1:
+            if len(self.beams) <= self.maxsize:
+                if self.maxmem is None:
+                    break
+                if sum([cached_beam.beam.nbytes for cached_beam in self.beams.itervalues()]) <= self.maxmem:
+                    break
+            self.beams.popitem(last=False)
+            self.evictions += 1
+
+        return beam.lookup(skypos, skyunits=skyunits)
+
+    ############################################################################
+
+    def stats(self):
+
+        """
+        ------------------------------------------------------------------------
+        Returns the hit and miss statistics of the cache
+
+        Output:
+
+        Dictionary with the following keys and values:
+        'hits'      [integer] Number of lookups served from a cached primary
+                    beam
+        'misses'    [integer] Number of lookups which required the primary
+                    beam to be tabulated
+        'evictions' [integer] Number of primary beams evicted from the cache
+        'size'      [integer] Number of primary beams currently in the cache
+        'maxsize'   [integer] Maximum number of primary beams held in the cache
+        'nbytes'    [integer] Memory (in bytes) occupied by the primary beams
+                    currently in the cache
+        ------------------------------------------------------------------------
+        """
+
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.beams), 'maxsize': self.maxsize, 'nbytes': sum([cached_beam.beam.nbytes for cached_beam in self.beams.itervalues()])}
+
+    ############################################################################
+
+    def clear(self):
+
+        """
+        ------------------------------------------------------------------------
+        Empties the cache and resets its statistics
+        ------------------------------------------------------------------------
+        """
+
+        self.beams.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+################################################################################
@@ -33,6 +33,7 @@ import prisim
 from prisim import interferometry as RI
 from prisim import primary_beams as PB
 from prisim import baseline_delay_horizon as DLY
+from prisim import parallel_processing as PP
 import ipdb as PDB
 
 ## Set MPI parameters
@@ -54,6 +55,7 @@ parser = argparse.ArgumentParser(description='Program to simulate interferometer
 
 input_group = parser.add_argument_group('Input parameters', 'Input specifications')
 input_group.add_argument('-i', '--infile', dest='infile', default=prisim_path+'examples/simparms/defaultparms.yaml', type=file, required=False, help='File specifying input parameters')
+input_group.add_argument('--resume', dest='resume', default=None, type=str, required=False, metavar='SIMID', help='Simulation ID of an interrupted simulation to be resumed from its checkpoints. The simulation parameters saved by the interrupted simulation are used, and the input parameters file only locates the project')
 
 args = vars(parser.parse_args())
 
@@ -93,6 +95,13 @@ else:
                 else:
                     raise KeyError('Invalid parameter found in custom simulation parameters file')                            
 
+resume = args['resume'] is not None
+if resume: # Restore the parameters of the interrupted simulation
+    resume_parmsfile = parms['dirstruct']['rootdir'] + parms['dirstruct']['project'] + '/' + args['resume'] + '/metainfo/simparms.yaml'
+    with open(resume_parmsfile, 'r') as parms_file:
+        parms = yaml.safe_load(parms_file)
+    parms['dirstruct']['simid'] = args['resume']
+
 rootdir = parms['dirstruct']['rootdir']
 project = parms['dirstruct']['project']
 simid = parms['dirstruct']['simid']
@@ -219,6 +228,74 @@ bandpass_correct = parms['processing']['bp_correct']
 noise_bandpass_correct = parms['processing']['noise_bp_correct']
 do_delay_transform = parms['processing']['delay_transform']
 memsave = parms['processing']['memsave']
+if memsave not in [True, False, 'mixed']:
+    raise ValueError('memsave must be true, false or "mixed"')
+vis_engine = parms['processing']['vis_engine']
+if vis_engine is not None:
+    if not isinstance(vis_engine, str):
+        raise TypeError('vis_engine must be a string')
+    if vis_engine.lower() not in ['baseline', 'antenna']:
+        raise ValueError('Invalid value specified for vis_engine')
+phasor_mode = parms['processing']['phasor_mode']
+if phasor_mode is not None:
+    if not isinstance(phasor_mode, str):
+        raise TypeError('phasor_mode must be a string')
+    if phasor_mode.lower() not in ['direct', 'recurrence']:
+        raise ValueError('Invalid value specified for phasor_mode')
+snapshot_batch = parms['processing']['snapshot_batch']
+if snapshot_batch is None:
+    snapshot_batch = 1
+elif not isinstance(snapshot_batch, int):
+    raise TypeError('snapshot_batch must be an integer')
+elif snapshot_batch < 1:
+    raise ValueError('snapshot_batch must be positive')
+nthreads = parms['processing']['nthreads']
+if nthreads is None:
+    nthreads = 1
+elif not isinstance(nthreads, int):
+    raise TypeError('nthreads must be an integer')
+elif nthreads < 1:
+    raise ValueError('nthreads must be positive')
+cull_tol = parms['processing']['cull_tol']
+if cull_tol is not None:
+    if not isinstance(cull_tol, (int,float)):
+        raise TypeError('cull_tol must be a scalar')
+    if cull_tol < 0.0:
+        raise ValueError('cull_tol must be non-negative')
+time_major = parms['processing']['time_major']
+if time_major is None:
+    time_major = False
+elif not isinstance(time_major, bool):
+    raise TypeError('time_major must be a boolean')
+use_beam_cache = parms['processing']['beam_cache']
+if use_beam_cache is None:
+    use_beam_cache = False
+elif not isinstance(use_beam_cache, bool):
+    raise TypeError('beam_cache must be a boolean')
+beam_cache_nside = parms['processing']['beam_cache_nside']
+if beam_cache_nside is None:
+    beam_cache_nside = 128
+elif not isinstance(beam_cache_nside, int):
+    raise TypeError('beam_cache_nside must be an integer')
+beam_cache_size = parms['processing']['beam_cache_size']
+if beam_cache_size is None:
+    beam_cache_size = 8
+elif not isinstance(beam_cache_size, int):
+    raise TypeError('beam_cache_size must be an integer')
+elif beam_cache_size < 1:
+    raise ValueError('beam_cache_size must be positive')
+tabulated_beams = parms['processing']['tabulated_beams']
+if tabulated_beams is None:
+    tabulated_beams = False
+elif not isinstance(tabulated_beams, bool):
+    raise TypeError('tabulated_beams must be a boolean')
+pbeam_rtol = parms['processing']['pbeam_rtol']
+if pbeam_rtol is not None:
+    if not isinstance(pbeam_rtol, (int,float)):
+        raise TypeError('pbeam_rtol must be a scalar')
+    if pbeam_rtol <= 0.0:
+        raise ValueError('pbeam_rtol must be positive')
+    pbeam_rtol = float(pbeam_rtol)
 cleanup = parms['processing']['cleanup']
 if not isinstance(cleanup, (bool,int)):
     raise TypeError('cleanup parameter must be an integer or boolean')
@@ -267,6 +344,24 @@ pc = parms['phasing']['center']
 pc_coords = parms['phasing']['coords']
 mpi_key = parms['pp']['key']
 mpi_eqvol = parms['pp']['eqvol']
+task_snapshots = parms['pp']['task_snapshots']
+if task_snapshots is not None:
+    if not isinstance(task_snapshots, int):
+        raise TypeError('task_snapshots must be an integer')
+    if task_snapshots < 1:
+        raise ValueError('task_snapshots must be positive')
+src_shares = parms['pp']['src_shares']
+if src_shares is not None:
+    if not isinstance(src_shares, int):
+        raise TypeError('src_shares must be an integer')
+    if src_shares < 1:
+        raise ValueError('src_shares must be positive')
+checkpoint = parms['pp']['checkpoint']
+if checkpoint is not None:
+    if not isinstance(checkpoint, int):
+        raise TypeError('checkpoint must be an integer')
+    if checkpoint < 1:
+        raise ValueError('checkpoint must be positive')
 save_redundant = parms['save_redundant']
 save_formats = parms['save_formats']
 save_to_npz = save_formats['npz']
@@ -480,6 +575,8 @@ telescope['groundplane'] = ground_plane
 telescope['latitude'] = latitude
 telescope['longitude'] = longitude
 telescope['altitude'] = altitude
+if tabulated_beams:
+    telescope['tabulated_kernels'] = True
 
 if A_eff is None:
     if (telescope['shape'] == 'dipole') or (telescope['shape'] == 'delta'):
@@ -789,20 +886,28 @@ except NameError:
     
 if not isinstance(mpi_key, str):
     raise TypeError('MPI key must be a string')
-if mpi_key not in ['src', 'bl', 'freq']:
-    raise ValueError('MPI key must be set on "bl" or "src"')
+if mpi_key not in ['src', 'bl', 'freq', 'auto']:
+    raise ValueError('MPI key must be set on "bl", "freq", "src" or "auto"')
 if mpi_key == 'src':
     mpi_on_src = True
-    mpi_ob_bl = False
+    mpi_on_bl = False
     mpi_on_freq = False
+    mpi_on_grid = False
 elif mpi_key == 'bl':
     mpi_on_src = False
     mpi_on_bl = True
     mpi_on_freq = False
-else:
+    mpi_on_grid = False
+elif mpi_key == 'freq':
     mpi_on_freq = True
     mpi_on_src = False
     mpi_on_bl = False
+    mpi_on_grid = False
+else:
+    mpi_on_grid = True
+    mpi_on_src = False
+    mpi_on_bl = False
+    mpi_on_freq = False
 
 if not isinstance(mpi_eqvol, bool):
     raise TypeError('MPI equal volume parameter must be boolean')
@@ -1564,11 +1669,10 @@ memory_DFT_matrix_per_process = memory_DFT_matrix / nproc
 memory_use_per_process = float(memuse) / nproc
 n_chunks_per_process = NP.ceil(memory_DFT_matrix/memuse)
 n_chunks = NP.ceil(nproc * n_chunks_per_process)
-if mpi_on_src:
-    src_chunk_size = int(NP.floor(1.0 * nchan / n_chunks))
-    src_bin_indices = range(0, nsrc, src_chunk_size)
-    src_chunk = range(len(src_bin_indices))
-    n_src_chunks = len(src_bin_indices)
+if mpi_on_src: # Every process holds a share of the sources of all baselines in a chunk
+    baseline_chunk_size = int(NP.ceil(1.0 * nbl / n_chunks_per_process))
+    baseline_bin_indices = range(0, nbl, baseline_chunk_size)
+    n_bl_chunks = len(baseline_bin_indices)
 elif mpi_on_freq:
     frequency_chunk_size = int(NP.floor(1.0 * nchan / n_chunks))
     frequency_bin_indices = range(0, nchan, frequency_chunk_size)
@@ -1579,12 +1683,7 @@ elif mpi_on_freq:
             raise IndexError('Chunking has run into a weird indexing problem. Rechunking is necessaray. Try changing number of parallel processes and amount of usable memory. Usually reducing either one of these should help avoid this problem.')
     freq_chunk = range(len(frequency_bin_indices))
     n_freq_chunks = len(frequency_bin_indices)
-    n_freq_chunk_per_rank = NP.zeros(nproc, dtype=int) + len(freq_chunk)/nproc
-    if len(freq_chunk) % nproc > 0:
-        n_freq_chunk_per_rank[:len(freq_chunk)%nproc] += 1
-    n_freq_chunk_per_rank = n_freq_chunk_per_rank[::-1] # Reverse for more equal distribution of chunk sizes over processes
-    cumm_freq_chunks = NP.concatenate(([0], NP.cumsum(n_freq_chunk_per_rank)))
-else:
+elif mpi_on_bl:
     baseline_chunk_size = int(NP.floor(1.0 * nbl / n_chunks))
     baseline_bin_indices = range(0, nbl, baseline_chunk_size)
     if baseline_bin_indices[-1] == nchan-1:
@@ -1594,11 +1693,73 @@ else:
             raise IndexError('Chunking has run into a weird indexing problem. Rechunking is necessaray. Try changing number of parallel processes and amount of usable memory. Usually reducing either one of these should help avoind this problem.')
     bl_chunk = range(len(baseline_bin_indices))
     n_bl_chunks = len(baseline_bin_indices)
-    n_bl_chunk_per_rank = NP.zeros(nproc, dtype=int) + len(bl_chunk)/nproc
-    if len(bl_chunk) % nproc > 0:
-        n_bl_chunk_per_rank[:len(bl_chunk)%nproc] += 1
-    n_bl_chunk_per_rank = n_bl_chunk_per_rank[::-1] # Reverse for more equal distribution of chunk sizes over processes
-    cumm_bl_chunks = NP.concatenate(([0], NP.cumsum(n_bl_chunk_per_rank)))
+else: # Tiles of baselines x frequency channels, optionally with the sources split between teams of processes
+    grid = PP.decomposition_grid(nbl, nchan, usable_fsky*nsrc, nproc, memory_use_per_process, memory_DFT_matrix/(usable_fsky*nsrc*nbl*nchan), src_shares=src_shares)
+    if rank == 0:
+        print 'Decomposition grid of {0:0d} baseline x {1:0d} frequency tiles with sources split {2:0d} ways'.format(grid['bl'], grid['freq'], grid['src'])
+
+sim_dir = 'simdata/'
+meta_dir = 'metainfo/'
+roi_dir = 'roi/'
+skymod_dir = 'skymodel/'
+
+## Split the simulation of the chunks into tasks of blocks of snapshots which
+## are handed out to the processes as they become free
+
+if mpi_on_src:
+    bl_tile_bounds = [(baseline_bin_indices[i], min(baseline_bin_indices[i]+baseline_chunk_size, total_baselines)) for i in range(n_bl_chunks)]
+    chan_tile_bounds = [(0, nchan)]
+    n_src_shares = nproc
+    task_snapshots = int(n_acc) # All processes work on all snapshots of a chunk
+    chunk_str = 'baseline'
+elif mpi_on_freq:
+    frequency_bin_indices_bounds = frequency_bin_indices + [nchan]
+    bl_tile_bounds = [(0, total_baselines)]
+    chan_tile_bounds = [(frequency_bin_indices_bounds[i], frequency_bin_indices_bounds[i+1]) for i in range(n_freq_chunks)]
+    n_src_shares = 1
+    chunk_str = 'frequency'
+elif mpi_on_bl:
+    bl_tile_bounds = [(baseline_bin_indices[i], min(baseline_bin_indices[i]+baseline_chunk_size, total_baselines)) for i in range(n_bl_chunks)]
+    chan_tile_bounds = [(0, nchan)]
+    n_src_shares = 1
+    chunk_str = 'baseline'
+else:
+    bl_tile_bounds = [(i*total_baselines//grid['bl'], (i+1)*total_baselines//grid['bl']) for i in range(grid['bl'])]
+    chan_tile_bounds = [(i*nchan//grid['freq'], (i+1)*nchan//grid['freq']) for i in range(grid['freq'])]
+    n_src_shares = grid['src']
+    chunk_str = 'baseline x frequency'
+
+# Chunks are the tiles of the grid of baselines x frequency channels
+# numbered with the frequency tiles varying fastest
+n_bl_tiles = len(bl_tile_bounds)
+n_freq_tiles = len(chan_tile_bounds)
+chunk_bl_bounds = [bl_bounds for bl_bounds in bl_tile_bounds for chan_bounds in chan_tile_bounds]
+chunk_chan_bounds = [chan_bounds for bl_bounds in bl_tile_bounds for chan_bounds in chan_tile_bounds]
+if task_snapshots is None:
+    task_snapshots = PP.snapshot_block_size(len(chunk_bl_bounds), int(n_acc), nproc//n_src_shares, snapshot_batch=snapshot_batch)
+
+# A resumed simulation restores the chunks and blocks of the interrupted
+# simulation, which may have run on a different number of processes, so
+# that the tasks map to the same files
+
+if resume:
+    decomposition = None
+    if rank == 0:
+        with open(rootdir+project_dir+simid+meta_dir+'manifest.yaml', 'r') as mfile:
+            decomposition = yaml.safe_load(mfile)
+    decomposition = comm.bcast(decomposition, root=0)
+    n_bl_tiles = decomposition['n_bl_tiles']
+    n_freq_tiles = decomposition['n_freq_tiles']
+    chunk_bl_bounds = [tuple(bl_bounds) for bl_bounds in decomposition['chunk_bl_bounds']]
+    chunk_chan_bounds = [tuple(chan_bounds) for chan_bounds in decomposition['chunk_chan_bounds']]
+    task_snapshots = decomposition['task_snapshots']
+
+n_data_chunks = len(chunk_bl_bounds)
+chunk_costs = [(chunk_bl_bounds[i][1]-chunk_bl_bounds[i][0]) * (chunk_chan_bounds[i][1]-chunk_chan_bounds[i][0]) for i in range(n_data_chunks)]
+tasks = PP.snapshot_tasks(chunk_costs, int(n_acc), task_snapshots)
+n_snapshot_blocks = int(NP.ceil(n_acc / float(task_snapshots)))
+if (rank == 0) and (not mpi_on_src):
+    print 'Simulation split into {0:0d} tasks of {1:0d} {2} chunks and {3:0d} blocks of up to {4:0d} snapshots'.format(len(tasks), n_data_chunks, chunk_str, n_snapshot_blocks, task_snapshots)
 
 # Create organized directory structure
 
@@ -1607,11 +1768,6 @@ init_timestamps_JD = timestamps_JD.min()
 init_time = Time(init_timestamps_JD, format='jd', scale='utc')
 obsdatetime_dir = '{0}{1}{2}_{3}{4}{5}/'.format(init_time.datetime.year, init_time.datetime.month, init_time.datetime.day, init_time.datetime.hour, init_time.datetime.minute, init_time.datetime.second)
 
-sim_dir = 'simdata/'
-meta_dir = 'metainfo/'
-roi_dir = 'roi/'
-skymod_dir = 'skymodel/'
-
 try:
     os.makedirs(rootdir+project_dir+simid+sim_dir, 0755)
 except OSError as exception:
@@ -1644,19 +1800,120 @@ if cleanup < 3:
             pass
         else:
             raise
-    
+
+## Save the simulation parameters and the decomposition into chunks and
+## blocks of snapshots in the manifest at the start so that the simulation
+## can be resumed if it is interrupted. The progress of the tasks is
+## recorded in a manifest file of every process
+
+manifest = PP.ProgressManifest(rootdir+project_dir+simid+meta_dir, rank)
+parmsfile = rootdir+project_dir+simid+meta_dir+'simparms.yaml'
+task_progress = {}
+if rank == 0:
+    if not resume:
+        parms['dirstruct']['simid'] = simid[:-1]
+        with open(parmsfile, 'w') as pfile:
+            yaml.dump(parms, pfile, default_flow_style=False)
+
+        decomposition = {'key': mpi_key, 'nproc': nproc, 'n_acc': int(n_acc), 'task_snapshots': int(task_snapshots), 'checkpoint': checkpoint, 'n_bl_tiles': n_bl_tiles, 'n_freq_tiles': n_freq_tiles, 'chunk_bl_bounds': [[int(ind) for ind in bl_bounds] for bl_bounds in chunk_bl_bounds], 'chunk_chan_bounds': [[int(ind) for ind in chan_bounds] for chan_bounds in chunk_chan_bounds]}
+        with open(rootdir+project_dir+simid+meta_dir+'manifest.yaml', 'w') as mfile:
+            yaml.dump(decomposition, mfile, default_flow_style=False)
+        PP.clear_progress(rootdir+project_dir+simid+meta_dir)
+    else:
+        # A task recorded as complete is simulated again if its output has
+        # gone missing
+        task_progress = PP.read_progress(rootdir+project_dir+simid+meta_dir)
+        for unit in task_progress:
+            if task_progress[unit]['complete']:
+                if not os.path.isfile(rootdir+project_dir+simid+sim_dir+'_part_{0:0d}_{1:0d}.{2}'.format(unit[1], unit[2], savefmt.lower())):
+                    task_progress[unit]['snapshots'] = 0
+                    task_progress[unit]['complete'] = False
+        print 'Resuming simulation {0} with {1:0d} tasks complete and {2:0d} tasks checkpointed'.format(simid[:-1], len([unit for unit in task_progress if task_progress[unit]['complete']]), len([unit for unit in task_progress if (not task_progress[unit]['complete']) and (task_progress[unit]['snapshots'] > 0)]))
+task_progress = comm.bcast(task_progress, root=0)
+
+## Tabulate the primary beam once if it is fixed in the local frame, or
+## once per delay setting of a phased array. An external beam is
+## interpolated spectrally to the frequency channels once here so that only
+## the spatial interpolation remains to be done in every snapshot
+
+beam_cache = None
+if use_beam_cache:
+    fixed_beam = use_external_beam
+    if not fixed_beam:
+        fixed_beam = NP.allclose(pointings_altaz, pointings_altaz[0,:].reshape(1,-1))
+        if ((telescope_id == 'mwa') or (phased_array) or (telescope_id == 'mwa_tools')) and (pointing_file is not None):
+            fixed_beam = fixed_beam and NP.all(delays == delays[0,:].reshape(1,-1))
+    if not fixed_beam:
+        if ((telescope_id == 'mwa') or (phased_array) or (telescope_id == 'mwa_tools')) and (pointing_file is not None):
+            if rank == 0:
+                print 'Primary beam is not fixed in the local frame. Primary beams will be tabulated and cached per delay setting.'
+            beam_cache = PB.PhasedArrayBeamCache(telescope, nside=beam_cache_nside, maxsize=beam_cache_size)
+        elif rank == 0:
+            print 'Primary beam is not fixed in the local frame and not set by delays from a pointing file. Primary beam cache will not be used.'
+    else:
+        if rank == 0:
+            print 'Tabulating the primary beam on a HEALPix grid of the local sky...'
+            if use_external_beam:
+                if beam_chromaticity:
+                    beam_cache = PB.PrimaryBeamCache(freqs=chans, freq_scale='GHz', external_beam=external_beam, external_beam_freqs=external_beam_freqs, spec_interp=pbeam_spec_interp_method)
+                else:
+                    nearest_freq_ind = NP.argmin(NP.abs(external_beam_freqs*1e6 - select_beam_freq))
+                    beam_cache = PB.PrimaryBeamCache(freqs=chans, freq_scale='GHz', external_beam=external_beam[:,nearest_freq_ind])
+            else:
+                pbinfo = None
+                if (telescope_id == 'mwa') or (phased_array) or (telescope_id == 'mwa_tools'):
+                    pbinfo = {}
+                    if pointing_file is not None:
+                        pbinfo['delays'] = delays[0,:]
+                    else:
+                        pbinfo['pointing_center'] = pointings_altaz[0,:]
+                        pbinfo['pointing_coords'] = 'altaz'
+                    if (telescope_id == 'mwa') or (phased_array):
+                        pbinfo['delayerr'] = phasedarray_delayerr
+                        pbinfo['gainerr'] = phasedarray_gainerr
+                        pbinfo['nrand'] = nrand
+                beam_cache = PB.PrimaryBeamCache(freqs=chans, freq_scale='GHz', telescope=telescope, nside=beam_cache_nside, pointing_info=pbinfo, pointing_center=pointings_altaz[0,:])
+            beam_cache_file = rootdir+project_dir+simid+roi_dir+'beamcache'
+            beam_cache.save(beam_cache_file, overwrite=True, verbose=True)
+        else:
+            beam_cache_file = None
+        beam_cache_file = comm.bcast(beam_cache_file, root=0) # Broadcast saved primary beam cache filename
+        if rank != 0:
+            beam_cache = PB.PrimaryBeamCache(init_file=beam_cache_file)
+
+## Share the computation of RoI parameters of snapshots between processes
+
+n_roi_per_rank = NP.zeros(nproc, dtype=int) + n_acc/nproc
+if n_acc % nproc > 0:
+    n_roi_per_rank[:n_acc % nproc] += 1
+cumm_roi_count = NP.concatenate(([0], NP.cumsum(n_roi_per_rank)))
+roi_snapshot_owner = (NP.searchsorted(cumm_roi_count, NP.arange(n_acc), side='right') - 1).tolist()
+
 ## Set up the observing run
 
+phase_ref_point = {'coords': pc_coords, 'location': NP.asarray(pc).reshape(1,-1)} # Phase center of the saved visibilities
 process_complete = False
 if mpi_on_src: # MPI based on source multiplexing
 
-    for i in range(len(bl_chunk)):
-        print 'Working on baseline chunk # {0:0d} ...'.format(bl_chunk[i])
-
-        ia = RI.InterferometerArray(labels[baseline_bin_indices[bl_chunk[i]]:min(baseline_bin_indices[bl_chunk[i]]+baseline_chunk_size,total_baselines)], bl[baseline_bin_indices[bl_chunk[i]]:min(baseline_bin_indices[bl_chunk[i]]+baseline_chunk_size,total_baselines),:], chans, telescope=telescope, latitude=latitude, longitude=longitude, altitude=altitude, A_eff=A_eff, layout=layout_info, freq_scale='GHz', pointing_coords='hadec', gaininfo=gaininfo, blgroupinfo={'groups': blgroups, 'reversemap': bl_reversemap})
+    for i in range(n_data_chunks):
+        outfile = rootdir+project_dir+simid+sim_dir+'_part_{0:0d}_0'.format(i)
+        unit_progress = task_progress.get((0, i, 0), {'snapshots': 0, 'shares': n_src_shares, 'complete': False})
+        if unit_progress['complete']:
+            continue
+        n_ckpt = 0 # Checkpoints of the shares of sources are valid only for the same number of processes
+        if unit_progress['shares'] == n_src_shares:
+            n_ckpt = unit_progress['snapshots']
+        print 'Process {0:0d} working on its share of sources in baseline chunk # {1:0d} ...'.format(rank, i)
+
+        bl_chunk_indices = NP.arange(chunk_bl_bounds[i][0], chunk_bl_bounds[i][1])
+        if n_ckpt > 0:
+            ia = RI.InterferometerArray(None, None, None, init_file=PP.checkpoint_file(outfile, n_ckpt, share=rank), n_acc_hint=int(n_acc), time_major=time_major)
+        else:
+            ia = RI.InterferometerArray([labels[ind] for ind in bl_chunk_indices], bl[bl_chunk_indices,:], chans, telescope=telescope, latitude=latitude, longitude=longitude, altitude=altitude, A_eff=A_eff, layout=layout_info, freq_scale='GHz', pointing_coords='hadec', gaininfo=gaininfo, blgroupinfo={'groups': blgroups, 'reversemap': bl_reversemap}, n_acc_hint=int(n_acc), time_major=time_major)
 
+        ts0 = time.time()
         progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(), PGB.ETA()], maxval=n_acc).start()
-        for j in range(n_acc):
+        for j in range(n_ckpt, n_acc):
             src_altaz_current = GEOM.hadec2altaz(NP.hstack((NP.asarray(lst[j]-skymod.location[:,0]).reshape(-1,1), skymod.location[:,1].reshape(-1,1))), latitude, units='degrees')
             roi_ind = NP.where(src_altaz_current[:,0] >= 0.0)[0]
             n_src_per_rank = NP.zeros(nproc, dtype=int) + roi_ind.size/nproc
@@ -1676,45 +1933,55 @@ if mpi_on_src: # MPI based on source multiplexing
                     pbinfo['nrand'] = nrand
 
             ts = time.time()
-            if j == 0:
-                ts0 = ts
-            ia.observe(timestamp, Tsysinfo, bpass, pointings_hadec[j,:], skymod.subset(roi_ind[cumm_src_count[rank]:cumm_src_count[rank+1]].tolist()), t_acc[j], pb_info=pbinfo, brightness_units=flux_unit, bpcorrect=noise_bpcorr, roi_radius=None, roi_center=None, lst=lst[j], gradient_mode=gradient_mode, memsave=memsave)
+            ia.observe(timestamp, Tsysinfo, bpass, pointings_hadec[j,:], skymod.subset(roi_ind[cumm_src_count[rank]:cumm_src_count[rank+1]].tolist()), t_acc[j], pb_info=pbinfo, brightness_units=flux_unit, bpcorrect=noise_bpcorr, roi_radius=None, roi_center=None, lst=lst[j], gradient_mode=gradient_mode, memsave=memsave, vis_engine=vis_engine, phasor_mode=phasor_mode, nthreads=nthreads, cull_tol=cull_tol, beam_cache=beam_cache)
             te = time.time()
             # print '{0:.1f} seconds for snapshot # {1:0d}'.format(te-ts, j)
+            if (checkpoint is not None) and (j+1 < n_acc) and (j+1-n_ckpt >= checkpoint): # Checkpoint the share of sources of every process
+                ia.save(PP.checkpoint_file(outfile, j+1, share=rank), fmt='HDF5', verbose=False, npz=False, overwrite=True, uvfits_parms=None)
+                manifest.commit(0, i, 0, outfile, j+1, previous=n_ckpt, shares=n_src_shares, comm=comm)
+                n_ckpt = j+1
             progress.update(j+1)
         progress.finish()
-    
-        # svf = NP.zeros_like(ia.skyvis_freq.astype(NP.complex128), dtype='complex128')
+        te0 = time.time()
+        print 'Process {0:0d} took {1:.1f} minutes to complete its share of sources in baseline chunk # {2:0d}'.format(rank, (te0-ts0)/60, i)
+
+        # The partial visibilities of the shares of sources are summed over
+        # the processes in contiguous buffers
+        skyvis_freq = PP.reduce_sum(comm, ia.skyvis_freq, root=0)
+        if gradient_mode is not None:
+            skyvis_gradient = PP.reduce_sum(comm, ia.gradient[gradient_mode], root=0)
         if rank == 0:
-            for k in range(1,nproc):
-                print 'receiving from process {0}'.format(k)
-                ia.skyvis_freq = ia.skyvis_freq + comm.recv(source=k)
-                # comm.Recv([svf, svf.size, MPI.DOUBLE_COMPLEX], source=i)
-                # ia.skyvis_freq = ia.skyvis_freq + svf
-            te0 = time.time()
-            print 'Time on process 0 was {0:.1f} seconds'.format(te0-ts0)
-            ia.t_obs = t_obs
-            # ia.generate_noise()
-            # ia.add_noise()
-            ia.delay_transform(oversampling_factor-1.0, freq_wts=window)
-            outfile = rootdir+project_dir+simid+sim_dir+'_part_{0:0d}'.format(i)
+            print 'Visibilities of baseline chunk # {0:0d} summed over processes in {1:.1f} seconds'.format(i, time.time()-te0)
+            ia.skyvis_freq = skyvis_freq
+            if gradient_mode is not None:
+                ia.gradient[gradient_mode] = skyvis_gradient
+            ia.delay_transform(oversampling_factor-1.0, freq_wts=window*NP.abs(ant_bpass)**2)
+            ia.project_baselines(ref_point={'location': ia.pointing_center, 'coords': ia.pointing_coords})
+            ia.generate_noise()
+            ia.add_noise()
+            ia.simparms_file = parmsfile
+            ia.rotate_visibilities(phase_ref_point, verbose=False)
+            if do_delay_transform:
+                ia.delay_transform(oversampling_factor-1.0, freq_wts=window*NP.abs(ant_bpass)**2)
             ia.save(outfile, fmt=savefmt, verbose=True, tabtype='BinTableHDU', npz=False, overwrite=True, uvfits_parms=None)
-        else:
-            comm.send(ia.skyvis_freq, dest=0)
-            # comm.Send([ia.skyvis_freq, ia.skyvis_freq.size, MPI.DOUBLE_COMPLEX])
+        manifest.commit(0, i, 0, outfile, int(n_acc), previous=n_ckpt, shares=n_src_shares, complete=True, comm=comm)
+        del ia
 
-elif mpi_on_freq: # MPI based on frequency multiplexing
+else: # MPI based on baseline or frequency multiplexing
 
+    ptb_str = str(DT.datetime.now())
+    task_log = []
     for k in range(n_sky_sectors):
         if n_sky_sectors == 1:
             sky_sector_str = '_all_sky_'
         else:
             sky_sector_str = '_sky_sector_{0:0d}_'.format(k)
 
-        if rank == 0: # Compute ROI parameters for only one process and broadcast to all
+        pbinfo = None
+        if n_roi_per_rank[rank] > 0: # Compute ROI parameters for the share of snapshots of this process
             roi = RI.ROI_parameters()
-            progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(marker='-', left=' |', right='| '), PGB.Counter(), '/{0:0d} Snapshots'.format(n_acc), PGB.ETA()], maxval=n_acc).start()
-            for j in range(n_acc):
+            progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(marker='-', left=' |', right='| '), PGB.Counter(), '/{0:0d} Snapshots'.format(n_roi_per_rank[rank]), PGB.ETA()], maxval=n_roi_per_rank[rank]).start()
+            for j in range(cumm_roi_count[rank], cumm_roi_count[rank+1]):
                 src_altaz_current = GEOM.hadec2altaz(NP.hstack((NP.asarray(lst[j]-skymod.location[:,0]).reshape(-1,1), skymod.location[:,1].reshape(-1,1))), latitude, units='degrees')
                 hemisphere_current = src_altaz_current[:,0] >= 0.0
                 # hemisphere_src_altaz_current = src_altaz_current[hemisphere_current,:]
@@ -1746,10 +2013,10 @@ elif mpi_on_freq: # MPI based on frequency multiplexing
                 roiinfo['ind'] = NP.asarray(roi_subset)
                 if use_external_beam:
                     theta_phi = NP.hstack((NP.pi/2-NP.radians(src_altaz_current[roi_subset,0]).reshape(-1,1), NP.radians(src_altaz_current[roi_subset,1]).reshape(-1,1)))
-                    if beam_chromaticity:
+                    if beam_cache is not None:
+                        interp_logbeam = NP.log10(beam_cache.lookup(src_altaz_current[roi_subset,:], skyunits='altaz', freqs=chans, freq_scale='GHz'))
+                    elif beam_chromaticity:
                         interp_logbeam = OPS.healpix_interp_along_axis(NP.log10(external_beam), theta_phi=theta_phi, inloc_axis=external_beam_freqs, outloc_axis=chans*1e9, axis=1, kind=pbeam_spec_interp_method, assume_sorted=True)
-                        # interp_logbeam = OPS.healpix_interp_along_axis(NP.log10(external_beam), theta_phi=theta_phi, inloc_axis=external_beam_freqs, outloc_axis=chans*1e9, axis=1, kind=pbeam_spec_interp_method, assume_sorted=True)
-                        
                     else:
                         nearest_freq_ind = NP.argmin(NP.abs(external_beam_freqs*1e6 - select_beam_freq))
                         interp_logbeam = OPS.healpix_interp_along_axis(NP.log10(NP.repeat(external_beam[:,nearest_freq_ind].reshape(-1,1), chans.size, axis=1)), theta_phi=theta_phi, inloc_axis=chans*1e9, outloc_axis=chans*1e9, axis=1, assume_sorted=True)
@@ -1767,287 +2034,151 @@ elif mpi_on_freq: # MPI based on frequency multiplexing
                 roiinfo['center'] = NP.asarray(roiinfo_center_radec).reshape(1,-1)
                 roiinfo['center_coords'] = 'radec'
 
-                roi.append_settings(skymod, chans, pinfo=pbinfo, lst=lst[j], roi_info=roiinfo, telescope=telescope, freq_scale='GHz')
+                roi.append_settings(skymod, chans, pinfo=pbinfo, lst=lst[j], roi_info=roiinfo, telescope=telescope, freq_scale='GHz', beam_cache=beam_cache, nthreads=nthreads, pbeam_rtol=pbeam_rtol)
                 
-                progress.update(j+1)
+                progress.update(j-cumm_roi_count[rank]+1)
             progress.finish()
 
-            roifile = rootdir+project_dir+simid+roi_dir+'roiinfo'
-            roi.save(roifile, tabtype='BinTableHDU', overwrite=True, verbose=True)
+            roifile = rootdir+project_dir+simid+roi_dir+'roiinfo'+sky_sector_str+'{0:0d}'.format(rank)
+            roi.save(roifile, fmt='HDF5', overwrite=True, verbose=(rank==0))
             del roi   # to save memory if primary beam arrays or n_acc are large
         else:
             roi = None
-            pbinfo = None
             roifile = None
 
-        roifile = comm.bcast(roifile, root=0) # Broadcast saved RoI filename
-        pbinfo = comm.bcast(pbinfo, root=0) # Broadcast PB synthesis info
-
-        frequency_bin_indices_bounds = frequency_bin_indices + [nchan]
-        for i in range(cumm_freq_chunks[rank], cumm_freq_chunks[rank+1]):
-            print 'Process {0:0d} working on frequency chunk # {1:0d} ... ({2:0d}/{3:0d})'.format(rank, freq_chunk[i], i-cumm_freq_chunks[rank]+1, n_freq_chunk_per_rank[rank])
-
-            chans_chunk_indices = NP.arange(frequency_bin_indices_bounds[i], frequency_bin_indices_bounds[i+1])
+        # Notify the other processes as soon as the RoI file of this process
+        # is saved so that they do not wait for the RoI of all snapshots
+        roifiles = {rank: roifile}
+        roistores = {} # RoI files are opened once and read by snapshot
+        roi_requests = []
+        if n_roi_per_rank[rank] > 0:
+            roi_requests = [comm.isend(roifile, dest=proc, tag=k) for proc in range(nproc) if proc != rank]
+
+        # Processes (or teams of processes sharing the sources) pull the next
+        # task of a chunk and a block of snapshots as soon as they are done
+        # with the previous one (unless the load is to be split equally in
+        # advance). Tasks completed before a resumed simulation was
+        # interrupted are skipped
+        pending_tasks = [taskid for taskid in range(len(tasks)) if not task_progress.get((k, tasks[taskid]['chunk'], tasks[taskid]['block']), {'complete': False})['complete']]
+        scheduler = PP.TaskScheduler(comm, len(pending_tasks), dynamic=mpi_async, team_size=n_src_shares)
+        src_share = None
+        if n_src_shares > 1:
+            src_share = (scheduler.team_rank, n_src_shares)
+        for pending_taskid in scheduler:
+            taskid = pending_tasks[pending_taskid]
+            task = tasks[taskid]
+            i = task['chunk']
+            j0_task, j1_task = task['snapshots']
+            print 'Process {0:0d} working on {1} chunk # {2:0d}, snapshots {3:0d}-{4:0d} ... (task {5:0d}/{6:0d})'.format(rank, chunk_str, i, j0_task, j1_task-1, taskid+1, len(tasks))
+
+            bl_chunk_indices = NP.arange(chunk_bl_bounds[i][0], chunk_bl_bounds[i][1])
+            chans_chunk_indices = NP.arange(chunk_chan_bounds[i][0], chunk_chan_bounds[i][1])
+            all_chans = chans_chunk_indices.size == nchan
             chans_chunk = NP.asarray(chans[chans_chunk_indices]).reshape(-1)
-            nchan_chunk = chans_chunk.size
-            f0_chunk = NP.mean(chans_chunk)
-            bw_chunk_str = '{0:0d}x{1:.1f}_kHz'.format(nchan_chunk, freq_resolution/1e3)
-            outfile = rootdir+project_dir+simid+sim_dir+'_part_{0:0d}'.format(i)
-            ia = RI.InterferometerArray(labels, bl, chans_chunk, telescope=telescope, latitude=latitude, longitude=longitude, altitude=altitude, A_eff=A_eff, layout=layout_info, freq_scale='GHz', pointing_coords='hadec', gaininfo=gaininfo, blgroupinfo={'groups': blgroups, 'reversemap': bl_reversemap})
+            if all_chans:
+                skymod_chunk = skymod
+                roi_chans = None
+            else:
+                skymod_chunk = skymod.subset(chans_chunk_indices, axis='spectrum')
+                roi_chans = chans_chunk_indices # Read only the channels of this chunk
+            outfile = rootdir+project_dir+simid+sim_dir+'_part_{0:0d}_{1:0d}'.format(i, task['block'])
+            unit_progress = task_progress.get((k, i, task['block']), {'snapshots': 0, 'shares': n_src_shares})
+            n_ckpt = 0 # Checkpoints of the shares of sources are valid only for the same number of shares
+            if unit_progress['shares'] == n_src_shares:
+                n_ckpt = unit_progress['snapshots']
+            if n_ckpt > 0:
+                ia = RI.InterferometerArray(None, None, None, init_file=PP.checkpoint_file(outfile, n_ckpt, share=scheduler.team_rank), n_acc_hint=int(j1_task-j0_task), time_major=time_major)
+            else:
+                ia = RI.InterferometerArray([labels[ind] for ind in bl_chunk_indices], bl[bl_chunk_indices,:], chans_chunk, telescope=telescope, latitude=latitude, longitude=longitude, altitude=altitude, A_eff=A_eff, layout=layout_info, freq_scale='GHz', pointing_coords='hadec', gaininfo=gaininfo, blgroupinfo={'groups': blgroups, 'reversemap': bl_reversemap}, n_acc_hint=int(j1_task-j0_task), time_major=time_major)
             
-            progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(marker='-', left=' |', right='| '), PGB.Counter(), '/{0:0d} Snapshots '.format(n_acc), PGB.ETA()], maxval=n_acc).start()
-            for j in range(n_acc):
-                roi_ind_snap = fits.getdata(roifile+'.fits', extname='IND_{0:0d}'.format(j), memmap=False)
-                roi_pbeam_snap = fits.getdata(roifile+'.fits', extname='PB_{0:0d}'.format(j), memmap=False)
-                roi_pbeam_snap = roi_pbeam_snap[:,chans_chunk_indices]
-                if obs_mode in ['custom', 'dns', 'lstbin']:
-                    timestamp = obs_id[j]
-                else:
-                    # timestamp = lst[j]
-                    timestamp = timestamps[j]
+            ts0 = time.time()
+            progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(marker='-', left=' |', right='| '), PGB.Counter(), '/{0:0d} Snapshots '.format(j1_task-j0_task), PGB.ETA()], maxval=j1_task-j0_task).start()
+            for j0 in range(j0_task+n_ckpt, j1_task, snapshot_batch):
+                j1 = min(j0+snapshot_batch, j1_task)
+                batch_timestamps = []
+                batch_roiinfo = []
+                for j in range(j0, j1):
+                    roi_owner = roi_snapshot_owner[j]
+                    if roi_owner not in roifiles: # Wait only for the process computing the RoI of this snapshot
+                        roifiles[roi_owner] = comm.recv(source=roi_owner, tag=k)
+                    if roi_owner not in roistores:
+                        roistores[roi_owner] = RI.ROI_store(roifiles[roi_owner])
+                    batch_roiinfo += [roistores[roi_owner].read(j-cumm_roi_count[roi_owner], chans=roi_chans, share=src_share, expand=False)]
+                    if obs_mode in ['custom', 'dns', 'lstbin']:
+                        batch_timestamps += [obs_id[j]]
+                    else:
+                        # batch_timestamps += [lst[j]]
+                        batch_timestamps += [timestamps[j]]
              
                 ts = time.time()
-                if j == 0:
-                    ts0 = ts
               
-                ia.observe(timestamp, Tsysinfo, bpass[chans_chunk_indices], pointings_hadec[j,:], skymod.subset(chans_chunk_indices, axis='spectrum'), t_acc[j], pb_info=pbinfo, brightness_units=flux_unit, bpcorrect=noise_bpcorr[chans_chunk_indices], roi_info={'ind': roi_ind_snap, 'pbeam': roi_pbeam_snap}, roi_radius=None, roi_center=None, lst=lst[j], gradient_mode=gradient_mode, memsave=memsave)
+                ia.observe_batch(batch_timestamps, Tsysinfo, bpass[chans_chunk_indices], pointings_hadec[j0:j1,:], skymod_chunk, t_acc[j0:j1], pb_info=pbinfo, brightness_units=flux_unit, bpcorrect=noise_bpcorr[chans_chunk_indices], roi_info=batch_roiinfo, roi_radius=None, roi_center=None, lsts=lst[j0:j1], gradient_mode=gradient_mode, memsave=memsave, vis_engine=vis_engine, phasor_mode=phasor_mode, nthreads=nthreads, cull_tol=cull_tol, beam_cache=beam_cache)
                 te = time.time()
-                # print '{0:.1f} seconds for snapshot # {1:0d}'.format(te-ts, j)
-                del roi_ind_snap
-                del roi_pbeam_snap
-                progress.update(j+1)
+                # print '{0:.1f} seconds for snapshots # {1:0d}-{2:0d}'.format(te-ts, j0, j1-1)
+                del batch_roiinfo
+                if (checkpoint is not None) and (j1 < j1_task) and (j1-j0_task-n_ckpt >= checkpoint): # Checkpoint the partial visibilities of every process in the team
+                    ia.save(PP.checkpoint_file(outfile, j1-j0_task, share=scheduler.team_rank), fmt='HDF5', verbose=False, npz=False, overwrite=True, uvfits_parms=None)
+                    manifest.commit(k, i, task['block'], outfile, j1-j0_task, previous=n_ckpt, shares=n_src_shares, comm=scheduler.team_comm)
+                    n_ckpt = j1 - j0_task
+                progress.update(j1-j0_task)
             progress.finish()
 
             te0 = time.time()
-            print 'Process {0:0d} took {1:.1f} minutes to complete frequency chunk # {2:0d} ({3:0d}/{4:0d})'.format(rank, (te0-ts0)/60, freq_chunk[i], i-cumm_freq_chunks[rank]+1, n_freq_chunk_per_rank[rank])
-            # ia.t_obs = t_obs
-            # ia.generate_noise()
-            # ia.add_noise()
-            # ia.delay_transform(oversampling_factor-1.0, freq_wts=window*NP.abs(ant_bpass)**2)
-            ia.project_baselines(ref_point={'location': ia.pointing_center, 'coords': ia.pointing_coords})
-            ia.save(outfile, fmt=savefmt, verbose=True, tabtype='BinTableHDU', npz=False, overwrite=True, uvfits_parms=None)
-else: # MPI based on baseline multiplexing
-
-    if mpi_async: # does not impose equal volume per process
-        print 'Processing next baseline chunk asynchronously...'
-        processed_chunks = []
-        process_sequence = []
-        counter = my_MPI.Counter(comm)
-        count = -1
-        ptb = time.time()
-        ptb_str = str(DT.datetime.now())
-        while (count+1 < len(bl_chunk)):
-            count = counter.next()
-            if count < len(bl_chunk):
-                processed_chunks.append(count)
-                process_sequence.append(rank)
-                print 'Process {0:0d} working on baseline chunk # {1:0d} ...'.format(rank, count)
-
-                outfile = rootdir+project_dir+simid+sim_dir+'_part_{0:0d}'.format(count)
-                ia = RI.InterferometerArray(labels[baseline_bin_indices[count]:min(baseline_bin_indices[count]+baseline_chunk_size,total_baselines)], bl[baseline_bin_indices[count]:min(baseline_bin_indices[count]+baseline_chunk_size,total_baselines),:], chans, telescope=telescope, latitude=latitude, longitude=longitude, altitude=altitude, A_eff=A_eff, layout=layout_info, freq_scale='GHz', pointing_coords='hadec', gaininfo=gaininfo, blgroupinfo={'groups': blgroups, 'reversemap': bl_reversemap})
-
-                progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(), PGB.ETA()], maxval=n_acc).start()
-                for j in range(n_acc):
-                    if obs_mode in ['custom', 'dns', 'lstbin']:
-                        timestamp = obs_id[j]
-                    else:
-                        timestamp = lst[j]
-
-                    pbinfo = None
-                    if (telescope_id == 'mwa') or (telescope_id == 'mwa_tools') or (phased_array):
-                        pbinfo = {}
-                        pbinfo['delays'] = delays[j,:]
-                        if (telescope_id == 'mwa') or (phased_array):
-                            # pbinfo['element_locs'] = element_locs
-                            pbinfo['delayerr'] = phasedarray_delayerr
-                            pbinfo['gainerr'] = phasedarray_gainerr
-                            pbinfo['nrand'] = nrand
-
-                    ts = time.time()
-                    if j == 0:
-                        ts0 = ts
-                    ia.observe(timestamp, Tsysinfo, bpass, pointings_hadec[j,:], skymod, t_acc[j], pb_info=pbinfo, brightness_units=flux_unit, bpcorrect=noise_bpcorr, roi_radius=None, roi_center=None, lst=lst[j], gradient_mode=gradient_mode, memsave=memsave)
-                    te = time.time()
-                    # print '{0:.1f} seconds for snapshot # {1:0d}'.format(te-ts, j)
-                    progress.update(j+1)
-                progress.finish()
-
-                te0 = time.time()
-                print 'Process {0:0d} took {1:.1f} minutes to complete baseline chunk # {2:0d}'.format(rank, (te0-ts0)/60, count)
-                ia.t_obs = t_obs
-                # ia.generate_noise()
-                # ia.add_noise()
-                ia.delay_transform(oversampling_factor-1.0, freq_wts=window)
-                ia.save(outfile, fmt=savefmt, verbose=True, tabtype='BinTableHDU', npz=False, overwrite=True, uvfits_parms=None)
-        counter.free()
-        pte = time.time()
-        pte_str = str(DT.datetime.now())
-        pt = pte - ptb
-        processed_chunks = comm.allreduce(processed_chunks)
-        process_sequence = comm.allreduce(process_sequence)
-
-    else: # impose equal volume per process
-        ptb_str = str(DT.datetime.now())
-
-        for k in range(n_sky_sectors):
-            if n_sky_sectors == 1:
-                sky_sector_str = '_all_sky_'
-            else:
-                sky_sector_str = '_sky_sector_{0:0d}_'.format(k)
-
-            if rank == 0: # Compute ROI parameters for only one process and broadcast to all
-                roi = RI.ROI_parameters()
-                progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(marker='-', left=' |', right='| '), PGB.Counter(), '/{0:0d} Snapshots'.format(n_acc), PGB.ETA()], maxval=n_acc).start()
-                for j in range(n_acc):
-                    src_altaz_current = GEOM.hadec2altaz(NP.hstack((NP.asarray(lst[j]-skymod.location[:,0]).reshape(-1,1), skymod.location[:,1].reshape(-1,1))), latitude, units='degrees')
-                    hemisphere_current = src_altaz_current[:,0] >= 0.0
-                    # hemisphere_src_altaz_current = src_altaz_current[hemisphere_current,:]
-                    src_az_current = NP.copy(src_altaz_current[:,1])
-                    src_az_current[src_az_current > 360.0 - 0.5*180.0/n_sky_sectors] -= 360.0
-                    roi_ind = NP.logical_or(NP.logical_and(src_az_current >= -0.5*180.0/n_sky_sectors + k*180.0/n_sky_sectors, src_az_current < -0.5*180.0/n_sky_sectors + (k+1)*180.0/n_sky_sectors), NP.logical_and(src_az_current >= 180.0 - 0.5*180.0/n_sky_sectors + k*180.0/n_sky_sectors, src_az_current < 180.0 - 0.5*180.0/n_sky_sectors + (k+1)*180.0/n_sky_sectors))
-                    roi_subset = NP.where(NP.logical_and(hemisphere_current, roi_ind))[0].tolist()
-                    src_dircos_current_subset = GEOM.altaz2dircos(src_altaz_current[roi_subset,:], units='degrees')
-                    fgmod = skymod.subset(roi_subset)
-   
-                    pbinfo = {}
-                    if (telescope_id == 'mwa') or (phased_array) or (telescope_id == 'mwa_tools'):
-                        if pointing_file is not None:
-                            pbinfo['delays'] = delays[j,:]
-                        else:
-                            pbinfo['pointing_center'] = pointings_altaz[j,:]
-                            pbinfo['pointing_coords'] = 'altaz'
-                            
-                        if (telescope_id == 'mwa') or (phased_array):
-                            # pbinfo['element_locs'] = element_locs
-                            pbinfo['delayerr'] = phasedarray_delayerr
-                            pbinfo['gainerr'] = phasedarray_gainerr
-                            pbinfo['nrand'] = nrand
-                    else:
-                        pbinfo['pointing_center'] = pointings_altaz[j,:]
-                        pbinfo['pointing_coords'] = 'altaz'
-
-                    roiinfo = {}
-                    roiinfo['ind'] = NP.asarray(roi_subset)
-                    if use_external_beam:
-                        theta_phi = NP.hstack((NP.pi/2-NP.radians(src_altaz_current[roi_subset,0]).reshape(-1,1), NP.radians(src_altaz_current[roi_subset,1]).reshape(-1,1)))
-                        if beam_chromaticity:
-                            interp_logbeam = OPS.healpix_interp_along_axis(NP.log10(external_beam), theta_phi=theta_phi, inloc_axis=external_beam_freqs, outloc_axis=chans*1e9, axis=1, kind=pbeam_spec_interp_method, assume_sorted=True)
-                        else:
-                            nearest_freq_ind = NP.argmin(NP.abs(external_beam_freqs*1e6 - freq))
-                            interp_logbeam = OPS.healpix_interp_along_axis(NP.log10(NP.repeat(external_beam[:,nearest_freq_ind].reshape(-1,1), chans.size, axis=1)), theta_phi=theta_phi, inloc_axis=chans*1e9, outloc_axis=chans*1e9, axis=1, kind=pbeam_spec_interp_method, assume_sorted=True)
-                        
-                        interp_logbeam_max = NP.nanmax(interp_logbeam, axis=0)
-                        interp_logbeam_max[interp_logbeam_max <= 0.0] = 0.0
-                        interp_logbeam_max = interp_logbeam_max.reshape(1,-1)
-                        interp_logbeam = interp_logbeam - interp_logbeam_max
-                        roiinfo['pbeam'] = 10**interp_logbeam
-                        # roiinfo['pbeam'] = NP.ones((roiinfo['ind'].size,chans.size), dtype=NP.float32)
-                    else:
-                        roiinfo['pbeam'] = None
-                    roiinfo['radius'] = 90.0
-                    roiinfo_center_hadec = GEOM.altaz2hadec(NP.asarray([90.0, 270.0]).reshape(1,-1), latitude, units='degrees').ravel()
-                    roiinfo_center_radec = [lst[j]-roiinfo_center_hadec[0], roiinfo_center_hadec[1]]
-                    roiinfo['center'] = NP.asarray(roiinfo_center_radec).reshape(1,-1)
-                    roiinfo['center_coords'] = 'radec'
-
-                    roi.append_settings(skymod, chans, pinfo=pbinfo, lst=lst[j], roi_info=roiinfo, telescope=telescope, freq_scale='GHz')
-                    
-                    progress.update(j+1)
-                progress.finish()
-
-                roifile = rootdir+project_dir+simid+roi_dir+'roiinfo'
-                roi.save(roifile, tabtype='BinTableHDU', overwrite=True, verbose=True)
-                del roi   # to save memory if primary beam arrays or n_acc are large
-            else:
-                roi = None
-                pbinfo = None
-                roifile = None
-
-            roifile = comm.bcast(roifile, root=0) # Broadcast saved RoI filename
-            pbinfo = comm.bcast(pbinfo, root=0) # Broadcast PB synthesis info
-
-            # if (rank != 0):
-            #     roi = RI.ROI_parameters(init_file=roifile+'.fits') # Other processes read in the RoI information
-            if rank == 0:
-                if plots:
-                    for j in xrange(n_acc):
-                        src_ra = roi.skymodel.location[roi.info['ind'][j],0]
-                        src_dec = roi.skymodel.location[roi.info['ind'][j],1]
-                        src_ra[src_ra > 180.0] = src_ra[src_ra > 180.0] - 360.0
-                        fig, axs = PLT.subplots(2, sharex=True, sharey=True, figsize=(6,6))
-                        modelsky = axs[0].scatter(src_ra, src_dec, c=roi.skymod.spec_parms['flux-scale'][roi.info['ind'][j]], norm=PLTC.LogNorm(vmin=roi.skymod.spec_parms['flux-scale'].min(), vmax=roi.skymod.spec_parms['flux-scale'].max()), edgecolor='none', s=20)
-                        axs[0].set_xlim(180.0, -180.0)
-                        axs[0].set_ylim(-90.0, 90.0)
-                        pbsky = axs[1].scatter(src_ra, src_dec, c=roi.info['pbeam'][j][:,NP.argmax(NP.abs(chans-freq))], norm=PLTC.LogNorm(vmin=roi.info['pbeam'][j].min(), vmax=1.0), edgecolor='none', s=20)
-                        axs[1].set_xlim(180.0, -180.0)
-                        axs[1].set_ylim(-90.0, 90.0)
-
-                        cbax0 = fig.add_axes([0.88, 0.5, 0.02, 0.35])
-                        cbar0 = fig.colorbar(modelsky, cax=cbax0, orientation='vertical')
-                        cbax0.set_ylabel('Flux Density [Jy]', labelpad=0, fontsize=14)
-
-                        cbax1 = fig.add_axes([0.88, 0.1, 0.02, 0.35])
-                        cbar1 = fig.colorbar(pbsky, cax=cbax1, orientation='vertical')
-                        
-                        fig.subplots_adjust(hspace=0)
-                        big_ax = fig.add_subplot(111)
-                        big_ax.set_axis_bgcolor('none')
-                        big_ax.tick_params(labelcolor='none', top='off', bottom='off', left='off', right='off')
-                        big_ax.set_xticks([])
-                        big_ax.set_yticks([])
-                        big_ax.set_ylabel(r'$\delta$ [degrees]', fontsize=16, weight='medium', labelpad=30)
-                        big_ax.set_xlabel(r'$\alpha$ [degrees]', fontsize=16, weight='medium', labelpad=20)
-
-                        fig.subplots_adjust(right=0.88)
-
-            for i in range(cumm_bl_chunks[rank], cumm_bl_chunks[rank+1]):
-                print 'Process {0:0d} working on baseline chunk # {1:0d} ...'.format(rank, bl_chunk[i])
-        
-                outfile = rootdir+project_dir+simid+sim_dir+'_part_{0:0d}'.format(i)
-                ia = RI.InterferometerArray(labels[baseline_bin_indices[bl_chunk[i]]:min(baseline_bin_indices[bl_chunk[i]]+baseline_chunk_size,total_baselines)], bl[baseline_bin_indices[bl_chunk[i]]:min(baseline_bin_indices[bl_chunk[i]]+baseline_chunk_size,total_baselines),:], chans, telescope=telescope, latitude=latitude, longitude=longitude, altitude=altitude, A_eff=A_eff, layout=layout_info, freq_scale='GHz', pointing_coords='hadec', gaininfo=gaininfo, blgroupinfo={'groups': blgroups, 'reversemap': bl_reversemap})
-                
-                progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(marker='-', left=' |', right='| '), PGB.Counter(), '/{0:0d} Snapshots '.format(n_acc), PGB.ETA()], maxval=n_acc).start()
-                for j in range(n_acc):
-                    roi_ind_snap = fits.getdata(roifile+'.fits', extname='IND_{0:0d}'.format(j))
-                    roi_pbeam_snap = fits.getdata(roifile+'.fits', extname='PB_{0:0d}'.format(j))
-                    if obs_mode in ['custom', 'dns', 'lstbin']:
-                        timestamp = obs_id[j]
-                    else:
-                        # timestamp = lst[j]
-                        timestamp = timestamps[j]
-                 
-                    ts = time.time()
-                    if j == 0:
-                        ts0 = ts
-                  
-                    ia.observe(timestamp, Tsysinfo, bpass, pointings_hadec[j,:], skymod, t_acc[j], pb_info=pbinfo, brightness_units=flux_unit, bpcorrect=noise_bpcorr, roi_info={'ind': roi_ind_snap, 'pbeam': roi_pbeam_snap}, roi_radius=None, roi_center=None, lst=lst[j], gradient_mode=gradient_mode, memsave=memsave)
-                    te = time.time()
-                    # print '{0:.1f} seconds for snapshot # {1:0d}'.format(te-ts, j)
-                    del roi_ind_snap
-                    del roi_pbeam_snap
-                    progress.update(j+1)
-                progress.finish()
-
-                te0 = time.time()
-                print 'Process {0:0d} took {1:.1f} minutes to complete baseline chunk # {2:0d}'.format(rank, (te0-ts0)/60, bl_chunk[i])
-                ia.t_obs = t_obs
-                # ia.generate_noise()
-                # ia.add_noise()
-                ia.delay_transform(oversampling_factor-1.0, freq_wts=window*NP.abs(ant_bpass)**2)
+            print 'Process {0:0d} took {1:.1f} minutes to complete {2} chunk # {3:0d}, snapshots {4:0d}-{5:0d}'.format(rank, (te0-ts0)/60, chunk_str, i, j0_task, j1_task-1)
+            if n_src_shares > 1: # Sum the visibilities of the shares of sources over the team
+                skyvis_freq = PP.reduce_sum(scheduler.team_comm, ia.skyvis_freq, root=0)
+                if gradient_mode is not None:
+                    skyvis_gradient = PP.reduce_sum(scheduler.team_comm, ia.gradient[gradient_mode], root=0)
+                if scheduler.team_rank == 0:
+                    ia.skyvis_freq = skyvis_freq
+                    if gradient_mode is not None:
+                        ia.gradient[gradient_mode] = skyvis_gradient
+            if scheduler.team_rank == 0:
+                # Noise and the rotation of the phase center act on every
+                # visibility independently, so every task completes its piece
+                # of the final data set
+                if all_chans:
+                    ia.delay_transform(oversampling_factor-1.0, freq_wts=window*NP.abs(ant_bpass)**2)
                 ia.project_baselines(ref_point={'location': ia.pointing_center, 'coords': ia.pointing_coords})
+                ia.generate_noise()
+                ia.add_noise()
+                ia.simparms_file = parmsfile
+                ia.rotate_visibilities(phase_ref_point, verbose=False)
+                if all_chans and do_delay_transform:
+                    ia.delay_transform(oversampling_factor-1.0, freq_wts=window*NP.abs(ant_bpass)**2)
                 ia.save(outfile, fmt=savefmt, verbose=True, tabtype='BinTableHDU', npz=False, overwrite=True, uvfits_parms=None)
-        pte_str = str(DT.datetime.now())                
+            manifest.commit(k, i, task['block'], outfile, j1_task-j0_task, previous=n_ckpt, shares=n_src_shares, complete=True, comm=scheduler.team_comm)
+            del ia
+        scheduler.free()
+
+        sector_log = scheduler.gather_log(root=0)
+        if rank == 0:
+            for entry in sector_log:
+                entry['task'] = pending_tasks[entry['task']]
+                entry.update({'sector': k, 'chunk': tasks[entry['task']]['chunk'], 'block': tasks[entry['task']]['block']})
+            task_log += sector_log
+
+        for roistore in roistores.itervalues():
+            roistore.close()
+        for roi_owner in set(roi_snapshot_owner):
+            if roi_owner not in roifiles:
+                roifiles[roi_owner] = comm.recv(source=roi_owner, tag=k)
+        MPI.Request.Waitall(roi_requests)
+    pte_str = str(DT.datetime.now())                
  
 if rank == 0:
-    parmsfile = rootdir+project_dir+simid+meta_dir+'simparms.yaml'
-    with open(parmsfile, 'w') as pfile:
-        yaml.dump(parms, pfile, default_flow_style=False)
-
     minfo = {'user': pwd.getpwuid(os.getuid())[0], 'git#': prisim.__githash__, 'PRISim': prisim.__version__}
     metafile = rootdir+project_dir+simid+meta_dir+'meta.yaml'
     with open(metafile, 'w') as mfile:
         yaml.dump(minfo, mfile, default_flow_style=False)
 
+    if not mpi_on_src:
+        PP.write_task_log(rootdir+project_dir+simid+meta_dir+'tasks.txt', task_log, verbose=True)
+
+if isinstance(beam_cache, PB.PhasedArrayBeamCache):
+    beam_cache_stats = beam_cache.stats()
+    print 'Process {0:0d} primary beam cache: {1:0d} hits, {2:0d} misses, {3:0d} evictions'.format(rank, beam_cache_stats['hits'], beam_cache_stats['misses'], beam_cache_stats['evictions'])
+
 process_complete = True
 all_process_complete = comm.gather(process_complete, root=0)
 if rank == 0:
@@ -2057,60 +2188,59 @@ if rank == 0:
         else:
             sky_sector_str = '_sky_sector_{0:0d}_'.format(k)
     
-        if mpi_on_bl:
-            progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(marker='-', left=' |', right='| '), PGB.Counter(), '/{0:0d} Baseline chunks '.format(n_bl_chunks), PGB.ETA()], maxval=n_bl_chunks).start()
-            for i in range(0, n_bl_chunks):
-                blchunk_infile = rootdir+project_dir+simid+sim_dir+'_part_{0:0d}'.format(i)
-                if i == 0:
-                    simvis = RI.InterferometerArray(None, None, None, init_file=blchunk_infile)
-                else:
-                    simvis_next = RI.InterferometerArray(None, None, None, init_file=blchunk_infile)
-                    simvis.concatenate(simvis_next, axis=0)
-    
-                if cleanup >= 1:
-                    if os.path.isfile(blchunk_infile+'.'+savefmt.lower()):
-                        os.remove(blchunk_infile+'.'+savefmt.lower())
-                    if os.path.isfile(blchunk_infile+'.gains.hdf5'):
-                        os.remove(blchunk_infile+'.gains.hdf5')
-                    
-                progress.update(i+1)
-            progress.finish()
+        # The pieces saved by the tasks are consolidated into one HDF5 file
+        # whose visibilities are virtual datasets mapped onto the pieces, so
+        # the data set is not copied. The delay transform of data split in
+        # frequency needs all the channels in memory and a copy is made then
+        consolidated_outfile = rootdir+project_dir+simid+sim_dir+'simvis'
+        part_files = [[[rootdir+project_dir+simid+sim_dir+'_part_{0:0d}_{1:0d}'.format(ib*n_freq_tiles+jf, b) for b in range(n_snapshot_blocks)] for jf in range(n_freq_tiles)] for ib in range(n_bl_tiles)]
+        virtual_output = (savefmt.lower() == 'hdf5') and not (do_delay_transform and (n_freq_tiles > 1))
+        if virtual_output:
+            try:
+                RI.virtual_concatenate(part_files, consolidated_outfile, overwrite=True, verbose=True)
+            except NotImplementedError as exception:
+                print '{0}. Consolidating the pieces by copying them instead.'.format(exception)
+                virtual_output = False
+
+        if virtual_output:
+            if save_to_npz or save_to_uvfits:
+                simvis = RI.InterferometerArray(None, None, None, init_file=consolidated_outfile)
+            if save_to_npz:
+                simvis.save_npz(consolidated_outfile, verbose=True)
+        else:
+            progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(marker='-', left=' |', right='| '), PGB.Counter(), '/{0:0d} Chunks '.format(n_data_chunks), PGB.ETA()], maxval=n_data_chunks).start()
+            for ib in range(n_bl_tiles):
+                for jf in range(n_freq_tiles):
+                    i = ib * n_freq_tiles + jf
+                    for b in range(n_snapshot_blocks): # Blocks of snapshots of a chunk are joined along time
+                        chunk_infile = part_files[ib][jf][b]
+                        if b == 0:
+                            chunkvis = RI.InterferometerArray(None, None, None, init_file=chunk_infile)
+                        else:
+                            chunkvis_next = RI.InterferometerArray(None, None, None, init_file=chunk_infile)
+                            chunkvis.concatenate(chunkvis_next, axis=2)
 
-        elif mpi_on_freq:
-            progress = PGB.ProgressBar(widgets=[PGB.Percentage(), PGB.Bar(marker='-', left=' |', right='| '), PGB.Counter(), '/{0:0d} Frequency chunks '.format(n_freq_chunks), PGB.ETA()], maxval=n_freq_chunks).start()
-            frequency_bin_indices_bounds = frequency_bin_indices + [nchan]
-            for i in range(0, n_freq_chunks):
-                chans_chunk_indices = NP.arange(frequency_bin_indices_bounds[i], frequency_bin_indices_bounds[i+1])
-                chans_chunk = NP.asarray(chans[chans_chunk_indices]).reshape(-1)
-                nchan_chunk = chans_chunk.size
-                f0_chunk = NP.mean(chans_chunk)
-                bw_chunk_str = '{0:0d}x{1:.1f}_kHz'.format(nchan_chunk, freq_resolution/1e3)
-                freqchunk_infile = rootdir+project_dir+simid+sim_dir+'_part_{0:0d}'.format(i)
-                if i == 0:
-                    simvis = RI.InterferometerArray(None, None, None, init_file=freqchunk_infile)    
+                        if cleanup >= 1:
+                            if os.path.isfile(chunk_infile+'.'+savefmt.lower()):
+                                os.remove(chunk_infile+'.'+savefmt.lower())
+                            if os.path.isfile(chunk_infile+'.gains.hdf5'):
+                                os.remove(chunk_infile+'.gains.hdf5')
+
+                    if jf == 0: # Frequency tiles of a row of baselines are joined along frequency
+                        rowvis = chunkvis
+                    else:
+                        rowvis.concatenate(chunkvis, axis=1)
+                    progress.update(i+1)
+
+                if ib == 0: # Rows are joined along baselines
+                    simvis = rowvis
                 else:
-                    simvis_next = RI.InterferometerArray(None, None, None, init_file=freqchunk_infile)    
-                    simvis.concatenate(simvis_next, axis=1)
-    
-                if cleanup > 1:
-                    if os.path.isfile(freqchunk_infile+'.'+savefmt.lower()):
-                        os.remove(freqchunk_infile+'.'+savefmt.lower())
-                    if os.path.isfile(freqchunk_infile+'.gains.hdf5'):
-                        os.remove(freqchunk_infile+'.gains.hdf5')
-                    
-                progress.update(i+1)
+                    simvis.concatenate(rowvis, axis=0)
             progress.finish()
 
-        simvis.generate_noise()
-        simvis.add_noise()
-        simvis.simparms_file = parmsfile
-        ref_point = {'coords': pc_coords, 'location': NP.asarray(pc).reshape(1,-1)}
-        simvis.rotate_visibilities(ref_point, do_delay_transform=do_delay_transform, verbose=True)
-        if do_delay_transform:
-            simvis.delay_transform(oversampling_factor-1.0, freq_wts=window*NP.abs(ant_bpass)**2)
-
-        consolidated_outfile = rootdir+project_dir+simid+sim_dir+'simvis'
-        simvis.save(consolidated_outfile, fmt=savefmt, verbose=True, tabtype='BinTableHDU', npz=save_to_npz, overwrite=True, uvfits_parms=None)
+            if do_delay_transform:
+                simvis.delay_transform(oversampling_factor-1.0, freq_wts=window*NP.abs(ant_bpass)**2)
+            simvis.save(consolidated_outfile, fmt=savefmt, verbose=True, tabtype='BinTableHDU', npz=save_to_npz, overwrite=True, uvfits_parms=None)
 
         uvfits_parms = None
         if save_to_uvfits:
@@ -0,0 +1,52 @@
+import pytest
+
+class DriftScan(object):
+
+    """
+    Small seeded drift scan of a random sky by a HERA-like array used to
+    compare the visibilities of different code paths
+    """
+
+    latitude = -30.7224
+    longitude = 21.4283
+
+    def __init__(self, nant=4, nchan=16, nsrc=60, seed=0):
+        self.NP = pytest.importorskip('numpy')
+        self.RI = pytest.importorskip('prisim.interferometry')
+        self.SM = pytest.importorskip('astroutils.catalog')
+        NP = self.NP
+        rng = NP.random.RandomState(seed)
+        antpos = NP.hstack((rng.uniform(-40.0, 40.0, size=(nant,2)), NP.zeros((nant,1))))
+        antlabels = NP.asarray([str(i) for i in range(nant)])
+        self.layout = {'positions': antpos, 'coords': 'ENU', 'labels': antlabels, 'ids': NP.arange(nant)}
+        a1_ind, a2_ind = NP.triu_indices(nant, k=1)
+        self.baselines = antpos[a2_ind,:] - antpos[a1_ind,:]
+        self.labels = [(antlabels[a2], antlabels[a1]) for a1, a2 in zip(a1_ind, a2_ind)]
+        self.channels = 150e6 + 97.65625e3 * NP.arange(nchan)
+        self.telescope = {'id': 'hera', 'shape': 'dish', 'size': 14.0, 'ocoords': 'altaz', 'orientation': NP.asarray([90.0, 270.0]).reshape(1,-1), 'groundplane': None, 'latitude': self.latitude, 'longitude': self.longitude, 'altitude': 1051.69}
+        ra = rng.uniform(0.0, 360.0, size=nsrc)
+        dec = NP.degrees(NP.arcsin(rng.uniform(-1.0, NP.sin(NP.radians(self.latitude+60.0)), size=nsrc)))
+        spectrum = rng.uniform(0.1, 10.0, size=(nsrc,1)) * (self.channels.reshape(1,-1) / 150e6)**rng.uniform(-1.0, -0.5, size=(nsrc,1))
+        self.skymodel = self.SM.SkyModel(init_parms={'name': 'test', 'frequency': self.channels, 'location': NP.hstack((ra.reshape(-1,1), dec.reshape(-1,1))), 'spec_type': 'spectrum', 'spec_parms': {}, 'spectrum': spectrum}, init_file=None)
+        self.Tsysinfo = {'Trx': 100.0, 'Tant': {'f0': 150e6, 'spindex': -2.55, 'T0': 300.0}, 'Tnet': None}
+        self.t_acc = 10.7
+
+    def new_array(self, **kwargs):
+        return self.RI.InterferometerArray(self.labels, self.baselines, self.channels, telescope=self.telescope, latitude=self.latitude, longitude=self.longitude, altitude=1051.69, A_eff=self.NP.pi*7.0**2, pointing_coords='hadec', layout=self.layout, baseline_coords='localenu', **kwargs)
+
+    def timestamp(self, j):
+        return 2458000.0 + j * self.t_acc / 86400.0
+
+    def lst(self, j):
+        return 30.0 + j * 2.5 # Wide steps so that sources rise and set
+
+    def observe(self, ia, snapshots, **kwargs):
+        for j in snapshots:
+            ia.observe(self.timestamp(j), self.Tsysinfo, self.NP.ones(self.channels.size), [0.0, self.latitude], self.skymodel, self.t_acc, lst=self.lst(j), brightness_units='Jy', **kwargs)
+
+    def observe_batch(self, ia, snapshots, **kwargs):
+        ia.observe_batch([self.timestamp(j) for j in snapshots], self.Tsysinfo, self.NP.ones(self.channels.size), [0.0, self.latitude], self.skymodel, self.t_acc, lsts=[self.lst(j) for j in snapshots], brightness_units='Jy', **kwargs)
+
+@pytest.fixture
+def drift_scan():
+    return DriftScan()
@@ -0,0 +1,37 @@
+import pytest
+
+def test_culled_flux_density_within_bound():
+    NP = pytest.importorskip('numpy')
+    RI = pytest.importorskip('prisim.interferometry')
+    rng = NP.random.RandomState(3)
+    nsrc = 500
+    pbfluxes = 10**rng.uniform(-3.0, 1.0, size=(nsrc,8))
+    for tol in [0.0, 1e-3, 1e-2, 1e-1]:
+        keep_ind, ncull, error_bound = RI.beam_weighted_culling(pbfluxes, tol)
+        assert ncull == nsrc - keep_ind.size
+        assert error_bound <= tol
+        culled_ind = NP.setdiff1d(NP.arange(nsrc), keep_ind)
+        # Culled sources adding up in phase is the worst case of the error
+        assert NP.all(NP.sum(pbfluxes[culled_ind,:], axis=0) <= error_bound * NP.sum(pbfluxes, axis=0) * (1.0 + 1e-12))
+
+def test_culling_error_bound_bounds_visibility_error(drift_scan):
+    NP = drift_scan.NP
+    GEOM = pytest.importorskip('astroutils.geometry')
+    PB = pytest.importorskip('prisim.primary_beams')
+    snapshots = range(3)
+    exact = drift_scan.new_array()
+    drift_scan.observe(exact, snapshots)
+    culled = drift_scan.new_array()
+    drift_scan.observe(culled, snapshots, cull_tol=0.05)
+    assert sum([info['ncull'] for info in culled.cull_info]) > 0
+
+    skypos = drift_scan.skymodel.location
+    pc_altaz = GEOM.hadec2altaz(NP.asarray([0.0, drift_scan.latitude]), drift_scan.latitude, units='degrees')
+    for j in snapshots:
+        hadec = NP.hstack(((drift_scan.lst(j) - skypos[:,0]).reshape(-1,1), skypos[:,1].reshape(-1,1)))
+        altaz = GEOM.hadec2altaz(hadec, drift_scan.latitude, units='degrees')
+        ind = NP.where(altaz[:,0] >= 0.0)[0]
+        pb = PB.primary_beam_generator(altaz[ind,:], drift_scan.channels/1e9, skyunits='altaz', telescope=drift_scan.telescope, pointing_center=pc_altaz, freq_scale='GHz')
+        total_pbflux = NP.sum(pb * drift_scan.skymodel.subset(indices=ind).generate_spectrum(), axis=0)
+        vis_error = NP.abs(culled.skyvis_freq[:,:,j] - exact.skyvis_freq[:,:,j])
+        assert NP.all(vis_error <= culled.cull_info[j]['error_bound'] * total_pbflux.reshape(1,-1) * (1.0 + 1e-9))
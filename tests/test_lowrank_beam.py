@@ -0,0 +1,40 @@
+import pytest
+
+NP = pytest.importorskip('numpy')
+PB = pytest.importorskip('prisim.primary_beams')
+
+@pytest.mark.parametrize('rtol', [1e-2, 1e-4, 1e-6])
+def test_every_sky_position_within_tolerance(rtol):
+    rng = NP.random.RandomState(2)
+    nsrc = 400
+    freqs = NP.linspace(0.1, 0.2, 64)
+    # Smooth spectra of a bright main lobe and faint sidelobes with
+    # different spectral structure
+    amplitude = NP.concatenate((rng.uniform(0.5, 1.0, size=100), rng.uniform(1e-5, 1e-3, size=nsrc-100)))
+    width = rng.uniform(0.5, 3.0, size=nsrc)
+    pbeam = amplitude.reshape(-1,1) * NP.cos(width.reshape(-1,1) * freqs.reshape(1,-1) / freqs[0])**2
+    pbeam[7,:] = 0.0
+    pbeam_lowrank = PB.lowrank_beam_compress(pbeam, rtol=rtol)
+    assert pbeam_lowrank['basis'].shape[0] < freqs.size
+    rownorms = NP.sqrt(NP.sum(pbeam**2, axis=1))
+    rownorms[rownorms == 0.0] = 1.0
+    coeffs = pbeam_lowrank['coeffs'].astype(NP.float64)
+    basis = pbeam_lowrank['basis'].astype(NP.float64)
+    row_errors = NP.sqrt(NP.sum((pbeam - NP.dot(coeffs, basis))**2, axis=1)) / rownorms
+    # Allow for storing the coefficients and basis in single precision
+    assert NP.all(row_errors <= rtol + 1e-6)
+    assert pbeam_lowrank['rel_error'] <= rtol
+    NP.testing.assert_allclose(pbeam_lowrank['rel_error'], NP.max(row_errors), rtol=1e-2, atol=1e-6)
+
+def test_max_rank_limits_basis():
+    rng = NP.random.RandomState(4)
+    pbeam = rng.rand(50, 16)
+    pbeam_lowrank = PB.lowrank_beam_compress(pbeam, rtol=1e-8, max_rank=3)
+    assert pbeam_lowrank['basis'].shape == (3, 16)
+    assert pbeam_lowrank['rel_error'] > 1e-8
+
+def test_empty_and_zero_beams():
+    for pbeam in [NP.zeros((0,8)), NP.zeros((5,8))]:
+        pbeam_lowrank = PB.lowrank_beam_compress(pbeam)
+        assert pbeam_lowrank['rel_error'] == 0.0
+        assert PB.lowrank_beam_expand(pbeam_lowrank).shape == pbeam.shape
@@ -0,0 +1,266 @@
+import pytest
+
+NP = pytest.importorskip('numpy')
+MPI = pytest.importorskip('mpi4py.MPI')
+PP = pytest.importorskip('prisim.parallel_processing')
+
+class FakeComm(object):
+
+    """
+    Stands in for an MPI communicator of size processes as seen by the
+    process of rank rank. Collective calls behave as if every other process
+    contributed other (for reductions) or as if this process led its team
+    """
+
+    def __init__(self, size, rank, other=None):
+        self.size = size
+        self.rank = rank
+        self.other = other
+        self.calls = []
+
+    def Get_size(self):
+        return self.size
+
+    def Get_rank(self):
+        return self.rank
+
+    def Split(self, color, key):
+        if color == MPI.UNDEFINED:
+            return MPI.COMM_NULL
+        return FakeComm(self.size, 0)
+
+    def Free(self):
+        pass
+
+    def bcast(self, obj, root=0):
+        return obj
+
+    def gather(self, obj, root=0):
+        if self.rank == root:
+            return [obj]
+        return None
+
+    def _reduce(self, segment):
+        offset = sum([call[1] for call in self.calls])
+        self.calls += [('reduce', segment.size)]
+        if self.other is not None:
+            segment += (self.size - 1) * self.other.reshape(-1)[offset:offset+segment.size]
+
+    def Reduce(self, sendbuf, recvbuf, op=None, root=0):
+        assert op == MPI.SUM
+        if sendbuf is MPI.IN_PLACE:
+            self._reduce(recvbuf[0])
+        else:
+            assert recvbuf is None
+            self.calls += [('send', sendbuf[0].size)]
+
+    def Allreduce(self, sendbuf, recvbuf, op=None):
+        assert (sendbuf is MPI.IN_PLACE) and (op == MPI.SUM)
+        self._reduce(recvbuf[0])
+
+################################################################################
+# Block sizes, tasks and scheduling
+
+def test_snapshot_block_size_fewer_snapshots_than_batch():
+    assert PP.snapshot_block_size(4, 3, 8, snapshot_batch=8) == 3
+
+def test_snapshot_block_size_more_chunks_than_processes():
+    # Enough tasks from the chunks alone, so snapshots are not split
+    assert PP.snapshot_block_size(64, 100, 4) == 100
+    assert PP.snapshot_block_size(64, 100, 4, snapshot_batch=16) == 100
+
+@pytest.mark.parametrize('n_chunks,n_acc,nproc,snapshot_batch', [(1, 1, 1, 1), (2, 100, 8, 4), (3, 97, 16, 5), (1, 10, 64, 1), (5, 1000, 7, 32)])
+def test_snapshot_block_size_multiple_of_batch(n_chunks, n_acc, nproc, snapshot_batch):
+    block = PP.snapshot_block_size(n_chunks, n_acc, nproc, snapshot_batch=snapshot_batch)
+    assert 1 <= block <= n_acc
+    if block < n_acc:
+        assert block % snapshot_batch == 0
+    nblocks = -(-n_acc // block)
+    # No more blocks than needed for tasks_per_process tasks per process
+    assert (nblocks == 1) or (n_chunks * (nblocks-1) < 4 * nproc)
+
+@pytest.mark.parametrize('args', [(0, 10, 4), (2, 0, 4), (2, 10, 0), (2, 10, 4, 0)])
+def test_snapshot_block_size_rejects_non_positive(args):
+    with pytest.raises(ValueError):
+        PP.snapshot_block_size(*args)
+
+def test_snapshot_block_size_rejects_non_integers():
+    with pytest.raises(TypeError):
+        PP.snapshot_block_size(2.0, 10, 4)
+
+@pytest.mark.parametrize('n_acc,snapshot_block', [(10, 3), (10, 10), (10, 20), (1, 1)])
+def test_snapshot_tasks_cover_every_snapshot_of_every_chunk_once(n_acc, snapshot_block):
+    chunk_costs = [3.0, 1.0, 2.0, 0.0]
+    tasks = PP.snapshot_tasks(chunk_costs, n_acc, snapshot_block)
+    assert len(tasks) == len(chunk_costs) * (-(-n_acc // snapshot_block))
+    for chunk in range(len(chunk_costs)):
+        blocks = sorted([task for task in tasks if task['chunk'] == chunk], key=lambda task: task['block'])
+        assert [task['block'] for task in blocks] == range(len(blocks))
+        snapshots = [j for task in blocks for j in range(*task['snapshots'])]
+        assert snapshots == range(n_acc)
+        for task in blocks:
+            assert task['cost'] == chunk_costs[chunk] * (task['snapshots'][1] - task['snapshots'][0])
+
+def test_snapshot_tasks_order():
+    tasks = PP.snapshot_tasks([1.0, 2.0, 2.0], 5, 2)
+    keys = [(-task['cost'], task['chunk'], task['block']) for task in tasks]
+    assert keys == sorted(keys)
+    assert (tasks[0]['chunk'], tasks[0]['block']) == (1, 0) # Ties broken by chunk and then block
+    assert tasks[-1]['snapshots'] == (4, 5) # The short last block of the cheapest chunk
+
+@pytest.mark.parametrize('nproc,ntasks', [(4, 10), (4, 3), (1, 5), (3, 0)])
+def test_static_scheduler_deals_tasks_round_robin(nproc, ntasks):
+    dealt = []
+    for rank in range(nproc):
+        scheduler = PP.TaskScheduler(FakeComm(nproc, rank), ntasks, dynamic=False)
+        tasks = list(scheduler)
+        assert tasks == range(rank, ntasks, nproc)
+        assert [entry['task'] for entry in scheduler.log] == tasks
+        assert all([entry['rank'] == rank for entry in scheduler.log])
+        dealt += tasks
+        scheduler.free()
+    assert sorted(dealt) == range(ntasks)
+
+def test_static_scheduler_deals_tasks_to_teams():
+    nproc = 6
+    team_size = 2
+    ntasks = 7
+    for rank in range(0, nproc, team_size): # Leaders of the teams
+        scheduler = PP.TaskScheduler(FakeComm(nproc, rank), ntasks, dynamic=False, team_size=team_size)
+        assert scheduler.nteams == 3
+        assert scheduler.team_rank == 0
+        assert list(scheduler) == range(rank // team_size, ntasks, 3)
+        scheduler.free()
+
+def test_scheduler_rejects_team_size_not_dividing_processes():
+    with pytest.raises(ValueError):
+        PP.TaskScheduler(FakeComm(6, 0), 4, dynamic=False, team_size=4)
+
+def test_dynamic_scheduler_on_single_process():
+    scheduler = PP.TaskScheduler(MPI.COMM_SELF, 5, dynamic=True)
+    assert list(scheduler) == range(5)
+    log = scheduler.gather_log()
+    assert [entry['task'] for entry in log] == range(5)
+    scheduler.free()
+
+################################################################################
+# Decomposition grid and shares of the regions of interest
+
+@pytest.mark.parametrize('n', [1, 2, 3, 12, 100, 1023])
+def test_split_counts(n):
+    counts = PP._split_counts(n)
+    assert counts == sorted(set(counts))
+    assert counts[0] == 1
+    assert counts[-1] == n
+    assert all([1 <= count <= n for count in counts])
+    assert len(counts) <= 2 * int(NP.ceil(NP.log2(max(n,2)))) + 2
+
+def test_decomposition_grid_keeps_every_process_busy():
+    grid = PP.decomposition_grid(100, 64, 1000, 8, 1e12, 16)
+    assert grid['src'] == 1
+    assert grid['bl'] * grid['freq'] >= 8
+    assert grid['memory'] == 1000 * (-(-100 // grid['bl'])) * (-(-64 // grid['freq'])) * 16
+
+def test_decomposition_grid_fewer_visibilities_than_processes():
+    grid = PP.decomposition_grid(1, 2, 1000, 8, 1e12, 16)
+    assert (grid['bl'], grid['freq']) == (1, 2)
+
+def test_decomposition_grid_respects_memory():
+    memory_per_process = 1000 * 10 * 8 * 16
+    grid = PP.decomposition_grid(100, 64, 1000, 4, memory_per_process, 16)
+    assert grid['memory'] <= memory_per_process
+
+def test_decomposition_grid_splits_sources_when_needed():
+    # One source share does not fit even for a single visibility per tile
+    with pytest.raises(ValueError):
+        PP.decomposition_grid(10, 10, 1000, 8, 10000, 16)
+    grid = PP.decomposition_grid(10, 10, 1000, 8, 10000, 16, src_shares=None)
+    assert grid['src'] > 1
+    assert 8 % grid['src'] == 0
+    assert grid['memory'] <= 10000
+
+def test_decomposition_grid_rejects_shares_not_dividing_processes():
+    with pytest.raises(ValueError):
+        PP.decomposition_grid(10, 10, 1000, 8, 1e12, 16, src_shares=3)
+
+def _write_roi_file(filename, n_roi_list, nchan, compressed):
+    h5py = pytest.importorskip('h5py')
+    rng = NP.random.RandomState(5)
+    snapshots = []
+    with h5py.File(filename+'.hdf5', 'w') as fileobj:
+        fileobj['header/n_obs'] = len(n_roi_list)
+        fileobj['spectral_info/freqs'] = 1e8 + 1e6 * NP.arange(nchan)
+        for i, n_roi in enumerate(n_roi_list):
+            ind = NP.sort(rng.choice(1000, size=n_roi, replace=False))
+            grp = fileobj.create_group('roi/{0:0d}'.format(i))
+            grp['ind'] = ind
+            if compressed:
+                coeffs = rng.rand(n_roi, 2)
+                basis = rng.rand(2, nchan)
+                grp['pbeam_coeffs'] = coeffs
+                grp['pbeam_basis'] = basis
+                grp['pbeam_basis'].attrs['rel_error'] = 0.0
+                pbeam = NP.dot(coeffs, basis)
+            else:
+                pbeam = rng.rand(n_roi, nchan)
+                grp['pbeam'] = pbeam
+            snapshots += [(ind, pbeam)]
+    return snapshots
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_roi_store_shares_partition_the_sources(tmpdir, compressed):
+    RI = pytest.importorskip('prisim.interferometry')
+    n_roi_list = [0, 1, 7, 10]
+    nchan = 6
+    infile = str(tmpdir.join('roi'))
+    snapshots = _write_roi_file(infile, n_roi_list, nchan, compressed)
+    store = RI.ROI_store(infile)
+    try:
+        for i, (ind, pbeam) in enumerate(snapshots):
+            for nshares in [1, 3, 4, 12]:
+                for chans in [None, slice(1,4), [0, 2, 5]]:
+                    parts = [store.read(i, chans=chans, share=(k, nshares)) for k in range(nshares)]
+                    sizes = [part['ind'].size for part in parts]
+                    assert max(sizes) - min(sizes) <= 1
+                    assert sizes == sorted(sizes, reverse=True) # Larger shares first
+                    NP.testing.assert_array_equal(NP.concatenate([part['ind'] for part in parts]), ind)
+                    expected = pbeam if chans is None else pbeam[:,chans]
+                    for part in parts:
+                        assert part['pbeam'].shape == (part['ind'].size, expected.shape[1])
+                    NP.testing.assert_allclose(NP.concatenate([part['pbeam'] for part in parts], axis=0), expected, rtol=1e-6 if compressed else 0.0) # Expanded beams are float32
+        with pytest.raises(ValueError):
+            store.read(0, share=(2, 2))
+    finally:
+        store.close()
+
+################################################################################
+# Reduction of visibilities
+
+@pytest.mark.parametrize('root', [0, None])
+@pytest.mark.parametrize('dtype', [NP.float32, NP.float64, NP.complex64, NP.complex128])
+def test_reduce_sum_in_segments(root, dtype):
+    nproc = 3
+    array = (NP.arange(10) + 1j * NP.arange(10)[::-1]).astype(dtype) if NP.iscomplexobj(NP.zeros(1, dtype=dtype)) else NP.arange(10).astype(dtype)
+    other = NP.ones_like(array)
+    comm = FakeComm(nproc, 0, other=other)
+    expected = array + (nproc-1) * other
+    result = PP.reduce_sum(comm, array.copy(), root=root, max_count=3)
+    assert [call[1] for call in comm.calls] == [3, 3, 3, 1]
+    NP.testing.assert_array_equal(result, expected)
+    assert result.dtype == NP.dtype(dtype)
+
+def test_reduce_sum_non_root_sends_and_returns_none():
+    comm = FakeComm(2, 1)
+    assert PP.reduce_sum(comm, NP.zeros(7), root=0, max_count=4) is None
+    assert comm.calls == [('send', 4), ('send', 3)]
+
+def test_reduce_sum_non_contiguous_array():
+    array = NP.arange(24, dtype=NP.float64).reshape(4,6)[:,::2]
+    comm = FakeComm(2, 0, other=NP.ones(array.size))
+    result = PP.reduce_sum(comm, array, root=0, max_count=5)
+    assert result.shape == array.shape
+    NP.testing.assert_array_equal(result, array + 1.0)
+
+def test_reduce_sum_rejects_unsupported_type():
+    with pytest.raises(TypeError):
+        PP.reduce_sum(FakeComm(2, 0), NP.arange(4), root=0)
@@ -0,0 +1,22 @@
+import pytest
+
+NP = pytest.importorskip('numpy')
+HP = pytest.importorskip('healpy')
+PB = pytest.importorskip('prisim.primary_beams')
+
+dipole = {'shape': 'dipole', 'size': 0.74, 'ocoords': 'altaz', 'orientation': NP.asarray([0.0, 90.0]).reshape(1,-1), 'groundplane': None}
+dipole_on_ground = dict(dipole, groundplane=0.3)
+mwa = {'id': 'mwa', 'shape': 'dipole', 'size': 0.74, 'ocoords': 'altaz', 'orientation': NP.asarray([0.0, 90.0]).reshape(1,-1), 'groundplane': 0.3}
+phased_array = dict(dipole_on_ground, element_locs=NP.hstack((1.1*NP.random.RandomState(0).uniform(-1.5, 1.5, size=(8,2)), NP.zeros((8,1)))))
+
+@pytest.mark.parametrize('telescope,pointing_info', [(dipole, None), (dipole_on_ground, None), (mwa, None), (phased_array, {'delays': NP.arange(8) * 0.5e-9})])
+def test_tabulated_beam_matches_beam_above_horizon(telescope, pointing_info):
+    nside = 16
+    freqs = NP.asarray([0.15, 0.16])
+    pbcache = PB.PrimaryBeamCache(freqs=freqs, freq_scale='GHz', telescope=telescope, nside=nside, pointing_info=pointing_info, pointing_center=NP.asarray([90.0, 270.0]), interp_method='nearest')
+    theta, phi = HP.pix2ang(nside, NP.arange(HP.nside2npix(nside)))
+    above_horizon = theta < 0.5*NP.pi
+    skypos = NP.hstack(((90.0-NP.degrees(theta[above_horizon])).reshape(-1,1), NP.degrees(phi[above_horizon]).reshape(-1,1)))
+    pb = PB.primary_beam_generator(skypos, freqs, telescope, freq_scale='GHz', skyunits='altaz', pointing_info=pointing_info, pointing_center=NP.asarray([90.0, 270.0]))
+    NP.testing.assert_allclose(pbcache.lookup(skypos, skyunits='altaz'), pb, rtol=1e-5, atol=1e-6*NP.amax(pb))
+    assert NP.all(NP.isfinite(pbcache.beam))
@@ -0,0 +1,44 @@
+import os
+import pytest
+
+pytest.importorskip('h5py')
+
+def _assert_same_observations(resumed, full):
+    NP = pytest.importorskip('numpy')
+    assert resumed.n_acc == full.n_acc
+    assert len(resumed.timestamp) == len(full.timestamp)
+    NP.testing.assert_allclose(resumed.timestamp, full.timestamp, rtol=0.0, atol=0.0)
+    NP.testing.assert_allclose(resumed.lst, full.lst, rtol=0.0, atol=0.0)
+    NP.testing.assert_allclose(resumed.t_obs, full.t_obs, rtol=1e-12)
+    NP.testing.assert_allclose(resumed.pointing_center, full.pointing_center, rtol=0.0, atol=0.0)
+    NP.testing.assert_allclose(resumed.Tsys, full.Tsys, rtol=1e-12)
+    NP.testing.assert_allclose(resumed.skyvis_freq, full.skyvis_freq, rtol=1e-12, atol=0.0)
+    assert len(resumed.Tsysinfo) == len(full.Tsysinfo)
+    assert resumed.cull_info == full.cull_info
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_resume_from_checkpoint_matches_uninterrupted_run(tmpdir, drift_scan, batch):
+    RI = drift_scan.RI
+    nsnaps = 5
+    nckpt = 2
+    if batch:
+        observe = drift_scan.observe_batch
+    else:
+        observe = drift_scan.observe
+
+    full = drift_scan.new_array()
+    observe(full, range(nsnaps), cull_tol=1e-3)
+
+    ckptfile = os.path.join(str(tmpdir), 'ckpt')
+    interrupted = drift_scan.new_array()
+    observe(interrupted, range(nckpt), cull_tol=1e-3)
+    interrupted.save(ckptfile, fmt='HDF5', verbose=False, npz=False, overwrite=True, uvfits_parms=None)
+
+    resumed = RI.InterferometerArray(None, None, None, init_file=ckptfile)
+    observe(resumed, range(nckpt, nsnaps), cull_tol=1e-3)
+    _assert_same_observations(resumed, full)
+
+    # A checkpoint of the resumed run must itself be resumable
+    resumed.save(ckptfile, fmt='HDF5', verbose=False, npz=False, overwrite=True, uvfits_parms=None)
+    reloaded = RI.InterferometerArray(None, None, None, init_file=ckptfile)
+    _assert_same_observations(reloaded, full)
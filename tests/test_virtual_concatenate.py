@@ -0,0 +1,53 @@
+import os
+import pytest
+
+NP = pytest.importorskip('numpy')
+h5py = pytest.importorskip('h5py')
+RI = pytest.importorskip('prisim.interferometry')
+
+if (not hasattr(h5py, 'VirtualLayout')) or (h5py.version.hdf5_version_tuple < (1,10,0)):
+    pytest.skip('Virtual datasets require h5py >= 2.9 built on HDF5 >= 1.10', allow_module_level=True)
+
+def _write_piece(filename, nbl, nchan, ntimes, seed):
+    rng = NP.random.RandomState(seed)
+    piece = {'baselines': rng.randn(nbl, 3), 'timestamps': rng.rand(ntimes), 'skyvis': rng.randn(nbl, nchan, ntimes) + 1j * rng.randn(nbl, nchan, ntimes), 'gradient': rng.randn(3, nbl, nchan, ntimes) + 1j * rng.randn(3, nbl, nchan, ntimes)}
+    with h5py.File(filename+'.hdf5', 'w') as fileobj:
+        fileobj['header/flux_unit'] = 'JY'
+        fileobj['array/baselines'] = piece['baselines']
+        fileobj['spectral_info/freqs'] = 1e8 + 1e6 * NP.arange(nchan)
+        fileobj['timing/timestamps'] = piece['timestamps']
+        fileobj['timing/n_acc'] = ntimes
+        fileobj['visibilities/freq_spectrum/skyvis'] = piece['skyvis']
+        fileobj['gradients/baseline'] = piece['gradient']
+    return piece
+
+def test_two_baseline_tiles_with_gradients(tmpdir):
+    nbl_tiles = [2, 3] # Unequal tiles of baselines
+    ntimes_blocks = [4, 2]
+    nchan = 5
+    infiles = []
+    pieces = []
+    for ib, nbl in enumerate(nbl_tiles):
+        infiles += [[[]]]
+        pieces += [[]]
+        for kt, ntimes in enumerate(ntimes_blocks):
+            infile = os.path.join(str(tmpdir), '_part_{0:0d}_{1:0d}'.format(ib, kt))
+            infiles[ib][0] += [infile]
+            pieces[ib] += [_write_piece(infile, nbl, nchan, ntimes, 10*ib+kt)]
+    outfile = os.path.join(str(tmpdir), 'simvis')
+    RI.virtual_concatenate(infiles, outfile, overwrite=True, verbose=False)
+
+    # Same axes as InterferometerArray.concatenate(), which joins the
+    # gradients along axis+1
+    expected_skyvis = NP.concatenate([NP.concatenate([piece['skyvis'] for piece in row], axis=2) for row in pieces], axis=0)
+    expected_gradient = NP.concatenate([NP.concatenate([piece['gradient'] for piece in row], axis=3) for row in pieces], axis=1)
+    expected_baselines = NP.concatenate([row[0]['baselines'] for row in pieces], axis=0)
+    expected_timestamps = NP.concatenate([piece['timestamps'] for piece in pieces[0]])
+    with h5py.File(outfile+'.hdf5', 'r') as fileobj:
+        assert fileobj['gradients/baseline'].is_virtual
+        assert fileobj['gradients/baseline'].shape == (3, sum(nbl_tiles), nchan, sum(ntimes_blocks))
+        NP.testing.assert_array_equal(fileobj['gradients/baseline'][...], expected_gradient)
+        NP.testing.assert_array_equal(fileobj['visibilities/freq_spectrum/skyvis'][...], expected_skyvis)
+        NP.testing.assert_array_equal(fileobj['array/baselines'][...], expected_baselines)
+        NP.testing.assert_array_equal(fileobj['timing/timestamps'][...], expected_timestamps)
+        assert fileobj['timing/n_acc'][()] == sum(ntimes_blocks)
@@ -0,0 +1,169 @@
+import pytest
+
+NSNAPS = 3
+
+def _observe(drift_scan, batch=False, **kwargs):
+    ia = drift_scan.new_array()
+    if batch:
+        drift_scan.observe_batch(ia, range(NSNAPS), **kwargs)
+    else:
+        drift_scan.observe(ia, range(NSNAPS), **kwargs)
+    return ia
+
+def _assert_same_visibilities(ia, ref, rtol, gradient=False):
+    NP = pytest.importorskip('numpy')
+    # Tolerances are relative to the largest visibility since the errors of
+    # the visibilities scale with the total apparent flux density rather
+    # than with the visibility itself
+    skyvis = NP.asarray(ia.skyvis_freq)
+    ref_skyvis = NP.asarray(ref.skyvis_freq)
+    assert skyvis.shape == ref_skyvis.shape
+    NP.testing.assert_allclose(skyvis, ref_skyvis, rtol=0.0, atol=rtol*NP.abs(ref_skyvis).max())
+    if gradient:
+        skyvis_gradient = NP.asarray(ia.gradient['baseline'])
+        ref_skyvis_gradient = NP.asarray(ref.gradient['baseline'])
+        assert skyvis_gradient.shape == ref_skyvis_gradient.shape
+        NP.testing.assert_allclose(skyvis_gradient, ref_skyvis_gradient, rtol=0.0, atol=rtol*NP.abs(ref_skyvis_gradient).max())
+
+def _gradient_kwargs(gradient):
+    if gradient:
+        return {'gradient_mode': 'baseline'}
+    return {}
+
+################################################################################
+# Antenna-factored visibilities
+
+@pytest.mark.parametrize('batch', [False, True])
+@pytest.mark.parametrize('gradient', [False, True])
+def test_antenna_engine_matches_direct_evaluation(drift_scan, batch, gradient):
+    ref = _observe(drift_scan, **_gradient_kwargs(gradient))
+    ia = _observe(drift_scan, batch=batch, vis_engine='antenna', **_gradient_kwargs(gradient))
+    _assert_same_visibilities(ia, ref, 1e-10, gradient=gradient)
+
+################################################################################
+# Phasor recurrence along frequency
+
+def test_phasor_recurrence_within_bound():
+    NP = pytest.importorskip('numpy')
+    RI = pytest.importorskip('prisim.interferometry')
+    rng = NP.random.RandomState(1)
+    delays = rng.uniform(-1e-6, 1e-6, size=(20,7))
+    freqs = 150e6 + 97.65625e3 * NP.arange(64)
+    direct = NP.exp(-1j * 2.0 * NP.pi * delays[:,:,NP.newaxis] * freqs.reshape(1,1,-1))
+    # (renorm_interval-1) steps of about 3.3 u each and the rounding of the
+    # phases of up to 2 pi x 150 radians
+    bound = 3.3 * 15 * 1.1e-16 + 8 * 2.0 * NP.pi * NP.abs(delays).max() * freqs.max() * 1.1e-16
+    NP.testing.assert_allclose(RI.phasor_recurrence(delays, freqs), direct, rtol=0.0, atol=bound)
+    direct32 = direct.astype(NP.complex64)
+    NP.testing.assert_allclose(RI.phasor_recurrence(delays, freqs, memsave=True), direct32, rtol=0.0, atol=3.3*15*6e-8+1e-6)
+
+def test_phasor_recurrence_requires_even_spacing():
+    NP = pytest.importorskip('numpy')
+    RI = pytest.importorskip('prisim.interferometry')
+    delays = NP.ones((2,3)) * 1e-6
+    for freqs in [150e6 + 97.65625e3 * NP.arange(1024), NP.linspace(100e6, 200e6, 1025)]:
+        assert RI._channel_spacing(freqs) is not None
+        RI.phasor_recurrence(delays, freqs)
+    # A deviation within a relative tolerance of 1e-6 on the spacing, which
+    # puts a phase error of 3e-7 radians on a delay of a microsecond
+    freqs = 150e6 + 97.65625e3 * NP.arange(64)
+    freqs[40] += 0.05
+    assert RI._channel_spacing(freqs) is None
+    with pytest.raises(ValueError):
+        RI.phasor_recurrence(delays, freqs)
+
+@pytest.mark.parametrize('batch', [False, True])
+@pytest.mark.parametrize('gradient', [False, True])
+def test_recurrence_matches_direct_evaluation(drift_scan, batch, gradient):
+    ref = _observe(drift_scan, **_gradient_kwargs(gradient))
+    ia = _observe(drift_scan, batch=batch, phasor_mode='recurrence', **_gradient_kwargs(gradient))
+    _assert_same_visibilities(ia, ref, 1e-10, gradient=gradient)
+
+################################################################################
+# Blocks of snapshots
+
+@pytest.mark.parametrize('gradient', [False, True])
+def test_observe_batch_matches_observe(drift_scan, gradient):
+    NP = drift_scan.NP
+    ref = _observe(drift_scan, **_gradient_kwargs(gradient))
+    ia = _observe(drift_scan, batch=True, **_gradient_kwargs(gradient))
+    assert ia.n_acc == ref.n_acc
+    NP.testing.assert_allclose(ia.timestamp, ref.timestamp, rtol=0.0, atol=0.0)
+    NP.testing.assert_allclose(ia.lst, ref.lst, rtol=0.0, atol=0.0)
+    NP.testing.assert_allclose(ia.pointing_center, ref.pointing_center, rtol=1e-12)
+    NP.testing.assert_allclose(ia.Tsys, ref.Tsys, rtol=1e-12)
+    for ind, ref_ind in zip(ia.obs_catalog_indices, ref.obs_catalog_indices):
+        NP.testing.assert_array_equal(ind, ref_ind)
+    _assert_same_visibilities(ia, ref, 1e-10, gradient=gradient)
+
+def test_observe_batch_in_parts_matches_whole(drift_scan):
+    ref = _observe(drift_scan, batch=True)
+    ia = drift_scan.new_array()
+    drift_scan.observe_batch(ia, range(1))
+    drift_scan.observe_batch(ia, range(1, NSNAPS))
+    _assert_same_visibilities(ia, ref, 1e-12)
+
+################################################################################
+# Visibility tiles within a memory budget
+
+@pytest.mark.parametrize('phasor_mode', ['direct', 'recurrence'])
+@pytest.mark.parametrize('gradient', [False, True])
+def test_tiles_within_memory_budget_match_direct_evaluation(drift_scan, phasor_mode, gradient):
+    ref = _observe(drift_scan, **_gradient_kwargs(gradient))
+    plans = []
+    memory_budget = 4 * 24 * 16 # A few sources, baselines and channels per tile
+    ia = _observe(drift_scan, phasor_mode=phasor_mode, memory_budget=memory_budget, tile_hook=plans.append, **_gradient_kwargs(gradient))
+    assert len(plans) > 0
+    assert all([plan['ntiles'] > 1 for plan in plans])
+    assert all([plan['tile_bytes'] <= memory_budget for plan in plans])
+    _assert_same_visibilities(ia, ref, 1e-10, gradient=gradient)
+
+def test_observe_batch_within_memory_budget(drift_scan):
+    ref = _observe(drift_scan)
+    ia = _observe(drift_scan, batch=True, memory_budget=4096)
+    _assert_same_visibilities(ia, ref, 1e-10)
+
+def test_visibility_tile_plan_within_budget():
+    pytest.importorskip('numpy')
+    RI = pytest.importorskip('prisim.interferometry')
+    for memory_budget in [1, 100, 1e4, 1e6, 1e9]:
+        plan = RI.visibility_tile_plan(1000, 300, 128, 16, memory_budget=memory_budget)
+        assert plan['tile_bytes'] <= max(memory_budget, 24)
+        assert 1 <= plan['src'] <= 1000
+        assert 1 <= plan['bl'] <= 300
+        assert 1 <= plan['chan'] <= 128
+
+################################################################################
+# Threads
+
+@pytest.mark.parametrize('batch', [False, True])
+@pytest.mark.parametrize('gradient', [False, True])
+def test_threads_match_single_thread(drift_scan, batch, gradient):
+    ref = _observe(drift_scan, **_gradient_kwargs(gradient))
+    ia = _observe(drift_scan, batch=batch, nthreads=3, **_gradient_kwargs(gradient))
+    _assert_same_visibilities(ia, ref, 1e-10, gradient=gradient)
+
+################################################################################
+# Mixed precision
+
+@pytest.mark.parametrize('batch', [False, True])
+@pytest.mark.parametrize('phasor_mode', ['direct', 'recurrence'])
+def test_mixed_precision_close_to_double_precision(drift_scan, batch, phasor_mode):
+    NP = drift_scan.NP
+    ref = _observe(drift_scan, gradient_mode='baseline')
+    ia = _observe(drift_scan, batch=batch, memsave='mixed', phasor_mode=phasor_mode, gradient_mode='baseline')
+    assert NP.asarray(ia.skyvis_freq).dtype == NP.complex64
+    assert NP.asarray(ia.gradient['baseline']).dtype == NP.complex64
+    # Phasors and flux densities in single precision contribute an error of
+    # a few units of single precision round-off per source, which the
+    # accumulation in double precision does not grow further
+    _assert_same_visibilities(ia, ref, 1e-6, gradient=True)
+
+def test_mixed_precision_more_accurate_than_single_precision(drift_scan):
+    NP = drift_scan.NP
+    ref = _observe(drift_scan)
+    single = _observe(drift_scan, memsave=True, memory_budget=2**20)
+    mixed = _observe(drift_scan, memsave='mixed', memory_budget=2**20)
+    single_error = NP.abs(NP.asarray(single.skyvis_freq) - NP.asarray(ref.skyvis_freq)).max()
+    mixed_error = NP.abs(NP.asarray(mixed.skyvis_freq) - NP.asarray(ref.skyvis_freq)).max()
+    assert mixed_error < single_error